@@ -29,6 +29,14 @@ app.conf.CELERYBEAT_SCHEDULE = {
         'task': 'core.common.tasks.vacuum_and_analyze_db',
         'schedule': crontab(0, 1),  # Run at 1 am
     },
+    'flush-index-sync-queue': {
+        'task': 'core.common.tasks.flush_index_sync_queue',
+        'schedule': timedelta(seconds=int(os.environ.get('ES_SYNC_QUEUE_FLUSH_INTERVAL', 10))),
+    },
+    'refresh-stale-repo-statistics': {
+        'task': 'core.common.tasks.refresh_stale_repo_statistics',
+        'schedule': timedelta(seconds=int(os.environ.get('REPO_STATISTICS_REFRESH_INTERVAL', 300))),
+    },
 
 }
 app.config_from_object('django.conf:settings', namespace='CELERY')
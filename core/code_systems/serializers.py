@@ -32,6 +32,15 @@ class ValidateCodeParametersSerializer(ParametersSerializer):
         'system': 'valueUri'
     }
 
+
+class LookupParametersSerializer(ParametersSerializer):
+    allowed_input_parameters = {
+        'system': 'valueUri',
+        'code': 'valueCode',
+        'version': 'valueString'
+    }
+
+
 class CodeSystemConceptDesignationUseSerializer(serializers.Field):
     def to_internal_value(self, data):
         if 'code' in data:
@@ -183,6 +183,111 @@ class CodeSystemTest(OCLTestCase):
                 {'name': 'result', 'valueBoolean': False}
                 ]}))
 
+    def test_validate_code_for_code_system_batch_via_bundle(self):
+        def entry(code, display=None):
+            parameters = [
+                {'name': 'url', 'valueUri': self.org_source.canonical_url}, {'name': 'code', 'valueCode': code}]
+            if display:
+                parameters.append({'name': 'display', 'valueString': display})
+            return {'resource': {'resourceType': 'Parameters', 'parameter': parameters}}
+
+        response = self.client.post(
+            '/fhir/CodeSystem/$validate-code/',
+            data={
+                'resourceType': 'Bundle',
+                'type': 'batch',
+                'entry': [
+                    entry(self.concept_1.mnemonic), entry('non_existing_code'),
+                    entry(self.concept_2.mnemonic, 'wrong_display'), entry(self.concept_2.mnemonic)
+                ]
+            },
+            format='json'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['resourceType'], 'Bundle')
+        self.assertEqual(response.data['type'], 'batch-response')
+        self.assertEqual(
+            [entry['resource']['parameter'][0]['valueBoolean'] for entry in response.data['entry']],
+            [True, False, False, True]
+        )
+        self.assertEqual([entry['response']['status'] for entry in response.data['entry']], ['200'] * 4)
+
+    def test_validate_code_for_code_system_with_multiple_codings(self):
+        response = self.client.post(
+            '/fhir/CodeSystem/$validate-code/',
+            data={
+                'resourceType': 'Parameters',
+                'parameter': [
+                    {'name': 'coding', 'valueCoding': {
+                        'system': self.org_source.canonical_url, 'code': self.concept_1.mnemonic}},
+                    {'name': 'coding', 'valueCoding': {
+                        'system': self.org_source.canonical_url, 'code': self.concept_2.mnemonic, 'version': 'v1'}},
+                    {'name': 'coding', 'valueCoding': {'system': 'non_existing_url', 'code': self.concept_1.mnemonic}},
+                ]
+            },
+            format='json'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['type'], 'batch-response')
+        self.assertEqual(
+            [entry['resource']['parameter'][0]['valueBoolean'] for entry in response.data['entry']],
+            [True, False, False]
+        )
+
+    def test_lookup_for_code_system_with_multiple_codings(self):
+        response = self.client.post(
+            '/fhir/CodeSystem/$lookup/',
+            data={
+                'resourceType': 'Parameters',
+                'parameter': [
+                    {'name': 'coding', 'valueCoding': {
+                        'system': self.org_source.canonical_url, 'code': self.concept_1.mnemonic}},
+                    {'name': 'coding', 'valueCoding': {'system': self.org_source.canonical_url, 'code': 'foo'}},
+                ]
+            },
+            format='json'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['type'], 'batch-response')
+        self.assertEqual(len(response.data['entry']), 2)
+        self.assertEqual(response.data['entry'][0]['response']['status'], '200')
+        self.assertEqual(response.data['entry'][0]['resource']['parameter'], [
+            {'name': 'name', 'valueString': self.org_source.mnemonic},
+            {'name': 'version', 'valueString': self.org_source_v2.version},
+            {'name': 'display', 'valueString': self.concept_1.display_name}
+        ])
+        self.assertEqual(response.data['entry'][1]['response']['status'], '400')
+        self.assertEqual(response.data['entry'][1]['resource'], CodeSystemLookupNotFoundError('foo').detail)
+
+    def test_batch_validate_code(self):
+        response = self.client.post(
+            '/fhir/CodeSystem/$batch-validate-code/',
+            data=[
+                [self.org_source.canonical_url, None, self.concept_1.mnemonic],
+                [self.org_source.canonical_url, 'v1', self.concept_2.mnemonic],
+                {'system': self.org_source.canonical_url, 'code': self.concept_2.mnemonic, 'display': 'wrong'},
+                {'system': self.org_source.canonical_url, 'code': self.concept_1.mnemonic,
+                 'display': self.concept_1.display_name},
+                ['non_existing_url', None, self.concept_1.mnemonic],
+            ],
+            format='json'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        results = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(
+            [result['parameter'][0]['valueBoolean'] for result in results], [True, False, False, True, False])
+
+        response = self.client.post('/fhir/CodeSystem/$batch-validate-code/', data={'code': 'foo'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get('/fhir/CodeSystem/$batch-validate-code/')
+        self.assertEqual(response.status_code, 405)
+
     def test_lookup_for_code_system(self):
         response = self.client.get(f'/fhir/CodeSystem/$lookup/'
                                    f'?system={self.org_source.canonical_url}'
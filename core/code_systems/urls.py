@@ -8,6 +8,8 @@ urlpatterns = [
     re_path(r'^\$lookup/$', views.CodeSystemListLookupView.as_view(), name='code-system-list-lookup'),
     re_path(r'^\$validate-code/$', views.CodeSystemValidateCodeView.as_view(),
             name='code-system-validate-code'),
+    re_path(r'^\$batch-validate-code/$', views.CodeSystemBatchValidateCodeView.as_view(),
+            name='code-system-batch-validate-code'),
     re_path(
         fr"^(?P<source>{NAMESPACE_PATTERN})/$",
         views.CodeSystemRetrieveUpdateView.as_view(),
@@ -1,14 +1,16 @@
 import logging
+from functools import partial
 
 from django.db.models import F
 from rest_framework.exceptions import ValidationError, NotAuthenticated
 
 from core.bundles.serializers import FHIRBundleSerializer
 from core.code_systems.serializers import CodeSystemDetailSerializer, \
-    ValidateCodeParametersSerializer
+    ValidateCodeParametersSerializer, LookupParametersSerializer
 from core.common.constants import HEAD
 from core.common.fhir_helpers import translate_fhir_query
 from core.common.serializers import IdentifierSerializer
+from core.common.terminology import TerminologyOperationMixin, TerminologyBatchOperationMixin
 from core.concepts.permissions import CanViewParentDictionaryAsGuest
 from core.concepts.views import ConceptRetrieveUpdateDestroyView
 from core.parameters.serializers import ParametersSerializer
@@ -70,8 +72,26 @@ class CodeSystemLookupNotFoundError(ValidationError):
         )
 
 
-class CodeSystemListLookupView(ConceptRetrieveUpdateDestroyView):
+class CodeSystemListLookupView(TerminologyOperationMixin, ConceptRetrieveUpdateDestroyView):
     serializer_class = ParametersSerializer
+    parameters_serializer_class = LookupParametersSerializer
+    required_parameters = ['system', 'code']
+    coding_parameters = {'system': 'system', 'version': 'version', 'code': 'code'}
+
+    def verify_scope(self):
+        pass
+
+    def get_permissions(self):
+        return [CanViewParentDictionaryAsGuest(), ]
+
+    def get(self, request, *args, **kwargs):
+        return self.operate(partial(super().get, request, *args, **kwargs))
+
+    def post(self, request, *args, **kwargs):
+        return self.operate(partial(self.retrieve, request, *args, **kwargs))
+
+    def evaluate(self, operations, inputs):
+        return operations.lookup(inputs)
 
     def is_container_version_specified(self):
         return True
@@ -106,14 +126,23 @@ class CodeSystemListLookupView(ConceptRetrieveUpdateDestroyView):
         return None
 
 
-class CodeSystemValidateCodeView(ConceptRetrieveUpdateDestroyView):
+class CodeSystemValidateCodeView(TerminologyOperationMixin, ConceptRetrieveUpdateDestroyView):
     serializer_class = ValidateCodeParametersSerializer
+    parameters_serializer_class = ValidateCodeParametersSerializer
+    required_parameters = ['url', 'code']
+    coding_parameters = {'system': 'url', 'version': 'version', 'code': 'code', 'display': 'display'}
 
     def verify_scope(self):
         pass
 
+    def get(self, request, *args, **kwargs):
+        return self.operate(partial(super().get, request, *args, **kwargs))
+
     def post(self, request, *args, **kwargs):
-        return self.retrieve(request, *args, **kwargs)
+        return self.operate(partial(self.retrieve, request, *args, **kwargs))
+
+    def evaluate(self, operations, inputs):
+        return operations.validate_code(inputs)
 
     def update(self, request, *args, **kwargs):
         return self.retrieve(request, *args, **kwargs)
@@ -137,25 +166,18 @@ class CodeSystemValidateCodeView(ConceptRetrieveUpdateDestroyView):
         version = parameters.get('version')
         display = parameters.get('display')
 
+        source = None
         if url:
-            source = Source.objects.filter(canonical_url=url)
-            if not source:
-                url = IdentifierSerializer.convert_fhir_url_to_ocl_uri(url, 'sources')
-                source = Source.objects.filter(uri=url)
-
-            if not source:
+            exists, source = Source.memoize_resolution(
+                ('fhir_code_system', url, version), lambda: self.resolve_source(url, version))
+            if not exists:
                 return queryset.none()
 
-            if version:
-                source = source.filter(version=version)
-            else:
-                source = source.filter(is_latest_version=True).exclude(version=HEAD)
-
         if code:
             if not source:
                 return queryset.none()
 
-            queryset = queryset.filter(sources=source.first(), mnemonic=code)
+            queryset = queryset.filter(sources=source, mnemonic=code)
 
         if display and queryset:
             instance = queryset.first()
@@ -164,6 +186,22 @@ class CodeSystemValidateCodeView(ConceptRetrieveUpdateDestroyView):
 
         return queryset
 
+    @staticmethod
+    def resolve_source(url, version):
+        """Returns whether a source matches the url and its requested (or latest) version"""
+        source = Source.objects.filter(canonical_url=url)
+        if not source.exists():
+            source = Source.objects.filter(uri=IdentifierSerializer.convert_fhir_url_to_ocl_uri(url, 'sources'))
+
+        if not source.exists():
+            return False, None
+
+        if version:
+            source = source.filter(version=version)
+        else:
+            source = source.filter(is_latest_version=True).exclude(version=HEAD)
+        return True, source.first()
+
     def get_parameters(self):
         if self.request.method in ['POST', 'PUT']:
             parameters = self.get_serializer(data=self.request.data, instance=None)
@@ -204,6 +242,10 @@ class CodeSystemValidateCodeView(ConceptRetrieveUpdateDestroyView):
         }
 
 
+class CodeSystemBatchValidateCodeView(TerminologyBatchOperationMixin, CodeSystemValidateCodeView):
+    batch_fields = [('system', 'url'), ('version', 'version'), ('code', 'code'), ('display', 'display')]
+
+
 class CodeSystemRetrieveUpdateView(SourceRetrieveUpdateDestroyView):
     serializer_class = CodeSystemDetailSerializer
 
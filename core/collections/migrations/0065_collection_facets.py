@@ -0,0 +1,18 @@
+# Generated by Django 4.2.4 on 2026-10-18 19:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collections', '0064_collection_coll_org_released_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collection',
+            name='facets',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
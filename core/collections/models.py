@@ -22,14 +22,14 @@ from core.common.constants import (
     ACCESS_TYPE_VIEW, ACCESS_TYPE_EDIT,
     ES_REQUEST_TIMEOUT, ES_REQUEST_TIMEOUT_ASYNC, HEAD, ALL, EXCLUDE_WILDCARD_SEARCH_PARAM, EXCLUDE_FUZZY_SEARCH_PARAM,
     SEARCH_MAP_CODES_PARAM, INCLUDE_SEARCH_META_PARAM)
-from core.common.models import ConceptContainerModel, BaseResourceModel
+from core.common.models import ConceptContainerModel, BaseResourceModel, materialized_statistic
 from core.common.search import CustomESSearch
 from core.common.tasks import seed_children_to_expansion, batch_index_resources, index_expansion_concepts, \
     index_expansion_mappings
 from core.common.utils import drop_version, to_owner_uri, generate_temp_version, es_id_in, \
     get_resource_class_from_resource_name, to_snake_case, \
     es_to_pks, batch_qs, split_list_by_condition, decode_string, is_canonical_uri, encode_string, \
-    get_truthy_values, get_falsy_values
+    get_truthy_values, get_falsy_values, iter_chunks
 from core.concepts.constants import LOCALES_FULLY_SPECIFIED
 from core.concepts.models import Concept
 from core.mappings.models import Mapping
@@ -355,6 +355,19 @@ class Collection(ConceptContainerModel):
 
         return None
 
+    def get_index_tasks(self):
+        expansion_id = get(self, 'expansion.id')
+        if not expansion_id:
+            return []
+        return [
+            (index_expansion_concepts, {'expansion_id': expansion_id}),
+            (index_expansion_mappings, {'expansion_id': expansion_id})
+        ]
+
+    def are_children_indexed(self):
+        """The expansion is seeded asynchronously (e.g. when not exporting), till then its children are incomplete"""
+        return not get(self, 'expansion.is_processing') and super().are_children_indexed()
+
     @property
     def active_references(self):
         return self.references.count()
@@ -388,6 +401,7 @@ class Collection(ConceptContainerModel):
         return expansion.mappings.filter() if expansion else Mapping.objects.none()
 
     @property
+    @materialized_statistic
     def references_distribution(self):
         return {
             'include': self.references.filter(include=True).count(),
@@ -398,6 +412,7 @@ class Collection(ConceptContainerModel):
         }
 
     @property
+    @materialized_statistic
     def referenced_sources_distribution(self):
         from core.sources.serializers import SourceVersionMinimalSerializer
         result = {}
@@ -418,6 +433,7 @@ class Collection(ConceptContainerModel):
         return sorted(result.values(), key=lambda summary: get(summary, 'distribution.references'), reverse=True)
 
     @property
+    @materialized_statistic
     def referenced_collections_distribution(self):
         from core.collections.serializers import CollectionVersionMinimalSerializer
         result = {}
@@ -438,6 +454,15 @@ class Collection(ConceptContainerModel):
 
         return sorted(result.values(), key=lambda summary: get(summary, 'distribution.references'), reverse=True)
 
+    def get_facets_search_filters(self):
+        return {
+            'collection': self.mnemonic,
+            'collection_owner_url': to_owner_uri(self.uri),
+            'collection_version': self.version,
+            'expansion': get(self, 'expansion.mnemonic', 'NO_EXPANSION'),
+            'collection_url': self.uri
+        }
+
     def _get_resource_facet_filters(self, filters=None):
         _filters = {
             'collection': self.mnemonic,
@@ -618,12 +643,14 @@ class CollectionReference(models.Model):
                 queryset = queryset.filter(version=self.resource_version)
         if self.cascade:
             cascade_params = self.get_concept_cascade_params(system_version or valueset_versions[0])
+            concept_ids, mapping_ids = set(), set()
             for concept in queryset:
                 result = concept.cascade(**cascade_params)
-                queryset = Concept.objects.filter(
-                    id__in=list(queryset.union(result['concepts']).values_list('id', flat=True)))
-                mapping_queryset = Mapping.objects.filter(
-                    id__in=list(mapping_queryset.union(result['mappings']).values_list('id', flat=True)))
+                concept_ids.add(concept.id)
+                concept_ids.update(result['concepts'].values_list('id', flat=True))
+                mapping_ids.update(result['mappings'].values_list('id', flat=True))
+            queryset = Concept.objects.filter(id__in=concept_ids)
+            mapping_queryset = Mapping.objects.filter(id__in=mapping_ids)
 
         if self.should_apply_filter():
             queryset = self.apply_filters(queryset, Concept)
@@ -1051,32 +1078,43 @@ class Expansion(BaseResourceModel):
         return split_list_by_condition(refs, lambda ref: ref.include)
 
     def delete_references(self, references):
-        refs, _ = self.to_ref_list_separated(references)
-
-        index_concepts = False
-        index_mappings = False
-        for reference in refs:
-            concepts = reference.concepts
-            if concepts.exists():
-                index_concepts = True
-                filters = {'versioned_object_id__in': list(concepts.values_list('versioned_object_id', flat=True))}
-                self.concepts.set(self.concepts.exclude(**filters))
-                batch_index_resources.apply_async(('concept', filters), queue='indexing')
-            mappings = reference.mappings
-            if mappings.exists():
-                index_mappings = True
-                filters = {'versioned_object_id__in': list(mappings.values_list('versioned_object_id', flat=True))}
-                self.mappings.set(self.mappings.exclude(**filters))
-                batch_index_resources.apply_async(('mapping', filters), queue='indexing')
-
-        if index_concepts:
-            self.index_concepts()
-        if index_mappings:
-            self.index_mappings()
+        ref_ids = [ref.id for ref in self.to_ref_list(references)]
+        remaining_refs = self.collection_version.references.exclude(id__in=ref_ids)
+
+        index_concepts = self.__reexpand_members(self.concepts, Concept, ref_ids, remaining_refs, True)
+        index_mappings = self.__reexpand_members(self.mappings, Mapping, ref_ids, remaining_refs, False)
+
+        self.index_resources(index_concepts, index_mappings)
+
+    def __reexpand_members(self, rel, klass, ref_ids, remaining_refs, is_concept_queryset):  # pylint: disable=too-many-arguments
+        """
+        Re-expands only the members (by versioned object) of the deleted references, from the members the remaining
+        references resolved to. Membership of a versioned object only depends on the references resolving to it,
+        so the other members stay as they are.
+        """
+        versioned_object_ids = list(set(
+            klass.objects.filter(references__id__in=ref_ids).values_list('versioned_object_id', flat=True)))
+        if not versioned_object_ids:
+            return False
 
-        references_to_readd = self.collection_version.references.exclude(
-            id__in=[ref.id for ref in self.to_ref_list(references)])
-        self.add_references(references_to_readd, True, True, False)
+        resources = ExpansionResources(rel, versioned_object_ids)
+        resources.clear()
+        include_refs = remaining_refs.filter(include=True)
+        exclude_refs = remaining_refs.exclude(include=True)
+        versioned_exclude_refs = exclude_refs.filter(resource_version__isnull=False).exclude(resource_version='')
+        resources.include([
+            self.apply_parameters(
+                resources.restrict(klass.objects.filter(references__in=include_refs)), is_concept_queryset)
+        ])
+        resources.exclude([klass.objects.filter(references__in=versioned_exclude_refs)], True)
+        resources.exclude(
+            [klass.objects.filter(references__in=exclude_refs.exclude(id__in=versioned_exclude_refs))], False)
+
+        should_index = resources.save()
+        if resources.removed:
+            batch_index_resources.apply_async(
+                ('concept' if is_concept_queryset else 'mapping', {'id__in': resources.removed}), queue='indexing')
+        return should_index
 
     def delete_expressions(self, expressions):  # Deprecated: Old way, must use delete_references instead
         concepts_filters = None
@@ -1101,17 +1139,11 @@ class Expansion(BaseResourceModel):
         include_refs, exclude_refs = self.to_ref_list_separated(references)
         resolved_valueset_versions = []
         resolved_system_versions = []
-        _system_version_cache = {}
 
+        existing_exclude_refs = []
         if not is_adding_all:
             existing_exclude_refs = self.collection_version.references.exclude(
                 include=True).exclude(id__in=[ref.id for ref in exclude_refs])
-            if isinstance(exclude_refs, QuerySet):
-                exclude_refs |= existing_exclude_refs
-            else:
-                exclude_refs += [*existing_exclude_refs.all()]
-
-        index_concepts = index_mappings = False
 
         # attempt_reevaluate is False for delete reference(s)
         should_reevaluate = attempt_reevaluate and not self.is_auto_generated
@@ -1120,21 +1152,10 @@ class Expansion(BaseResourceModel):
         system_versions = self.parameters.get(ExpansionParameters.INCLUDE_SYSTEM)
         if should_reevaluate and system_versions:
             for system_version in compact(system_versions.split(',')):
-                _system = system_version.strip()
-                _cache_key = f"NONE-{_system}-NONE"
-                version = ConceptContainerModel.resolve_reference_expression(_system)
-                _system_version_cache[_cache_key] = version
+                version = ConceptContainerModel.resolve_reference_expression(system_version.strip())
                 if version.id:
                     include_system_versions.append(version)
 
-        def get_ref_system_version(ref):
-            if ref.system:
-                __cache_key = f"{ref.namespace or 'NONE'}-{ref.system}-{ref.version or 'NONE'}"
-                if __cache_key not in _system_version_cache:
-                    _system_version_cache[__cache_key] = ref.resolve_system_version
-                return _system_version_cache[__cache_key]
-            return None
-
         def get_ref_results(ref):
             nonlocal resolved_valueset_versions
             nonlocal resolved_system_versions
@@ -1147,73 +1168,71 @@ class Expansion(BaseResourceModel):
                     should_use_ref_system_version = False
 
             if should_use_ref_system_version:
-                _system_version = get_ref_system_version(ref)
+                _system_version = ref.resolve_system_version
                 if _system_version:
                     ref_system_versions.append(_system_version)
             if ref_system_versions:
                 ref_system_versions = list(set(ref_system_versions))
 
-            _concepts = Concept.objects.none()
-            _mappings = Mapping.objects.none()
+            _concepts = []
+            _mappings = []
 
             if should_reevaluate:
                 for _system_version in ref_system_versions:
                     if ref.is_mapping:
-                        _mappings = _mappings.union(ref.get_mappings(_system_version))
+                        _mappings.append(ref.get_mappings(_system_version))
                     else:
                         __concepts, __mappings = ref.get_concepts(_system_version)
-                        _concepts = Concept.objects.filter(
-                            id__in=_concepts.union(__concepts).values_list('id', flat=True)
-                        )
-                        _mappings = _mappings.union(__mappings)
-                    _mappings = Mapping.objects.filter(id__in=_mappings.values_list('id', flat=True))
+                        _concepts.append(__concepts)
+                        _mappings.append(__mappings)
             else:
-                _concepts = ref.concepts.filter()
-                _mappings = ref.mappings.filter()
+                _concepts.append(ref.concepts.filter())
+                _mappings.append(ref.mappings.filter())
             resolved_system_versions += ref_system_versions
             return _concepts, _mappings
 
-        for reference in include_refs:
-            concepts, mappings = get_ref_results(reference)
-            index_concepts = self.__include_resources(self.concepts, concepts, True)
-            index_mappings = self.__include_resources(self.mappings, mappings, False)
-
-        for reference in exclude_refs:
-            concepts, mappings = get_ref_results(reference)
-            index_concepts = self.__exclude_resources(reference, self.concepts, concepts)
-            index_mappings = self.__exclude_resources(reference, self.mappings, mappings)
+        include_results = [get_ref_results(reference) for reference in include_refs]
+        exclude_results = [(reference, get_ref_results(reference)) for reference in exclude_refs]
+        include_concepts = [
+            self.apply_parameters(queryset, True) for _concepts, _ in include_results for queryset in _concepts]
+        include_mappings = [
+            self.apply_parameters(queryset, False) for _, _mappings in include_results for queryset in _mappings]
+
+        # only the members of the versioned objects the references resolve to can change
+        concepts = ExpansionResources.for_querysets(
+            self.concepts, None if is_adding_all else [
+                *include_concepts, *[queryset for _, (_concepts, _) in exclude_results for queryset in _concepts]])
+        mappings = ExpansionResources.for_querysets(
+            self.mappings, None if is_adding_all else [
+                *include_mappings, *[queryset for _, (_, _mappings) in exclude_results for queryset in _mappings]])
+
+        concepts.include(include_concepts)
+        mappings.include(include_mappings)
+
+        for reference, (_concepts, _mappings) in exclude_results:
+            concepts.exclude(_concepts, bool(reference.resource_version))
+            mappings.exclude(_mappings, bool(reference.resource_version))
+
+        # existing members already went through the existing excludes, only the added ones need to
+        concept_versioned_object_ids = concepts.get_added_versioned_object_ids()
+        mapping_versioned_object_ids = mappings.get_added_versioned_object_ids()
+        if concept_versioned_object_ids or mapping_versioned_object_ids:
+            for reference in existing_exclude_refs:
+                _concepts, _mappings = get_ref_results(reference)
+                concepts.exclude(_concepts, bool(reference.resource_version), concept_versioned_object_ids)
+                mappings.exclude(_mappings, bool(reference.resource_version), mapping_versioned_object_ids)
+
+        index_concepts = concepts.save()
+        index_mappings = mappings.save()
 
         self.resolved_collection_versions.add(*compact(resolved_valueset_versions))
         self.resolved_source_versions.add(*compact(resolved_system_versions))
-        self.dedupe_resources()
         if index:
             self.index_resources(index_concepts, index_mappings)
 
     def dedupe_resources(self):
-        self.__dedupe_concepts()
-        self.__dedupe_mappings()
-
-    def __dedupe_concepts(self):
-        self.concepts.set(self.concepts.distinct('versioned_object_id'))
-
-    def __dedupe_mappings(self):
-        self.mappings.set(self.mappings.distinct('versioned_object_id'))
-
-    def __include_resources(self, rel, resources, is_concept_queryset):
-        should_index = resources.exists()
-        if should_index:
-            rel.add(*self.apply_parameters(resources, is_concept_queryset))
-        return should_index
-
-    @staticmethod
-    def __exclude_resources(ref, rel, resources):
-        should_index = resources.exists()
-        if should_index:
-            if ref.resource_version:
-                rel.remove(*resources)
-            else:
-                rel.set(rel.exclude(versioned_object_id__in=resources.values_list('versioned_object_id', flat=True)))
-        return should_index
+        ExpansionResources(self.concepts).save()
+        ExpansionResources(self.mappings).save()
 
     def index_resources(self, concepts, mappings):
         if concepts:
@@ -1291,6 +1310,82 @@ class Expansion(BaseResourceModel):
                 self.resolved_source_versions.add(version)
 
 
+class ExpansionResources:
+    """
+    Id sets of the concepts or mappings of an expansion, optionally scoped to some versioned objects. References are
+    resolved and excluded on these in memory, deduped by versioned object and only the difference with the stored
+    m2m is written back.
+    """
+    BATCH_SIZE = 1000
+
+    def __init__(self, rel, versioned_object_ids=None):
+        self.rel = rel
+        self.versioned_object_ids = versioned_object_ids
+        self.existing = dict(self.restrict(rel.all()).values_list('id', 'versioned_object_id'))
+        self.resources = {**self.existing}
+        self.added = []
+        self.removed = []
+
+    @classmethod
+    def for_querysets(cls, rel, querysets=None):
+        """Scoped to the versioned objects the querysets resolve to, or not scoped if querysets is None"""
+        if querysets is None:
+            return cls(rel)
+        versioned_object_ids = set()
+        for queryset in querysets:
+            versioned_object_ids.update(queryset.values_list('versioned_object_id', flat=True))
+        return cls(rel, list(versioned_object_ids))
+
+    def restrict(self, queryset, versioned_object_ids=None):
+        if versioned_object_ids is None:
+            versioned_object_ids = self.versioned_object_ids
+        if versioned_object_ids is None:
+            return queryset
+        return queryset.filter(versioned_object_id__in=versioned_object_ids)
+
+    def include(self, querysets):
+        for queryset in querysets:
+            self.resources.update(self.restrict(queryset).values_list('id', 'versioned_object_id'))
+
+    def exclude(self, querysets, is_versioned, versioned_object_ids=None):
+        for queryset in querysets:
+            queryset = self.restrict(queryset, versioned_object_ids)
+            if is_versioned:
+                for _id in queryset.values_list('id', flat=True):
+                    self.resources.pop(_id, None)
+            else:
+                excluded_versioned_object_ids = set(queryset.values_list('versioned_object_id', flat=True))
+                self.resources = {
+                    _id: versioned_object_id for _id, versioned_object_id in self.resources.items()
+                    if versioned_object_id not in excluded_versioned_object_ids
+                }
+
+    def clear(self):
+        self.resources = {}
+
+    def get_added_versioned_object_ids(self):
+        return list({
+            versioned_object_id for _id, versioned_object_id in self.resources.items() if _id not in self.existing
+        })
+
+    def dedupe(self):
+        ids = {}
+        for _id, versioned_object_id in sorted(self.resources.items()):
+            ids.setdefault(versioned_object_id, _id)
+        self.resources = {_id: versioned_object_id for versioned_object_id, _id in ids.items()}
+
+    def save(self):
+        self.dedupe()
+        self.added = sorted(self.resources.keys() - self.existing.keys())
+        self.removed = sorted(self.existing.keys() - self.resources.keys())
+        for ids in iter_chunks(self.removed, self.BATCH_SIZE):
+            self.rel.remove(*ids)
+        for ids in iter_chunks(self.added, self.BATCH_SIZE):
+            self.rel.add(*ids)
+        self.existing = {**self.resources}
+        return bool(self.added or self.removed)
+
+
 class ExpansionParameters:
     ACTIVE = 'activeOnly'
     TEXT_FILTER = 'filter'
@@ -9,10 +9,12 @@ from rest_framework.relations import PrimaryKeyRelatedField
 from rest_framework.serializers import ModelSerializer, Serializer
 
 from core.client_configs.serializers import ClientConfigSerializer
+from core.collections.constants import COLLECTION_REFERENCE_TYPE
 from core.collections.models import Collection, CollectionReference, Expansion
 from core.common.constants import HEAD, DEFAULT_ACCESS_TYPE, NAMESPACE_REGEX, ACCESS_TYPE_CHOICES, INCLUDE_SUMMARY, \
     INCLUDE_CLIENT_CONFIGS, INVALID_EXPANSION_URL
-from core.common.serializers import AbstractRepoResourcesSerializer, AbstractResourceSerializer
+from core.common.serializers import AbstractRepoResourcesSerializer, AbstractResourceSerializer, \
+    ExportBatchListSerializer
 from core.common.utils import get_truthy_values
 from core.orgs.models import Organization
 from core.settings import DEFAULT_LOCALE
@@ -492,6 +494,27 @@ class CollectionReferenceSerializer(ModelSerializer):
         fields = ('expression', 'reference_type', 'id', 'last_resolved_at', 'uri', 'uuid', 'include', 'type')
 
 
+class CollectionReferenceExportBatchSerializer(CollectionReferenceSerializer):
+    """Same representation as CollectionReferenceSerializer, with a single query per batch of references."""
+
+    class Meta:
+        model = CollectionReference
+        fields = CollectionReferenceSerializer.Meta.fields
+        list_serializer_class = ExportBatchListSerializer
+
+    @staticmethod
+    def get_batch_rows(queryset):
+        return [
+            {
+                **reference,
+                'uri': f"{reference['collection__uri']}references/{reference['id']}/" if reference[
+                    'collection_id'] else None,
+                'resource_type': COLLECTION_REFERENCE_TYPE
+            } for reference in queryset.values(
+                'id', 'expression', 'reference_type', 'last_resolved_at', 'include', 'collection_id', 'collection__uri')
+        ]
+
+
 class CollectionReferenceDetailSerializer(CollectionReferenceSerializer):
     concepts = IntegerField(source='concepts_count', read_only=True)
     mappings = IntegerField(source='mappings_count', read_only=True)
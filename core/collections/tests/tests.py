@@ -3,10 +3,11 @@ from mock import patch, Mock, PropertyMock
 
 from core.collections.documents import CollectionDocument
 from core.collections.models import CollectionReference, Collection, Expansion
-from core.collections.models import ExpansionParameters
+from core.collections.models import ExpansionParameters, ExpansionResources
 from core.collections.parsers import CollectionReferenceExpressionStringParser, \
     CollectionReferenceSourceAllExpressionParser, CollectionReferenceOldStyleToExpandedStructureParser, \
     CollectionReferenceParser
+from core.collections.serializers import CollectionReferenceSerializer, CollectionReferenceExportBatchSerializer
 from core.collections.tests.factories import OrganizationCollectionFactory, ExpansionFactory, UserCollectionFactory
 from core.collections.utils import is_mapping, is_concept, is_version_specified, \
     get_concept_by_expression
@@ -334,6 +335,45 @@ class CollectionTest(OCLTestCase):
             sorted([mapping1.url, mapping2.url])
         )
 
+    def test_facets_search_filters_and_reset(self):
+        collection = OrganizationCollectionFactory(mnemonic='c1')
+        collection_v1 = OrganizationCollectionFactory(
+            version='v1', mnemonic='c1', organization=collection.organization,
+            facets={'concepts': {'conceptClass': [['Drug', 1, False]]}}
+        )
+        expansion = ExpansionFactory(collection_version=collection_v1, mnemonic='e1')
+
+        self.assertEqual(
+            collection_v1.get_facets_search_filters(),
+            {
+                'collection': 'c1', 'collection_owner_url': collection.organization.uri, 'collection_version': 'v1',
+                'expansion': 'NO_EXPANSION', 'collection_url': collection_v1.uri
+            }
+        )
+
+        collection_v1.expansion_uri = expansion.uri
+        collection_v1.save()
+        self.assertEqual(collection_v1.get_facets_search_filters()['expansion'], 'e1')
+        collection_v1.refresh_from_db()
+        self.assertEqual(collection_v1.get_precomputed_facets('concepts'), {'conceptClass': [['Drug', 1, False]]})
+
+        expansion.concepts.add(ConceptFactory())
+
+        collection_v1.refresh_from_db()
+        self.assertIsNone(collection_v1.facets)
+
+        Expansion.objects.filter(id=expansion.id).update(is_processing=True)
+        self.assertFalse(collection_v1.are_children_indexed())
+        collection_v1.set_precomputed_facets('concepts', {'conceptClass': []})
+        collection_v1.refresh_from_db()
+        self.assertIsNone(collection_v1.facets)
+
+        Expansion.objects.filter(id=expansion.id).update(is_processing=False)
+        self.assertTrue(collection_v1.are_children_indexed())
+        collection_v1.set_precomputed_facets('concepts', {'conceptClass': []})
+        collection_v1.refresh_from_db()
+        self.assertEqual(collection_v1.facets, {'concepts': {'conceptClass': []}})
+
     def test_references_distribution(self):
         collection = OrganizationCollectionFactory()
         reference1 = CollectionReference(expression='/foo/concepts/', collection=collection, reference_type='concepts')
@@ -908,6 +948,18 @@ class CollectionReferenceTest(OCLTestCase):
             reference.build_expression(), '/orgs/MyOrg/collections/Coll/concepts/?q=foo&name=foobar'
         )
 
+    def test_export_batch_serializer(self):
+        collection = OrganizationCollectionFactory()
+        CollectionReference(expression='/foo/bar/', collection=collection).save()
+        CollectionReference(expression='/foo/bar/mappings/', reference_type='mappings', collection=collection).save()
+        queryset = collection.references.order_by('-id')
+
+        with self.assertNumQueries(1):
+            data = CollectionReferenceExportBatchSerializer(queryset, many=True).data
+
+        self.assertEqual(len(data), 2)
+        self.assertEqual(data, CollectionReferenceSerializer(queryset, many=True).data)
+
 
 class CollectionUtilsTest(OCLTestCase):
     def test_is_mapping(self):
@@ -1144,6 +1196,84 @@ class ExpansionTest(OCLTestCase):
     def test_expansion(self):
         self.assertEqual(Expansion(mnemonic='e1').expansion, 'e1')
 
+    @patch('core.collections.models.batch_index_resources')
+    def test_delete_references_reexpands_only_affected_members(self, batch_index_resources_mock):
+        collection = OrganizationCollectionFactory()
+        expansion = ExpansionFactory(collection_version=collection)
+        concept1 = ConceptFactory()
+        concept2 = ConceptFactory(parent=concept1.parent)
+        concept3 = ConceptFactory(parent=concept1.parent)
+        reference1 = CollectionReference(expression=concept1.uri, collection=collection)
+        reference2 = CollectionReference(expression=concept1.parent.uri, collection=collection)
+        reference3 = CollectionReference(expression=concept3.uri, collection=collection, include=False)
+        for reference in [reference1, reference2, reference3]:
+            reference.save()
+        reference1.concepts.add(concept1)
+        reference2.concepts.add(concept1, concept2, concept3)
+        reference3.concepts.add(concept3)
+        expansion.concepts.add(concept1, concept2)
+
+        expansion.delete_references(reference1)
+
+        self.assertCountEqual(expansion.concepts.values_list('id', flat=True), [concept1.id, concept2.id])
+        batch_index_resources_mock.apply_async.assert_not_called()
+
+        expansion.delete_references(reference3)
+
+        self.assertCountEqual(
+            expansion.concepts.values_list('id', flat=True), [concept1.id, concept2.id, concept3.id])
+
+        expansion.delete_references([reference1, reference2, reference3])
+
+        self.assertEqual(expansion.concepts.count(), 0)
+        batch_index_resources_mock.apply_async.assert_called_once_with(
+            ('concept', {'id__in': sorted([concept1.id, concept2.id, concept3.id])}), queue='indexing')
+
+    def test_add_references_touches_only_affected_members(self):
+        collection = OrganizationCollectionFactory()
+        expansion = ExpansionFactory(collection_version=collection)
+        concept1 = ConceptFactory()
+        concept2 = ConceptFactory(parent=concept1.parent)
+        reference = CollectionReference(expression=concept1.uri, collection=collection)
+        reference.save()
+        reference.concepts.add(concept1)
+        expansion.concepts.add(concept2)
+
+        resources = ExpansionResources.for_querysets(expansion.concepts, [reference.concepts.all()])
+        self.assertEqual(resources.versioned_object_ids, [concept1.versioned_object_id])
+        self.assertEqual(resources.existing, {})
+        self.assertEqual(
+            ExpansionResources.for_querysets(expansion.concepts, None).existing,
+            {concept2.id: concept2.versioned_object_id}
+        )
+
+        expansion.add_references([reference], index=False, attempt_reevaluate=False)
+
+        self.assertCountEqual(expansion.concepts.values_list('id', flat=True), [concept1.id, concept2.id])
+
+    def test_expansion_resources(self):
+        concept1 = ConceptFactory()
+        concept1_v1 = ConceptFactory(
+            parent=concept1.parent, version='v1', mnemonic=concept1.mnemonic, versioned_object=concept1)
+        concept2 = ConceptFactory(parent=concept1.parent)
+        concept3 = ConceptFactory(parent=concept1.parent)
+        expansion = ExpansionFactory(collection_version=OrganizationCollectionFactory())
+        expansion.concepts.add(concept2)
+
+        resources = ExpansionResources(expansion.concepts)
+        resources.include([
+            Concept.objects.filter(id__in=[concept1.id, concept1_v1.id]), Concept.objects.filter(id=concept3.id)])
+        resources.exclude([Concept.objects.filter(id=concept3.id)], True)
+
+        self.assertTrue(resources.save())
+        self.assertCountEqual(expansion.concepts.values_list('id', flat=True), [concept1.id, concept2.id])
+
+        resources.exclude([Concept.objects.filter(id=concept1_v1.id)], False)
+
+        self.assertTrue(resources.save())
+        self.assertCountEqual(expansion.concepts.values_list('id', flat=True), [concept2.id])
+        self.assertFalse(resources.save())
+
     def test_get_url_kwarg(self):
         self.assertEqual(Expansion().get_url_kwarg(), 'expansion')
 
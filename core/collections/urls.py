@@ -48,6 +48,11 @@ urlpatterns = [
         views.CollectionVersionExportView.as_view(),
         name='collectionversion-latest-export-detail'
     ),
+    re_path(
+        fr'^(?P<collection>{NAMESPACE_PATTERN})/latest/export/delta/$',
+        views.CollectionVersionDeltaExportView.as_view(),
+        name='collectionversion-latest-export-delta'
+    ),
     path(
         "<str:collection>/concepts/<str:concept>/mappings/",
         views.CollectionVersionConceptMappingsView.as_view(),
@@ -205,6 +210,10 @@ urlpatterns = [
         r'^(?P<collection>{pattern})/(?P<version>{pattern})/export/$'.format(pattern=NAMESPACE_PATTERN),
         views.CollectionVersionExportView.as_view(), name='collectionversion-export'
     ),
+    re_path(
+        r'^(?P<collection>{pattern})/(?P<version>{pattern})/export/delta/$'.format(pattern=NAMESPACE_PATTERN),
+        views.CollectionVersionDeltaExportView.as_view(), name='collectionversion-export-delta'
+    ),
     re_path(
         r"^(?P<collection>{pattern})/(?P<version>{pattern})/extras/$".format(pattern=NAMESPACE_PATTERN),
         views.CollectionVersionExtrasView.as_view(),
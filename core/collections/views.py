@@ -51,7 +51,7 @@ from core.common.permissions import (
     CanViewConceptDictionaryVersion
 )
 from core.common.serializers import TaskSerializer
-from core.common.swagger_parameters import q_param, compress_header, page_param, verbose_param, \
+from core.common.swagger_parameters import q_param, compress_header, page_param, cursor_param, verbose_param, \
     include_facets_header, sort_asc_param, sort_desc_param, updated_since_param, include_retired_param, limit_param, \
     canonical_url_param
 from core.common.tasks import add_references, export_collection, delete_collection, index_expansion_concepts, \
@@ -187,7 +187,7 @@ class CollectionListView(CollectionBaseView, ConceptDictionaryCreateMixin, ListW
 
     @swagger_auto_schema(
         manual_parameters=[
-            q_param, limit_param, sort_desc_param, sort_asc_param, page_param, verbose_param,
+            q_param, limit_param, sort_desc_param, sort_asc_param, page_param, cursor_param, verbose_param,
             include_retired_param, updated_since_param, canonical_url_param, include_facets_header, compress_header
         ]
     )
@@ -1150,6 +1150,11 @@ class CollectionVersionExportView(ConceptContainerExportMixin, CollectionVersion
             return status.HTTP_409_CONFLICT
 
 
+class CollectionVersionDeltaExportView(CollectionVersionExportView):
+    is_delta = True
+    http_method_names = ['get']
+
+
 class CollectionSummaryView(CollectionBaseView, RetrieveAPIView, CreateAPIView):
     serializer_class = CollectionSummaryDetailSerializer
     permission_classes = (CanViewConceptDictionary,)
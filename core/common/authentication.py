@@ -1,18 +1,38 @@
 from django.conf import settings
+from django.utils.translation import gettext_lazy as _
 from pydash import get
 from rest_framework.authentication import BaseAuthentication, TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+
+class OCLTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that resolves the token's user id through AuthCache"""
+    def authenticate_credentials(self, key):
+        from core.services.auth.cache import AuthCache
+        from core.users.models import UserProfile
+        user_id = AuthCache.get_user_id(AuthCache.DJANGO, key)
+        if user_id is None:
+            user, token = super().authenticate_credentials(key)
+            AuthCache.set_user_id(AuthCache.DJANGO, key, user.id)
+            return user, token
+
+        user = UserProfile.objects.filter(id=user_id).first()
+        if not user or not user.is_active:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+        return user, Token(key=key, user=user)
 
 
 class OCLAuthentication(BaseAuthentication):
     """
     1. configured as settings.DEFAULT_AUTHENTICATION_CLASSES
-    2. Uses Django default TokenAuthentication for valid django token request (and for tests)
+    2. Uses OCLTokenAuthentication for valid django token request (and for tests)
     3. Uses Auth Service to determine auth class Django/OIDC
     """
     def get_auth_class(self, request):
         from core.services.auth.core import AuthService
         if AuthService.is_valid_django_token(request) or get(settings, 'TEST_MODE', False):
-            klass = TokenAuthentication
+            klass = OCLTokenAuthentication
         else:
             klass = AuthService.get().authentication_class
 
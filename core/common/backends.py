@@ -1,3 +1,7 @@
+import base64
+import json
+import time
+
 from celery_once.backends import Redis
 from django.conf import settings
 from django.contrib.auth.backends import ModelBackend
@@ -77,6 +81,37 @@ class OCLOIDCAuthenticationBackend(OIDCAuthenticationBackend):
         user.set_checksums()
         return user
 
+    @staticmethod
+    def get_token_expiry(access_token, payload=None):
+        """Expiry (epoch secs) of the access token, from the verified payload or from its claims if it is a JWT"""
+        expiry = get(payload, 'exp')
+        if not expiry:
+            try:
+                claims = access_token.split('.')[1]
+                expiry = json.loads(base64.urlsafe_b64decode(claims + '=' * (-len(claims) % 4))).get('exp')
+            except:  # pylint: disable=bare-except
+                expiry = None
+        return expiry
+
+    def get_or_create_user(self, access_token, id_token, payload):
+        """
+        The user an access token authenticated as is cached (at most till the token expires), so the userinfo
+        endpoint isn't hit per request. Tokens without a known expiry are not cached.
+        """
+        from core.services.auth.cache import AuthCache
+        from core.users.models import UserProfile
+        user_id = AuthCache.get_user_id(AuthCache.OIDC, access_token)
+        if user_id:
+            user = UserProfile.objects.filter(id=user_id, is_active=True).first()
+            if user:
+                return user
+
+        user = super().get_or_create_user(access_token, id_token, payload)
+        expiry = self.get_token_expiry(access_token, payload)
+        if user and expiry:
+            AuthCache.set_user_id(AuthCache.OIDC, access_token, user.id, expiry - time.time())
+        return user
+
     def filter_users_by_claims(self, claims):
         from core.users.models import UserProfile
 
@@ -74,11 +74,17 @@ FHIR_LIMIT_PARAM = '_count'
 LIST_DEFAULT_LIMIT = 25
 CSV_DEFAULT_LIMIT = 1000
 SEARCH_PARAM = 'q'
+SEARCH_CURSOR_PARAM = 'cursor'
 INCLUDE_FACETS = 'HTTP_INCLUDEFACETS'
 SEARCH_LATEST_REPO_VERSION = 'HTTP_INCLUDESEARCHLATEST'
 INCLUDE_SEARCH_STATS = 'HTTP_INCLUDESEARCHSTATS'
 FACETS_ONLY = 'facetsOnly'
 SEARCH_STATS_ONLY = 'searchStatsOnly'
+# params that don't change the facets of a repo version's concepts/mappings
+FACETS_NEUTRAL_PARAMS = [
+    LIMIT_PARAM, OFFSET_PARAM, 'page', VERBOSE_PARAM, BRIEF_PARAM, INCLUDE_RETIRED_PARAM, INCLUDE_SEARCH_META_PARAM,
+    FACETS_ONLY, 'sort', 'sortAsc', 'sortDesc'
+]
 HTTP_COMPRESS_HEADER = 'HTTP_COMPRESS'
 NOT_FOUND = 'Not found.'
 OK_MESSAGE = 'ok!'
@@ -121,7 +127,9 @@ EQUIVALENCY_MAP_TYPES = 'equivalencyMapType'
 CASCADE_DIRECTION_PARAM = 'reverse'
 OMIT_IF_EXISTS_IN = 'omitIfExistsIn'
 INCLUDE_SELF = 'includeSelf'
+HIERARCHY_DEPTH_PARAM = 'depth'
 FACET_SIZE = 20
 ALL = '*'
 CANONICAL_URL_REQUEST_PARAM = 'canonicalUrl'
 SAME_STANDARD_CHECKSUM_ERROR = 'No changes detected. Standard checksum is same as last version.'
+DISPLAY_NAMES_RERUN_KEY = 'display_names:rerun:{}'
@@ -0,0 +1,85 @@
+from django.conf import settings
+from django.db import models
+from django.db.models import Prefetch, prefetch_related_objects
+
+from core.common.response_cache import ListResponseCache
+from core.common.utils import iter_chunks
+
+
+class BatchIndexDocumentMixin:
+    """
+    Prepares and bulk indexes iterables of source children (concepts/mappings) in batches of ES_INDEX_BATCH_SIZE.
+    Related values used by the prepare_* hooks are loaded for a whole batch with a few grouped queries
+    (prefetch_batch), the hooks read them from the prefetched relations instead of querying per instance.
+    Batches are usually the result of queryset updates (no save signals), so the cached list responses
+    of their sources are invalidated and their materialized statistics marked stale here.
+    """
+    def update(self, thing, refresh=None, action='index', parallel=False, **kwargs):  # pylint: disable=too-many-arguments
+        if action == 'delete' or isinstance(thing, models.Model):
+            return super().update(thing, refresh, action, parallel, **kwargs)
+
+        from core.repos.models import RepoStatistics
+        result = (0, [])
+        for batch in iter_chunks(thing, settings.ES_INDEX_BATCH_SIZE):
+            self.prefetch_batch(batch)
+            result = super().update(batch, refresh, action, parallel, **kwargs)
+            ListResponseCache.invalidate_for(batch)
+            RepoStatistics.invalidate_for(batch)
+        return result
+
+    def get_batch_prefetches(self):
+        return []
+
+    def prefetch_batch(self, instances):
+        from core.collections.models import Expansion
+        from core.sources.models import Source
+        prefetch_related_objects(
+            instances,
+            'created_by', 'updated_by', 'parent__organization', 'parent__user',
+            Prefetch('sources', queryset=Source.objects.only('id', 'version')),
+            Prefetch('expansion_set', queryset=Expansion.objects.select_related('collection_version').only(
+                'id', 'mnemonic', 'uri', 'collection_version__id', 'collection_version__version',
+                'collection_version__mnemonic', 'collection_version__uri'
+            )),
+            *self.get_batch_prefetches()
+        )
+        self.set_latest_source_versions(instances)
+
+    @staticmethod
+    def set_latest_source_versions(instances):
+        """Caches the latest released version of each parent once per batch, for is_in_latest_source_version"""
+        latest_source_versions = {}
+        for instance in instances:
+            if instance.parent_id not in latest_source_versions:
+                latest_source_versions[instance.parent_id] = instance.parent.get_latest_released_version()
+            instance._cached_latest_source_version = latest_source_versions[  # pylint: disable=protected-access
+                instance.parent_id]
+
+    @staticmethod
+    def prepare_is_in_latest_source_version(instance):
+        version = instance._cached_latest_source_version  # pylint: disable=protected-access
+        return bool(version) and version.version in {source.version for source in instance.sources.all()}
+
+    @staticmethod
+    def prepare_source_version(instance):
+        return [source.version for source in instance.sources.all()]
+
+    @staticmethod
+    def prepare_collection_version(instance):
+        return list({expansion.collection_version.version for expansion in instance.expansion_set.all()})
+
+    @staticmethod
+    def prepare_expansion(instance):
+        return [expansion.mnemonic for expansion in instance.expansion_set.all()]
+
+    @staticmethod
+    def prepare_collection(instance):
+        return list({expansion.collection_version.mnemonic for expansion in instance.expansion_set.all()})
+
+    @staticmethod
+    def prepare_collection_url(instance):
+        return list({expansion.collection_version.uri for expansion in instance.expansion_set.all()})
+
+    @staticmethod
+    def prepare_collection_owner_url(instance):
+        return list({expansion.owner_url for expansion in instance.expansion_set.all()})
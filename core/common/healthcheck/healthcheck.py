@@ -76,6 +76,23 @@ class ESHealthCheck(BaseHealthCheck):
         return 'ElasticSearch'
 
 
+class IndexSyncQueueHealthCheck(BaseHealthCheck):
+    critical_service = False
+
+    def check_status(self):
+        from core.common.index_sync import IndexSyncQueue
+        try:
+            stats = IndexSyncQueue().stats()
+        except Exception as ex:
+            raise ServiceUnavailable(ex.args) from ex
+
+        if stats['backpressure']:
+            raise ServiceReturnedUnexpectedResult(f"{stats['pending']} instances pending index sync")
+
+    def identifier(self):
+        return 'IndexSyncQueue'
+
+
 class CeleryQueueHealthCheck(BaseHealthCheck):
     critical_service = False
 
@@ -8,6 +8,7 @@ urlpatterns = [
     path('db/', views.DBHealthcheckView.as_view(), name='db-healthcheck'),
     path('redis/', views.RedisHealthcheckView.as_view(), name='redis-healthcheck'),
     path('es/', views.ESHealthcheckView.as_view(), name='redis-healthcheck'),
+    path('index-sync/', views.IndexSyncQueueHealthcheckView.as_view(), name='index-sync-healthcheck'),
     path('celery/', views.CeleryHealthCheckView.as_view(), name='celery-healthcheck'),
     path(
         'celery@default/', views.CeleryDefaultHealthCheckView.as_view(),
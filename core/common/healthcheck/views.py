@@ -4,7 +4,7 @@ from health_check.views import MainView
 from core.common.healthcheck.healthcheck import FlowerHealthCheck, CeleryDefaultQueueHealthCheck, \
     CeleryBulkImport0QueueHealthCheck, CeleryBulkImportRootQueueHealthCheck, CeleryBulkImport3QueueHealthCheck, \
     CeleryBulkImport2QueueHealthCheck, CeleryBulkImport1QueueHealthCheck, CeleryConcurrentThreadsHealthCheck, \
-    ESHealthCheck, CeleryIndexingQueueHealthCheck, RedisHealthCheck
+    ESHealthCheck, CeleryIndexingQueueHealthCheck, RedisHealthCheck, IndexSyncQueueHealthCheck
 
 
 class BaseHealthcheckView(MainView):
@@ -30,6 +30,10 @@ class RedisHealthcheckView(BaseHealthcheckView):
     _plugins = [RedisHealthCheck()]
 
 
+class IndexSyncQueueHealthcheckView(BaseHealthcheckView):
+    _plugins = [IndexSyncQueueHealthCheck(critical_service=True)]
+
+
 class DBHealthcheckView(BaseHealthcheckView):
     _plugins = [DatabaseBackend()]
 
@@ -0,0 +1,105 @@
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.utils import timezone
+from django_elasticsearch_dsl.registries import registry
+
+
+class IndexSyncQueue:
+    """
+    Coalesces ES updates of saved/m2m changed instances.
+    Dirty (app_name, model_name, id) members are collected in a redis set, so an instance saved many times
+    is indexed once. The set is flushed periodically (beat) or when it grows beyond ES_SYNC_QUEUE_FLUSH_SIZE,
+    each model's dirty instances are loaded with one query per batch and bulk indexed.
+    """
+    KEY = 'index_sync:dirty'
+    STATS_KEY = 'index_sync:stats'
+    SEPARATOR = ':'
+
+    def __init__(self, client=None):
+        if client is None:
+            from core.services.storages.redis import RedisService
+            client = RedisService.get_client()
+        self.client = client
+
+    @classmethod
+    def to_member(cls, app_name, model_name, instance_id):
+        return cls.SEPARATOR.join([app_name, model_name, str(instance_id)])
+
+    @classmethod
+    def from_member(cls, member):
+        if isinstance(member, bytes):
+            member = member.decode()
+        app_name, model_name, instance_id = member.split(cls.SEPARATOR)
+        return app_name, model_name, int(instance_id)
+
+    def add(self, app_name, model_name, instance_id):
+        pipeline = self.client.pipeline()
+        pipeline.sadd(self.KEY, self.to_member(app_name, model_name, instance_id))
+        pipeline.scard(self.KEY)
+        added, size = pipeline.execute()
+        self.client.hincrby(self.STATS_KEY, 'enqueued' if added else 'coalesced')
+
+        if added and size >= settings.ES_SYNC_QUEUE_FLUSH_SIZE:
+            from core.common.tasks import flush_index_sync_queue
+            flush_index_sync_queue.delay()
+
+        return size
+
+    def add_instance(self, instance):
+        return self.add(instance.app_name, instance.model_name, instance.id)
+
+    @property
+    def size(self):
+        return self.client.scard(self.KEY)
+
+    def flush(self, batch_size=None):
+        batch_size = batch_size or settings.ES_INDEX_BATCH_SIZE
+        flushed = 0
+        while True:
+            members = self.client.spop(self.KEY, batch_size)
+            if not members:
+                break
+            try:
+                self.index(members)
+            except Exception:
+                self.client.sadd(self.KEY, *members)
+                self.client.hincrby(self.STATS_KEY, 'failed', len(members))
+                raise
+            flushed += len(members)
+            self.client.hincrby(self.STATS_KEY, 'flushed', len(members))
+
+        self.client.hset(self.STATS_KEY, 'last_flushed_at', timezone.now().isoformat())
+        return flushed
+
+    def drain(self):
+        """Flushes synchronously until the queue is empty, meant for tests and management shells"""
+        return self.flush()
+
+    def index(self, members):
+        ids_by_model = defaultdict(set)
+        for member in members:
+            app_name, model_name, instance_id = self.from_member(member)
+            ids_by_model[(app_name, model_name)].add(instance_id)
+
+        for (app_name, model_name), ids in ids_by_model.items():
+            model = apps.get_model(app_name, model_name)
+            instances = list(model.objects.filter(id__in=ids))
+            if not instances:
+                continue
+            for document in registry.get_documents([model]):
+                if not document.django.ignore_signals:
+                    document().update(instances)
+            for instance in instances:
+                registry.update_related(instance)
+
+    def stats(self):
+        stats = {key.decode(): value.decode() for key, value in self.client.hgetall(self.STATS_KEY).items()}
+        result = {
+            key: int(stats.get(key, 0)) for key in ['enqueued', 'coalesced', 'flushed', 'failed']
+        }
+        result['pending'] = self.size
+        result['last_flushed_at'] = stats.get('last_flushed_at')
+        result['backpressure'] = result['pending'] > settings.ES_SYNC_QUEUE_MAX_BACKLOG
+        return result
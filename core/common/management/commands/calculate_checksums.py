@@ -0,0 +1,26 @@
+from django.core.management import BaseCommand
+
+from core.common.constants import HEAD
+from core.common.tasks import calculate_source_version_checksums
+from core.sources.models import Source
+
+
+class Command(BaseCommand):
+    help = 'calculate missing (or all) checksums of concepts/mappings of source versions (all HEADs by default)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('version_ids', nargs='*', type=int, help='Source version ids')
+        parser.add_argument(
+            '--recalculate', action='store_true', help='Recalculate checksums which are already calculated')
+        parser.add_argument('--queue', action='store_true', help='Queue a task per source version')
+
+    def handle(self, *args, **options):
+        versions = Source.objects.filter(version=HEAD)
+        if options['version_ids']:
+            versions = Source.objects.filter(id__in=options['version_ids'])
+
+        for version_id in versions.order_by('id').values_list('id', flat=True):
+            if options['queue']:
+                calculate_source_version_checksums.delay(version_id, options['recalculate'])
+            else:
+                calculate_source_version_checksums(version_id, options['recalculate'])
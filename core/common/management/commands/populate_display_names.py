@@ -0,0 +1,26 @@
+from django.core.management import BaseCommand
+
+from core.common.constants import HEAD
+from core.common.tasks import update_source_display_names
+from core.sources.models import Source
+
+
+class Command(BaseCommand):
+    help = 'materialize missing (or all) display names/locales of concepts of sources (all sources by default)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source_ids', nargs='*', type=int, help='Source (HEAD) ids')
+        parser.add_argument(
+            '--recalculate', action='store_true', help='Recalculate display names which are already materialized')
+        parser.add_argument('--queue', action='store_true', help='Queue a task per source')
+
+    def handle(self, *args, **options):
+        sources = Source.objects.filter(version=HEAD)
+        if options['source_ids']:
+            sources = sources.filter(id__in=options['source_ids'])
+
+        for source_id in sources.order_by('id').values_list('id', flat=True):
+            if options['queue']:
+                update_source_display_names.delay(source_id, options['recalculate'])
+            else:
+                update_source_display_names(source_id, options['recalculate'])
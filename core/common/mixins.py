@@ -19,12 +19,14 @@ from rest_framework.response import Response
 from core.common.constants import HEAD, ACCESS_TYPE_NONE, INCLUDE_FACETS, \
     LIST_DEFAULT_LIMIT, HTTP_COMPRESS_HEADER, CSV_DEFAULT_LIMIT, FACETS_ONLY, INCLUDE_RETIRED_PARAM, \
     SEARCH_STATS_ONLY, INCLUDE_SEARCH_STATS, UPDATED_BY_USERNAME_PARAM, CHECKSUM_STANDARD_HEADER, \
-    CHECKSUM_SMART_HEADER, SEARCH_LATEST_REPO_VERSION, SAME_STANDARD_CHECKSUM_ERROR
+    CHECKSUM_SMART_HEADER, SEARCH_LATEST_REPO_VERSION, SAME_STANDARD_CHECKSUM_ERROR, SEARCH_CURSOR_PARAM
 from core.common.permissions import HasPrivateAccess, HasOwnership, CanViewConceptDictionary, \
     CanViewConceptDictionaryVersion
+from core.common.response_cache import ListResponseCache
 from .checksums import ChecksumModel, Checksum
 from .utils import write_csv_to_s3, get_csv_from_s3, get_query_params_from_url_string, compact_dict_by_values, \
-    to_owner_uri, parse_updated_since_param, get_export_service, to_int, get_truthy_values, generate_temp_version
+    to_owner_uri, parse_updated_since_param, get_export_service, to_int, get_truthy_values, generate_temp_version, \
+    keyset_batches
 from ..concepts.constants import PERSIST_CLONE_ERROR
 from ..toggles.models import Toggle
 
@@ -35,14 +37,16 @@ TRUTHY = get_truthy_values()
 class CustomPaginator:
     def __init__(  # pylint: disable=too-many-arguments
             self, request, total_count, queryset, page_size, is_sliced=False, max_score=None, search_scores=None,
-            highlights=None
+            highlights=None, next_cursor=None
     ):
         self.request = request
         self.queryset = queryset
         self.total = total_count or (
             self.queryset.count() if isinstance(self.queryset, QuerySet) else len(self.queryset))
         self.page_size = int(page_size)
-        self.page_number = to_int(request.GET.get('page', '1'), 1)
+        self.is_cursor = is_sliced and SEARCH_CURSOR_PARAM in request.GET  # search_after/pit based es pagination
+        self.next_cursor = next_cursor
+        self.page_number = 1 if self.is_cursor else to_int(request.GET.get('page', '1'), 1)
         if not is_sliced:
             bottom = (self.page_number - 1) * self.page_size
             top = bottom + self.page_size
@@ -67,6 +71,8 @@ class CustomPaginator:
         results = self.page_object.object_list
         if self.search_scores or self.max_score or self.highlights:
             for result in results:
+                if hasattr(result, '_score'):  # already annotated while hydrating the search hits
+                    continue
                 result._score = self.search_scores.get(result.id)  # pylint: disable=protected-access
                 result._highlight = self.highlights.get(result.id)  # pylint: disable=protected-access
                 if result._score and self.max_score:  # pylint: disable=protected-access
@@ -98,6 +104,12 @@ class CustomPaginator:
         query_params['page'] = str(self.current_page_number - 1)
         return self.__get_full_url() + '?' + query_params.urlencode()
 
+    def get_next_cursor_url(self):
+        query_params = self.__get_query_params()
+        query_params.pop('page', None)
+        query_params[SEARCH_CURSOR_PARAM] = self.next_cursor
+        return self.__get_full_url() + '?' + query_params.urlencode()
+
     def has_next(self):
         return self.page_number < self.page_count
 
@@ -112,10 +124,15 @@ class CustomPaginator:
             'pages': self.page_count,
             'page_number': self.page_number
         }
-        if self.has_next():
-            headers['next'] = self.get_next_page_url()
-        if self.has_previous():
-            headers['previous'] = self.get_previous_page_url()
+        if self.is_cursor:
+            if self.next_cursor:
+                headers['next'] = self.get_next_cursor_url()
+                headers['next_cursor'] = self.next_cursor
+        else:
+            if self.has_next():
+                headers['next'] = self.get_next_page_url()
+            if self.has_previous():
+                headers['previous'] = self.get_previous_page_url()
         standard, smart = self.checksums
         if standard is not None:
             headers[CHECKSUM_STANDARD_HEADER] = standard
@@ -145,14 +162,21 @@ class ListWithHeadersMixin(ListModelMixin):
     _highlights = None
     limit = LIST_DEFAULT_LIMIT
     document_model = None
+    list_response_cache = False
 
     def head(self, request, **kwargs):  # pylint: disable=unused-argument
         queryset = self.filter_queryset()
         res = Response()
-        res['num_found'] = get(self, 'total_count') or queryset.count()
+        res['num_found'] = get(self, 'total_count') or (
+            queryset.count() if isinstance(queryset, QuerySet) else len(queryset))
         return res
 
-    def list(self, request, *args, **kwargs):  # pylint:disable=too-many-locals
+    def list(self, request, *args, **kwargs):
+        if self.list_response_cache:
+            return ListResponseCache(self).fetch(lambda: self.get_list_response(request))
+        return self.get_list_response(request)
+
+    def get_list_response(self, request):  # pylint:disable=too-many-locals
         query_params = request.query_params.dict()
         is_csv = query_params.get('csv', False)
         search_string = query_params.get('type', None)
@@ -193,7 +217,8 @@ class ListWithHeadersMixin(ListModelMixin):
             paginator = CustomPaginator(
                 request=request, queryset=sorted_list, page_size=self.limit, total_count=self.total_count,
                 is_sliced=self.should_perform_es_search(), max_score=get(self, '_max_score'),
-                search_scores=get(self, '_scores'), highlights=get(self, '_highlights')
+                search_scores=get(self, '_scores'), highlights=get(self, '_highlights'),
+                next_cursor=get(self, 'next_cursor')
             )
             headers = paginator.headers
             results = paginator.current_page_results
@@ -243,7 +268,8 @@ class ListWithHeadersMixin(ListModelMixin):
         return self.request.META.get(HTTP_COMPRESS_HEADER, False) in TRUTHY
 
     def get_object_ids(self):
-        self.object_list.limit_iter = False
+        if isinstance(self.object_list, QuerySet):
+            self.object_list.limit_iter = False
         return map(lambda o: o.id, self.object_list[0:100])
 
     def get_csv(self, request, queryset=None):
@@ -528,6 +554,45 @@ class SourceChildMixin(ChecksumModel):
     def is_strictly_equal(instance1, instance2):
         return instance1.get_checksums() == instance2.get_checksums()
 
+    @classmethod
+    def get_checksum_rows(cls, ids):
+        """
+        Returns a dict per resource in ids with id, checksums and everything
+        get_standard/smart_checksum_fields_for_resource read, fetched with a fixed number of queries.
+        """
+        raise NotImplementedError
+
+    @classmethod
+    def get_checksums_for_resource(cls, data):
+        return {
+            cls.STANDARD_CHECKSUM_KEY: cls.generate_checksum(cls.get_standard_checksum_fields_for_resource(data)),
+            cls.SMART_CHECKSUM_KEY: cls.generate_checksum(cls.get_smart_checksum_fields_for_resource(data)),
+        }
+
+    @classmethod
+    def set_checksums_in_batches(cls, queryset, recalculate=False, batch_size=None):
+        """
+        Calculates and saves checksums of resources in queryset (only the ones missing any checksum unless
+        recalculate), batch_size at a time, with a fixed number of queries per batch. Returns number of updates.
+        """
+        if not Toggle.get('CHECKSUMS_TOGGLE'):
+            return 0
+        if not recalculate:
+            queryset = queryset.filter(
+                Q(checksums__isnull=True) |
+                ~Q(checksums__has_keys=[cls.STANDARD_CHECKSUM_KEY, cls.SMART_CHECKSUM_KEY])
+            )
+
+        updated = 0
+        for ids in keyset_batches(queryset, 'id', batch_size or settings.CHECKSUM_BATCH_SIZE):
+            resources = [
+                cls(id=row['id'], checksums=cls.get_checksums_for_resource(row)) for row in cls.get_checksum_rows(ids)
+            ]
+            cls.objects.bulk_update(resources, ['checksums'])
+            updated += len(resources)
+
+        return updated
+
     @staticmethod
     def apply_user_criteria(queryset, user):
         queryset = queryset.exclude(
@@ -837,6 +902,7 @@ class SourceChildMixin(ChecksumModel):
 
 class ConceptContainerExportMixin:
     permission_classes = (CanViewConceptDictionaryVersion, )
+    is_delta = False  # GET serves the delta export (since the previous released version) instead of the full one
 
     def get_object(self):
         queryset = self.get_queryset()
@@ -855,7 +921,8 @@ class ConceptContainerExportMixin:
     def get(self, request, *args, **kwargs):  # pylint: disable=unused-argument
         version = self.get_object()
         logger.debug(
-            'Export requested for %s version %s', self.entity.lower(), version.version
+            '%s requested for %s version %s', 'Delta export' if self.is_delta else 'Export', self.entity.lower(),
+            version.version
         )
         if version.is_head and not request.user.is_staff:
             return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
@@ -863,9 +930,13 @@ class ConceptContainerExportMixin:
         if version.is_exporting:
             return Response(status=status.HTTP_208_ALREADY_REPORTED)
 
-        if version.has_export():
+        export_url = None
+        if self.is_delta:
+            export_url = version.get_delta_export_url()
+        elif version.has_export():
             export_url = version.get_export_url()
 
+        if export_url:
             no_redirect = request.query_params.get('noRedirect', False) in TRUTHY
             if no_redirect:
                 return Response({'url': export_url}, status=status.HTTP_200_OK)
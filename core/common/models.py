@@ -1,3 +1,7 @@
+from contextlib import contextmanager
+from functools import wraps
+from threading import local
+
 from celery.result import AsyncResult
 from celery_once import AlreadyQueued
 from django.conf import settings
@@ -20,6 +24,7 @@ from core.common.tasks import update_collection_active_concepts_count, update_co
 from core.common.utils import reverse_resource, reverse_resource_version, parse_updated_since_param, drop_version, \
     to_parent_uri, is_canonical_uri, get_export_service, from_string_to_date, get_truthy_values
 from core.common.utils import to_owner_uri
+from core.services.storages.redis import RedisService
 from core.settings import DEFAULT_LOCALE
 from .checksums import ChecksumModel
 from .constants import (
@@ -27,12 +32,13 @@ from .constants import (
     ACCESS_TYPE_VIEW, ACCESS_TYPE_EDIT, SUPER_ADMIN_USER_ID,
     HEAD, PERSIST_NEW_ERROR_MESSAGE, SOURCE_PARENT_CANNOT_BE_NONE, PARENT_RESOURCE_CANNOT_BE_NONE,
     CREATOR_CANNOT_BE_NONE, CANNOT_DELETE_ONLY_VERSION, OPENMRS_VALIDATION_SCHEMA, VALIDATION_SCHEMAS,
-    DEFAULT_VALIDATION_SCHEMA, ES_REQUEST_TIMEOUT, UPDATED_BY_USERNAME_PARAM)
+    DEFAULT_VALIDATION_SCHEMA, ES_REQUEST_TIMEOUT, UPDATED_BY_USERNAME_PARAM, DISPLAY_NAMES_RERUN_KEY)
 from .exceptions import Http400
 from .fields import URIField
+from .index_sync import IndexSyncQueue
 from .mixins import SourceContainerMixin
 from .tasks import handle_save, handle_m2m_changed, seed_children_to_new_version, update_validation_schema, \
-    update_source_active_concepts_count, update_source_active_mappings_count
+    update_source_active_concepts_count, update_source_active_mappings_count, update_source_display_names
 from ..toggles.models import Toggle
 
 TRUTHY = get_truthy_values()
@@ -86,7 +92,10 @@ class BaseModel(models.Model):
 
     def index(self):
         if not get(settings, 'TEST_MODE', False):
-            handle_save.delay(self.app_name, self.model_name, self.id)
+            if settings.ES_SYNC_QUEUE:
+                IndexSyncQueue().add_instance(self)
+            else:
+                handle_save.delay(self.app_name, self.model_name, self.id)
 
     @property
     def should_index(self):
@@ -185,8 +194,7 @@ class BaseModel(models.Model):
             if single_batch or not get(settings, 'DB_CURSOR_ON', True):
                 doc.update(queryset.all(), parallel=True)
             else:
-                for batch in queryset.iterator(chunk_size=500):
-                    doc.update(batch, parallel=True)
+                doc.update(queryset.iterator(chunk_size=settings.ES_INDEX_BATCH_SIZE), parallel=True)
 
     @staticmethod
     @transaction.atomic
@@ -348,6 +356,16 @@ class VersionedModel(BaseResourceModel):
         return drop_version(self.uri) + 'versions/'
 
 
+def materialized_statistic(func):
+    """Serves a repo summary statistic from RepoStatistics, parameterized calls are computed live"""
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        if any(args) or any(kwargs.values()):
+            return func(self, *args, **kwargs)
+        return self.statistics.fetch(func.__name__, lambda: func(self))
+    return wrapper
+
+
 class ConceptContainerModel(VersionedModel, ChecksumModel):
     """
     A sub-resource is an object that exists within the scope of its parent resource.
@@ -375,6 +393,7 @@ class ConceptContainerModel(VersionedModel, ChecksumModel):
     meta = models.JSONField(null=True, blank=True)
     active_concepts = models.IntegerField(null=True, blank=True, default=None)
     active_mappings = models.IntegerField(null=True, blank=True, default=None)
+    facets = models.JSONField(null=True, blank=True)  # unfiltered concepts/mappings facets of non HEAD versions
     custom_validation_schema = models.CharField(
         choices=VALIDATION_SCHEMAS, default=DEFAULT_VALIDATION_SCHEMA, max_length=100
     )
@@ -677,7 +696,7 @@ class ConceptContainerModel(VersionedModel, ChecksumModel):
         pass
 
     @classmethod
-    def persist_changes(cls, obj, updated_by, original_schema, **kwargs):
+    def persist_changes(cls, obj, updated_by, original_schema, **kwargs):  # pylint: disable=too-many-branches
         errors = {}
         parent_resource = kwargs.pop('parent_resource', obj.parent)
         if not parent_resource:
@@ -685,7 +704,10 @@ class ConceptContainerModel(VersionedModel, ChecksumModel):
 
         queue_schema_update_task = obj.is_validation_necessary()
         is_source = cls.__name__ == 'Source'
-        should_reindex_resources = is_source and obj.released != cls.objects.filter(id=obj.id).first().released
+        saved = cls.objects.filter(id=obj.id).first() if is_source else None
+        should_reindex_resources = is_source and obj.released != saved.released
+        should_update_display_names = is_source and obj.is_head and (
+            obj.default_locale != saved.default_locale or obj.supported_locales != saved.supported_locales)
 
         try:
             obj.full_clean()
@@ -711,6 +733,14 @@ class ConceptContainerModel(VersionedModel, ChecksumModel):
                     obj.index_resources_for_self_as_latest_released()
                 else:
                     obj.index_resources_for_self_as_unreleased()
+            if should_update_display_names:
+                if get(settings, 'TEST_MODE', False):
+                    update_source_display_names(obj.id)
+                else:
+                    try:
+                        update_source_display_names.delay(obj.id)
+                    except AlreadyQueued:  # the queued/running update runs again with these locales
+                        RedisService().set(DISPLAY_NAMES_RERUN_KEY.format(obj.id), 1, ex=86400)
 
         except IntegrityError as ex:
             errors.update({'__all__': ex.args})
@@ -864,6 +894,16 @@ class ConceptContainerModel(VersionedModel, ChecksumModel):
             return service.exists(self.version_export_path)
         return service.has_path(self.get_version_export_path(suffix=None))
 
+    @cached_property
+    def version_delta_export_path(self):
+        # kept out of the owner's directory so that it is never taken for the full export of this version
+        return f'deltas/{self.version_export_path}'
+
+    def get_delta_export_url(self):
+        service = get_export_service()
+        path = service.get_last_key_from_path(f'deltas/{self.get_version_export_path(suffix=None)}')
+        return service.url_for(path) if path else None
+
     def can_view_all_content(self, user):
         if get(user, 'is_anonymous'):
             return False
@@ -871,6 +911,35 @@ class ConceptContainerModel(VersionedModel, ChecksumModel):
             user, 'is_staff'
         ) or self.public_can_view or self.user_id == user.id or self.organization.members.filter(id=user.id).exists()
 
+    resolution_memo = local()  # per request/task, set up by resolution_memo_scope
+
+    @classmethod
+    @contextmanager
+    def resolution_memo_scope(cls):
+        """Memoizes repo version resolutions in the block, nested scopes share the outermost one's memo"""
+        if getattr(cls.resolution_memo, 'repos', None) is not None:
+            yield
+            return
+        cls.resolution_memo.repos = {}
+        try:
+            yield
+        finally:
+            cls.resolution_memo.repos = None
+
+    @classmethod
+    def clear_resolution_memo(cls):
+        if getattr(cls.resolution_memo, 'repos', None) is not None:
+            cls.resolution_memo.repos = {}
+
+    @classmethod
+    def memoize_resolution(cls, key, resolve):
+        memo = getattr(cls.resolution_memo, 'repos', None)
+        if memo is None:
+            return resolve()
+        if key not in memo:
+            memo[key] = resolve()
+        return memo[key]
+
     @classmethod
     def resolve_expression_to_version(cls, expression):
         url = expression
@@ -911,7 +980,13 @@ class ConceptContainerModel(VersionedModel, ChecksumModel):
         2. Else if relative URL provided:
             - Return the repository directly using the relative URL, or return 404 if not found
         """
+        return cls.memoize_resolution(
+            ('expression', url, namespace, version),
+            lambda: cls.__resolve_reference_expression(url, namespace, version)
+        )
 
+    @classmethod
+    def __resolve_reference_expression(cls, url, namespace=None, version=None):
         resolution_url, version, is_canonical = cls.__get_resolution_url(url, version)
         instance = None
         is_global_namespace = not namespace or namespace == '/'
@@ -991,27 +1066,39 @@ class ConceptContainerModel(VersionedModel, ChecksumModel):
         if self.released and not self.revision_date:
             self.revision_date = timezone.now()
 
+    @cached_property
+    def statistics(self):
+        """RepoStatistics row of the repo, memoized per instance until RepoStatistics.invalidate resets it"""
+        from core.repos.models import RepoStatistics
+        return RepoStatistics.get_for(self)
+
     @property
+    @materialized_statistic
     def map_types_count(self):
         return self.get_active_mappings().aggregate(count=Count('map_type', distinct=True))['count']
 
     @property
+    @materialized_statistic
     def concept_class_count(self):
         return self.get_active_concepts().aggregate(count=Count('concept_class', distinct=True))['count']
 
     @property
+    @materialized_statistic
     def datatype_count(self):
         return self.get_active_concepts().aggregate(count=Count('datatype', distinct=True))['count']
 
     @property
+    @materialized_statistic
     def retired_concepts_count(self):
         return self.get_concepts_queryset().filter(retired=True).count()
 
     @property
+    @materialized_statistic
     def retired_mappings_count(self):
         return self.get_mappings_queryset().filter(retired=True).count()
 
     @property
+    @materialized_statistic
     def concepts_distribution(self):
         facets = self.get_concept_facets()
         return {
@@ -1025,6 +1112,7 @@ class ConceptContainerModel(VersionedModel, ChecksumModel):
         }
 
     @property
+    @materialized_statistic
     def mappings_distribution(self):
         facets = self.get_mapping_facets()
 
@@ -1036,12 +1124,14 @@ class ConceptContainerModel(VersionedModel, ChecksumModel):
         }
 
     @property
+    @materialized_statistic
     def versions_distribution(self):
         return {
             'total': self.num_versions,
             'released': self.released_versions_count
         }
 
+    @materialized_statistic
     def get_concepts_extras_distribution(self):
         return self.get_distinct_extras_keys(self.get_concepts_queryset(), 'concepts')
 
@@ -1055,24 +1145,30 @@ class ConceptContainerModel(VersionedModel, ChecksumModel):
         return ConceptName.objects.filter(concept__in=self.get_active_concepts())
 
     @property
+    @materialized_statistic
     def concept_names_distribution(self):
         locales = self.get_name_locales_queryset()
         locales_total = locales.distinct('locale').count()
         names_total = locales.distinct('type').count()
         return {'locales': locales_total, 'names': names_total}
 
+    @materialized_statistic
     def get_name_locale_distribution(self):
         return self._get_distribution(self.get_name_locales_queryset(), 'locale')
 
+    @materialized_statistic
     def get_name_type_distribution(self):
         return self._get_distribution(self.get_name_locales_queryset(), 'type')
 
+    @materialized_statistic
     def get_concept_class_distribution(self):
         return self._get_distribution(self.get_active_concepts(), 'concept_class')
 
+    @materialized_statistic
     def get_datatype_distribution(self):
         return self._get_distribution(self.get_active_concepts(), 'datatype')
 
+    @materialized_statistic
     def get_map_type_distribution(self):
         return self._get_distribution(self.get_active_mappings(), 'map_type')
 
@@ -1080,6 +1176,70 @@ class ConceptContainerModel(VersionedModel, ChecksumModel):
     def _get_distribution(queryset, field):
         return list(queryset.values(field).annotate(count=Count('id')).values(field, 'count').order_by('-count'))
 
+    def get_facets_search_filters(self):
+        """Filters the concepts/mappings list views apply to search the children of this version"""
+        return {}
+
+    def get_index_tasks(self):
+        """(QueueOnce task, kwargs) of the tasks that index the children of this version"""
+        return []
+
+    def has_pending_index_tasks(self):
+        """QueueOnce tasks hold their lock while they are queued or running"""
+        for task, kwargs in self.get_index_tasks():
+            try:
+                if task.once_backend.redis.exists(task.get_key(kwargs=kwargs)):
+                    return True
+            except:  # pylint: disable=bare-except
+                pass
+        return False
+
+    def are_children_indexed(self):
+        return not self.has_pending_index_tasks()
+
+    def get_precomputed_facets(self, resource):
+        if self.is_head or self.is_processing:
+            return None
+        return get(self.facets, resource)
+
+    def set_precomputed_facets(self, resource, facets):
+        if self.is_head or self.is_processing or not self.are_children_indexed():
+            return
+        self.facets = {**(self.facets or {}), resource: facets}
+        self.__class__.objects.filter(id=self.id).update(facets=self.facets)
+
+    def update_facets(self):
+        """
+        Children of a non HEAD version don't change, so their facets are computed once after seeding (and after
+        the indexes are refreshed), unless they are still being seeded/indexed, then they are stored on first
+        anonymous search. Only public children are counted, these facets are only served to anonymous requests.
+        """
+        if self.is_head or get(settings, 'TEST_MODE', False) or not self.are_children_indexed():
+            return
+        from core.concepts.documents import ConceptDocument
+        from core.concepts.search import ConceptFacetedSearch
+        from core.mappings.documents import MappingDocument
+        from core.mappings.search import MappingFacetedSearch
+        ConceptDocument._index.refresh()  # pylint: disable=protected-access
+        MappingDocument._index.refresh()  # pylint: disable=protected-access
+        self.facets = {
+            'concepts': self._compute_facets(ConceptFacetedSearch, ConceptDocument),
+            'mappings': self._compute_facets(MappingFacetedSearch, MappingDocument),
+        }
+        self.__class__.objects.filter(id=self.id).update(facets=self.facets)
+
+    def _compute_facets(self, facet_class, document):
+        """Facets of the public children, i.e. as searched anonymously (BaseAPIView.get_public_criteria)"""
+        search = document.search().query('match', public_can_view=True)
+        for attr, value in self.get_facets_search_filters().items():
+            search = search.query('match', **{attr: value})
+        faceted_search = facet_class('', _search=search)
+        faceted_search.params(request_timeout=ES_REQUEST_TIMEOUT)
+        try:
+            return faceted_search.execute().facets.to_dict()
+        except TransportError as ex:  # pragma: no cover
+            raise Http400(detail=get(ex, 'info') or get(ex, 'error') or str(ex)) from ex
+
     def get_concept_facets(self, filters=None):
         from core.concepts.search import ConceptFacetedSearch
         return self._get_resource_facets(ConceptFacetedSearch, filters)
@@ -1111,10 +1271,16 @@ class ConceptContainerModel(VersionedModel, ChecksumModel):
 
 
 class CelerySignalProcessor(RealTimeSignalProcessor):
+    """
+    With ES_SYNC_QUEUE, saved and m2m changed (post_*) instances are coalesced in IndexSyncQueue and bulk indexed
+    by flush_index_sync_queue instead of a handle_save task per signal.
+    """
     def handle_save(self, sender, instance, **kwargs):
         if settings.ES_SYNC and instance.__class__ in registry.get_models() and instance.should_index:
             if get(settings, 'TEST_MODE', False):
                 handle_save(instance.app_name, instance.model_name, instance.id)
+            elif settings.ES_SYNC_QUEUE:
+                IndexSyncQueue().add_instance(instance)
             else:
                 handle_save.delay(instance.app_name, instance.model_name, instance.id)
 
@@ -1122,5 +1288,7 @@ class CelerySignalProcessor(RealTimeSignalProcessor):
         if settings.ES_SYNC and instance.__class__ in registry.get_models() and instance.should_index:
             if get(settings, 'TEST_MODE', False):
                 handle_m2m_changed(instance.app_name, instance.model_name, instance.id, action)
+            elif settings.ES_SYNC_QUEUE and action in ('post_add', 'post_remove', 'post_clear'):
+                IndexSyncQueue().add_instance(instance)
             else:
                 handle_m2m_changed.delay(instance.app_name, instance.model_name, instance.id, action)
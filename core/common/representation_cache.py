@@ -0,0 +1,129 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from pydash import get, compact
+
+
+class RepresentationCache:
+    """
+    Caches the serialized representations of concept/mapping versions (for REPRESENTATION_CACHE_TTL seconds) in the
+    default cache backend. A representation is keyed by the resource id, the serializer (brief/list/verbose variant)
+    and the fields it renders, the standard checksum and the generations of everything else it is built from:
+    the resource itself (bumped when it is saved, so HEAD versions are invalidated on save), its source (bumped when
+    the source or its versions change, that changes display locales and latest source versions) and for mappings
+    the concepts/sources mapped from/to. Fields that change without any of these (LIVE_FIELDS), e.g. owner names and
+    usernames that change when an org/user is renamed, are never cached, they are built again and spliced into the
+    cached fragment on every read.
+    """
+    PREFIX = 'representation'
+    LIVE_FIELDS = {
+        'search_meta', 'checksums', 'is_latest_version', 'references', 'mappings', 'summary', 'parent_concepts',
+        'child_concepts', 'hierarchy_path', 'parent_concept_urls', 'child_concept_urls', 'has_children',
+        'source_versions', 'collection_versions', 'from_concept', 'to_concept', 'from_source', 'to_source',
+        'owner', 'owner_name', 'from_source_owner', 'to_source_owner', 'created_by', 'updated_by',
+        'version_created_by', 'version_updated_by',
+    }
+    DEPENDENCIES = {
+        'concept': [('source', 'parent_id')],
+        'mapping': [
+            ('source', 'parent_id'), ('concept', 'from_concept_id'), ('concept', 'to_concept_id'),
+            ('source', 'from_source_id'), ('source', 'to_source_id')
+        ],
+    }
+
+    def __init__(self, serializer):
+        self.serializer = serializer
+        self.fields = [name for name in serializer.fields if name not in self.LIVE_FIELDS]
+
+    @staticmethod
+    def is_enabled():
+        return bool(settings.REPRESENTATION_CACHE_TTL) and not get(settings, 'TEST_MODE', False)
+
+    def is_cacheable(self):
+        return self.is_enabled() and get(self.serializer.context, 'request.method') == 'GET'
+
+    @staticmethod
+    def get_kind(instance):
+        return instance.__class__.__name__.lower()
+
+    @classmethod
+    def generation_key(cls, kind, _id):
+        return f'{cls.PREFIX}:generation:{kind}:{_id}'
+
+    @classmethod
+    def get_generation_keys(cls, instance):
+        kind = cls.get_kind(instance)
+        return [cls.generation_key(kind, instance.id)] + [
+            cls.generation_key(dependency, getattr(instance, attr, None))
+            for dependency, attr in cls.DEPENDENCIES.get(kind, [])
+        ]
+
+    def get_key(self, instance, generations):
+        checksum = get(instance.checksums, instance.STANDARD_CHECKSUM_KEY)
+        if not instance.id or not checksum:
+            return None
+        payload = [
+            self.get_kind(instance),
+            instance.id,
+            self.serializer.__class__.__name__,
+            self.fields,
+            checksum,
+            [generations.get(key, 0) for key in self.get_generation_keys(instance)],
+        ]
+        return f'{self.PREFIX}:' + hashlib.sha1(json.dumps(payload).encode()).hexdigest()
+
+    def get_many(self, instances):
+        """Returns {instance id: (key, cached fragment or None)} for the given instances"""
+        if not self.is_cacheable():
+            return {}
+        instances = [instance for instance in compact(instances) if get(instance, 'id')]
+        try:
+            generations = cache.get_many(
+                {key for instance in instances for key in self.get_generation_keys(instance)})
+            keys = {instance.id: self.get_key(instance, generations) for instance in instances}
+            fragments = cache.get_many(compact(keys.values()))
+        except:  # pylint: disable=bare-except
+            return {}
+        return {_id: (key, fragments.get(key)) for _id, key in keys.items() if key}
+
+    def set(self, key, representation):
+        try:
+            cache.set(
+                key, {name: representation[name] for name in self.fields if name in representation},
+                settings.REPRESENTATION_CACHE_TTL
+            )
+        except:  # pylint: disable=bare-except
+            pass
+
+    @classmethod
+    def incr(cls, key):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+    @classmethod
+    def invalidate(cls, kind, *ids):
+        if not cls.is_enabled():
+            return
+        try:
+            for _id in set(compact(ids)):
+                cls.incr(cls.generation_key(kind, _id))
+        except:  # pylint: disable=bare-except
+            pass
+
+    @classmethod
+    def invalidate_for(cls, instances):
+        """Bumps the generations of the given concepts/mappings"""
+        instances = compact(instances)
+        if instances:
+            cls.invalidate(cls.get_kind(instances[0]), *[instance.id for instance in instances])
+
+    @classmethod
+    def invalidate_source(cls, source):
+        """Bumps the generation of the source (HEAD) the given source or source version belongs to"""
+        if source and cls.is_enabled():
+            head = source if source.is_head else source.head
+            cls.invalidate('source', get(head, 'id'))
@@ -0,0 +1,155 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from pydash import get, compact
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from core.common.constants import INCLUDE_FACETS, INCLUDE_SEARCH_STATS, SEARCH_LATEST_REPO_VERSION, \
+    HTTP_COMPRESS_HEADER, SEARCH_CURSOR_PARAM
+
+
+class ListResponseCache:
+    """
+    Short lived (LIST_RESPONSE_CACHE_TTL seconds) cache of list/search responses in the default cache backend.
+    Responses are keyed by the requester's visibility scope, the normalized query params, the headers that change
+    the response and the generation of the repo being listed (or of the resource type for global lists).
+    Generations are bumped whenever the concepts/mappings of a repo change, so stale entries are never read again
+    and simply expire.
+    """
+    PREFIX = 'list_cache'
+    HEADERS = [INCLUDE_FACETS, INCLUDE_SEARCH_STATS, SEARCH_LATEST_REPO_VERSION, HTTP_COMPRESS_HEADER]
+    EXCLUDED_RESPONSE_HEADERS = ['Content-Type']
+
+    def __init__(self, view):
+        self.view = view
+        self.request = view.request
+        self.key = None
+
+    @staticmethod
+    def is_enabled():
+        return bool(settings.LIST_RESPONSE_CACHE_TTL) and not get(settings, 'TEST_MODE', False)
+
+    def is_cacheable(self):
+        params = self.request.query_params
+        return self.is_enabled() and self.request.method == 'GET' and not params.get(
+            'csv') and SEARCH_CURSOR_PARAM not in params
+
+    def get_scope(self):
+        parent = get(self.view, 'parent_resource')
+        if parent:
+            return parent.versioned_object_url
+        return self.view.model.__name__.lower()
+
+    @staticmethod
+    def get_user_scope(user):
+        if not user or user.is_anonymous:
+            return 'anonymous'
+        return 'staff' if user.is_staff else f'user:{user.id}'
+
+    def get_key(self):
+        request = self.request
+        scope = self.get_scope()
+        payload = [
+            request.build_absolute_uri(request.path),
+            self.get_user_scope(request.user),
+            sorted((key, sorted(values)) for key, values in request.query_params.lists()),
+            [request.META.get(header) for header in self.HEADERS],
+            scope,
+            self.get_generation(scope)
+        ]
+        return f'{self.PREFIX}:response:' + hashlib.sha1(json.dumps(payload).encode()).hexdigest()
+
+    def get(self):
+        try:
+            self.key = self.get_key()
+            cached = cache.get(self.key)
+        except:  # pylint: disable=bare-except
+            return None
+        self.count('hits' if cached is not None else 'misses')
+        if cached is None:
+            return None
+
+        response = Response(cached['data'])
+        for key, value in cached['headers'].items():
+            response[key] = value
+        return response
+
+    def set(self, response):
+        if response.status_code != 200:
+            return
+        headers = {
+            key: value for key, value in response.items() if key not in self.EXCLUDED_RESPONSE_HEADERS
+        }
+        data = json.loads(json.dumps(response.data, cls=JSONEncoder))
+        try:
+            cache.set(
+                self.key or self.get_key(), {'data': data, 'headers': headers}, settings.LIST_RESPONSE_CACHE_TTL)
+        except:  # pylint: disable=bare-except
+            pass
+
+    def fetch(self, get_response):
+        if not self.is_cacheable():
+            return get_response()
+
+        response = self.get()
+        if response is None:
+            response = get_response()
+            self.set(response)
+        return response
+
+    @classmethod
+    def generation_key(cls, scope):
+        return f'{cls.PREFIX}:generation:{scope}'
+
+    @classmethod
+    def get_generation(cls, scope):
+        return cache.get(cls.generation_key(scope), 0)
+
+    @classmethod
+    def incr(cls, key):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+    @classmethod
+    def invalidate(cls, *scopes):
+        if not cls.is_enabled():
+            return
+        try:
+            for scope in set(compact(scopes)):
+                cls.incr(cls.generation_key(scope))
+        except:  # pylint: disable=bare-except
+            pass
+
+    @classmethod
+    def invalidate_for(cls, instances):
+        """Bumps the generations of the source(s) and resource type of the given concepts/mappings"""
+        instances = compact(instances)
+        if instances:
+            cls.invalidate(
+                instances[0].__class__.__name__.lower(),
+                *{instance.parent.versioned_object_url for instance in instances if instance.parent_id}
+            )
+
+    @classmethod
+    def count(cls, name):
+        try:
+            cls.incr(f'{cls.PREFIX}:{name}')
+        except:  # pylint: disable=bare-except
+            pass
+
+    @classmethod
+    def stats(cls):
+        hits = cache.get(f'{cls.PREFIX}:hits', 0)
+        misses = cache.get(f'{cls.PREFIX}:misses', 0)
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / total, 4) if total else None,
+            'ttl': settings.LIST_RESPONSE_CACHE_TTL,
+        }
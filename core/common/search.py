@@ -1,8 +1,13 @@
+import base64
+import binascii
+import json
 import re
 import urllib
+from collections import defaultdict
 
-from django.db.models import Case, When, IntegerField
+from django.conf import settings
 from elasticsearch_dsl import FacetedSearch, Q
+from elasticsearch_dsl.connections import get_connection
 from pydash import compact, get
 
 from core.common.utils import is_url_encoded_string
@@ -49,6 +54,9 @@ class CustomESSearch:
         self.score_stats = None
         self.score_distribution = None
         self.total = 0
+        self.cursor_size = None
+        self.pit_id = None
+        self.next_cursor = None
 
     @classmethod
     def get_must_haves(cls, search_str):
@@ -176,38 +184,96 @@ class CustomESSearch:
     def apply_aggregation_score_stats(self):
         self._dsl_search.aggs.bucket("score", "stats", script="_score")
 
+    @staticmethod
+    def encode_cursor(pit_id, search_after):
+        return base64.urlsafe_b64encode(json.dumps({'pit': pit_id, 'after': search_after}).encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            return data['pit'], data['after']
+        except (ValueError, KeyError, TypeError, binascii.Error) as ex:
+            raise ValueError('Invalid cursor') from ex
+
+    def apply_cursor(self, cursor, size):
+        """
+        Cursor based pagination with a point in time (pit) and search_after, no from/size window limits.
+        cursor is None for the first page, which opens the pit, else the next_cursor of the previous page.
+        """
+        search = self._dsl_search
+        if cursor:
+            self.pit_id, search_after = self.decode_cursor(cursor)
+        else:
+            self.pit_id = get_connection(search._using).open_point_in_time(  # pylint: disable=protected-access
+                index=search._index, keep_alive=settings.ES_PIT_KEEP_ALIVE)['id']  # pylint: disable=protected-access
+            search_after = None
+
+        if not search._sort:  # pylint: disable=protected-access
+            search = search.sort('_shard_doc')
+        search = search.index().extra(pit={'id': self.pit_id, 'keep_alive': settings.ES_PIT_KEEP_ALIVE})[0:size]
+        if search_after:
+            search = search.extra(search_after=search_after)
+        self._dsl_search = search
+        self.cursor_size = size
+
+    def set_next_cursor(self, response, hits):
+        pit_id = get(response, 'pit_id') or self.pit_id
+        if len(hits.hits) == self.cursor_size:
+            self.next_cursor = self.encode_cursor(pit_id, list(get(hits.hits[-1], 'sort')))
+        else:
+            get_connection(self._dsl_search._using).close_point_in_time(body={'id': pit_id})  # pylint: disable=protected-access
+
     def to_queryset(self, keep_order=True):
         """
-        This method return a django queryset from the an elasticsearch result.
-        It cost a query to the sql db.
+        Hydrates the elasticsearch hits into db instances.
+        All hits are fetched with one pk__in query (one per model for RepoDocument), arranged in hit order in python
+        and annotated with _score, _highlight and _confidence in the same pass.
+        self.queryset is a plain list of instances, stale hits (not in db anymore) are skipped.
         """
-        s, hits = self.__get_response()
+        response, hits = self.__get_response()
+        self.queryset = self.hydrate(hits.hits, keep_order)
+        self.total = hits.total.value
+        if self.cursor_size:
+            self.set_next_cursor(response, hits)
 
-        for result in hits.hits:
-            _id = get(result, '_id')
-            self.scores[int(_id)] = get(result, '_score')
-            highlight = get(result, 'highlight')
-            if highlight:
-                self.highlights[int(_id)] = highlight.to_dict()
+    def get_hit_model(self, hit):
         if self.document and self.document.__name__ == 'RepoDocument':
             from core.sources.models import Source
             from core.collections.models import Collection
-            qs = compact([
-                (Source if result.meta.index == 'sources' else Collection).objects.filter(
-                    id=result.meta.id
-                ).first() for result in s
-            ])
-        else:
-            pks = [result.meta.id for result in s]
-            qs = self._dsl_search._model.objects.filter(pk__in=pks)  # pylint: disable=protected-access
-            if keep_order:
-                preserved_order = Case(
-                    *[When(pk=pk, then=pos) for pos, pk in enumerate(pks)],
-                    output_field=IntegerField()
-                )
-                qs = qs.order_by(preserved_order)
-        self.queryset = qs
-        self.total = hits.total.value
+            return Source if get(hit, '_index') == 'sources' else Collection
+        return self._dsl_search._model  # pylint: disable=protected-access
+
+    def hydrate(self, hits, keep_order=True):
+        keys = []
+        ids_by_model = defaultdict(list)
+        for hit in hits:
+            key = (self.get_hit_model(hit), int(get(hit, '_id')))
+            keys.append(key)
+            ids_by_model[key[0]].append(key[1])
+            self.scores[key[1]] = get(hit, '_score')
+            highlight = get(hit, 'highlight')
+            if highlight:
+                self.highlights[key[1]] = highlight.to_dict()
+
+        instances = {}
+        for model, ids in ids_by_model.items():
+            for instance in model.objects.filter(pk__in=ids):
+                instances[(model, instance.pk)] = instance
+
+        results = []
+        for hit, key in zip(hits, keys):
+            instance = instances.get(key)
+            if instance is None:
+                continue
+            instance._score = get(hit, '_score')  # pylint: disable=protected-access
+            highlight = get(hit, 'highlight')
+            instance._highlight = highlight.to_dict() if highlight else None  # pylint: disable=protected-access
+            if instance._score and self.max_score:  # pylint: disable=protected-access
+                instance._confidence = f"{round((instance._score / self.max_score) * 100, 2)}%"  # pylint: disable=protected-access
+            results.append(instance)
+
+        return results if keep_order else list(instances.values())
 
     def get_aggregations(self, verbose=False, raw=False):
         s, _ = self.__get_response()
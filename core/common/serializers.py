@@ -1,12 +1,17 @@
+from collections import OrderedDict
+
+from django.db.models.manager import BaseManager
 from pydash import get
-from rest_framework.fields import CharField, JSONField, SerializerMethodField, FloatField
-from rest_framework.serializers import Serializer, Field, ValidationError, ModelSerializer
+from rest_framework.fields import CharField, JSONField, SerializerMethodField, FloatField, SkipField
+from rest_framework.relations import PKOnlyObject
+from rest_framework.serializers import Serializer, Field, ValidationError, ModelSerializer, ListSerializer
 
 from core import settings
 from core.code_systems.constants import RESOURCE_TYPE as CODE_SYSTEM_RESOURCE_TYPE
 from core.common.constants import INCLUDE_CONCEPTS_PARAM, INCLUDE_MAPPINGS_PARAM, LIMIT_PARAM, OFFSET_PARAM, \
     INCLUDE_VERBOSE_REFERENCES, INCLUDE_SEARCH_META_PARAM
 from core.common.feeds import DEFAULT_LIMIT
+from core.common.representation_cache import RepresentationCache
 from core.common.utils import to_int, get_truthy_values
 from core.concept_maps.constants import RESOURCE_TYPE as CONCEPT_MAP_RESOURCE_TYPE
 from core.orgs.models import Organization
@@ -36,6 +41,77 @@ class ReadSerializerMixin:
         pass
 
 
+class ExportBatchListSerializer(ListSerializer):  # pylint: disable=abstract-method
+    """
+    Serializes a whole export batch from dict rows which the child serializer builds with a fixed number of set based
+    queries (child.get_batch_rows(queryset)), instead of resolving the relations of each instance one by one.
+    """
+
+    def to_representation(self, data):
+        return super().to_representation(self.child.get_batch_rows(data))
+
+
+class RepresentationCacheListSerializer(ListSerializer):  # pylint: disable=abstract-method
+    """
+    Fetches the cached representations of a whole page with one round trip before the child serializer
+    (a RepresentationCacheMixin serializer) builds the representation of each instance.
+    """
+
+    def to_representation(self, data):
+        instances = list(data.all() if isinstance(data, BaseManager) else data)
+        self.child.prefetch_representations(instances)
+        return super().to_representation(instances)
+
+
+class RepresentationCacheMixin:
+    """
+    Serves the representation of concept/mapping versions from RepresentationCache, only the live fields
+    (RepresentationCache.LIVE_FIELDS) are built again and spliced into the cached fragment.
+    """
+    _representation_cache = None
+    _prefetched_representations = None
+
+    def get_representation_cache(self):
+        if self._representation_cache is None:
+            self._representation_cache = RepresentationCache(self)
+        return self._representation_cache
+
+    def prefetch_representations(self, instances):
+        self._prefetched_representations = self.get_representation_cache().get_many(instances)
+
+    def to_representation(self, instance):
+        representation_cache = self.get_representation_cache()
+        if not representation_cache.is_cacheable():
+            return super().to_representation(instance)
+
+        _id = get(instance, 'id')
+        prefetched = self._prefetched_representations
+        if prefetched is None:
+            prefetched = representation_cache.get_many([instance])
+        key, fragment = prefetched.get(_id, (None, None))
+        if fragment is not None:
+            return self.splice_representation(instance, fragment)
+
+        representation = super().to_representation(instance)
+        if key:
+            representation_cache.set(key, representation)
+        return representation
+
+    def splice_representation(self, instance, fragment):
+        representation = OrderedDict()
+        for field in self._readable_fields:
+            if field.field_name in fragment:
+                representation[field.field_name] = fragment[field.field_name]
+                continue
+            try:
+                attribute = field.get_attribute(instance)
+            except SkipField:
+                continue
+            check_for_none = attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+            representation[field.field_name] = None if check_for_none is None else field.to_representation(attribute)
+        return representation
+
+
 class StatusField(Field):
 
     def to_internal_value(self, data):
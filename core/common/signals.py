@@ -1,8 +1,20 @@
-from django.db.models.signals import pre_save, post_save
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
 from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
 
-from core.common.models import BaseModel
+from core.collections.models import Collection, Expansion
+from core.common.constants import HEAD
+from core.common.models import BaseModel, ConceptContainerModel
+from core.common.representation_cache import RepresentationCache
+from core.common.response_cache import ListResponseCache
+from core.common.terminology import RepoResolver, CodeIndex
+from core.concepts.models import Concept
+from core.mappings.models import Mapping
 from core.orgs.models import Organization
+from core.repos.models import RepoStatistics
+from core.services.auth.cache import AuthCache
+from core.sources.models import Source
+from core.url_registry.models import URLRegistry
 from core.users.models import UserProfile
 
 
@@ -29,3 +41,94 @@ def propagate_owner_status(sender, instance=None, created=False, **kwargs):  # p
         if updated_collections:
             from core.collections.documents import CollectionDocument
             instance.batch_index(instance.collection_set, CollectionDocument, True)
+
+
+def is_bookkeeping_update(update_fields):
+    """checksums are lazily stamped while serializing and processing ids come and go with tasks"""
+    return bool(update_fields) and set(update_fields) <= {'checksums', '_background_process_ids'}
+
+
+@receiver(post_save, sender=Concept)
+@receiver(post_save, sender=Mapping)
+@receiver(post_delete, sender=Concept)
+@receiver(post_delete, sender=Mapping)
+def invalidate_list_response_cache(sender, instance=None, update_fields=None, **kwargs):  # pylint: disable=unused-argument
+    if not is_bookkeeping_update(update_fields):
+        ListResponseCache.invalidate_for([instance])
+        RepresentationCache.invalidate_for([instance])
+        RepoStatistics.invalidate_for([instance])
+
+
+@receiver(post_save, sender=Source)
+@receiver(post_save, sender=Collection)
+@receiver(post_save, sender=URLRegistry)
+@receiver(post_delete, sender=Source)
+@receiver(post_delete, sender=Collection)
+@receiver(post_delete, sender=URLRegistry)
+def clear_resolution_memo(sender, **kwargs):  # pylint: disable=unused-argument
+    """Releases, new versions and URL registry changes can change what references resolve to"""
+    ConceptContainerModel.clear_resolution_memo()
+
+
+@receiver(post_save, sender=Source)
+@receiver(post_save, sender=Collection)
+def invalidate_repo_list_response_cache(sender, instance=None, update_fields=None, **kwargs):  # pylint: disable=unused-argument
+    if instance and not is_bookkeeping_update(update_fields):
+        ListResponseCache.invalidate(instance.versioned_object_url)
+        RepoStatistics.invalidate(instance, None if instance.is_head else instance.head)
+
+
+@receiver(post_delete, sender=Source)
+@receiver(post_delete, sender=Collection)
+def invalidate_head_statistics(sender, instance=None, **kwargs):  # pylint: disable=unused-argument
+    """Version counts (versions_distribution) of HEAD change when one of its versions is deleted"""
+    if instance and not instance.is_head:
+        ListResponseCache.invalidate(instance.versioned_object_url)
+        RepoStatistics.invalidate(instance.head)
+
+
+@receiver(post_save, sender=Source)
+@receiver(post_save, sender=Collection)
+@receiver(post_delete, sender=Source)
+@receiver(post_delete, sender=Collection)
+def invalidate_terminology_caches(sender, instance=None, update_fields=None, **kwargs):  # pylint: disable=unused-argument
+    if not instance:
+        return
+    if not is_bookkeeping_update(update_fields):
+        RepoResolver.invalidate()
+    # processing ids are cleared once the concepts of a new version are seeded, so that drops its code index too
+    if sender is Source and not instance.is_head and set(update_fields or []) != {'checksums'}:
+        CodeIndex.drop(instance.id)
+
+
+@receiver(post_save, sender=Source)
+@receiver(post_delete, sender=Source)
+def invalidate_source_representation_cache(sender, instance=None, update_fields=None, **kwargs):  # pylint: disable=unused-argument
+    """Display locales and latest source versions of the concepts/mappings of a source follow its versions"""
+    if instance and (not is_bookkeeping_update(update_fields) or (
+            not instance.is_head and set(update_fields) != {'checksums'})):
+        RepresentationCache.invalidate_source(instance)
+
+
+@receiver(m2m_changed, sender=Expansion.concepts.through)
+@receiver(m2m_changed, sender=Expansion.mappings.through)
+def invalidate_expansion_list_response_cache(
+        sender, instance=None, action=None, reverse=False, **kwargs):  # pylint: disable=unused-argument
+    if not reverse and action in ['post_add', 'post_remove', 'post_clear'] and instance.collection_version_id:
+        ListResponseCache.invalidate(instance.collection_version.versioned_object_url)
+        RepoStatistics.invalidate(instance.collection_version)
+
+
+@receiver(m2m_changed, sender=Expansion.concepts.through)
+@receiver(m2m_changed, sender=Expansion.mappings.through)
+def reset_collection_version_facets(
+        sender, instance=None, action=None, reverse=False, **kwargs):  # pylint: disable=unused-argument
+    if not reverse and action in ['post_add', 'post_remove', 'post_clear'] and instance.collection_version_id:
+        Collection.objects.filter(
+            id=instance.collection_version_id, facets__isnull=False).exclude(version=HEAD).update(facets=None)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_auth_cache(sender, instance=None, **kwargs):  # pylint: disable=unused-argument
+    if instance and instance.key:
+        AuthCache.invalidate(AuthCache.DJANGO, instance.key)
@@ -6,7 +6,7 @@ from core.common.constants import RELEASED_PARAM, VERBOSE_PARAM, INCLUDE_RETIRED
     LAST_LOGIN_BEFORE_PARAM, LAST_LOGIN_SINCE_PARAM, DATE_JOINED_SINCE_PARAM, DATE_JOINED_BEFORE_PARAM, \
     CASCADE_HIERARCHY_PARAM, CASCADE_METHOD_PARAM, MAP_TYPES_PARAM, EXCLUDE_MAP_TYPES_PARAM, CASCADE_MAPPINGS_PARAM, \
     INCLUDE_MAPPINGS_PARAM, CASCADE_LEVELS_PARAM, CASCADE_DIRECTION_PARAM, ALL, RETURN_MAP_TYPES, OMIT_IF_EXISTS_IN, \
-    EQUIVALENCY_MAP_TYPES, CANONICAL_URL_REQUEST_PARAM
+    EQUIVALENCY_MAP_TYPES, CANONICAL_URL_REQUEST_PARAM, HIERARCHY_DEPTH_PARAM
 # HEADERS
 from core.orgs.constants import NO_MEMBERS
 
@@ -24,6 +24,10 @@ compress_header = openapi.Parameter(
 # QUERY PARAMS
 q_param = openapi.Parameter('q', openapi.IN_QUERY, description="search text", type=openapi.TYPE_STRING)
 page_param = openapi.Parameter('page', openapi.IN_QUERY, description="page number", type=openapi.TYPE_INTEGER)
+cursor_param = openapi.Parameter(
+    'cursor', openapi.IN_QUERY, description="With q param, 'true' for the first page then the next_cursor header value,"
+                                            " pages beyond 10000 results (instead of page)", type=openapi.TYPE_STRING
+)
 limit_param = openapi.Parameter(
     'limit', openapi.IN_QUERY, description="result list size", type=openapi.TYPE_INTEGER, default=25
 )
@@ -129,6 +133,10 @@ all_resource_query_param = openapi.Parameter(
     enum=['concept_version', 'mapping_version', 'source_version', 'collection_version', 'org', 'user'],
     required=True
 )
+bulk_load_param = openapi.Parameter(
+    'bulk_load', openapi.IN_QUERY, type=openapi.TYPE_BOOLEAN, default=False,
+    description="Create new concepts/mappings with bulk inserts, meant for loading brand new sources/versions"
+)
 parallel_threads_param = openapi.Parameter(
     'parallel', openapi.IN_FORM, description="Parallel threads count (default: 5, max: 10)", type=openapi.TYPE_INTEGER
 )
@@ -174,6 +182,9 @@ include_mappings_param = openapi.Parameter(
 cascade_levels_param = openapi.Parameter(
     CASCADE_LEVELS_PARAM, openapi.IN_QUERY, type=openapi.TYPE_STRING, default=ALL, description=f'0, 1, 2...{ALL}'
 )
+hierarchy_depth_param = openapi.Parameter(
+    HIERARCHY_DEPTH_PARAM, openapi.IN_QUERY, type=openapi.TYPE_STRING, default=1, description=f'1, 2...{ALL}'
+)
 cascade_direction_param = openapi.Parameter(
     CASCADE_DIRECTION_PARAM, openapi.IN_QUERY, type=openapi.TYPE_BOOLEAN, default=False,
     description='$cascade backward or up'
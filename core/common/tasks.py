@@ -1,4 +1,5 @@
 import json
+import shutil
 import time
 from datetime import datetime
 from json import JSONDecodeError
@@ -19,9 +20,10 @@ from pydash import get
 
 from core.celery import app
 from core.common import ERRBIT_LOGGER
-from core.common.constants import CONFIRM_EMAIL_ADDRESS_MAIL_SUBJECT, PASSWORD_RESET_MAIL_SUBJECT
+from core.common.constants import CONFIRM_EMAIL_ADDRESS_MAIL_SUBJECT, PASSWORD_RESET_MAIL_SUBJECT, \
+    DISPLAY_NAMES_RERUN_KEY
 from core.common.utils import write_export_file, web_url, get_resource_class_from_resource_name, get_export_service, \
-    get_date_range_label
+    get_date_range_label, write_export_shard, queue_export_shards, get_export_shards_dir
 from core.reports.models import ResourceUsageReport
 
 logger = get_task_logger(__name__)
@@ -114,13 +116,18 @@ def export_source(self, version_id):
     version.add_processing(self.request.id)
     try:
         logger.info('Found source version %s.  Beginning export...', version.version)
-        write_export_file(
-            version,
-            'source', 'core.sources.serializers.SourceVersionExportSerializer',
-            logger,
-            start_time
-        )
-        logger.info('Export complete!')
+        if queue_export_shards(
+                version, 'source', 'core.sources.serializers.SourceVersionExportSerializer', logger, start_time
+        ):
+            logger.info('Export queued to be written once its shards are serialized.')
+        else:
+            write_export_file(
+                version,
+                'source', 'core.sources.serializers.SourceVersionExportSerializer',
+                logger,
+                start_time
+            )
+            logger.info('Export complete!')
     finally:
         version.remove_processing(self.request.id)
 
@@ -147,17 +154,51 @@ def export_collection(self, version_id):
             expansion.wait_until_processed()
     try:
         logger.info('Found collection version %s.  Beginning export...', version.version)
-        write_export_file(
-            version,
-            'collection', 'core.collections.serializers.CollectionVersionExportSerializer',
-            logger,
-            start_time
-        )
-        logger.info('Export complete!')
+        if queue_export_shards(
+                version, 'collection', 'core.collections.serializers.CollectionVersionExportSerializer',
+                logger, start_time
+        ):
+            logger.info('Export queued to be written once its shards are serialized.')
+        else:
+            write_export_file(
+                version,
+                'collection', 'core.collections.serializers.CollectionVersionExportSerializer',
+                logger,
+                start_time
+            )
+            logger.info('Export complete!')
     finally:
         version.remove_processing(self.request.id)
 
 
+@app.task
+def export_shard(version_id, resource_type, name, max_id, min_id, path):  # pylint: disable=too-many-arguments
+    version = get_resource_class_from_resource_name(resource_type).objects.filter(id=version_id).first()
+    logger.info('Serializing %s (%s - %s) of %s version %s...', name, max_id, min_id, resource_type, version_id)
+    write_export_shard(version, resource_type, name, max_id, min_id, path, logger)
+
+
+@app.task
+def merge_export_shards(  # pylint: disable=too-many-arguments
+        version_id, resource_type, resource_serializer_type, start_time, export_id, shards
+):
+    version = get_resource_class_from_resource_name(resource_type).objects.filter(id=version_id).first()
+    try:
+        logger.info('Writing %s version %s export from its shards...', resource_type, version_id)
+        write_export_file(version, resource_type, resource_serializer_type, logger, start_time, shards)
+        logger.info('Export complete!')
+    finally:
+        discard_export_shards(version_id, resource_type, export_id)
+
+
+@app.task
+def discard_export_shards(version_id, resource_type, export_id):
+    shutil.rmtree(get_export_shards_dir(export_id), ignore_errors=True)
+    version = get_resource_class_from_resource_name(resource_type).objects.filter(id=version_id).first()
+    if version:
+        version.remove_processing(export_id)
+
+
 @app.task(bind=True)
 def add_references(  # pylint: disable=too-many-arguments,too-many-locals
         self, user_id, data, collection_id, cascade=False, transform_to_resource_version=False
@@ -170,8 +211,9 @@ def add_references(  # pylint: disable=too-many-arguments,too-many-locals
     head.add_processing(self.request.id)
 
     try:
-        (added_references, errors) = collection.add_expressions(
-            data, user, cascade, transform_to_resource_version, True)
+        with Collection.resolution_memo_scope():
+            (added_references, errors) = collection.add_expressions(
+                data, user, cascade, transform_to_resource_version, True)
     finally:
         head.remove_processing(self.request.id)
     if collection.expansion_uri:
@@ -224,6 +266,26 @@ def handle_pre_delete(app_name, model_name, instance_id):
     __handle_pre_delete(apps.get_model(app_name, model_name).objects.filter(id=instance_id).first())
 
 
+@app.task(
+    base=QueueOnce, once={'graceful': True}, ignore_result=True, autoretry_for=(Exception, WorkerLostError, ),
+    retry_kwargs={'max_retries': 2, 'countdown': 2}, acks_late=True, reject_on_worker_lost=True
+)
+def flush_index_sync_queue():
+    from core.common.index_sync import IndexSyncQueue
+    return IndexSyncQueue().flush()
+
+
+@app.task(base=QueueOnce, once={'graceful': True}, ignore_result=True)
+def refresh_stale_repo_statistics():
+    from core.repos.models import RepoStatistics
+    queryset = RepoStatistics.objects.filter(is_stale=True).order_by('updated_at')
+    refreshed = 0
+    for statistics in queryset[:settings.REPO_STATISTICS_REFRESH_BATCH_SIZE]:
+        statistics.refresh()
+        refreshed += 1
+    return refreshed
+
+
 @app.task(base=QueueOnce)
 def populate_indexes(app_names=None):  # app_names has to be an iterable of strings
     __run_search_index_command('--populate', app_names)
@@ -250,33 +312,42 @@ def bulk_import(to_import, username, update_if_exists):
     return BulkImport(content=to_import, username=username, update_if_exists=update_if_exists).run()
 
 
-@app.task(base=QueueOnce, bind=True, retry_kwargs={'max_retries': 0})
-def bulk_import_parallel_inline(self, to_import, username, update_if_exists, threads=5):
+@app.task(
+    base=QueueOnce, bind=True, retry_kwargs={'max_retries': 0},
+    once={'keys': ['to_import', 'username', 'update_if_exists', 'threads']}
+)
+def bulk_import_parallel_inline(self, to_import, username, update_if_exists, threads=5, bulk_load=False):  # pylint: disable=too-many-arguments
     from core.importers.models import BulkImportParallelRunner
+    from core.importers.input_parsers import ImportContentStore
     try:
-        importer = BulkImportParallelRunner(
-            content=to_import, username=username, update_if_exists=update_if_exists,
-            parallel=threads, self_task_id=self.request.id
-        )
-    except JSONDecodeError as ex:
-        return {'error': f"Invalid JSON ({ex.msg})"}
-    except ValidationError as ex:
-        return {'error': f"Invalid Input ({ex.message})"}
-    return importer.run()
+        try:
+            importer = BulkImportParallelRunner(
+                content=to_import, username=username, update_if_exists=update_if_exists,
+                parallel=threads, self_task_id=self.request.id, bulk_load=bulk_load
+            )
+        except JSONDecodeError as ex:
+            return {'error': f"Invalid JSON ({ex.msg})"}
+        except ValidationError as ex:
+            return {'error': f"Invalid Input ({ex.message})"}
+        return importer.run()
+    finally:
+        ImportContentStore.delete(to_import)
 
 
-@app.task(base=QueueOnce, retry_kwargs={'max_retries': 0})
-def bulk_import_inline(to_import, username, update_if_exists):
+@app.task(
+    base=QueueOnce, retry_kwargs={'max_retries': 0}, once={'keys': ['to_import', 'username', 'update_if_exists']})
+def bulk_import_inline(to_import, username, update_if_exists, bulk_load=False):
     from core.importers.models import BulkImportInline
-    return BulkImportInline(content=to_import, username=username, update_if_exists=update_if_exists).run()
+    return BulkImportInline(
+        content=to_import, username=username, update_if_exists=update_if_exists, bulk_load=bulk_load).run()
 
 
 @app.task(bind=True, retry_kwargs={'max_retries': 0})
-def bulk_import_parts_inline(self, input_list, username, update_if_exists):
+def bulk_import_parts_inline(self, input_list, username, update_if_exists, bulk_load=False):
     from core.importers.models import BulkImportInline
     return BulkImportInline(
         content=None, username=username, update_if_exists=update_if_exists, input_list=input_list,
-        self_task_id=self.request.id
+        self_task_id=self.request.id, bulk_load=bulk_load
     ).run()
 
 
@@ -357,6 +428,9 @@ def seed_children_to_new_version(self, resource, obj_id, export=True, sync=False
                 export_task.delay(obj_id)
                 if autoexpand:
                     instance.index_children()
+            if autoexpand and (is_source or export or sync):
+                # an expansion seeded (and indexed) asynchronously updates the facets itself once seeded
+                instance.update_facets()
         finally:
             instance.remove_processing(task_id)
 
@@ -366,10 +440,13 @@ def seed_children_to_expansion(expansion_id, index=True):
     from core.collections.models import Expansion
     expansion = Expansion.objects.filter(id=expansion_id).first()
     if expansion:
-        expansion.seed_children(index=index)
+        with expansion.collection_version.resolution_memo_scope():
+            expansion.seed_children(index=index)
         if expansion.is_processing:
             expansion.is_processing = False
             expansion.save()
+        if index and expansion.uri == expansion.collection_version.expansion_uri:
+            expansion.collection_version.update_facets()
 
 
 @app.task
@@ -720,3 +797,54 @@ def calculate_checksums(resource_type, resource_id):
                     instance.get_latest_version().set_checksums()
                 if not instance.is_versioned_object:
                     instance.versioned_object.set_checksums()
+
+
+@app.task(base=QueueOnce, ignore_result=True)
+def calculate_source_version_checksums(version_id, recalculate=False):
+    # Backfills checksums of all concepts/mappings of a source version in bulk, instead of a task per resource
+    from core.sources.models import Source
+    from core.concepts.models import Concept
+    from core.mappings.models import Mapping
+    version = Source.objects.filter(id=version_id).first()
+    if not version:
+        logger.info('Not found source version %s', version_id)
+        return
+
+    concepts = Concept.set_checksums_in_batches(version.concepts, recalculate)
+    mappings = Mapping.set_checksums_in_batches(version.mappings, recalculate)
+    logger.info('Calculated checksums of %s concepts and %s mappings of %s', concepts, mappings, version.uri)
+
+
+@app.task(base=QueueOnce, ignore_result=True)
+def update_source_display_names(source_id, recalculate=True):
+    # Materializes display names/locales of all concept versions of a source in bulk, e.g. after its locales changed
+    from core.sources.models import Source
+    from core.concepts.models import Concept
+    from core.common.response_cache import ListResponseCache
+    from core.common.representation_cache import RepresentationCache
+    from core.services.storages.redis import RedisService
+    rerun_key = DISPLAY_NAMES_RERUN_KEY.format(source_id)
+    redis_client = RedisService.get_client()
+    while True:
+        # locales changed again while this was queued/running are picked up by running again
+        redis_client.delete(rerun_key)
+        source = Source.objects.filter(id=source_id).first()
+        if not source:
+            logger.info('Not found source %s', source_id)
+            return
+
+        count = Concept.set_display_names_in_batches(Concept.objects.filter(parent_id=source.id), recalculate)
+        logger.info('Updated display names of %s concepts of %s', count, source.uri)
+        if count:
+            ListResponseCache.invalidate(source.versioned_object_url)
+            RepresentationCache.invalidate_source(source)
+            index_source_concepts(source.id)
+        if not redis_client.exists(rerun_key):
+            break
+
+
+@app.task(base=QueueOnce, once={'graceful': True}, ignore_result=True)
+def build_terminology_code_index(version_id):
+    from core.common.terminology import CodeIndex
+    count = CodeIndex.build(version_id)
+    logger.info('Indexed %s codes of source version %s', count, version_id)
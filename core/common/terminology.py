@@ -0,0 +1,492 @@
+import hashlib
+import json
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from pydash import get, compact
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from core.common.constants import HEAD, ACCESS_TYPE_EDIT, ACCESS_TYPE_VIEW, INCLUDE_RETIRED_PARAM
+from core.common.permissions import CanViewConceptDictionary
+from core.common.serializers import IdentifierSerializer
+from core.common.utils import get_truthy_values, iter_chunks
+from core.concept_maps.constants import RESOURCE_TYPE as CONCEPT_MAP_RESOURCE_TYPE
+from core.mappings.constants import SAME_AS
+
+TRUTHY = get_truthy_values()
+
+
+def is_terminology_cache_enabled():
+    return bool(settings.TERMINOLOGY_CACHE_TTL) and not get(settings, 'TEST_MODE', False)
+
+
+class RepoResolver:
+    """
+    Resolves a FHIR canonical url (or the FHIR url of an OCL uri) to the requested, or else the latest released,
+    version of a source/collection. Resolutions are cached (TERMINOLOGY_CACHE_TTL secs) under a generation that is
+    bumped whenever a source/collection changes, and memoized per request/task.
+    """
+    PREFIX = 'terminology:resolve'
+
+    @classmethod
+    def resolve(cls, model, url, version=None):
+        if not url:
+            return None
+        return model.memoize_resolution(
+            ('terminology', model.__name__, url, version), lambda: cls.fetch(model, url, version))
+
+    @classmethod
+    def fetch(cls, model, url, version):
+        if not is_terminology_cache_enabled():
+            return cls.find(model, url, version)
+
+        key = cls.get_key(model, url, version)
+        repo = cache.get(key)
+        if repo is None:
+            repo = cls.find(model, url, version) or {}
+            cache.set(key, repo, settings.TERMINOLOGY_CACHE_TTL)
+        return repo or None
+
+    @classmethod
+    def find(cls, model, url, version):
+        repos = model.objects.filter(canonical_url=url)
+        if not repos.exists():
+            repos = model.objects.filter(
+                uri=IdentifierSerializer.convert_fhir_url_to_ocl_uri(url, model.get_resource_url_kwarg() + 's'))
+
+        if version:
+            repos = repos.filter(version=version)
+        else:
+            repos = repos.filter(is_latest_version=True).exclude(version=HEAD)
+
+        repo = repos.first()
+        if not repo:
+            return None
+        head = repo if repo.is_head else repo.head
+        return {
+            'id': repo.id,
+            'version': repo.version,
+            'name': repo.name,
+            'head_id': get(head, 'id'),
+            'public_access': get(head, 'public_access'),
+        }
+
+    @classmethod
+    def get_key(cls, model, url, version):
+        payload = [model.__name__, url, version, cache.get(cls.generation_key(), 0)]
+        return f'{cls.PREFIX}:' + hashlib.sha1(json.dumps(payload).encode()).hexdigest()
+
+    @classmethod
+    def generation_key(cls):
+        return f'{cls.PREFIX}:generation'
+
+    @classmethod
+    def invalidate(cls):
+        if not is_terminology_cache_enabled():
+            return
+        try:
+            cache.incr(cls.generation_key())
+        except ValueError:
+            cache.set(cls.generation_key(), 1, timeout=None)
+        except:  # pylint: disable=bare-except
+            pass
+
+
+class CodeIndex:
+    """
+    code -> [concept version id, display name, retired] of a released source version, kept in a redis hash for
+    TERMINOLOGY_CACHE_TTL secs. It is built in the background on first use and dropped whenever the version is
+    saved (its concepts are seeded while it is processing). Until it is built, and for HEAD, codes are looked up
+    in the db.
+    """
+    PREFIX = 'terminology:codes'
+    BUILT = ''  # field marking a complete index
+    BATCH_SIZE = 1000
+
+    @staticmethod
+    def get_client():
+        from core.services.storages.redis import RedisService
+        return RedisService.get_client()
+
+    @classmethod
+    def get_key(cls, version_id):
+        return f'{cls.PREFIX}:{version_id}'
+
+    @classmethod
+    def fetch(cls, repo, codes):
+        """Returns code -> (concept id, display name, retired) of the given codes found in the repo version"""
+        codes = list(set(compact(codes)))
+        if not codes:
+            return {}
+        if is_terminology_cache_enabled() and repo['version'] != HEAD:
+            try:
+                entries = cls.get_entries(repo['id'], codes)
+            except:  # pylint: disable=bare-except
+                entries = None
+            if entries is not None:
+                return entries
+            from core.common.tasks import build_terminology_code_index
+            build_terminology_code_index.delay(repo['id'])
+
+        return cls.find(repo['id'], codes)
+
+    @classmethod
+    def get_entries(cls, version_id, codes):
+        built, *values = cls.get_client().hmget(cls.get_key(version_id), [cls.BUILT, *codes])
+        if built is None:
+            return None
+        return {code: tuple(json.loads(value)) for code, value in zip(codes, values) if value is not None}
+
+    @staticmethod
+    def get_concepts(version_id):
+        from core.concepts.models import Concept
+        return Concept.objects.filter(sources__id=version_id, is_active=True)
+
+    @staticmethod
+    def to_entry(concept):
+        return concept.id, concept.display_name, concept.retired
+
+    @classmethod
+    def iter_entries(cls, concepts):
+        # ordered by -id so that the oldest concept version wins, same as queryset.first()
+        for concept in concepts.select_related('parent').prefetch_related('names').order_by('-id'):
+            yield concept.mnemonic, cls.to_entry(concept)
+
+    @classmethod
+    def find(cls, version_id, codes):
+        return dict(cls.iter_entries(cls.get_concepts(version_id).filter(mnemonic__in=codes)))
+
+    @classmethod
+    def build(cls, version_id):
+        from core.concepts.models import Concept
+        from core.sources.models import Source
+        version = Source.objects.filter(id=version_id).exclude(version=HEAD).first()
+        if not version or version._background_process_ids:  # pylint: disable=protected-access
+            return 0
+
+        key = cls.get_key(version_id)
+        client = cls.get_client()
+        client.delete(key)
+        ids = cls.get_concepts(version_id).order_by('-id').values_list('id', flat=True)
+        count = 0
+        for chunk in iter_chunks(ids.iterator(), cls.BATCH_SIZE):
+            entries = {
+                code: json.dumps(entry) for code, entry in cls.iter_entries(Concept.objects.filter(id__in=chunk))
+            }
+            client.hset(key, mapping=entries)
+            count += len(entries)
+        client.hset(key, cls.BUILT, count)
+        client.expire(key, settings.TERMINOLOGY_CACHE_TTL)
+        return count
+
+    @classmethod
+    def drop(cls, version_id):
+        if not is_terminology_cache_enabled():
+            return
+        try:
+            cls.get_client().delete(cls.get_key(version_id))
+        except:  # pylint: disable=bare-except
+            pass
+
+
+class TerminologyOperations:
+    """
+    Answers $lookup, $validate-code and $translate for a list of inputs (operation parameter name -> value).
+    Systems are resolved with RepoResolver and codes are looked up in the CodeIndex grouped by repo version, so a
+    batch of inputs costs a few lookups per distinct system. Returns a (status, resource) per input, or None for
+    an input of a repo the requester can not view.
+    """
+    def __init__(self, request):
+        self.request = request
+        self.include_retired = request.query_params.get(INCLUDE_RETIRED_PARAM, None) in TRUTHY
+        self.permissions = {}
+
+    def can_view(self, model, repo):
+        if repo['public_access'] in [ACCESS_TYPE_EDIT, ACCESS_TYPE_VIEW]:
+            return True
+        key = (model.__name__, repo['head_id'])
+        if key not in self.permissions:
+            head = model.objects.filter(id=repo['head_id']).first()
+            self.permissions[key] = bool(head) and CanViewConceptDictionary().has_object_permission(
+                self.request, None, head)
+        return self.permissions[key]
+
+    def find_concepts(self, repos, codes):
+        """Returns the code index entry (or None) of each code in its repo version"""
+        groups = defaultdict(set)
+        repos_by_id = {}
+        for repo, code in zip(repos, codes):
+            if repo and code:
+                groups[repo['id']].add(code)
+                repos_by_id[repo['id']] = repo
+
+        entries = {repo_id: CodeIndex.fetch(repos_by_id[repo_id], group) for repo_id, group in groups.items()}
+        concepts = []
+        for repo, code in zip(repos, codes):
+            concept = get(entries, [get(repo, 'id'), code]) if repo and code else None
+            concepts.append(concept if concept and (self.include_retired or not concept[2]) else None)
+        return concepts
+
+    @staticmethod
+    def is_display_valid(concept, display):
+        return not display or display == concept[1]
+
+    @staticmethod
+    def to_validate_code_result(result):
+        return 200, {'resourceType': 'Parameters', 'parameter': [{'name': 'result', 'valueBoolean': result}]}
+
+    def lookup(self, inputs):
+        from core.code_systems.views import CodeSystemLookupNotFoundError
+        from core.sources.models import Source
+        repos = [RepoResolver.resolve(Source, get(params, 'system'), get(params, 'version')) for params in inputs]
+        concepts = self.find_concepts(repos, [get(params, 'code') for params in inputs])
+        results = []
+        for params, repo, concept in zip(inputs, repos, concepts):
+            if repo and not self.can_view(Source, repo):
+                results.append(None)
+            elif concept:
+                results.append((200, {'resourceType': 'Parameters', 'parameter': [
+                    {'name': 'name', 'valueString': repo['name']},
+                    {'name': 'version', 'valueString': repo['version']},
+                    {'name': 'display', 'valueString': concept[1]},
+                ]}))
+            else:
+                results.append((400, CodeSystemLookupNotFoundError(get(params, 'code') if repo else None).detail))
+        return results
+
+    def validate_code(self, inputs):
+        from core.sources.models import Source
+        repos = [RepoResolver.resolve(Source, get(params, 'url'), get(params, 'version')) for params in inputs]
+        concepts = self.find_concepts(repos, [get(params, 'code') for params in inputs])
+        results = []
+        for params, repo, concept in zip(inputs, repos, concepts):
+            if repo and not self.can_view(Source, repo):
+                results.append(None)
+            else:
+                results.append(self.to_validate_code_result(
+                    bool(concept) and self.is_display_valid(concept, get(params, 'display'))))
+        return results
+
+    def validate_value_set_code(self, inputs):
+        from core.collections.models import Collection
+        from core.concepts.models import Concept
+        from core.sources.models import Source
+        value_sets = [RepoResolver.resolve(Collection, get(params, 'url')) for params in inputs]
+        repos = [
+            RepoResolver.resolve(Source, get(params, 'system'), get(params, 'systemVersion')) for params in inputs
+        ]
+        concepts = self.find_concepts(repos, [get(params, 'code') for params in inputs])
+
+        groups = defaultdict(set)
+        for value_set, concept in zip(value_sets, concepts):
+            if value_set and concept:
+                groups[value_set['id']].add(concept[0])
+        members = {
+            (value_set_id, concept_id)
+            for value_set_id, concept_ids in groups.items()
+            for concept_id in Concept.objects.filter(
+                id__in=concept_ids, references__collection_id=value_set_id).values_list('id', flat=True)
+        }
+
+        results = []
+        for params, value_set, repo, concept in zip(inputs, value_sets, repos, concepts):
+            if repo and not self.can_view(Source, repo):
+                results.append(None)
+            else:
+                results.append(self.to_validate_code_result(
+                    bool(value_set and concept) and (value_set['id'], concept[0]) in members and
+                    self.is_display_valid(concept, get(params, 'display'))
+                ))
+        return results
+
+    @staticmethod
+    def filter_mappings(queryset, url=None, system=None, targetsystem=None):
+        # TODO: implement 'source' and 'target'
+        if url:
+            queryset = queryset.filter(canonical_url=url)
+        if system:
+            system_url = IdentifierSerializer.convert_fhir_url_to_ocl_uri(system, 'sources')
+            queryset = queryset.filter(Q(from_source__canonical_url=system) |
+                                       Q(from_source_url=system_url) |
+                                       Q(from_source__uri=system_url))
+        if targetsystem:
+            target_url = IdentifierSerializer.convert_fhir_url_to_ocl_uri(targetsystem, 'sources')
+            queryset = queryset.filter(Q(to_source__canonical_url=targetsystem) |
+                                       Q(to_source_url=target_url) |
+                                       Q(to_source__uri=target_url))
+        return queryset
+
+    def translate(self, inputs, queryset):
+        """queryset is the mappings the requester can view, one query is made per (url, system, targetsystem)"""
+        groups = defaultdict(set)
+        for params in inputs:
+            if get(params, 'code'):
+                groups[(get(params, 'url'), get(params, 'system'), get(params, 'targetsystem'))].add(params['code'])
+
+        matches = defaultdict(list)
+        for group, codes in groups.items():
+            mappings = self.filter_mappings(queryset, *group).filter(
+                from_concept_code__in=codes).select_related('to_source')
+            for mapping in mappings:
+                matches[(*group, mapping.from_concept_code)].append(mapping)
+
+        return [
+            (200, self.to_translate_parameters(matches[(
+                get(params, 'url'), get(params, 'system'), get(params, 'targetsystem'), get(params, 'code')
+            )])) for params in inputs
+        ]
+
+    @staticmethod
+    def to_translate_parameters(mappings):
+        matches = []
+        for mapping in mappings:
+            equivalence = mapping.map_type
+            if mapping.map_type == SAME_AS:
+                equivalence = "equivalent"
+
+            to_url = None
+            if mapping.to_source and mapping.to_source.canonical_url:
+                to_url = mapping.to_source.canonical_url
+            elif mapping.to_source_url:
+                to_url = IdentifierSerializer.convert_ocl_uri_to_fhir_url(
+                    mapping.to_source_url, CONCEPT_MAP_RESOURCE_TYPE)
+            elif mapping.to_source:
+                to_url = IdentifierSerializer.convert_ocl_uri_to_fhir_url(
+                    mapping.to_source.uri, CONCEPT_MAP_RESOURCE_TYPE)
+
+            matches.append({
+                'name': 'match',
+                'part': [
+                    {'name': 'equivalence', 'valueCode': equivalence},
+                    {
+                        'name': 'concept',
+                        'valueCoding': {'system': to_url, 'code': mapping.to_concept_code, 'userSelected': False}
+                    }
+                ]
+            })
+
+        return {
+            'resourceType': 'Parameters',
+            'parameter': [{'name': 'result', 'valueBoolean': bool(matches)}, *matches]
+        }
+
+
+class TerminologyOperationMixin:
+    """
+    Answers a FHIR terminology operation with TerminologyOperations, bypassing the queryset/serializer machinery
+    of the view. A Bundle of Parameters, or a Parameters with several coding parameters, is answered with a
+    batch-response Bundle holding the result of each entry/coding. Single inputs the fast path does not support,
+    or of repos the requester can not view, fall back to the regular implementation.
+    """
+    parameters_serializer_class = None
+    required_parameters = []
+    coding_parameters = {}  # coding attribute -> operation parameter
+
+    def evaluate(self, operations, inputs):
+        raise NotImplementedError()
+
+    def is_fast_path_supported(self, inputs, is_batch):
+        return is_batch or all(get(inputs[0], name) for name in self.required_parameters)
+
+    def operate(self, fallback):
+        inputs, is_batch = self.get_operation_inputs()
+        if not self.is_fast_path_supported(inputs, is_batch):
+            return fallback()
+
+        results = self.evaluate(TerminologyOperations(self.request), inputs)
+        if is_batch:
+            return Response(self.to_batch_response(results))
+        if results[0] is None:
+            return fallback()
+        status, resource = results[0]
+        return Response(resource, status=status)
+
+    def get_operation_inputs(self):
+        data = self.request.data if self.request.method in ['POST', 'PUT'] else None
+        if get(data, 'resourceType') == 'Bundle':
+            return [
+                self.parse_parameters(get(entry, 'resource') or {})[0] for entry in get(data, 'entry') or []
+            ], True
+
+        inputs = self.parse_parameters(data)
+        return inputs, len(inputs) > 1
+
+    def parse_parameters(self, data=None):
+        """Returns the parameters of each coding of the Parameters (or query params), merged with the others"""
+        if data is None:
+            parameters = self.parameters_serializer_class.parse_query_params(self.request.query_params)
+        else:
+            parameters = self.parameters_serializer_class(data=data)  # pylint: disable=not-callable
+        if not parameters.is_valid():
+            raise ValidationError(parameters.errors)
+        params = parameters.validated_data.get('parameters', {})
+
+        codings = [
+            parameter['valueCoding'] for parameter in get(data, 'parameter') or []
+            if get(parameter, 'name') == 'coding' and isinstance(get(parameter, 'valueCoding'), dict)
+        ]
+        return [
+            {
+                **params,
+                **{name: coding[key] for key, name in self.coding_parameters.items() if coding.get(key)}
+            } for coding in codings
+        ] or [params]
+
+    @staticmethod
+    def to_status_and_resource(result):
+        return result or (403, {
+            'resourceType': 'OperationOutcome',
+            'issue': [{'severity': 'error', 'code': 'forbidden', 'details': {'text': 'Not permitted'}}]
+        })
+
+    def to_batch_response(self, results):
+        entries = []
+        for result in results:
+            status, resource = self.to_status_and_resource(result)
+            entries.append({'resource': resource, 'response': {'status': str(status)}})
+        return {'resourceType': 'Bundle', 'type': 'batch-response', 'entry': entries}
+
+
+class TerminologyBatchOperationMixin(TerminologyOperationMixin):  # pylint: disable=abstract-method
+    """
+    Bulk variant of a terminology operation. Accepts a POSTed JSON list of inputs, each a list of values in
+    batch_fields order or an object keyed by the field names, and streams back newline delimited JSON with the
+    Parameters (or OperationOutcome) of each input, in input order. Inputs are evaluated BATCH_SIZE at a time, so
+    each chunk costs a few resolutions and lookups per distinct system.
+    """
+    BATCH_SIZE = 1000
+    batch_fields = []  # (input field, operation parameter), in input order
+    http_method_names = ['post', 'options']
+
+    def post(self, request, *args, **kwargs):  # pylint: disable=unused-argument
+        return StreamingHttpResponse(
+            self.stream_results(self.get_batch_inputs(request.data)), content_type='application/x-ndjson')
+
+    def get_batch_inputs(self, data):
+        fields = [field for field, _ in self.batch_fields]
+        if not isinstance(data, list):
+            raise ValidationError({'detail': f'Expected a list of [{", ".join(fields)}] lists or objects'})
+
+        inputs = []
+        for index, item in enumerate(data):
+            if isinstance(item, (list, tuple)):
+                values = dict(zip(fields, item))
+            elif isinstance(item, dict):
+                values = item
+            else:
+                raise ValidationError({'detail': f'Invalid input at {index}: {item}'})
+            inputs.append({name: values.get(field) for field, name in self.batch_fields if values.get(field)})
+        return inputs
+
+    def stream_results(self, inputs):
+        from core.common.models import ConceptContainerModel
+        # streamed after the response leaves the middlewares, so it memoizes resolutions itself
+        with ConceptContainerModel.resolution_memo_scope():
+            operations = TerminologyOperations(self.request)
+            for chunk in iter_chunks(inputs, self.BATCH_SIZE):
+                for result in self.evaluate(operations, chunk):
+                    yield json.dumps(self.to_status_and_resource(result)[1]) + '\n'
@@ -8,18 +8,22 @@ import django
 import factory
 from colour_runner.django_runner import ColourRunnerMixin
 from django.conf import settings
+from django.core.cache import cache
 from django.core.files.base import File
 from django.core.management import call_command
 from django.test import TestCase
 from django.test.runner import DiscoverRunner
+from elasticsearch_dsl.utils import AttrDict
 from mock.mock import call
 from requests.auth import HTTPBasicAuth
 from rest_framework.exceptions import ValidationError
 from rest_framework.test import APITestCase, APITransactionTestCase
 
 from core.collections.models import CollectionReference
+from core.collections.tests.factories import OrganizationCollectionFactory
 from core.common.constants import HEAD
-from core.common.tasks import delete_s3_objects, bulk_import_parallel_inline, resources_report, calculate_checksums
+from core.common.tasks import delete_s3_objects, bulk_import_parallel_inline, resources_report, calculate_checksums, \
+    discard_export_shards
 from core.common.utils import (
     compact_dict_by_values, to_snake_case, flower_get, task_exists, parse_bulk_import_task_id,
     to_camel_case,
@@ -27,19 +31,28 @@ from core.common.utils import (
     get_resource_class_from_resource_name, flatten_dict, is_csv_file, is_url_encoded_string, to_parent_uri_from_kwargs,
     set_current_user, get_current_user, set_request_url, get_request_url, nested_dict_values, chunks, api_get,
     split_list_by_condition, is_zip_file, get_date_range_label, get_prev_month, from_string_to_date, get_end_of_month,
-    get_start_of_month, es_id_in, web_url)
+    get_start_of_month, es_id_in, es_to_pks, web_url, keyset_batches, get_export_shard_ranges, iter_chunks,
+    queue_export_shards, get_export_delta, get_export_shards_dir)
+from core.concepts.documents import ConceptDocument
 from core.concepts.models import Concept
 from core.orgs.models import Organization
+from core.repos.documents import RepoDocument
 from core.sources.models import Source
 from core.users.models import UserProfile
 from core.users.tests.factories import UserProfileFactory
 from .backends import OCLOIDCAuthenticationBackend
 from .checksums import Checksum
 from .fhir_helpers import translate_fhir_query
+from .index_sync import IndexSyncQueue
+from .representation_cache import RepresentationCache
+from .response_cache import ListResponseCache
+from .search import CustomESSearch
 from .serializers import IdentifierSerializer
+from .terminology import CodeIndex, RepoResolver
 from .validators import URIValidator
 from ..code_systems.serializers import CodeSystemDetailSerializer
 from ..concepts.tests.factories import ConceptFactory, ConceptNameFactory
+from ..mappings.models import Mapping
 from ..sources.tests.factories import OrganizationSourceFactory
 
 
@@ -829,6 +842,11 @@ class UtilsTest(OCLTestCase):
         self.assertEqual(list(chunks([1, 2, 3, 4], 7)), [[1, 2, 3, 4]])
         self.assertEqual(list(chunks([1, 2, 3, 4], 4)), [[1, 2, 3, 4]])
 
+    def test_iter_chunks(self):
+        self.assertEqual(list(iter_chunks(iter([]), 1000)), [])
+        self.assertEqual(list(iter_chunks(iter(range(5)), 2)), [[0, 1], [2, 3], [4]])
+        self.assertEqual(list(iter_chunks((i for i in [1, 2, 3, 4]), 4)), [[1, 2, 3, 4]])
+
     def test_split_list_by_condition(self):
         even, odd = split_list_by_condition([2, 3, 4, 5, 6, 7], lambda x: x % 2 == 0)
         self.assertEqual(even, [2, 4, 6])
@@ -900,6 +918,14 @@ class UtilsTest(OCLTestCase):
         self.assertEqual(es_id_in(search, [1, 2, 3]), 'search')
         search.query.assert_called_once_with("terms", _id=[1, 2, 3])
 
+    def test_es_to_pks(self):
+        scan_search = Mock(scan=Mock(return_value=iter([Mock(meta=Mock(id='1')), Mock(meta=Mock(id='3'))])))
+        search = Mock(source=Mock(return_value=Mock(params=Mock(return_value=scan_search))))
+
+        self.assertEqual(es_to_pks(search), ['1', '3'])
+        search.source.assert_called_once_with(excludes=['*'])
+        search.source.return_value.params.assert_called_once_with(size=1000)
+
     @patch('core.common.utils.settings')
     def test_web_url(self, settings_mock):
         settings_mock.WEB_URL = 'https://ocl.org'
@@ -928,6 +954,118 @@ class UtilsTest(OCLTestCase):
         self.assertEqual(
             from_string_to_date('2023-02-29'), None)
 
+    def test_keyset_batches(self):
+        source = OrganizationSourceFactory()
+        ConceptFactory(parent=source)
+        ConceptFactory(parent=source)
+        through_qs = Concept.sources.through.objects.filter(source_id=source.id)
+        concept_ids = sorted(through_qs.values_list('concept_id', flat=True), reverse=True)
+
+        self.assertEqual(len(concept_ids), 4)
+        self.assertEqual(
+            list(keyset_batches(through_qs, 'concept_id', 3)),
+            [concept_ids[:3], concept_ids[3:]]
+        )
+        self.assertEqual(list(keyset_batches(through_qs, 'concept_id', 2)), [concept_ids[:2], concept_ids[2:]])
+        self.assertEqual(list(keyset_batches(through_qs, 'concept_id', 4)), [concept_ids])
+        self.assertEqual(list(keyset_batches(through_qs.none(), 'concept_id', 5)), [])
+
+    def test_get_export_shard_ranges(self):
+        source = OrganizationSourceFactory()
+        ConceptFactory(parent=source)
+        ConceptFactory(parent=source)
+        ConceptFactory(parent=source)
+        through_qs = Concept.sources.through.objects.filter(source_id=source.id)
+        concept_ids = sorted(through_qs.values_list('concept_id', flat=True), reverse=True)
+
+        self.assertEqual(
+            get_export_shard_ranges(through_qs, 'concept_id', 4),
+            [
+                (concept_ids[0], concept_ids[1]), (concept_ids[2], concept_ids[3]),
+                (concept_ids[4], concept_ids[4]), (concept_ids[5], concept_ids[5])
+            ]
+        )
+        self.assertEqual(
+            get_export_shard_ranges(through_qs, 'concept_id', 3),
+            [(concept_ids[0], concept_ids[1]), (concept_ids[2], concept_ids[3]), (concept_ids[4], concept_ids[5])]
+        )
+        self.assertEqual(
+            get_export_shard_ranges(through_qs.filter(concept_id__lte=concept_ids[3]), 'concept_id', 10),
+            [(concept_id, concept_id) for concept_id in concept_ids[3:]]
+        )
+        self.assertEqual(get_export_shard_ranges(through_qs, 'concept_id', 1), [(concept_ids[0], concept_ids[5])])
+        self.assertEqual(get_export_shard_ranges(through_qs.none(), 'concept_id', 4), [])
+
+    def test_get_export_delta(self):
+        source = OrganizationSourceFactory()
+        source_v1 = OrganizationSourceFactory(mnemonic=source.mnemonic, organization=source.organization, version='v1')
+        source_v2 = OrganizationSourceFactory(mnemonic=source.mnemonic, organization=source.organization, version='v2')
+
+        def concept_version(concept, checksum, repo_version):
+            version = ConceptFactory(
+                parent=source, mnemonic=concept.mnemonic, versioned_object=concept, version=repo_version.version)
+            Concept.objects.filter(id=version.id).update(checksums=checksum)
+            version.sources.add(repo_version)
+            return version
+
+        def concept_versions(prev_checksum, checksum):
+            concept = ConceptFactory(parent=source)
+            prev_version = concept_version(concept, prev_checksum, source_v1)
+            if checksum is True:
+                prev_version.sources.add(source_v2)
+                return prev_version, prev_version
+            return prev_version, concept_version(concept, checksum, source_v2) if checksum is not None else None
+
+        concept_versions({'standard': 'same'}, True)
+        concept_versions({'standard': 'same'}, {'standard': 'same'})
+        changed_ids = [
+            concept_versions(prev_checksum, checksum)[1].id for prev_checksum, checksum in [
+                ({'standard': 'v1'}, {'standard': 'v2'}), ({}, {'standard': 'v2'}), ({'standard': 'v1'}, {})]
+        ]
+        removed, _ = concept_versions({'standard': 'v1'}, None)
+        added = concept_version(ConceptFactory(parent=source), {'standard': 'v2'}, source_v2)
+
+        (added_qs, changed_qs, removed_qs), field = get_export_delta(source_v2, source_v1, 'source', 'concepts')
+
+        self.assertEqual(field, 'concept_id')
+        self.assertEqual(list(added_qs.values_list(field, flat=True)), [added.id])
+        self.assertCountEqual(changed_qs.values_list(field, flat=True), changed_ids)
+        self.assertEqual(list(removed_qs.values_list(field, flat=True)), [removed.id])
+
+    @patch('celery.chord')
+    def test_queue_export_shards(self, chord_mock):
+        source = OrganizationSourceFactory()
+        ConceptFactory(parent=source)
+        ConceptFactory(parent=source)
+
+        with self.settings(EXPORT_SHARDS=1):
+            self.assertFalse(queue_export_shards(source, 'source', 'serializer', Mock(), 0))
+        with self.settings(EXPORT_SHARDS=2, TEST_MODE=False):
+            self.assertTrue(queue_export_shards(source, 'source', 'serializer', Mock(), 0))
+
+        header = list(chord_mock.call_args[0][0])
+        self.assertEqual(
+            [shard.args[2:5] for shard in header],
+            [('concepts', *shard_range) for shard_range in get_export_shard_ranges(
+                Concept.sources.through.objects.filter(source_id=source.id), 'concept_id', 2)]
+        )
+        self.assertEqual({shard.options['queue'] for shard in header}, {'concurrent'})
+        callback = chord_mock.return_value.call_args[0][0]
+        export_id = callback.options['task_id']
+        self.assertEqual(callback.task, 'core.common.tasks.merge_export_shards')
+        self.assertEqual(
+            callback.args, (source.id, 'source', 'serializer', 0, export_id, [shard.args for shard in header]))
+        self.assertEqual(callback.options['link_error'][0]['task'], 'core.common.tasks.discard_export_shards')
+        source.refresh_from_db()
+        self.assertIn(export_id, source._background_process_ids)  # pylint: disable=protected-access
+
+        os.makedirs(get_export_shards_dir(export_id))
+        discard_export_shards(source.id, 'source', export_id)
+
+        self.assertFalse(os.path.exists(get_export_shards_dir(export_id)))
+        source.refresh_from_db()
+        self.assertNotIn(export_id, source._background_process_ids)  # pylint: disable=protected-access
+
 
 class BaseModelTest(OCLTestCase):
     def test_model_name(self):
@@ -939,6 +1077,463 @@ class BaseModelTest(OCLTestCase):
         self.assertEqual(Source().app_name, 'sources')
 
 
+class CustomESSearchTest(OCLTestCase):
+    @staticmethod
+    def hit(_id, score, index='concepts', highlight=None):
+        return AttrDict({'_id': str(_id), '_index': index, '_score': score, 'highlight': highlight})
+
+    def test_hydrate(self):
+        concept1 = ConceptFactory()
+        concept2 = ConceptFactory()
+        concept3 = ConceptFactory()
+        search = CustomESSearch(Mock(_model=Concept))
+        search.max_score = 4
+
+        with self.assertNumQueries(1):
+            results = search.hydrate([
+                self.hit(concept3.id, 4, highlight={'name': ['<em>foo</em>']}),
+                self.hit(0, 3),
+                self.hit(concept1.id, 2),
+                self.hit(concept2.id, 1),
+            ])
+
+        self.assertEqual(results, [concept3, concept1, concept2])
+        self.assertEqual([result._score for result in results], [4, 2, 1])  # pylint: disable=protected-access
+        self.assertEqual(
+            [result._confidence for result in results], ['100.0%', '50.0%', '25.0%'])  # pylint: disable=protected-access
+        self.assertEqual(results[0]._highlight, {'name': ['<em>foo</em>']})  # pylint: disable=protected-access
+        self.assertIsNone(results[1]._highlight)  # pylint: disable=protected-access
+        self.assertEqual(search.scores, {concept3.id: 4, 0: 3, concept1.id: 2, concept2.id: 1})
+
+    def test_hydrate_repos(self):
+        source = OrganizationSourceFactory()
+        collection = OrganizationCollectionFactory()
+        search = CustomESSearch(Mock(_model=None), RepoDocument)
+
+        with self.assertNumQueries(2):
+            results = search.hydrate([
+                self.hit(collection.id, 2, 'collections'),
+                self.hit(source.id, 1, 'sources'),
+            ])
+
+        self.assertEqual(results, [collection, source])
+        self.assertEqual([result._score for result in results], [2, 1])  # pylint: disable=protected-access
+
+
+    def test_cursor(self):
+        cursor = CustomESSearch.encode_cursor('pit-id', [1.5, 'foo', 10])
+
+        self.assertEqual(CustomESSearch.decode_cursor(cursor), ('pit-id', [1.5, 'foo', 10]))
+        for invalid_cursor in ['foobar', 'e30=', '$$']:
+            with self.assertRaisesMessage(ValueError, 'Invalid cursor'):
+                CustomESSearch.decode_cursor(invalid_cursor)
+
+    @patch('core.common.search.get_connection')
+    def test_apply_cursor(self, get_connection_mock):
+        get_connection_mock.return_value = Mock(open_point_in_time=Mock(return_value={'id': 'pit-id'}))
+        search = CustomESSearch(ConceptDocument.search().sort({'_score': {'order': 'desc'}}))
+
+        search.apply_cursor('', 10)
+
+        get_connection_mock.return_value.open_point_in_time.assert_called_once_with(
+            index=['concepts'], keep_alive='2m')
+        self.assertIsNone(search._dsl_search._index)  # pylint: disable=protected-access
+        self.assertEqual(
+            search._dsl_search.to_dict(),  # pylint: disable=protected-access
+            {
+                'pit': {'id': 'pit-id', 'keep_alive': '2m'}, 'from': 0, 'size': 10,
+                'sort': [{'_score': {'order': 'desc'}}]
+            }
+        )
+
+        get_connection_mock.reset_mock()
+        search = CustomESSearch(ConceptDocument.search())
+        search.apply_cursor(CustomESSearch.encode_cursor('pit-id2', [5, 'id']), 10)
+
+        get_connection_mock.return_value.open_point_in_time.assert_not_called()
+        self.assertEqual(
+            search._dsl_search.to_dict(),  # pylint: disable=protected-access
+            {
+                'pit': {'id': 'pit-id2', 'keep_alive': '2m'}, 'from': 0, 'size': 10, 'search_after': [5, 'id'],
+                'sort': ['_shard_doc']
+            }
+        )
+
+    @patch('core.common.search.get_connection')
+    def test_set_next_cursor(self, get_connection_mock):
+        search = CustomESSearch(ConceptDocument.search())
+        search.pit_id = 'pit-id'
+        search.cursor_size = 2
+
+        search.set_next_cursor(
+            AttrDict({'pit_id': 'pit-id2'}),
+            AttrDict({'hits': [{'_id': '1', 'sort': [2, 1]}, {'_id': '2', 'sort': [1, 2]}]})
+        )
+
+        self.assertEqual(CustomESSearch.decode_cursor(search.next_cursor), ('pit-id2', [1, 2]))
+        get_connection_mock.return_value.close_point_in_time.assert_not_called()
+
+        search.next_cursor = None
+        search.set_next_cursor(AttrDict({}), AttrDict({'hits': [{'_id': '1', 'sort': [2, 1]}]}))
+
+        self.assertIsNone(search.next_cursor)
+        get_connection_mock.return_value.close_point_in_time.assert_called_once_with(body={'id': 'pit-id'})
+
+
+class IndexSyncQueueTest(OCLTestCase):
+    def setUp(self):
+        super().setUp()
+        self.queue = IndexSyncQueue()
+        self.queue.client.delete(IndexSyncQueue.KEY, IndexSyncQueue.STATS_KEY)
+
+    def tearDown(self):
+        self.queue.client.delete(IndexSyncQueue.KEY, IndexSyncQueue.STATS_KEY)
+        super().tearDown()
+
+    def test_member(self):
+        self.assertEqual(IndexSyncQueue.to_member('concepts', 'Concept', 1), 'concepts:Concept:1')
+        self.assertEqual(IndexSyncQueue.from_member(b'concepts:Concept:1'), ('concepts', 'Concept', 1))
+
+    @patch('core.common.tasks.flush_index_sync_queue')
+    def test_add_coalesces(self, flush_mock):
+        concept = ConceptFactory()
+
+        self.assertEqual(self.queue.add_instance(concept), 1)
+        self.assertEqual(self.queue.add_instance(concept), 1)
+        self.assertEqual(self.queue.add_instance(concept.parent), 2)
+
+        self.assertEqual(
+            self.queue.stats(),
+            {
+                'enqueued': 2, 'coalesced': 1, 'flushed': 0, 'failed': 0, 'pending': 2,
+                'last_flushed_at': None, 'backpressure': False
+            }
+        )
+        flush_mock.delay.assert_not_called()
+
+    @patch('core.common.tasks.flush_index_sync_queue')
+    def test_add_triggers_flush_by_size(self, flush_mock):
+        concept = ConceptFactory()
+        with self.settings(ES_SYNC_QUEUE_FLUSH_SIZE=2):
+            self.queue.add_instance(concept)
+            flush_mock.delay.assert_not_called()
+
+            self.queue.add_instance(concept.parent)
+            flush_mock.delay.assert_called_once()
+
+    @patch('core.common.index_sync.registry')
+    def test_drain(self, registry_mock):
+        concept_document_mock = Mock(django=Mock(ignore_signals=False))
+        registry_mock.get_documents.return_value = [concept_document_mock]
+        concept1 = ConceptFactory()
+        concept2 = ConceptFactory(parent=concept1.parent)
+        self.queue.add_instance(concept1)
+        self.queue.add_instance(concept2)
+        self.queue.add_instance(concept1)
+        self.queue.add('concepts', 'Concept', 0)
+
+        self.assertEqual(self.queue.drain(), 3)
+
+        self.assertEqual(self.queue.size, 0)
+        registry_mock.get_documents.assert_called_once_with([Concept])
+        concept_document_mock.return_value.update.assert_called_once()
+        self.assertCountEqual(
+            concept_document_mock.return_value.update.call_args[0][0], [concept1, concept2])
+        self.assertEqual(registry_mock.update_related.call_count, 2)
+        stats = self.queue.stats()
+        self.assertEqual(stats['flushed'], 3)
+        self.assertEqual(stats['pending'], 0)
+        self.assertIsNotNone(stats['last_flushed_at'])
+
+    @patch('core.common.index_sync.registry')
+    def test_flush_requeues_on_failure(self, registry_mock):
+        registry_mock.get_documents.return_value = [
+            Mock(django=Mock(ignore_signals=False), return_value=Mock(update=Mock(side_effect=Exception('ES down'))))
+        ]
+        concept = ConceptFactory()
+        self.queue.add_instance(concept)
+
+        with self.assertRaises(Exception):
+            self.queue.flush()
+
+        self.assertEqual(self.queue.size, 1)
+        self.assertEqual(self.queue.stats()['failed'], 1)
+
+    @patch('core.common.models.handle_save')
+    def test_signal_processor_enqueues(self, handle_save_mock):
+        concept = ConceptFactory()
+        with self.settings(TEST_MODE=False, ES_SYNC=True):
+            concept.save()
+
+        handle_save_mock.delay.assert_not_called()
+        self.assertTrue(
+            self.queue.client.sismember(IndexSyncQueue.KEY, IndexSyncQueue.to_member('concepts', 'Concept', concept.id))
+        )
+
+
+class ListResponseCacheTest(OCLAPITestCase):
+    def setUp(self):
+        super().setUp()
+        cache.delete_pattern(f'{ListResponseCache.PREFIX}:*')
+        self.source = OrganizationSourceFactory()
+        self.concept = ConceptFactory(parent=self.source)
+        self.url = self.source.concepts_url
+        self.token = UserProfile.objects.get(username='ocladmin').get_token()
+
+    def tearDown(self):
+        cache.delete_pattern(f'{ListResponseCache.PREFIX}:*')
+        IndexSyncQueue().client.delete(IndexSyncQueue.KEY)
+        super().tearDown()
+
+    def test_list_hit_and_miss(self):
+        with self.settings(TEST_MODE=False, LIST_RESPONSE_CACHE_TTL=60):
+            response = self.client.get(self.url + '?limit=1&page=1')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(ListResponseCache.stats()['misses'], 1)
+            self.assertEqual(ListResponseCache.stats()['hits'], 0)
+
+            cached_response = self.client.get(self.url + '?page=1&limit=1')
+            self.assertEqual(cached_response.status_code, 200)
+            self.assertEqual(cached_response.data, response.data)
+            self.assertEqual(cached_response['num_found'], response['num_found'])
+            self.assertEqual(ListResponseCache.stats(), {'hits': 1, 'misses': 1, 'hit_ratio': 0.5, 'ttl': 60})
+
+            self.client.get(self.url + '?limit=1&page=1&verbose=true')
+            self.assertEqual(ListResponseCache.stats()['misses'], 2)
+
+            self.client.get(self.url + '?limit=1&page=1', HTTP_AUTHORIZATION='Token ' + self.token)
+            self.assertEqual(ListResponseCache.stats()['misses'], 3)
+
+    def test_list_invalidated_by_source_edit(self):
+        with self.settings(TEST_MODE=False, LIST_RESPONSE_CACHE_TTL=60):
+            response = self.client.get(self.url)
+            self.assertEqual(len(response.data), 1)
+
+            ConceptFactory(parent=self.source)
+
+            response = self.client.get(self.url)
+            self.assertEqual(len(response.data), 2)
+            self.assertEqual(ListResponseCache.stats()['misses'], 2)
+            self.assertEqual(ListResponseCache.stats()['hits'], 0)
+
+            self.client.get(self.url)
+            self.assertEqual(ListResponseCache.stats()['hits'], 1)
+
+    @patch('core.common.response_cache.cache')
+    def test_list_falls_through_on_cache_errors(self, cache_mock):
+        cache_mock.get.side_effect = ConnectionError()
+        cache_mock.set.side_effect = ConnectionError()
+        cache_mock.incr.side_effect = ConnectionError()
+
+        with self.settings(TEST_MODE=False, LIST_RESPONSE_CACHE_TTL=60):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1)
+
+    def test_invalidate_on_save(self):
+        scope = self.source.versioned_object_url
+        self.assertEqual(ListResponseCache.get_generation(scope), 0)
+
+        self.concept.save()
+        self.assertEqual(ListResponseCache.get_generation(scope), 0)
+
+        with self.settings(TEST_MODE=False, LIST_RESPONSE_CACHE_TTL=60):
+            ListResponseCache.invalidate_for([self.concept])
+        self.assertEqual(ListResponseCache.get_generation(scope), 1)
+        self.assertEqual(ListResponseCache.get_generation('concept'), 1)
+
+        with self.settings(TEST_MODE=False, LIST_RESPONSE_CACHE_TTL=0):
+            ListResponseCache.invalidate_for([self.concept])
+        self.assertEqual(ListResponseCache.get_generation(scope), 1)
+
+    def test_is_cacheable(self):
+        def view(method='GET', **params):
+            return Mock(request=Mock(method=method, query_params=params))
+
+        self.assertFalse(ListResponseCache(view()).is_cacheable())
+        with self.settings(TEST_MODE=False, LIST_RESPONSE_CACHE_TTL=60):
+            self.assertTrue(ListResponseCache(view(q='foo')).is_cacheable())
+            self.assertFalse(ListResponseCache(view(csv='true')).is_cacheable())
+            self.assertFalse(ListResponseCache(view(cursor='')).is_cacheable())
+            self.assertFalse(ListResponseCache(view('POST')).is_cacheable())
+        with self.settings(TEST_MODE=False, LIST_RESPONSE_CACHE_TTL=0):
+            self.assertFalse(ListResponseCache(view()).is_cacheable())
+
+
+class TerminologyCacheTest(OCLTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.delete_pattern(f'{RepoResolver.PREFIX}:*')
+        self.source = OrganizationSourceFactory(canonical_url='http://terminology.org/cs')
+        self.concept = ConceptFactory(parent=self.source, mnemonic='c1', names=1)
+        self.retired_concept = ConceptFactory(parent=self.source, mnemonic='c2', retired=True, names=1)
+        self.version = OrganizationSourceFactory.build(
+            version='v1', mnemonic=self.source.mnemonic, organization=self.source.parent)
+        Source.persist_new_version(self.version, self.source.created_by)
+
+    def tearDown(self):
+        cache.delete_pattern(f'{RepoResolver.PREFIX}:*')
+        CodeIndex.get_client().delete(CodeIndex.get_key(self.version.id))
+        IndexSyncQueue().client.delete(IndexSyncQueue.KEY)
+        super().tearDown()
+
+    def test_repo_resolver(self):
+        with self.settings(TEST_MODE=False):
+            repo = RepoResolver.resolve(Source, 'http://terminology.org/cs')
+            self.assertEqual(
+                repo,
+                {
+                    'id': self.version.id, 'version': 'v1', 'name': self.version.name, 'head_id': self.source.id,
+                    'public_access': self.source.public_access
+                }
+            )
+            self.assertEqual(RepoResolver.resolve(Source, 'http://terminology.org/cs', HEAD)['id'], self.source.id)
+            self.assertEqual(
+                RepoResolver.resolve(Source, self.source.uri.replace('/sources/', '/CodeSystem/'), HEAD)['id'],
+                self.source.id
+            )
+            self.assertIsNone(RepoResolver.resolve(Source, 'http://terminology.org/cs', 'v2'))
+            self.assertIsNone(RepoResolver.resolve(Source, None))
+
+            Source.objects.filter(id=self.version.id).update(is_latest_version=False)
+            self.assertEqual(RepoResolver.resolve(Source, 'http://terminology.org/cs'), repo)
+
+            RepoResolver.invalidate()
+            self.assertIsNone(RepoResolver.resolve(Source, 'http://terminology.org/cs'))
+
+    @patch('core.common.tasks.build_terminology_code_index')
+    def test_code_index(self, build_task_mock):
+        repo = {'id': self.version.id, 'version': 'v1'}
+        expected = {
+            'c1': (self.concept.get_latest_version().id, self.concept.display_name, False),
+            'c2': (self.retired_concept.get_latest_version().id, self.retired_concept.display_name, True),
+        }
+
+        self.assertEqual(CodeIndex.fetch(repo, ['c1', 'c2', 'c3']), expected)
+        build_task_mock.delay.assert_not_called()
+
+        with self.settings(TEST_MODE=False):
+            self.assertEqual(CodeIndex.fetch(repo, ['c1', 'c2', 'c3', None]), expected)
+            build_task_mock.delay.assert_called_once_with(self.version.id)
+            build_task_mock.delay.reset_mock()
+
+            self.assertEqual(CodeIndex.build(self.version.id), 2)
+            self.assertEqual(CodeIndex.fetch(repo, ['c1', 'c2', 'c3']), expected)
+            self.assertEqual(CodeIndex.fetch(repo, []), {})
+            build_task_mock.delay.assert_not_called()
+
+            self.version.save()
+            self.assertIsNone(CodeIndex.get_entries(self.version.id, ['c1']))
+
+        self.assertEqual(CodeIndex.build(self.source.id), 0)
+
+
+class RepresentationCacheTest(OCLAPITestCase):
+    def setUp(self):
+        super().setUp()
+        cache.delete_pattern(f'{RepresentationCache.PREFIX}:*')
+        self.source = OrganizationSourceFactory()
+        self.concept = ConceptFactory(parent=self.source, external_id='ext1')
+        Concept.objects.filter(id=self.concept.id).update(checksums={'standard': 'std1', 'smart': 'smart1'})
+
+    def tearDown(self):
+        cache.delete_pattern(f'{RepresentationCache.PREFIX}:*')
+        IndexSyncQueue().client.delete(IndexSyncQueue.KEY)
+        super().tearDown()
+
+    def test_concept_representations(self):
+        with self.settings(TEST_MODE=False, LIST_RESPONSE_CACHE_TTL=0, REPRESENTATION_CACHE_TTL=60):
+            response = self.client.get(self.source.concepts_url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data[0]['external_id'], 'ext1')
+            self.assertEqual(len(cache.keys(f'{RepresentationCache.PREFIX}:*')), 1)
+
+            Concept.objects.filter(id=self.concept.id).update(external_id='ext2', is_latest_version=False)
+            response = self.client.get(self.source.concepts_url + '?includeRetired=true')
+            self.assertEqual(response.data[0]['external_id'], 'ext1')
+            self.assertFalse(response.data[0]['is_latest_version'])
+            self.assertEqual(
+                list(response.data[0].keys()),
+                list(self.client.get(self.source.concepts_url + '?limit=1').data[0].keys())
+            )
+
+            response = self.client.get(self.concept.uri)
+            self.assertEqual(response.data['external_id'], 'ext2')
+            self.assertEqual(len(cache.keys(f'{RepresentationCache.PREFIX}:*')), 2)
+
+            Concept.objects.filter(id=self.concept.id).update(checksums={'standard': 'std2', 'smart': 'smart2'})
+            self.assertEqual(self.client.get(self.source.concepts_url).data[0]['external_id'], 'ext2')
+
+            Concept.objects.filter(id=self.concept.id).update(external_id='ext3')
+            self.concept.refresh_from_db()
+            self.concept.save()
+            self.assertEqual(self.client.get(self.source.concepts_url).data[0]['external_id'], 'ext3')
+
+            Concept.objects.filter(id=self.concept.id).update(external_id='ext4')
+            self.source.save()
+            self.assertEqual(self.client.get(self.source.concepts_url).data[0]['external_id'], 'ext4')
+
+            self.concept.created_by.username = 'renamed-creator'
+            self.concept.created_by.save()
+            self.source.organization.mnemonic = 'renamed-org'
+            self.source.organization.save()
+            response = self.client.get(self.source.concepts_url)
+            self.assertEqual(response.data[0]['external_id'], 'ext4')
+            self.assertEqual(response.data[0]['owner'], 'renamed-org')
+            self.assertEqual(response.data[0]['version_created_by'], 'renamed-creator')
+
+    def test_not_cached(self):
+        with self.settings(TEST_MODE=False, LIST_RESPONSE_CACHE_TTL=0, REPRESENTATION_CACHE_TTL=60):
+            Concept.objects.filter(id=self.concept.id).update(checksums={})
+            self.assertEqual(self.client.get(self.source.concepts_url).status_code, 200)
+            self.assertEqual(cache.keys(f'{RepresentationCache.PREFIX}:*'), [])
+
+        with self.settings(TEST_MODE=False, LIST_RESPONSE_CACHE_TTL=0, REPRESENTATION_CACHE_TTL=0):
+            self.assertEqual(self.client.get(self.source.concepts_url).status_code, 200)
+            self.assertEqual(cache.keys(f'{RepresentationCache.PREFIX}:*'), [])
+
+    def test_generation_keys(self):
+        mapping = Mapping(id=1, parent_id=2, from_concept_id=3, to_concept_id=4, from_source_id=2, to_source_id=5)
+        self.assertEqual(
+            RepresentationCache.get_generation_keys(mapping),
+            [
+                'representation:generation:mapping:1', 'representation:generation:source:2',
+                'representation:generation:concept:3', 'representation:generation:concept:4',
+                'representation:generation:source:2', 'representation:generation:source:5'
+            ]
+        )
+        self.assertEqual(
+            RepresentationCache.get_generation_keys(self.concept),
+            [
+                f'representation:generation:concept:{self.concept.id}',
+                f'representation:generation:source:{self.source.id}'
+            ]
+        )
+
+    def test_invalidate(self):
+        concept_key = RepresentationCache.generation_key('concept', self.concept.id)
+        source_key = RepresentationCache.generation_key('source', self.source.id)
+        self.concept.save()
+        self.assertIsNone(cache.get(concept_key))
+
+        with self.settings(TEST_MODE=False, REPRESENTATION_CACHE_TTL=60):
+            self.concept.save()
+            self.assertEqual(cache.get(concept_key), 1)
+            self.concept.save(update_fields=['checksums'])
+            self.assertEqual(cache.get(concept_key), 1)
+
+            self.source.save()
+            self.assertEqual(cache.get(source_key), 1)
+            self.source.save(update_fields=['_background_process_ids'])
+            self.assertEqual(cache.get(source_key), 1)
+            version = OrganizationSourceFactory(
+                version='v1', mnemonic=self.source.mnemonic, organization=self.source.parent)
+            self.assertEqual(cache.get(source_key), 2)
+            version.save(update_fields=['_background_process_ids'])
+            self.assertEqual(cache.get(source_key), 3)
+
+
 class TaskTest(OCLTestCase):
     @patch('core.common.tasks.get_export_service')
     def test_delete_s3_objects(self, export_service_mock):
@@ -1033,6 +1628,16 @@ class TaskTest(OCLTestCase):
         self.assertEqual(concept_latest.checksums, {'smart': ANY, 'standard': ANY})
         self.assertEqual(concept.checksums, {'smart': ANY, 'standard': ANY})
 
+    def test_calculate_source_version_checksums(self):
+        concept = ConceptFactory()
+        concepts = Concept.objects.filter(versioned_object_id=concept.id)
+        expected = {_concept.id: _concept.get_all_checksums() for _concept in concepts}
+        concepts.update(checksums={})
+
+        call_command('calculate_checksums', str(concept.parent_id))
+
+        self.assertEqual({_concept.id: _concept.checksums for _concept in concepts}, expected)
+
 
 class URIValidatorTest(OCLTestCase):
     validator = URIValidator()
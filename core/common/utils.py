@@ -1,5 +1,6 @@
 # pylint: disable=cyclic-import # only occurring in dev env
 
+import io
 import json
 import mimetypes
 import os
@@ -19,6 +20,9 @@ import requests
 from celery_once.helpers import queue_once_key
 from dateutil import parser
 from django.conf import settings
+from django.db import connection
+from django.db.models import Exists, F, OuterRef, Q
+from django.db.models.fields.json import KeyTextTransform
 from django.urls import NoReverseMatch, reverse, get_resolver
 from django.utils import timezone
 from djqscsv import csv_file_for
@@ -193,11 +197,279 @@ def get_class(kls):
     return _module
 
 
-def write_export_file(
+def keyset_batches(queryset, field, batch_size):
+    """
+    Yields lists of `field` values from queryset in descending order, `batch_size` at a time.
+    Each batch is fetched with `field < last seen value` instead of an OFFSET, so late batches
+    cost the same as early ones.
+    """
+    last_value = None
+    while True:
+        batch_queryset = queryset
+        if last_value is not None:
+            batch_queryset = batch_queryset.filter(**{f'{field}__lt': last_value})
+        values = list(batch_queryset.order_by(f'-{field}').values_list(field, flat=True)[:batch_size])
+        if not values:
+            break
+        yield values
+        if len(values) < batch_size:
+            break
+        last_value = values[-1]
+
+
+def write_export_resources(out, batches, serialize, logger, name, is_first=True):  # pylint: disable=too-many-arguments
+    """
+    Writes serialized resources of each batch to out as comma separated JSON objects (without enclosing brackets).
+    Returns False if anything was written, else returns is_first as it is.
+    """
+    start = 0
+    for batch in batches:
+        end = start + len(batch)
+        logger.info(f'Serializing {name} {start + 1:d} - {end:d}...')
+        data = serialize(batch)
+        if data:
+            if not is_first:
+                out.write(', ')
+            out.write(json.dumps(data, cls=encoders.JSONEncoder)[1:-1])
+            is_first = False
+        start = end
+    return is_first
+
+
+def get_export_queryset(version, resource_type, name):
+    """Returns the through queryset (and its resource id field) of concepts/mappings to be exported for version."""
+    from core.concepts.models import Concept
+    from core.mappings.models import Mapping
+    klass = Concept if name == 'concepts' else Mapping
+    field = f'{klass.__name__.lower()}_id'
+
+    if resource_type == 'collection':
+        if version.expansion_uri:
+            return klass.expansion_set.through.objects.filter(expansion_id=version.expansion.id), field
+        return klass.expansion_set.through.objects.none(), field
+    return klass.sources.through.objects.filter(source_id=version.id), field
+
+
+def get_export_filters(version, resource_type):
+    """Returns the filters (on concepts/mappings) of the resources exported for version."""
+    filters = {}
+
+    if resource_type != 'collection':
+        filters['is_active'] = True
+        if version.is_head:
+            filters['is_latest_version'] = True
+
+    return filters
+
+
+def get_export_serializer(version, resource_type, name):
+    """Returns a function which serializes the exportable concepts/mappings of version from a batch of ids."""
+    from core.concepts.models import Concept
+    from core.mappings.models import Mapping
+    filters = get_export_filters(version, resource_type)
+
+    if name == 'concepts':
+        serializer_class = get_class('core.concepts.serializers.ConceptVersionExportBatchSerializer')
+        return lambda ids: serializer_class(
+            Concept.objects.filter(id__in=ids).filter(**filters).order_by('-id'), many=True).data
+
+    serializer_class = get_class('core.mappings.serializers.MappingExportBatchSerializer')
+    return lambda ids: serializer_class(
+        Mapping.objects.filter(id__in=ids).filter(**filters).order_by('-id'), many=True).data
+
+
+def get_export_shard_ranges(queryset, field, shards):
+    """
+    Splits values of field in queryset into (at most) `shards` contiguous (max, min) ranges of (almost) the same size,
+    in descending order. The boundaries are computed by the database (ntile), without loading the values.
+    """
+    if queryset.query.is_empty():
+        return []
+    sql, params = queryset.order_by().values_list(field, flat=True).query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT MAX(value), MIN(value) FROM ('
+            f'SELECT value, ntile(%s) OVER (ORDER BY value DESC) AS shard FROM ({sql}) AS resources(value)'
+            ') AS shards GROUP BY shard ORDER BY shard',
+            [shards, *params]
+        )
+        return [tuple(row) for row in cursor.fetchall()]
+
+
+def get_export_shards_dir(export_id):
+    return os.path.join(settings.EXPORT_SHARDS_DIR, export_id)
+
+
+def get_export_shards(version, resource_type, export_id):
+    """
+    Returns the export_shard task args of the concepts/mappings shards of version, in export order. Each shard is a
+    contiguous (max_id, min_id) range, serialized to its own file in the export_id shards dir.
+    """
+    shards = []
+    for name in ['concepts', 'mappings']:
+        queryset, field = get_export_queryset(version, resource_type, name)
+        for index, (max_id, min_id) in enumerate(get_export_shard_ranges(queryset, field, settings.EXPORT_SHARDS)):
+            path = os.path.join(get_export_shards_dir(export_id), f'{name}-{index:d}.json')
+            shards.append((version.id, resource_type, name, max_id, min_id, path))
+    return shards
+
+
+def write_export_shard(  # pylint: disable=too-many-arguments
+        version, resource_type, name, max_id, min_id, path, logger
+):
+    queryset, field = get_export_queryset(version, resource_type, name)
+    queryset = queryset.filter(**{f'{field}__lte': max_id, f'{field}__gte': min_id})
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as out:
+        write_export_resources(
+            out, keyset_batches(queryset, field, settings.EXPORT_BATCH_SIZE),
+            get_export_serializer(version, resource_type, name), logger, name
+        )
+
+
+def copy_export_shards(out, paths):
+    """
+    Copies the shard files at paths into out in order, a chunk at a time, comma separating the non-empty ones,
+    so the output is the same as serializing their resources serially.
+    """
+    is_first = True
+    for path in paths:
+        if not os.path.getsize(path):
+            continue
+        if not is_first:
+            out.write(', ')
+        with open(path, encoding='utf-8') as shard:
+            shutil.copyfileobj(shard, out)
+        is_first = False
+
+
+def queue_export_shards(  # pylint: disable=too-many-arguments
         version, resource_type, resource_serializer_type, logger, start_time
-):  # pylint: disable=too-many-statements,too-many-locals,too-many-branches
+):
+    """
+    Serializes concepts/mappings of version in shards, each shard in a separate celery task on the concurrent queue,
+    and queues merge_export_shards as their chord callback, which writes (and uploads) the export from the shard
+    files, so no worker waits for the shards. The version is processing until the callback is done.
+    Returns False, queuing nothing, if version is not to be exported in shards.
+    """
+    from celery import chord
+    from core.common.tasks import export_shard, merge_export_shards, discard_export_shards
+    if settings.EXPORT_SHARDS <= 1:
+        return False
+    export_id = str(uuid.uuid4())
+    shards = get_export_shards(version, resource_type, export_id)
+    if not shards:
+        return False
+
+    logger.info(f'Serializing concepts and mappings in {len(shards):d} shards...')
+    version.add_processing(export_id)
+    merge_args = (version.id, resource_type, resource_serializer_type, start_time, export_id, shards)
+    if get(settings, 'TEST_MODE', False):
+        for args in shards:
+            export_shard(*args)
+        merge_export_shards(*merge_args)
+    else:
+        chord(export_shard.si(*args).set(queue='concurrent') for args in shards)(
+            merge_export_shards.si(*merge_args).set(task_id=export_id).on_error(
+                discard_export_shards.si(version.id, resource_type, export_id))
+        )
+    return True
+
+
+def get_export_delta(version, prev_version, resource_type, name):
+    """
+    Compares the exportable concepts/mappings of version with the ones of prev_version, by versioned object, in the
+    database. Returns the through querysets of the (added, changed, removed) ones, removed ones being of prev_version,
+    and their resource id field, to be read with keyset_batches.
+    A resource is changed if its version differs and so does its standard checksum (or it is not calculated yet).
+    """
+    def get_queryset(_version):
+        _queryset, _field = get_export_queryset(_version, resource_type, name)
+        relation = _field[:-3]
+        filters = {f'{relation}__{key}': value for key, value in get_export_filters(_version, resource_type).items()}
+        return _queryset.filter(**filters).annotate(
+            resource_versioned_object_id=F(f'{relation}__versioned_object_id'),
+            resource_checksum=KeyTextTransform('standard', f'{relation}__checksums')
+        ), _field
+
+    def of_same_versioned_object(_queryset):
+        return _queryset.filter(resource_versioned_object_id=OuterRef('resource_versioned_object_id'))
+
+    queryset, field = get_queryset(version)
+    prev_queryset, _ = get_queryset(prev_version)
+    prev_other_versions = of_same_versioned_object(prev_queryset).exclude(**{field: OuterRef(field)})
+
+    added = queryset.filter(~Exists(of_same_versioned_object(prev_queryset)))
+    changed = queryset.filter(
+        Exists(prev_other_versions) & (Q(resource_checksum__isnull=True) | Q(resource_checksum='')) |
+        Exists(prev_other_versions.filter(
+            Q(resource_checksum__isnull=True) | ~Q(resource_checksum=OuterRef('resource_checksum'))))
+    )
+    removed = prev_queryset.filter(~Exists(of_same_versioned_object(queryset)))
+
+    return (added, changed, removed), field
+
+
+def write_delta_export_file(version, resource_type, logger):  # pylint: disable=too-many-locals
+    """
+    Writes delta.zip with the concepts/mappings of version added, changed and removed since the previous released
+    version and uploads it to version.version_delta_export_path. Added/changed ones have the same representation as
+    in export.json, removed ones only their type, id, url and version_url (of the previous released version).
+    Nothing is written for HEAD or if there is no released version before version.
+    """
     from core.concepts.models import Concept
     from core.mappings.models import Mapping
+    prev_version = None if version.is_head else version.get_prev_released_version()
+    if not prev_version or prev_version.created_at >= version.created_at:
+        return
+
+    batch_size = settings.EXPORT_BATCH_SIZE
+    logger.info(f'Writing delta of {resource_type} version {version.version} since {prev_version.version}...')
+
+    with zipfile.ZipFile('delta.zip', 'w', zipfile.ZIP_DEFLATED) as _zip:
+        with io.TextIOWrapper(_zip.open('delta.json', 'w', force_zip64=True), encoding='utf-8') as out:
+            out.write(json.dumps({
+                'id': version.version, 'url': version.uri,
+                'previous_version': prev_version.version, 'previous_version_url': prev_version.uri
+            })[:-1])
+            for name, klass in [('concepts', Concept), ('mappings', Mapping)]:
+                (added, changed, removed), field = get_export_delta(version, prev_version, resource_type, name)
+                serialize = get_export_serializer(version, resource_type, name)
+                out.write(f', "{name}": {{"added": [')
+                write_export_resources(
+                    out, keyset_batches(added, field, batch_size), serialize, logger, f'added {name}')
+                out.write('], "changed": [')
+                write_export_resources(
+                    out, keyset_batches(changed, field, batch_size), serialize, logger, f'changed {name}')
+                out.write('], "removed": [')
+                write_export_resources(
+                    out, keyset_batches(removed, field, batch_size),
+                    lambda ids, klass=klass: [
+                        {
+                            'type': klass.OBJECT_TYPE, 'id': resource['mnemonic'],
+                            'url': drop_version(resource['uri']), 'version_url': resource['uri']
+                        } for resource in klass.objects.filter(id__in=ids).order_by('-id').values('mnemonic', 'uri')
+                    ],
+                    logger, f'removed {name}'
+                )
+                out.write(']}')
+            out.write('}')
+
+    export_service = get_export_service()
+    upload_status_code = export_service.upload_file(
+        key=version.version_delta_export_path, file_path=os.path.abspath('delta.zip'), binary=True,
+        metadata={'ContentType': 'application/zip'}, headers={'content-type': 'application/zip'}
+    )
+    logger.info(f'Delta upload response status: {str(upload_status_code)}')
+
+
+def write_export_file(
+        version, resource_type, resource_serializer_type, logger, start_time, shards=None
+):  # pylint: disable=too-many-locals,too-many-arguments
+    """
+    Writes export.zip of version and uploads it to version.version_export_path. shards are the export_shard args
+    of the already serialized concepts/mappings shards (see queue_export_shards), if any.
+    """
     cwd = cd_temp()
     logger.info(f'Writing export file to tmp directory: {cwd}')
 
@@ -209,122 +481,48 @@ def write_export_file(
     resource_string = json.dumps(data, cls=encoders.JSONEncoder)
     logger.info('Done serializing attributes.')
 
-    batch_size = 100
+    batch_size = settings.EXPORT_BATCH_SIZE
     is_collection = resource_type == 'collection'
-
-    concepts_qs = Concept.objects.none()
-    mappings_qs = Mapping.objects.none()
-
-    if is_collection:
-        if version.expansion_uri:
-            concepts_qs = Concept.expansion_set.through.objects.filter(expansion_id=version.expansion.id)
-            mappings_qs = Mapping.expansion_set.through.objects.filter(expansion_id=version.expansion.id)
-    else:
-        concepts_qs = Concept.sources.through.objects.filter(source_id=version.id)
-        mappings_qs = Mapping.sources.through.objects.filter(source_id=version.id)
-
-    filters = {}
-
-    if not is_collection:
-        filters['is_active'] = True
-        if version.is_head:
-            filters['is_latest_version'] = True
-
-    with open('export.json', 'w') as out:
-        out.write(f'{resource_string[:-1]}, "concepts": [')
-
     resource_name = resource_type.title()
 
-    if concepts_qs.exists():
-        logger.info(f'{resource_name} has concepts. Getting them in batches of {batch_size:d}...')
-        concept_serializer_class = get_class('core.concepts.serializers.ConceptVersionExportSerializer')
-        start = 0
-        end = batch_size
-        batch_queryset = concepts_qs.order_by('-concept_id')[start:end]
-
-        while batch_queryset.exists():
-            logger.info(f'Serializing concepts {start + 1:d} - {end:d}...')
-            queryset = Concept.objects.filter(
-                id__in=batch_queryset.values_list('concept_id')).filter(**filters).order_by('-id')
-            if queryset.exists():
-                if start > 0:
-                    with open('export.json', 'a') as out:
-                        out.write(', ')
-                concept_versions = queryset.prefetch_related('names', 'descriptions')
-                data = concept_serializer_class(concept_versions, many=True).data
-                concept_string = json.dumps(data, cls=encoders.JSONEncoder)
-                concept_string = concept_string[1:-1]
-
-                with open('export.json', 'a') as out:
-                    out.write(concept_string)
-
-            start += batch_size
-            end += batch_size
-            batch_queryset = concepts_qs.order_by('-concept_id')[start:end]
-
-        logger.info('Done serializing concepts.')
-
-    if is_collection:
-        references_qs = version.references
-        total_references = references_qs.count()
-
-        with open('export.json', 'a') as out:
-            out.write('], "references": [')
-        if total_references:
-            logger.info(
-                f'{resource_name} has {total_references:d} references. Getting them in batches of {batch_size:d}...'
+    def write_resources(out, name):
+        logger.info(f'{resource_name} {name}: getting them in batches of {batch_size:d}...')
+        if shards:
+            copy_export_shards(out, [shard[-1] for shard in shards if shard[2] == name])
+        else:
+            queryset, field = get_export_queryset(version, resource_type, name)
+            write_export_resources(
+                out, keyset_batches(queryset, field, batch_size),
+                get_export_serializer(version, resource_type, name), logger, name
             )
-            reference_serializer_class = get_class('core.collections.serializers.CollectionReferenceSerializer')
-            for start in range(0, total_references, batch_size):
-                end = min(start + batch_size, total_references)
-                logger.info(f'Serializing references {start + 1:d} - {end:d}...')
-                references = references_qs.order_by('-id').filter()[start:end]
-                reference_serializer = reference_serializer_class(references, many=True)
-                reference_string = json.dumps(reference_serializer.data, cls=encoders.JSONEncoder)
-                reference_string = reference_string[1:-1]
-                with open('export.json', 'a') as out:
-                    out.write(reference_string)
-                    if end != total_references:
-                        out.write(', ')
-            logger.info('Done serializing references.')
-
-    with open('export.json', 'a') as out:
-        out.write('], "mappings": [')
-
-    if mappings_qs.exists():
-        logger.info(f'{resource_name} has mappings. Getting them in batches of {batch_size:d}...')
-        mapping_serializer_class = get_class('core.mappings.serializers.MappingDetailSerializer')
-        start = 0
-        end = batch_size
-        batch_queryset = mappings_qs.order_by('-mapping_id')[start:end]
-
-        while batch_queryset.exists():
-            logger.info(f'Serializing mappings {start + 1:d} - {start + batch_size:d}...')
-            queryset = Mapping.objects.filter(
-                id__in=batch_queryset.values_list('mapping_id')).filter(**filters).order_by('-id')
-            if queryset.exists():
-                if start > 0:
-                    with open('export.json', 'a') as out:
-                        out.write(', ')
-
-                data = mapping_serializer_class(queryset, many=True).data
-                mapping_string = json.dumps(data, cls=encoders.JSONEncoder)
-                mapping_string = mapping_string[1:-1]
-                with open('export.json', 'a') as out:
-                    out.write(mapping_string)
-
-            start += batch_size
-            end += batch_size
-            batch_queryset = mappings_qs.order_by('-mapping_id')[start:end]
-
-        logger.info('Done serializing mappings.')
-
-    with open('export.json', 'a') as out:
-        end_time = str(round((time.time() - start_time) + 2, 2)) + 'secs'
-        out.write('], "export_time": ' + json.dumps(end_time, cls=encoders.JSONEncoder) + '}')
+        logger.info(f'Done serializing {name}.')
 
+    # export.json is streamed straight into the zip archive, it never exists uncompressed on disk
     with zipfile.ZipFile('export.zip', 'w', zipfile.ZIP_DEFLATED) as _zip:
-        _zip.write('export.json')
+        with io.TextIOWrapper(_zip.open('export.json', 'w', force_zip64=True), encoding='utf-8') as out:
+            out.write(f'{resource_string[:-1]}, "concepts": [')
+
+            write_resources(out, 'concepts')
+
+            out.write('], "references": [' if is_collection else '], "mappings": [')
+
+            if is_collection:
+                logger.info(f'{resource_name} references: getting them in batches of {batch_size:d}...')
+                reference_serializer_class = get_class(
+                    'core.collections.serializers.CollectionReferenceExportBatchSerializer')
+                write_export_resources(
+                    out, keyset_batches(version.references, 'id', batch_size),
+                    lambda ids: reference_serializer_class(
+                        version.references.filter(id__in=ids).order_by('-id'), many=True).data,
+                    logger, 'references'
+                )
+                logger.info('Done serializing references.')
+                out.write('], "mappings": [')
+
+            write_resources(out, 'mappings')
+
+            end_time = str(round((time.time() - start_time) + 2, 2)) + 'secs'
+            out.write('], "export_time": ' + json.dumps(end_time, cls=encoders.JSONEncoder) + '}')
 
     file_path = os.path.abspath('export.zip')
     logger.info(file_path)
@@ -343,6 +541,8 @@ def write_export_file(
     uploaded_path = export_service.url_for(s3_key)
     logger.info(f'Uploaded to {uploaded_path}.')
 
+    write_delta_export_file(version, resource_type, logger)
+
     if not get(settings, 'TEST_MODE', False):
         tmp_dir_path = file_path.replace('/export.zip', '')
         logger.info(f'Removing tmp {tmp_dir_path}.')
@@ -437,7 +637,8 @@ def task_exists(task_id):
 
 
 def queue_bulk_import(  # pylint: disable=too-many-arguments
-        to_import, import_queue, username, update_if_exists, threads=None, inline=False, sub_task=False
+        to_import, import_queue, username, update_if_exists, threads=None, inline=False, sub_task=False,
+        bulk_load=False
 ):
     """
     Used to queue bulk imports. It assigns a bulk import task to a specified import queue or a random one.
@@ -450,6 +651,7 @@ def queue_bulk_import(  # pylint: disable=too-many-arguments
     :param threads:
     :param inline:
     :param sub_task:
+    :param bulk_load: creates new concepts/mappings with bulk inserts (inline imports only)
     :return: task
     """
     queue_id, task_id = get_queue_task_names(import_queue, username)
@@ -458,17 +660,17 @@ def queue_bulk_import(  # pylint: disable=too-many-arguments
         if sub_task:
             from core.common.tasks import bulk_import_parts_inline
             return bulk_import_parts_inline.apply_async(
-                (to_import, username, update_if_exists), task_id=task_id, queue=queue_id
+                (to_import, username, update_if_exists, bulk_load), task_id=task_id, queue=queue_id
             )
 
         if threads:
             from core.common.tasks import bulk_import_parallel_inline
             return bulk_import_parallel_inline.apply_async(
-                (to_import, username, update_if_exists, threads), task_id=task_id, queue=queue_id
+                (to_import, username, update_if_exists, threads, bulk_load), task_id=task_id, queue=queue_id
             )
         from core.common.tasks import bulk_import_inline
         return bulk_import_inline.apply_async(
-            (to_import, username, update_if_exists), task_id=task_id, queue=queue_id
+            (to_import, username, update_if_exists, bulk_load), task_id=task_id, queue=queue_id
         )
 
     from core.common.tasks import bulk_import
@@ -771,6 +973,18 @@ def chunks(lst, size):
         yield lst[i:i + size]
 
 
+def iter_chunks(iterable, size):
+    """Yields lists of size items from any iterable, unlike chunks which needs a sliceable sequence"""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
 def es_id_in(search, ids):
     if ids:
         return search.query("terms", _id=ids)
@@ -778,20 +992,9 @@ def es_id_in(search, ids):
 
 
 def es_to_pks(search):
-    # doesn't care about the order
-    default_limit = 25
-    limit = default_limit
-    offset = 0
-    result_count = 25
-    pks = []
-    while result_count > 0:
-        hits = search[offset:limit].execute().hits
-        result_count = len(hits)
-        if result_count:
-            pks += [hit.meta.id for hit in hits]
-        offset += default_limit
-        limit += default_limit
-    return pks
+    # doesn't care about the order, walks all the hits with the scroll api instead of growing from/size windows
+    search = search.source(excludes=['*']).params(size=settings.ES_SCAN_BATCH_SIZE)
+    return [hit.meta.id for hit in search.scan()]
 
 
 def batch_qs(qs, batch_size=1000):
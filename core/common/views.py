@@ -15,7 +15,7 @@ from elasticsearch_dsl import Q
 from pydash import get, compact, flatten
 from rest_framework import response, generics, status
 from rest_framework.generics import ListAPIView, RetrieveUpdateDestroyAPIView
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
@@ -24,9 +24,10 @@ from core.common.constants import SEARCH_PARAM, LIST_DEFAULT_LIMIT, CSV_DEFAULT_
     LIMIT_PARAM, NOT_FOUND, MUST_SPECIFY_EXTRA_PARAM_IN_BODY, INCLUDE_RETIRED_PARAM, VERBOSE_PARAM, HEAD, LATEST, \
     BRIEF_PARAM, ES_REQUEST_TIMEOUT, INCLUDE_INACTIVE, FHIR_LIMIT_PARAM, RAW_PARAM, SEARCH_MAP_CODES_PARAM, \
     INCLUDE_SEARCH_META_PARAM, EXCLUDE_FUZZY_SEARCH_PARAM, EXCLUDE_WILDCARD_SEARCH_PARAM, UPDATED_BY_USERNAME_PARAM, \
-    CANONICAL_URL_REQUEST_PARAM
+    CANONICAL_URL_REQUEST_PARAM, SEARCH_CURSOR_PARAM, FACETS_NEUTRAL_PARAMS, ACCESS_TYPE_NONE
 from core.common.exceptions import Http400
 from core.common.mixins import PathWalkerMixin
+from core.common.response_cache import ListResponseCache
 from core.common.search import CustomESSearch
 from core.common.serializers import RootSerializer
 from core.common.swagger_parameters import all_resource_query_param
@@ -61,6 +62,7 @@ class BaseAPIView(generics.GenericAPIView, PathWalkerMixin):
     default_qs_sort_attr = '-updated_at'
     facet_class = None
     total_count = 0
+    next_cursor = None
 
     def has_no_kwargs(self):
         return len(self.kwargs.values()) == 0
@@ -411,16 +413,14 @@ class BaseAPIView(generics.GenericAPIView, PathWalkerMixin):
             if self.is_user_document():
                 return facets
 
-            faceted_search = self.facet_class(  # pylint: disable=not-callable
-                self.get_search_string(lower=False),
-                _search=self.__get_search_results(ignore_retired_filter=True, sort=False, highlight=False, force=True),
-            )
-            faceted_search.params(request_timeout=ES_REQUEST_TIMEOUT)
-            try:
-                s = faceted_search.execute()
-                facets = s.facets.to_dict()
-            except TransportError as ex:  # pragma: no cover
-                raise Http400(detail=get(ex, 'info') or get(ex, 'error') or str(ex)) from ex
+            repo_version = self.get_precomputed_facets_repo_version()
+            precomputed_facets = repo_version.get_precomputed_facets(self.facet_class.index) if repo_version else None
+            if precomputed_facets is None:
+                facets = self.execute_faceted_search()
+                if repo_version:
+                    repo_version.set_precomputed_facets(self.facet_class.index, facets)
+            else:
+                facets = {**precomputed_facets}
         if not get(self.request.user, 'is_authenticated'):
             facets.pop('updatedBy', None)
         if self.should_search_latest_repo() and self.is_source_child_document_model() and 'source_version' in facets:
@@ -435,6 +435,37 @@ class BaseAPIView(generics.GenericAPIView, PathWalkerMixin):
         facets.pop('is_latest_version', None)
         return facets
 
+    def execute_faceted_search(self):
+        faceted_search = self.facet_class(  # pylint: disable=not-callable
+            self.get_search_string(lower=False),
+            _search=self.__get_search_results(ignore_retired_filter=True, sort=False, highlight=False, force=True),
+        )
+        faceted_search.params(request_timeout=ES_REQUEST_TIMEOUT)
+        try:
+            return faceted_search.execute().facets.to_dict()
+        except TransportError as ex:  # pragma: no cover
+            raise Http400(detail=get(ex, 'info') or get(ex, 'error') or str(ex)) from ex
+
+    def get_precomputed_facets_repo_version(self):
+        """
+        Non HEAD source/collection version whose stored facets answer this request,
+        i.e. its concepts/mappings are listed without any search or filters, by an anonymous requester.
+        Stored facets are of the public concepts/mappings only, others (staff, private scope and authenticated
+        users, who also see what they created) are answered by the live faceted search.
+        """
+        repo_version = get(self, 'parent_resource')
+        if not repo_version or repo_version.is_head or 'expansion' in self.kwargs:
+            return None
+        if not self.is_source_child_document_model() or self.get_raw_search_string():
+            return None
+        if set(self.request.query_params.keys()) - {SEARCH_PARAM, *FACETS_NEUTRAL_PARAMS}:
+            return None
+        if self._should_include_private() or get(self.request.user, 'is_authenticated'):
+            return None
+        if repo_version.public_access == ACCESS_TYPE_NONE:
+            return None
+        return repo_version
+
     def get_extras_searchable_fields_from_query_params(self):
         query_params = self.request.query_params.dict()
         result = {}
@@ -766,17 +797,33 @@ class BaseAPIView(generics.GenericAPIView, PathWalkerMixin):
     def get_fuzzy_search_fields(self):
         return self.document_model.get_fuzzy_search_attrs() or {}
 
+    def get_search_cursor(self):
+        """None when not paginating by cursor, '' for the first page, else the next_cursor of the previous page"""
+        cursor = self.request.query_params.get(SEARCH_CURSOR_PARAM)
+        if cursor is None:
+            return None
+        return '' if cursor in TRUTHY else cursor
+
     def __get_queryset_from_search_results(self, search_results):
-        offset = max(to_int(self.request.GET.get('offset'), 0), 0)
+        cursor = self.get_search_cursor()
+        offset = max(to_int(self.request.GET.get('offset'), 0), 0) if cursor is None else 0
         self.limit = int(self.limit) or LIST_DEFAULT_LIMIT
         page = max(to_int(self.request.GET.get('page'), 1), 1)
         start = offset or (page - 1) * self.limit
         end = start + self.limit
         try:
             search_results = search_results.params(request_timeout=ES_REQUEST_TIMEOUT)
-            es_search = CustomESSearch(search_results[start:end], self.document_model)
+            if cursor is None:
+                es_search = CustomESSearch(search_results[start:end], self.document_model)
+            else:
+                es_search = CustomESSearch(search_results, self.document_model)
+                try:
+                    es_search.apply_cursor(cursor, self.limit)
+                except ValueError as ex:
+                    raise Http400(detail=str(ex)) from ex
             es_search.to_queryset()
             self.total_count = es_search.total - offset
+            self.next_cursor = es_search.next_cursor
             return es_search.queryset, es_search.scores, es_search.max_score, es_search.highlights
         except RequestError as ex:  # pragma: no cover
             if get(ex, 'info.error.caused_by.reason', '').startswith('Result window is too large'):
@@ -940,6 +987,15 @@ class APIVersionView(APIView):  # pragma: no cover
         return Response(__version__)
 
 
+class ListResponseCacheStatsView(APIView):
+    permission_classes = (IsAdminUser,)
+    swagger_schema = None
+
+    @staticmethod
+    def get(_):
+        return Response(ListResponseCache.stats())
+
+
 class ChangeLogView(APIView):  # pragma: no cover
     permission_classes = (AllowAny, )
     swagger_schema = None
@@ -1,3 +1,4 @@
+import json
 from collections import OrderedDict
 
 from mock.mock import patch, Mock
@@ -412,7 +413,11 @@ class ConceptMapTest(OCLTestCase):
                                 ]),
                                 OrderedDict([
                                     ('name', 'concept'),
-                                    ('valueCoding', OrderedDict([('system', '/some/url'), ('code', 'concept_1')]))
+                                    (
+                                        'valueCoding',
+                                        OrderedDict(
+                                            [('system', '/some/url'), ('code', 'concept_1'), ('userSelected', False)])
+                                    )
                                 ])
                             ]
                         )
@@ -428,7 +433,11 @@ class ConceptMapTest(OCLTestCase):
                                 ]),
                                 OrderedDict([
                                     ('name', 'concept'),
-                                    ('valueCoding', OrderedDict([('system', '/some/url'), ('code', 'concept_1')]))
+                                    (
+                                        'valueCoding',
+                                        OrderedDict(
+                                            [('system', '/some/url'), ('code', 'concept_1'), ('userSelected', False)])
+                                    )
                                 ])
                             ]
                         )
@@ -527,7 +536,11 @@ class ConceptMapTest(OCLTestCase):
                                 ]),
                                 OrderedDict([
                                     ('name', 'concept'),
-                                    ('valueCoding', OrderedDict([('system', '/some/url'), ('code', 'concept_1')]))
+                                    (
+                                        'valueCoding',
+                                        OrderedDict(
+                                            [('system', '/some/url'), ('code', 'concept_1'), ('userSelected', False)])
+                                    )
                                 ])
                             ]
                         )
@@ -543,7 +556,11 @@ class ConceptMapTest(OCLTestCase):
                                 ]),
                                 OrderedDict([
                                     ('name', 'concept'),
-                                    ('valueCoding', OrderedDict([('system', '/some/url'), ('code', 'concept_1')]))
+                                    (
+                                        'valueCoding',
+                                        OrderedDict(
+                                            [('system', '/some/url'), ('code', 'concept_1'), ('userSelected', False)])
+                                    )
                                 ])
                             ]
                         )
@@ -567,6 +584,67 @@ class ConceptMapTest(OCLTestCase):
             'parameter': [OrderedDict(
                 [('name', 'result'), ('valueBoolean', False)])]})
 
+    def test_translate_with_multiple_codings(self):
+        self.putConceptMap()
+
+        response = self.client.post(
+            f'/users/{self.user.mnemonic}/ConceptMap/$translate',
+            data={
+                'resourceType': 'Parameters',
+                'parameter': [
+                    {'name': 'targetsystem', 'valueUri': self.org_source.canonical_url},
+                    {'name': 'coding', 'valueCoding': {
+                        'system': self.org_source_B_v1.canonical_url, 'code': 'concept_B_1'}},
+                    {'name': 'coding', 'valueCoding': {
+                        'system': self.org_source_B_v1.canonical_url, 'code': 'concept_1'}},
+                ]
+            },
+            HTTP_AUTHORIZATION='Token ' + self.user_token,
+            format='json'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['type'], 'batch-response')
+        self.assertEqual(len(response.data['entry']), 2)
+        match = {
+            'name': 'match',
+            'part': [
+                {'name': 'equivalence', 'valueCode': 'equivalent'},
+                {'name': 'concept', 'valueCoding': {'system': '/some/url', 'code': 'concept_1', 'userSelected': False}}
+            ]
+        }
+        self.assertEqual(
+            response.data['entry'][0]['resource'],
+            {'resourceType': 'Parameters', 'parameter': [{'name': 'result', 'valueBoolean': True}, match, match]}
+        )
+        self.assertEqual(
+            response.data['entry'][1]['resource'],
+            {'resourceType': 'Parameters', 'parameter': [{'name': 'result', 'valueBoolean': False}]}
+        )
+
+    def test_batch_translate(self):
+        self.putConceptMap()
+
+        response = self.client.post(
+            f'/users/{self.user.mnemonic}/ConceptMap/$batch-translate',
+            data=[
+                ['concept_B_1', self.org_source_B_v1.canonical_url, self.org_source.canonical_url],
+                {'code': 'concept_1', 'system': self.org_source_B_v1.canonical_url},
+                ['concept_B_1', self.org_source_B_v1.canonical_url, self.org_source_B_v1.canonical_url],
+            ],
+            HTTP_AUTHORIZATION='Token ' + self.user_token,
+            format='json'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        results = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([result['parameter'][0]['valueBoolean'] for result in results], [True, False, False])
+        self.assertEqual(len(results[0]['parameter']), 3)
+        self.assertEqual(
+            results[0]['parameter'][1]['part'][1]['valueCoding'],
+            {'system': '/some/url', 'code': 'concept_1', 'userSelected': False}
+        )
+
     def test_unable_to_represent_as_fhir(self):
         instance = Source(id='1', uri='/invalid/uri')
         serialized = ConceptMapDetailSerializer(instance=instance).data
@@ -6,6 +6,8 @@ from . import views
 urlpatterns = [
     re_path(r'^$', views.ConceptMapListView.as_view(), name='concept-map-list'),
     re_path(r'^\$translate$', views.ConceptMapTranslateView.as_view(), name='concept-map-list-translate'),
+    re_path(r'^\$batch-translate$', views.ConceptMapBatchTranslateView.as_view(),
+            name='concept-map-list-batch-translate'),
     re_path(
         fr"^(?P<source>{NAMESPACE_PATTERN})/$",
         views.ConceptMapRetrieveUpdateView.as_view(),
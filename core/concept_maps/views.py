@@ -1,18 +1,17 @@
 import logging
+from functools import partial
 
 from django.core.exceptions import ValidationError
-from django.db.models import Q
 from pydash import get
 
 from core.bundles.serializers import FHIRBundleSerializer
 from core.common.constants import HEAD
 from core.common.fhir_helpers import translate_fhir_query
 from core.common.permissions import CanViewConceptDictionary
-from core.common.serializers import IdentifierSerializer
-from core.concept_maps.constants import RESOURCE_TYPE
+from core.common.terminology import TerminologyOperationMixin, TerminologyOperations, \
+    TerminologyBatchOperationMixin
 from core.concept_maps.serializers import ConceptMapDetailSerializer, ConceptMapParametersSerializer
 from core.concepts.permissions import CanAccessParentDictionary
-from core.mappings.constants import SAME_AS
 from core.mappings.views import MappingListView
 from core.sources.views import SourceListView, SourceRetrieveUpdateDestroyView
 
@@ -65,8 +64,12 @@ class ConceptMapRetrieveUpdateView(SourceRetrieveUpdateDestroyView):
         return ConceptMapDetailSerializer(obj)
 
 
-class ConceptMapTranslateView(MappingListView):
+class ConceptMapTranslateView(TerminologyOperationMixin, MappingListView):
     serializer_class = ConceptMapParametersSerializer
+    parameters_serializer_class = ConceptMapParametersSerializer
+    required_parameters = ['code']
+    coding_parameters = {'system': 'system', 'code': 'code'}
+    apply_parameters = True
 
     def get_permissions(self):
         return [CanAccessParentDictionary(), CanViewConceptDictionary()]
@@ -80,7 +83,7 @@ class ConceptMapTranslateView(MappingListView):
         :return: None
         """
 
-    def apply_filters(self, queryset):
+    def get_parameters(self):
         if self.request.method in ['POST', 'PUT']:
             parameters = self.get_serializer(data=self.request.data, instance=None)
         else:
@@ -90,87 +93,38 @@ class ConceptMapTranslateView(MappingListView):
             raise ValidationError(message=parameters.errors)
 
         params = parameters.validated_data
-        params = params.get('parameters', {})
+        return params.get('parameters', {})
 
-        url = params.get('url')
-        code = params.get('code')
-        system = params.get('system')
-        targetsystem = params.get('targetsystem')
-        # TODO: implement 'source' and 'target'
-        if url:
-            queryset = queryset.filter(canonical_url=url)
-            if not queryset:
-                return queryset
+    def apply_filters(self, queryset):
+        if not self.apply_parameters:  # the fast path filters by the parameters of each input itself
+            return queryset
 
+        params = self.get_parameters()
+        code = params.get('code')
+        queryset = TerminologyOperations.filter_mappings(
+            queryset, params.get('url'), params.get('system'), params.get('targetsystem'))
         if code:
             queryset = queryset.filter(from_concept_code=code)
-            if not queryset:
-                return queryset
-        if system:
-            system_url = IdentifierSerializer.convert_fhir_url_to_ocl_uri(system, 'sources')
-            queryset = queryset.filter(Q(from_source__canonical_url=system) |
-                                       Q(from_source_url=system_url) |
-                                       Q(from_source__uri=system_url))
-            if not queryset:
-                return queryset
-        if targetsystem:
-            target_url = IdentifierSerializer.convert_fhir_url_to_ocl_uri(targetsystem, 'sources')
-            queryset = queryset.filter(Q(to_source__canonical_url=targetsystem) |
-                                       Q(to_source_url=target_url) |
-                                       Q(to_source__uri=target_url))
         return queryset
 
+    def evaluate(self, operations, inputs):
+        self.apply_parameters = False
+        return operations.translate(inputs, self.get_queryset())
+
     def get_serializer(self, *args, **kwargs):
         instance = get(args, '0')
         many = kwargs.get('many', False)
         if many:
-            if isinstance(instance, list) and len(instance) != 0:
-                matches = []
-                for mapping in instance:
-                    equivalence = mapping.map_type
-                    if mapping.map_type == SAME_AS:
-                        equivalence = "equivalent"
-
-                    if mapping.to_source and mapping.to_source.canonical_url:
-                        to_url = mapping.to_source.canonical_url
-                    elif mapping.to_source_url:
-                        to_url = IdentifierSerializer.convert_ocl_uri_to_fhir_url(mapping.to_source_url, RESOURCE_TYPE)
-                    elif mapping.to_source:
-                        to_url = IdentifierSerializer.convert_ocl_uri_to_fhir_url(mapping.to_source.uri, RESOURCE_TYPE)
-
-                    matches.append({
-                        'name': 'match',
-                        'part': [
-                            {
-                                'name': 'equivalence',
-                                'valueCode': equivalence
-                            },
-                            {
-                                'name': 'concept',
-                                'valueCoding': {
-                                    'system': to_url,
-                                    'code': mapping.to_concept_code,
-                                    'userSelected': False
-                                }
-                            }
-                        ]
-                    })
-                return ConceptMapParametersSerializer({'parameter': [
-                        {
-                            'name': 'result',
-                            'valueBoolean': True
-                        },
-                        *matches
-                   ]})
-
-            return ConceptMapParametersSerializer({'parameter': [
-                {
-                    'name': 'result',
-                    'valueBoolean': False
-                }
-            ]})
+            return ConceptMapParametersSerializer(
+                TerminologyOperations.to_translate_parameters(instance if isinstance(instance, list) else []))
         return super().get_serializer(instance, many, *args, **kwargs)
 
+    def get(self, request, *args, **kwargs):
+        self.set_parent_resource(False)
+        if self.parent_resource:
+            self.check_object_permissions(request, self.parent_resource)
+        return self.operate(partial(self.list, request, *args, **kwargs))
+
     # Change POST behavior to get
     def post(self, request, *args, **kwargs):
         """
@@ -181,3 +135,7 @@ class ConceptMapTranslateView(MappingListView):
         :return: parameters
         """
         return self.get(request, *args, **kwargs)
+
+
+class ConceptMapBatchTranslateView(TerminologyBatchOperationMixin, ConceptMapTranslateView):
+    batch_fields = [('code', 'code'), ('system', 'system'), ('targetsystem', 'targetsystem')]
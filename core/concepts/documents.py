@@ -1,13 +1,15 @@
+from django.db.models import F
 from django_elasticsearch_dsl import Document, fields
 from django_elasticsearch_dsl.registries import registry
 from pydash import compact
 
+from core.common.documents import BatchIndexDocumentMixin
 from core.common.utils import jsonify_safe, flatten_dict
 from core.concepts.models import Concept
 
 
 @registry.register_document
-class ConceptDocument(Document):
+class ConceptDocument(BatchIndexDocumentMixin, Document):
     class Index:
         name = 'concepts'
         settings = {'number_of_shards': 1, 'number_of_replicas': 0}
@@ -119,31 +121,7 @@ class ConceptDocument(Document):
 
     @staticmethod
     def prepare_locale(instance):
-        return compact(set(instance.names.values_list('locale', flat=True)))
-
-    @staticmethod
-    def prepare_source_version(instance):
-        return list(instance.sources.values_list('version', flat=True))
-
-    @staticmethod
-    def prepare_collection_version(instance):
-        return list(set(instance.expansion_set.values_list('collection_version__version', flat=True)))
-
-    @staticmethod
-    def prepare_expansion(instance):
-        return list(instance.expansion_set.values_list('mnemonic', flat=True))
-
-    @staticmethod
-    def prepare_collection(instance):
-        return list(set(instance.expansion_set.values_list('collection_version__mnemonic', flat=True)))
-
-    @staticmethod
-    def prepare_collection_url(instance):
-        return list(set(list(instance.expansion_set.values_list('collection_version__uri', flat=True))))
-
-    @staticmethod
-    def prepare_collection_owner_url(instance):
-        return list(set(expansion.owner_url for expansion in instance.expansion_set.all()))
+        return compact({name.locale for name in instance.names.all()})
 
     @staticmethod
     def prepare_extras(instance):
@@ -158,37 +136,76 @@ class ConceptDocument(Document):
 
     @staticmethod
     def prepare_name_types(instance):
-        return compact(set(instance.names.values_list('type', flat=True)))
+        return compact({name.type for name in instance.names.all()})
 
     @staticmethod
     def prepare_description_types(instance):
-        return compact(set(instance.descriptions.values_list('type', flat=True)))
+        return compact({description.type for description in instance.descriptions.all()})
+
+    def get_batch_prefetches(self):
+        return ['names', 'descriptions']
+
+    def prefetch_batch(self, instances):
+        super().prefetch_batch(instances)
+        batch_mapped_codes = self.get_batch_mapped_codes(instances)
+        for instance in instances:
+            instance.batch_mapped_codes = batch_mapped_codes[instance.id]
 
     def prepare(self, instance):
         data = super().prepare(instance)
 
-        same_as_mapped_codes, other_mapped_codes = self.get_mapped_codes(instance)
+        same_as_mapped_codes, other_mapped_codes = getattr(
+            instance, 'batch_mapped_codes', None) or self.get_mapped_codes(instance)
         data['same_as_map_codes'] = same_as_mapped_codes
         data['other_map_codes'] = other_mapped_codes
 
         name = instance.display_name or ''
         data['_name'] = name.lower()
         data['name'] = name.replace('-', '_')
-        data['synonyms'] = compact(set(instance.names.exclude(name=name).values_list('name', flat=True)))
+        data['synonyms'] = compact({_name.name for _name in instance.names.all() if _name.name != name})
 
         return data
 
     @staticmethod
-    def get_mapped_codes(instance):
+    def add_mapped_code(mapped_codes, map_type, to_concept_code):
+        same_as_mapped_codes, other_mapped_codes = mapped_codes
+        if to_concept_code and map_type:
+            if map_type.lower().startswith('same'):
+                same_as_mapped_codes.append(to_concept_code)
+            else:
+                other_mapped_codes.append(to_concept_code)
+
+    @classmethod
+    def get_mapped_codes(cls, instance):
         mappings = instance.get_unidirectional_mappings()
-        same_as_mapped_codes = []
-        other_mapped_codes = []
+        mapped_codes = [], []
         for value in mappings.values('map_type', 'to_concept_code'):
-            to_concept_code = value['to_concept_code']
-            map_type = value['map_type']
-            if to_concept_code and map_type:
-                if map_type.lower().startswith('same'):
-                    same_as_mapped_codes.append(to_concept_code)
-                else:
-                    other_mapped_codes.append(to_concept_code)
-        return same_as_mapped_codes, other_mapped_codes
+            cls.add_mapped_code(mapped_codes, value['map_type'], value['to_concept_code'])
+        return mapped_codes
+
+    @classmethod
+    def get_batch_mapped_codes(cls, instances):
+        """Same as get_mapped_codes (unidirectional mappings of the concept, its head and latest version) in 2 queries"""
+        from core.mappings.models import Mapping
+        latest_version_ids = dict(Concept.objects.filter(
+            versioned_object_id__in={instance.versioned_object_id for instance in instances},
+            is_latest_version=True, is_active=True
+        ).exclude(id=F('versioned_object_id')).order_by('versioned_object_id', '-created_at').distinct(
+            'versioned_object_id').values_list('versioned_object_id', 'id'))
+
+        instance_ids = {}
+        for instance in instances:
+            for concept_id in set(compact([
+                    instance.id, instance.versioned_object_id, latest_version_ids.get(instance.versioned_object_id)
+            ])):
+                instance_ids.setdefault((instance.parent_id, concept_id), []).append(instance.id)
+
+        batch_mapped_codes = {instance.id: ([], []) for instance in instances}
+        mappings = Mapping.objects.filter(
+            parent_id__in={instance.parent_id for instance in instances},
+            from_concept_id__in={concept_id for _, concept_id in instance_ids}, id=F('versioned_object_id')
+        ).values_list('parent_id', 'from_concept_id', 'map_type', 'to_concept_code')
+        for parent_id, from_concept_id, map_type, to_concept_code in mappings:
+            for instance_id in instance_ids.get((parent_id, from_concept_id), []):
+                cls.add_mapped_code(batch_mapped_codes[instance_id], map_type, to_concept_code)
+        return batch_mapped_codes
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.4 on 2026-10-18 21:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('concepts', '0075_remove_concept_repo_version_concepts_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='concept',
+            name='_display_locale',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='concept',
+            name='_display_name',
+            field=models.TextField(blank=True, null=True),
+        ),
+    ]
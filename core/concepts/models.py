@@ -1,9 +1,14 @@
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
 from django.conf import settings
 from django.contrib.postgres.indexes import HashIndex
 from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator
-from django.db import models, IntegrityError
-from django.db.models import F, Q
+from django.db import models, IntegrityError, connection
+from django.db.models import F, Q, Value, Case, When
+from django.db.models.expressions import RawSQL
 from pydash import get, compact
 
 from core.common.checksums import ChecksumModel
@@ -13,7 +18,7 @@ from core.common.models import VersionedModel, ConceptContainerModel
 from core.common.tasks import process_hierarchy_for_new_concept, process_hierarchy_for_concept_version, \
     process_hierarchy_for_new_parent_concept_version, update_mappings_concept
 from core.common.utils import generate_temp_version, drop_version, \
-    encode_string, decode_string, startswith_temp_version, is_versioned_uri
+    encode_string, decode_string, startswith_temp_version, is_versioned_uri, keyset_batches
 from core.concepts.constants import CONCEPT_TYPE, LOCALES_FULLY_SPECIFIED, LOCALES_SHORT, LOCALES_SEARCH_INDEX_TERM, \
     CONCEPT_WAS_RETIRED, CONCEPT_IS_ALREADY_RETIRED, CONCEPT_IS_ALREADY_NOT_RETIRED, CONCEPT_WAS_UNRETIRED, \
     ALREADY_EXISTS, CONCEPT_REGEX, MAX_LOCALES_LIMIT, \
@@ -67,6 +72,15 @@ class AbstractLocalizedText(ChecksumModel):
             return [cls._build(param) for param in params]
         return cls._build(params)
 
+    @classmethod
+    def get_checksum_fields_for_concepts(cls, concept_ids):
+        """Returns CHECKSUM_INCLUSIONS of each locale of concept_ids, grouped by concept id, with one query"""
+        locales = defaultdict(list)
+        for locale in cls.objects.filter(concept_id__in=concept_ids).only(
+                'concept_id', 'name', 'type', 'locale', 'locale_preferred'):
+            locales[locale.concept_id].append({field: getattr(locale, field) for field in cls.CHECKSUM_INCLUSIONS})
+        return locales
+
     @property
     def is_fully_specified(self):
         return self.is_fully_specified_type(self.type)
@@ -227,6 +241,8 @@ class Concept(ConceptValidationMixin, SourceChildMixin, VersionedModel):  # pyli
     )
     _counted = models.BooleanField(default=True, null=True, blank=True)
     _index = models.BooleanField(default=True)
+    _display_name = models.TextField(null=True, blank=True)
+    _display_locale = models.TextField(null=True, blank=True)
     logo_path = None
     name = None
     full_name = None
@@ -245,6 +261,8 @@ class Concept(ConceptValidationMixin, SourceChildMixin, VersionedModel):  # pyli
         'extras', 'concept_class', 'datatype', 'retired'
     ]
 
+    CASCADE_FIELDS = ['id', 'versioned_object_id', 'parent_id', 'is_latest_version']  # what $cascade needs per concept
+
     # $cascade as hierarchy attributes
     cascaded_entries = None
     terminal = None
@@ -330,6 +348,64 @@ class Concept(ConceptValidationMixin, SourceChildMixin, VersionedModel):  # pyli
             ),
         }
 
+    @classmethod
+    def get_checksum_rows(cls, ids):
+        concepts = list(Concept.objects.filter(id__in=ids).values(
+            'id', 'checksums', 'concept_class', 'datatype', 'retired', 'external_id', 'extras', 'is_latest_version',
+            'versioned_object_id'
+        ))
+        latest_versions = {
+            version['versioned_object_id']: version for version in Concept.objects.filter(
+                versioned_object_id__in=[concept['id'] for concept in concepts], is_active=True, is_latest_version=True
+            ).exclude(id=F('versioned_object_id')).order_by('created_at').values('id', 'versioned_object_id')
+        }  # newest wins, same as get_latest_version
+        hierarchy_urls = cls.get_batch_hierarchy_concept_urls(concepts, latest_versions)
+        names = ConceptName.get_checksum_fields_for_concepts(ids)
+        descriptions = ConceptDescription.get_checksum_fields_for_concepts(ids)
+
+        return [
+            {
+                **concept,
+                'names': names[concept['id']],
+                'descriptions': descriptions[concept['id']],
+                'parent_concept_urls': hierarchy_urls[concept['id']][0],
+                'child_concept_urls': hierarchy_urls[concept['id']][1],
+            } for concept in concepts
+        ]
+
+    @staticmethod
+    def get_batch_hierarchy_concept_urls(concepts, latest_versions):
+        """
+        Same as parent_concept_urls/child_concept_urls for each of concepts (dicts with id, is_latest_version and
+        versioned_object_id), with two queries. latest_versions maps versioned object id to its latest version dict.
+        """
+        related_ids = {}
+        for concept in concepts:
+            ids = [concept['id']]
+            if concept['is_latest_version']:
+                ids.append(concept['versioned_object_id'])
+            if concept['id'] == concept['versioned_object_id'] and concept['id'] in latest_versions:
+                ids.append(latest_versions[concept['id']]['id'])
+            related_ids[concept['id']] = ids
+        all_ids = {_id for ids in related_ids.values() for _id in ids}
+
+        parent_uris = defaultdict(list)
+        for child_id, uri in HierarchicalConcepts.objects.filter(
+                child_id__in=all_ids).values_list('child_id', 'parent__uri'):
+            parent_uris[child_id].append(uri)
+        child_uris = defaultdict(list)
+        for parent_id, uri in HierarchicalConcepts.objects.filter(
+                parent_id__in=all_ids).values_list('parent_id', 'child__uri'):
+            child_uris[parent_id].append(uri)
+
+        def to_urls(uris, ids):
+            return list({drop_version(uri) for _id in ids for uri in uris[_id]})
+
+        return {
+            concept_id: (to_urls(parent_uris, ids), to_urls(child_uris, ids))
+            for concept_id, ids in related_ids.items()
+        }
+
     @staticmethod
     def get_search_document():
         from core.concepts.documents import ConceptDocument
@@ -349,12 +425,86 @@ class Concept(ConceptValidationMixin, SourceChildMixin, VersionedModel):  # pyli
 
     @property
     def display_name(self):
+        if self._display_name is not None:
+            return self._display_name
         return get(self.preferred_locale, 'name')
 
     @property
     def display_locale(self):
+        if self._display_name is not None:
+            return self._display_locale
         return get(self.preferred_locale, 'locale')
 
+    @staticmethod
+    def get_preferred_name(names, parent_default_locale, parent_supported_locales):
+        """Same lookups as preferred_locale, over already fetched name rows (in id order)"""
+        def is_eligible(name, filters):
+            for key, value in filters.items():
+                if key == 'locale__in':
+                    if name['locale'] not in (value or []):
+                        return False
+                elif get(name, key) != value:
+                    return False
+            return True
+
+        def first(filters):
+            return get(sorted(
+                [name for name in names if is_eligible(name, filters)],
+                key=lambda name: name['created_at'], reverse=True
+            ), '0')
+
+        return first({'locale': parent_default_locale, 'locale_preferred': True}) or \
+            first({'locale': parent_default_locale}) or \
+            first({'locale__in': parent_supported_locales, 'locale_preferred': True}) or \
+            first({'locale__in': parent_supported_locales}) or \
+            first({'locale': settings.DEFAULT_LOCALE, 'locale_preferred': True}) or \
+            first({'locale': settings.DEFAULT_LOCALE}) or first({'locale_preferred': True}) or first({})
+
+    @staticmethod
+    def get_batch_names(concept_ids):
+        names = defaultdict(list)
+        for name in ConceptName.objects.filter(concept_id__in=concept_ids).order_by('id').values(
+                'concept_id', 'name', 'type', 'locale', 'locale_preferred', 'created_at'):
+            names[name['concept_id']].append(name)
+        return names
+
+    def set_display_name(self):
+        """Materializes display name/locale, resolved from the names and the parent's locales"""
+        if not self.id:
+            return
+        preferred_name = self.get_preferred_name(
+            self.get_batch_names([self.id])[self.id], self.parent.default_locale, self.parent.supported_locales)
+        self._display_name = get(preferred_name, 'name')
+        self._display_locale = get(preferred_name, 'locale')
+        Concept.objects.filter(id=self.id).update(
+            _display_name=self._display_name, _display_locale=self._display_locale)
+
+    @classmethod
+    def set_display_names_in_batches(cls, queryset, recalculate=True, batch_size=None):
+        """
+        Materializes display name/locale of concept versions in queryset (only the ones missing it unless recalculate),
+        batch_size at a time, with a fixed number of queries per batch. Returns number of updates.
+        """
+        if not recalculate:
+            queryset = queryset.filter(_display_name__isnull=True)
+
+        updated = 0
+        for ids in keyset_batches(queryset, 'id', batch_size or settings.DISPLAY_NAME_BATCH_SIZE):
+            names = cls.get_batch_names(ids)
+            concepts = []
+            for concept in cls.objects.filter(id__in=ids).values(
+                    'id', 'parent__default_locale', 'parent__supported_locales'):
+                preferred_name = cls.get_preferred_name(
+                    names[concept['id']], concept['parent__default_locale'], concept['parent__supported_locales'])
+                concepts.append(cls(
+                    id=concept['id'], _display_name=get(preferred_name, 'name'),
+                    _display_locale=get(preferred_name, 'locale')
+                ))
+            cls.objects.bulk_update(concepts, ['_display_name', '_display_locale'])
+            updated += len(concepts)
+
+        return updated
+
     @property
     def preferred_locale(self):
         try:
@@ -673,8 +823,11 @@ class Concept(ConceptValidationMixin, SourceChildMixin, VersionedModel):  # pyli
                     else self.parent.concept_description_external_id_next
             new_locale.save()
             new_locale.set_checksums()
+        if is_name:
+            self.set_display_name()
 
     def remove_locales(self):
+        self._display_name = self._display_locale = None
         self.names.all().delete()
         self.descriptions.all().delete()
 
@@ -968,10 +1121,7 @@ class Concept(ConceptValidationMixin, SourceChildMixin, VersionedModel):  # pyli
         return queryset.filter(**filters)
 
     def child_concept_queryset(self):
-        urls = self.child_concept_urls
-        if urls:
-            return Concept.objects.filter(uri__in=urls)
-        return Concept.objects.none()
+        return self.get_descendants(depth=1)
 
     @property
     def children_concepts_count(self):
@@ -993,10 +1143,50 @@ class Concept(ConceptValidationMixin, SourceChildMixin, VersionedModel):  # pyli
         return len(self.parent_concept_urls)
 
     def parent_concept_queryset(self):
-        urls = self.parent_concept_urls
-        if urls:
-            return Concept.objects.filter(uri__in=urls)
-        return Concept.objects.none()
+        return self.get_ancestors(depth=1)
+
+    def get_descendants(self, depth=None):
+        return self.get_transitive_hierarchy_queryset('parent', 'child', depth)
+
+    def get_ancestors(self, depth=None):
+        return self.get_transitive_hierarchy_queryset('child', 'parent', depth)
+
+    def get_transitive_hierarchy_queryset(self, near, far, depth=None):
+        """
+        Versioned objects reachable from self by walking HierarchicalConcepts from `near` to `far` side, upto `depth`
+        levels (all levels if not given), resolved with one recursive query.
+        First level follows the same rows as get_hierarchy_concept_urls, next levels follow the versioned object and
+        its latest version of every reached concept.
+        """
+        depth_column = ', depth' if depth else ''
+        sql = f"""
+            WITH RECURSIVE hierarchy(id{depth_column}) AS (
+                SELECT far.versioned_object_id{', 1' if depth else ''}
+                FROM concepts_hierarchicalconcepts h
+                INNER JOIN concepts near ON near.id = h.{near}_id
+                INNER JOIN concepts far ON far.id = h.{far}_id
+                WHERE near.id = ANY(%s) OR (
+                    near.versioned_object_id = %s AND near.is_latest_version AND near.is_active
+                    AND near.id <> near.versioned_object_id
+                )
+              UNION
+                SELECT far.versioned_object_id{', hierarchy.depth + 1' if depth else ''}
+                FROM hierarchy
+                INNER JOIN concepts near ON near.versioned_object_id = hierarchy.id AND (
+                    near.id = near.versioned_object_id OR (near.is_latest_version AND near.is_active)
+                )
+                INNER JOIN concepts_hierarchicalconcepts h ON h.{near}_id = near.id
+                INNER JOIN concepts far ON far.id = h.{far}_id
+                {f'WHERE hierarchy.depth < {int(depth)}' if depth else ''}
+            )
+            SELECT id FROM hierarchy WHERE id <> %s
+        """
+        related_ids = [self.id]
+        if self.is_latest_version:
+            related_ids.append(self.versioned_object_id)
+
+        return Concept.objects.filter(id__in=RawSQL(
+            sql, [related_ids, self.id if self.is_versioned_object else None, self.versioned_object_id]))
 
     @staticmethod
     def __format_hierarchy_uris(uris):
@@ -1007,14 +1197,29 @@ class Concept(ConceptValidationMixin, SourceChildMixin, VersionedModel):  # pyli
         return list({uri for uri in uris if is_versioned_uri(uri)})
 
     def get_hierarchy_path(self):
-        result = []
-        parent_concept = self.parent_concepts.first()
-        while parent_concept is not None:
-            result.append(drop_version(parent_concept.uri))
-            parent_concept = parent_concept.parent_concepts.first()
-
-        result.reverse()
-        return result
+        """Uris from root to the first (lowest id) parent of self, following first parents, with one recursive query"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                WITH RECURSIVE path(id, uri, depth, visited) AS (
+                    SELECT concepts.id, concepts.uri, 1, ARRAY[%s, concepts.id]
+                    FROM concepts WHERE concepts.id = (
+                        SELECT parent_id FROM concepts_hierarchicalconcepts
+                        WHERE child_id = %s ORDER BY parent_id LIMIT 1
+                    )
+                  UNION ALL
+                    SELECT concepts.id, concepts.uri, path.depth + 1, path.visited || concepts.id
+                    FROM path INNER JOIN concepts ON concepts.id = (
+                        SELECT parent_id FROM concepts_hierarchicalconcepts
+                        WHERE child_id = path.id ORDER BY parent_id LIMIT 1
+                    )
+                    WHERE NOT concepts.id = ANY(path.visited)
+                )
+                SELECT uri FROM path ORDER BY depth DESC
+                """,
+                [self.id, self.id]
+            )
+            return [drop_version(uri) for uri, in cursor.fetchall()]
 
     @staticmethod
     def __get_omit_from_version(omit_if_exists_in):
@@ -1066,6 +1271,15 @@ class Concept(ConceptValidationMixin, SourceChildMixin, VersionedModel):  # pyli
 
         return criteria
 
+    @staticmethod
+    def get_criteria_flag(criteria):
+        """Expression which is True for rows matching criteria (Q, empty Q matches all, False matches none)"""
+        if criteria is False:
+            return Value(False)
+        if not criteria:
+            return Value(True)
+        return Case(When(criteria, then=Value(True)), default=Value(False), output_field=models.BooleanField())
+
     @staticmethod
     def _get_equivalency_map_types_criteria(equivalency_map_types):
         criteria = Q()
@@ -1110,40 +1324,130 @@ class Concept(ConceptValidationMixin, SourceChildMixin, VersionedModel):  # pyli
             from core.collections.models import Collection
             is_collection = repo_version.__class__ == Collection
 
-        cascaded = []
+        concepts = {self.id: {field: getattr(self, field) for field in self.CASCADE_FIELDS}}
+        mapping_ids = set()
+        cascaded = set()  # versioned object ids
+        level = cascade_levels
+        while level == ALL or level > 0:
+            if cascaded and max_results is not None and len(concepts) + len(mapping_ids) >= max_results:
+                break
+            frontier = [concept for concept in concepts.values() if concept['versioned_object_id'] not in cascaded]
+            if not frontier:
+                break
+            new_concepts, new_mapping_ids = self.get_cascaded_resources_for_frontier(
+                frontier, repo_version=repo_version, is_collection=is_collection, reverse=reverse,
+                source_mappings=source_mappings, source_to_concepts=source_to_concepts,
+                mappings_criteria=mappings_criteria, cascade_mappings=cascade_mappings,
+                cascade_hierarchy=cascade_hierarchy, include_retired=include_retired,
+                return_map_types_criteria=return_map_types_criteria,
+                omit_concepts_criteria=omit_concepts_criteria, omit_mappings_criteria=omit_mappings_criteria
+            )
+            cascaded.update(concept['versioned_object_id'] for concept in frontier)
+            concepts.update(new_concepts)
+            mapping_ids.update(new_mapping_ids)
+            level = level if level == ALL else level - 1
 
-        def iterate(level):
-            if level == ALL or level > 0:
-                if not cascaded or max_results is None or (
-                        result['concepts'].count() + result['mappings'].count()) < max_results:
-                    not_cascaded = result['concepts'].exclude(
-                        versioned_object_id__in=cascaded) if cascaded else result['concepts']
-                    if not_cascaded.exists():
-                        for concept in not_cascaded:
-                            res = concept.get_cascaded_resources(
-                                repo_version=repo_version,
-                                source_mappings=source_mappings, source_to_concepts=source_to_concepts,
-                                mappings_criteria=mappings_criteria, cascade_mappings=cascade_mappings,
-                                cascade_hierarchy=cascade_hierarchy,
-                                include_retired=include_retired, reverse=reverse, is_collection=is_collection,
-                                return_map_types_criteria=return_map_types_criteria
-                            )
-                            cascaded.append(concept.versioned_object_id)
-
-                            concepts_qs = res['concepts'].union(res['hierarchy_concepts']).union(result['concepts'])
-                            result['concepts'] = Concept.objects.filter(
-                                id__in=list(concepts_qs.values_list('id', flat=True))
-                            ).exclude(omit_concepts_criteria)
-
-                            mappings_qs = res['mappings'].union(result['mappings'])
-                            result['mappings'] = Mapping.objects.filter(
-                                id__in=list(mappings_qs.values_list('id', flat=True))
-                            ).exclude(omit_mappings_criteria).order_by('map_type', 'sort_weight')
-
-                        iterate(level if level == ALL else level - 1)
+        return {
+            'concepts': Concept.objects.filter(id__in=concepts.keys()),
+            'mappings': Mapping.objects.filter(id__in=mapping_ids).order_by('map_type', 'sort_weight')
+        }
 
-        iterate(cascade_levels)
-        return result
+    @staticmethod
+    def get_cascaded_resources_for_frontier(  # pylint: disable=too-many-arguments,too-many-locals,too-many-branches
+            frontier, repo_version, is_collection=False, reverse=False, source_mappings=True,
+            source_to_concepts=True, mappings_criteria=None, cascade_mappings=True, cascade_hierarchy=True,
+            include_retired=False, return_map_types_criteria=None, omit_concepts_criteria=None,
+            omit_mappings_criteria=None
+    ):
+        """
+        Same resources as get_cascaded_resources (without self) of every concept in frontier (dicts of CASCADE_FIELDS)
+        put together, with at most three queries: mappings, hierarchy uris and concepts.
+        Returns cascaded concepts (as id -> dict of CASCADE_FIELDS) and ids of cascaded mappings (minus omitted).
+        """
+        repo = get(repo_version, 'expansion') if is_collection else repo_version
+        if not repo:
+            return {}, set()
+        is_head = not is_collection and repo_version.is_head
+        concept_field, cascaded_field = ('to_concept', 'from_concept') if reverse else ('from_concept', 'to_concept')
+        parent_ids = {
+            concept[field]: concept['parent_id'] for concept in frontier for field in ['id', 'versioned_object_id']
+        }
+
+        mapping_ids = set()
+        mapped_concept_ids = set()  # ids when reverse, else versioned object ids
+        if cascade_mappings and (source_mappings or source_to_concepts):
+            mappings = repo.mappings.filter(**{f'{concept_field}_id__in': parent_ids.keys()})
+            if is_head:
+                mappings = mappings.filter(id=F('versioned_object_id'))
+            if not include_retired:
+                mappings = mappings.filter(retired=False)
+            returned_criteria = return_map_types_criteria
+            if returned_criteria is not False and omit_mappings_criteria:
+                returned_criteria = (returned_criteria or Q()) & ~Q(omit_mappings_criteria)
+            mappings = mappings.annotate(
+                _returned=Concept.get_criteria_flag(returned_criteria),
+                _cascaded=Concept.get_criteria_flag(mappings_criteria)
+            ).values(
+                'id', '_returned', '_cascaded', f'{concept_field}_id', f'{cascaded_field}_id',
+                f'{cascaded_field}__parent_id', f'{cascaded_field}__versioned_object_id'
+            )
+            for mapping in mappings:
+                if mapping['_returned']:
+                    mapping_ids.add(mapping['id'])
+                if source_to_concepts and mapping['_cascaded'] and mapping[f'{cascaded_field}_id'] and (
+                        is_collection or
+                        mapping[f'{cascaded_field}__parent_id'] == parent_ids[mapping[f'{concept_field}_id']]
+                ):
+                    mapped_concept_ids.add(
+                        mapping[f'{cascaded_field}_id'] if reverse else
+                        mapping[f'{cascaded_field}__versioned_object_id']
+                    )
+
+        criteria = []
+        if source_to_concepts and cascade_hierarchy:
+            uris = Concept.get_hierarchy_concept_urls_for_frontier(
+                frontier, 'parent_concepts' if reverse else 'child_concepts', not repo_version.is_head)
+            if uris:
+                hierarchy_concepts = Concept.objects.filter(uri__in=uris).filter(
+                    **({'expansion_set__collection_version': repo_version} if is_collection else
+                       {'sources': repo_version}))
+                criteria.append(Q(id__in=hierarchy_concepts.values('id')))
+        if mapped_concept_ids:
+            mapped_concepts = repo.concepts.filter(versioned_object_id__in=mapped_concept_ids)
+            if is_head:
+                mapped_concepts = mapped_concepts.filter(id=F('versioned_object_id'))
+            criteria.append(Q(id__in=mapped_concepts.values('id')))
+        if not criteria:
+            return {}, mapping_ids
+
+        concepts = Concept.objects.filter(reduce(or_, criteria))
+        if not include_retired:
+            concepts = concepts.filter(retired=False)
+        if omit_concepts_criteria:
+            concepts = concepts.exclude(omit_concepts_criteria)
+
+        return {concept['id']: concept for concept in concepts.values(*Concept.CASCADE_FIELDS)}, mapping_ids
+
+    @staticmethod
+    def get_hierarchy_concept_urls_for_frontier(frontier, relation, versioned=False):
+        """get_hierarchy_concept_urls of all concepts in frontier (dicts of CASCADE_FIELDS) together, in one query"""
+        field, uri_field = ('child', 'parent__uri') if relation == 'parent_concepts' else ('parent', 'child__uri')
+        criteria = Q(**{f'{field}_id__in': {
+            _id for concept in frontier for _id in [
+                concept['id'], concept['versioned_object_id'] if concept['is_latest_version'] else None
+            ] if _id
+        }})
+        versioned_object_ids = [
+            concept['id'] for concept in frontier if concept['id'] == concept['versioned_object_id']]
+        if versioned_object_ids:  # and their latest versions
+            criteria |= Q(**{
+                f'{field}__versioned_object_id__in': versioned_object_ids,
+                f'{field}__is_latest_version': True, f'{field}__is_active': True
+            }) & ~Q(**{f'{field}_id': F(f'{field}__versioned_object_id')})
+        uris = HierarchicalConcepts.objects.filter(criteria).values_list(uri_field, flat=True)
+        if versioned:
+            return Concept.__format_hierarchy_versioned_uris(uris)
+        return Concept.__format_hierarchy_uris(uris)
 
     def cascade_as_hierarchy(  # pylint: disable=too-many-arguments,too-many-locals,unused-argument
             self, repo_version=None, source_mappings=True, source_to_concepts=True,
@@ -1,3 +1,6 @@
+from collections import defaultdict
+
+from django.db.models import F
 from pydash import get
 from rest_framework.fields import CharField, DateTimeField, BooleanField, URLField, JSONField, SerializerMethodField, \
     UUIDField, ListField, IntegerField, ReadOnlyField
@@ -6,11 +9,15 @@ from rest_framework.serializers import ModelSerializer
 from core.common.constants import INCLUDE_INVERSE_MAPPINGS_PARAM, INCLUDE_MAPPINGS_PARAM, INCLUDE_EXTRAS_PARAM, \
     INCLUDE_PARENT_CONCEPTS, INCLUDE_CHILD_CONCEPTS, INCLUDE_SOURCE_VERSIONS, INCLUDE_COLLECTION_VERSIONS, \
     CREATE_PARENT_VERSION_QUERY_PARAM, INCLUDE_HIERARCHY_PATH, INCLUDE_PARENT_CONCEPT_URLS, \
-    INCLUDE_CHILD_CONCEPT_URLS, HEAD, INCLUDE_SUMMARY, INCLUDE_VERBOSE_REFERENCES, VERBOSE_PARAM
+    INCLUDE_CHILD_CONCEPT_URLS, HEAD, INCLUDE_SUMMARY, INCLUDE_VERBOSE_REFERENCES, VERBOSE_PARAM, ISO_639_1
 from core.common.fields import EncodedDecodedCharField
-from core.common.serializers import AbstractResourceSerializer
-from core.common.utils import to_parent_uri_from_kwargs, get_truthy_values
-from core.concepts.models import Concept, ConceptName
+from core.common.serializers import AbstractResourceSerializer, ExportBatchListSerializer, \
+    RepresentationCacheListSerializer, RepresentationCacheMixin
+from core.common.utils import to_parent_uri_from_kwargs, get_truthy_values, drop_version, to_owner_uri
+from core.concepts.models import Concept, ConceptName, ConceptDescription
+from core.orgs.constants import ORG_OBJECT_TYPE
+from core.toggles.models import Toggle
+from core.users.constants import USER_OBJECT_TYPE
 
 
 TRUTHY = get_truthy_values()
@@ -255,7 +262,7 @@ class ConceptLookupListSerializer(ModelSerializer):
         super().__init__(*args, **kwargs)
 
 
-class ConceptListSerializer(ConceptAbstractSerializer):
+class ConceptListSerializer(RepresentationCacheMixin, ConceptAbstractSerializer):
     type = CharField(source='resource_type', read_only=True)
     id = EncodedDecodedCharField(source='mnemonic')
     source = CharField(source='parent_resource')
@@ -272,6 +279,7 @@ class ConceptListSerializer(ConceptAbstractSerializer):
 
     class Meta:
         model = Concept
+        list_serializer_class = RepresentationCacheListSerializer
         fields = ConceptAbstractSerializer.Meta.fields + (
             'uuid', 'id', 'external_id', 'concept_class', 'datatype', 'url', 'retired', 'source',
             'owner', 'owner_type', 'owner_url', 'display_name', 'display_locale', 'version', 'update_comment',
@@ -288,6 +296,7 @@ class ConceptVersionListSerializer(ConceptListSerializer):
 
     class Meta:
         model = Concept
+        list_serializer_class = RepresentationCacheListSerializer
         fields = ConceptListSerializer.Meta.fields + (
             'previous_version_url', 'source_versions', 'collection_versions'
         )
@@ -312,6 +321,7 @@ class ConceptVersionListSerializer(ConceptListSerializer):
 class ConceptVersionCascadeSerializer(ConceptVersionListSerializer):
     class Meta:
         model = Concept
+        list_serializer_class = RepresentationCacheListSerializer
         fields = tuple(field for field in ConceptVersionListSerializer.Meta.fields if field not in ('uuid', ))
 
 
@@ -390,7 +400,7 @@ class ConceptMinimalSerializerRecursive(ConceptAbstractSerializer):
         return result
 
 
-class ConceptDetailSerializer(ConceptAbstractSerializer):
+class ConceptDetailSerializer(RepresentationCacheMixin, ConceptAbstractSerializer):
     version = CharField(read_only=True)
     type = CharField(source='versioned_resource_type', read_only=True)
     id = EncodedDecodedCharField(source='mnemonic', required=False)
@@ -419,6 +429,7 @@ class ConceptDetailSerializer(ConceptAbstractSerializer):
 
     class Meta:
         model = Concept
+        list_serializer_class = RepresentationCacheListSerializer
         fields = ConceptAbstractSerializer.Meta.fields + (
             'id', 'external_id', 'concept_class', 'datatype', 'url', 'retired', 'source',
             'owner', 'owner_type', 'owner_url', 'display_name', 'display_locale', 'names', 'descriptions',
@@ -484,7 +495,140 @@ class ConceptVersionExportSerializer(ModelSerializer):
         return obj.get_checksums()
 
 
-class ConceptVersionDetailSerializer(ModelSerializer):
+class ConceptVersionExportBatchSerializer(ConceptVersionExportSerializer):
+    """
+    Same representation as ConceptVersionExportSerializer, but a batch of concepts is serialized with a fixed number
+    of queries (names, descriptions, versions and hierarchy are fetched for the whole batch at once).
+    """
+
+    class Meta:
+        model = Concept
+        fields = ConceptVersionExportSerializer.Meta.fields
+        list_serializer_class = ExportBatchListSerializer
+
+    @staticmethod
+    def get_checksums(obj):
+        return obj['checksums']
+
+    @staticmethod
+    def get_owner(row, prefix='parent__'):
+        """(name, type) of the owner of the repo in row, same precedence as ConceptContainerModel.parent"""
+        if row[f'{prefix}user__username'] is not None:
+            return row[f'{prefix}user__username'], USER_OBJECT_TYPE
+        if row[f'{prefix}organization__mnemonic'] is not None:
+            return row[f'{prefix}organization__mnemonic'], ORG_OBJECT_TYPE
+        return None, None
+
+    @staticmethod
+    def get_batch_locales(locale_class, concept_ids, checksums_toggle):
+        locales = defaultdict(list)
+        missing_checksums = []
+        for locale in locale_class.objects.filter(concept_id__in=concept_ids).order_by('id'):
+            checksum = None
+            if checksums_toggle:
+                checksum = get(locale, f'checksums.{locale.STANDARD_CHECKSUM_KEY}')
+                if not checksum:
+                    checksum = locale.generate_checksum(locale.get_standard_checksum_fields())
+                    locale.checksums = {locale.STANDARD_CHECKSUM_KEY: checksum}
+                    missing_checksums.append(locale)
+            locales[locale.concept_id].append({
+                **{
+                    field: getattr(locale, field) for field in [
+                        'id', 'name', 'external_id', 'type', 'locale', 'locale_preferred', 'created_at',
+                        *locale_class.CHECKSUM_INCLUSIONS
+                    ]
+                },
+                'checksum': checksum
+            })
+        if missing_checksums:
+            locale_class.objects.bulk_update(missing_checksums, ['checksums'])
+        return locales
+
+    @classmethod
+    def get_batch_rows(cls, queryset):  # pylint: disable=too-many-locals
+        concepts = list(queryset.values(
+            'id', 'mnemonic', 'external_id', 'concept_class', 'datatype', 'extras', 'retired', 'version', 'uri',
+            'created_at', 'updated_at', 'comment', 'is_latest_version', 'versioned_object_id', 'checksums',
+            '_display_name', '_display_locale',
+            'parent__mnemonic', 'parent__uri', 'parent__default_locale', 'parent__supported_locales',
+            'parent__organization__mnemonic', 'parent__user__username', 'created_by__username', 'updated_by__username'
+        ))
+        if not concepts:
+            return []
+
+        concept_ids = [concept['id'] for concept in concepts]
+        checksums_toggle = Toggle.get('CHECKSUMS_TOGGLE')
+        names = cls.get_batch_locales(ConceptName, concept_ids, checksums_toggle)
+        descriptions = cls.get_batch_locales(ConceptDescription, concept_ids, checksums_toggle)
+
+        versions = defaultdict(list)
+        for version in Concept.objects.filter(
+                versioned_object_id__in={concept['versioned_object_id'] for concept in concepts}
+        ).exclude(id=F('versioned_object_id')).order_by('-created_at', 'id').values(
+            'id', 'versioned_object_id', 'uri', 'created_at', 'is_active', 'is_latest_version'
+        ):
+            versions[version['versioned_object_id']].append(version)
+        latest_versions = {}
+        for versioned_object_id, _versions in versions.items():
+            latest_version = get([v for v in _versions if v['is_active'] and v['is_latest_version']], '0')
+            if latest_version:
+                latest_versions[versioned_object_id] = latest_version
+        hierarchy_urls = Concept.get_batch_hierarchy_concept_urls(concepts, latest_versions)
+
+        rows = []
+        missing_checksums = []
+        for concept in concepts:
+            owner, owner_type = cls.get_owner(concept)
+            display_name, display_locale = concept.pop('_display_name'), concept.pop('_display_locale')
+            if display_name is None:
+                preferred_name = Concept.get_preferred_name(
+                    names[concept['id']], concept['parent__default_locale'], concept['parent__supported_locales'])
+                display_name, display_locale = get(preferred_name, 'name'), get(preferred_name, 'locale')
+            prev_version = get([
+                version for version in versions[concept['versioned_object_id']] if version['id'] != concept['id'] and
+                version['is_active'] and version['created_at'] <= concept['created_at']
+            ], '0')
+            row = {
+                **concept,
+                'resource_type': Concept.OBJECT_TYPE,
+                'names': names[concept['id']],
+                'descriptions': descriptions[concept['id']],
+                'display_name': display_name,
+                'display_locale': display_locale,
+                'parent_resource': concept['parent__mnemonic'],
+                'parent_url': concept['parent__uri'],
+                'owner_name': str(owner or ''),
+                'owner_type': owner_type,
+                'owner_url': to_owner_uri(concept['uri']),
+                'created_by': concept['created_by__username'],
+                'updated_by': concept['updated_by__username'],
+                'iso_639_1_locale': get([name for name in names[concept['id']] if name['type'] == ISO_639_1], '0.name'),
+                'versioned_object_url': drop_version(concept['uri']),
+                'prev_version_uri': get(prev_version, 'uri'),
+                'parent_concept_urls': hierarchy_urls[concept['id']][0],
+                'child_concept_urls': hierarchy_urls[concept['id']][1],
+            }
+            if concept['id'] != concept['versioned_object_id']:
+                row['version_url'] = concept['uri']
+            elif concept['id'] in latest_versions:
+                row['version_url'] = latest_versions[concept['id']]['uri']
+            if checksums_toggle:
+                if not concept['checksums'] or not all(
+                        key in concept['checksums'] for key in [
+                            Concept.STANDARD_CHECKSUM_KEY, Concept.SMART_CHECKSUM_KEY]):
+                    row['checksums'] = Concept.get_checksums_for_resource(row)
+                    missing_checksums.append(Concept(id=concept['id'], checksums=row['checksums']))
+            else:
+                row['checksums'] = None
+            rows.append(row)
+
+        if missing_checksums:
+            Concept.objects.bulk_update(missing_checksums, ['checksums'])
+
+        return rows
+
+
+class ConceptVersionDetailSerializer(RepresentationCacheMixin, ModelSerializer):
     type = CharField(source='resource_type')
     uuid = CharField(source='id')
     id = EncodedDecodedCharField(source='mnemonic')
@@ -548,6 +692,7 @@ class ConceptVersionDetailSerializer(ModelSerializer):
 
     class Meta:
         model = Concept
+        list_serializer_class = RepresentationCacheListSerializer
         fields = (
             'type', 'uuid', 'id', 'external_id', 'concept_class', 'datatype', 'display_name', 'display_locale',
             'names', 'descriptions', 'extras', 'retired', 'source', 'source_url', 'owner', 'owner_name', 'owner_url',
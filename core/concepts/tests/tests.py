@@ -1,11 +1,14 @@
-from unittest.mock import patch, ANY
+from unittest.mock import patch, ANY, Mock
 
 import factory
+from celery_once import AlreadyQueued
+from django.test import override_settings
 from pydash import omit
 
 from core.collections.models import CollectionReference
 from core.collections.tests.factories import OrganizationCollectionFactory, ExpansionFactory
 from core.common.constants import OPENMRS_VALIDATION_SCHEMA, HEAD, ACCESS_TYPE_EDIT, ACCESS_TYPE_VIEW
+from core.common.tasks import update_source_display_names
 from core.common.tests import OCLTestCase
 from core.concepts.constants import (
     OPENMRS_MUST_HAVE_EXACTLY_ONE_PREFERRED_NAME,
@@ -17,11 +20,13 @@ from core.concepts.constants import (
 from core.concepts.documents import ConceptDocument
 from core.concepts.models import Concept
 from core.concepts.serializers import ConceptListSerializer, ConceptVersionListSerializer, ConceptDetailSerializer, \
-    ConceptVersionDetailSerializer, ConceptMinimalSerializer
+    ConceptVersionDetailSerializer, ConceptMinimalSerializer, ConceptVersionExportSerializer, \
+    ConceptVersionExportBatchSerializer
 from core.concepts.tests.factories import ConceptNameFactory, ConceptFactory, ConceptDescriptionFactory
 from core.concepts.validators import ValidatorSpecifier
 from core.mappings.tests.factories import MappingFactory
-from core.sources.tests.factories import OrganizationSourceFactory
+from core.sources.models import Source
+from core.sources.tests.factories import OrganizationSourceFactory, UserSourceFactory
 
 
 class LocalizedTextTest(OCLTestCase):
@@ -107,6 +112,79 @@ class ConceptTest(OCLTestCase):
 
         self.assertEqual(concept.display_locale, preferred_locale.locale)
 
+    def test_materialized_display_name(self):
+        source = OrganizationSourceFactory(default_locale='en', supported_locales=['en', 'es'])
+        concept = Concept.persist_new({
+            **factory.build(dict, FACTORY_CLASS=ConceptFactory), 'mnemonic': 'c1', 'parent': source,
+            'names': [
+                ConceptNameFactory.build(locale='es', name='Spanish'),
+                ConceptNameFactory.build(locale='en', name='English'),
+            ]
+        })
+        self.assertEqual(concept.errors, {})
+        concept = Concept.objects.get(id=concept.id)
+        version = concept.get_latest_version()
+        self.assertEqual(
+            dict(Concept.objects.filter(versioned_object_id=concept.id).values_list('id', '_display_name')),
+            {concept.id: 'English', version.id: 'English'}
+        )
+
+        with patch.object(Concept, 'preferred_locale') as preferred_locale_mock:
+            self.assertEqual((concept.display_name, concept.display_locale), ('English', 'en'))
+            preferred_locale_mock.assert_not_called()
+
+        source.default_locale = 'es'
+        self.assertEqual(Source.persist_changes(source, None, None), {})
+        concept.refresh_from_db()
+        version.refresh_from_db()
+        self.assertEqual((concept.display_name, concept.display_locale), ('Spanish', 'es'))
+        self.assertEqual((version.display_name, version.display_locale), ('Spanish', 'es'))
+
+        new_version = version.clone()
+        new_version.cloned_names = [ConceptNameFactory.build(locale='es', name='Nuevo')]
+        self.assertEqual(new_version.save_as_new_version(source.created_by), {})
+        concept.refresh_from_db()
+        new_version.refresh_from_db()
+        self.assertEqual((concept.display_name, concept.display_locale), ('Nuevo', 'es'))
+        self.assertEqual((new_version.display_name, new_version.display_locale), ('Nuevo', 'es'))
+
+    @override_settings(TEST_MODE=False)
+    @patch('core.common.models.RedisService')
+    @patch('core.common.models.update_source_display_names')
+    def test_persist_changes_when_display_names_update_already_queued(self, task_mock, redis_service_mock):
+        task_mock.delay.side_effect = AlreadyQueued(60)
+        source = OrganizationSourceFactory(default_locale='en', supported_locales=['en', 'es'])
+        source.default_locale = 'es'
+
+        self.assertEqual(Source.persist_changes(source, None, None), {})
+
+        task_mock.delay.assert_called_once_with(source.id)
+        redis_service_mock().set.assert_called_once_with(f'display_names:rerun:{source.id}', 1, ex=86400)
+
+    @patch('core.services.storages.redis.RedisService.get_client')
+    @patch('core.concepts.models.Concept.set_display_names_in_batches')
+    def test_update_source_display_names_reruns_when_requested(self, set_display_names_mock, get_client_mock):
+        source = OrganizationSourceFactory()
+        set_display_names_mock.return_value = 0
+        get_client_mock.return_value = Mock(exists=Mock(side_effect=[True, False]))
+
+        update_source_display_names(source.id)
+
+        self.assertEqual(set_display_names_mock.call_count, 2)
+        self.assertEqual(get_client_mock().delete.call_count, 2)
+        get_client_mock().delete.assert_called_with(f'display_names:rerun:{source.id}')
+
+    def test_set_display_names_in_batches(self):
+        concept = ConceptFactory(names=[ConceptNameFactory.build(locale='en', name='English')])
+        queryset = Concept.objects.filter(parent_id=concept.parent_id)
+        queryset.update(_display_name=None, _display_locale=None)
+
+        self.assertEqual(Concept.set_display_names_in_batches(queryset, False), 2)
+        self.assertEqual(Concept.set_display_names_in_batches(queryset, False), 0)
+        self.assertEqual(Concept.set_display_names_in_batches(queryset, batch_size=1), 2)
+        self.assertEqual(
+            list(queryset.values_list('_display_name', '_display_locale').distinct()), [('English', 'en')])
+
     def test_default_name_locales(self):
         es_locale = ConceptNameFactory.build(locale='es')
         en_locale = ConceptNameFactory.build(locale='en')
@@ -988,7 +1066,6 @@ class ConceptTest(OCLTestCase):
         )
 
     def test_custom_validation_schema(self):
-        from core.sources.models import Source
         self.assertEqual(
             Concept(parent=Source(custom_validation_schema='foobar')).custom_validation_schema,
             'foobar'
@@ -1148,6 +1225,88 @@ class ConceptTest(OCLTestCase):
         self.assertEqual(child_child_concept.parent_concept_urls, [child_concept.uri])
         self.assertEqual(child_child_concept.parent_concepts_count, 1)
 
+    def test_get_descendants_and_ancestors(self):
+        parent_concept = ConceptFactory()
+        child_concept = Concept.persist_new({
+            **factory.build(dict, FACTORY_CLASS=ConceptFactory), 'mnemonic': 'c1', 'parent': parent_concept.parent,
+            'names': [ConceptNameFactory.build(locale='en', name='English', locale_preferred=True)],
+            'parent_concept_urls': [parent_concept.uri]
+        })
+        child_child_concept = Concept.persist_new({
+            **factory.build(dict, FACTORY_CLASS=ConceptFactory), 'mnemonic': 'c2', 'parent': parent_concept.parent,
+            'names': [ConceptNameFactory.build(locale='en', name='English', locale_preferred=True)],
+            'parent_concept_urls': [child_concept.uri]
+        })
+
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                sorted(parent_concept.get_descendants().values_list('uri', flat=True)),
+                sorted([child_concept.uri, child_child_concept.uri])
+            )
+        self.assertEqual(
+            list(parent_concept.get_descendants(depth=1).values_list('uri', flat=True)), [child_concept.uri])
+        self.assertEqual(
+            list(child_child_concept.get_latest_version().get_descendants().values_list('uri', flat=True)), [])
+
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                sorted(child_child_concept.get_ancestors().values_list('uri', flat=True)),
+                sorted([parent_concept.uri, child_concept.uri])
+            )
+        self.assertEqual(
+            list(child_child_concept.get_latest_version().get_ancestors(depth=1).values_list('uri', flat=True)),
+            [child_concept.uri]
+        )
+        self.assertEqual(list(parent_concept.get_ancestors().values_list('uri', flat=True)), [])
+
+        with self.assertNumQueries(1):
+            self.assertEqual(child_child_concept.get_hierarchy_path(), [parent_concept.uri, child_concept.uri])
+
+    def test_search_document_prepare_batch(self):
+        def normalized(data):
+            return {key: sorted(value) if isinstance(value, list) else value for key, value in data.items()}
+
+        source = OrganizationSourceFactory()
+        concept1 = ConceptFactory(
+            parent=source, names=[
+                ConceptNameFactory.build(name='Foo-bar', locale='en', locale_preferred=True, type='FULLY_SPECIFIED'),
+                ConceptNameFactory.build(name='Foo fr', locale='fr', type='SHORT'),
+            ],
+            descriptions=[ConceptDescriptionFactory.build(locale='en', type='Definition')]
+        )
+        concept2 = ConceptFactory(parent=source, names=[ConceptNameFactory.build(name='Bar', locale='es')])
+        MappingFactory(
+            parent=source, from_concept=concept1, to_concept=concept2, to_concept_code=concept2.mnemonic,
+            map_type='SAME-AS')
+        MappingFactory(
+            parent=source, from_concept=concept1.get_latest_version(), to_concept_code='Q1', map_type='Q-AND-A')
+        source_version = OrganizationSourceFactory(
+            mnemonic=source.mnemonic, organization=source.organization, version='v1', released=True)
+        concept1.sources.add(source_version)
+        expansion = ExpansionFactory(collection_version=OrganizationCollectionFactory(version='v1'))
+        expansion.concepts.add(concept1, concept2)
+
+        concept_ids = [concept1.id, concept1.get_latest_version().id, concept2.id]
+        expected = {
+            concept.id: normalized(ConceptDocument().prepare(concept))
+            for concept in Concept.objects.filter(id__in=concept_ids)
+        }
+        self.assertEqual(expected[concept1.id]['same_as_map_codes'], [concept2.mnemonic])
+        self.assertEqual(expected[concept1.id]['other_map_codes'], ['Q1'])
+        self.assertEqual(expected[concept1.id]['synonyms'], ['Foo fr'])
+        self.assertEqual(expected[concept1.id]['is_in_latest_source_version'], True)
+        self.assertEqual(expected[concept1.id]['source_version'], sorted([HEAD, 'v1']))
+        self.assertEqual(expected[concept1.id]['collection_version'], ['v1'])
+
+        document = ConceptDocument()
+        concepts = list(Concept.objects.filter(id__in=concept_ids))
+        with self.assertNumQueries(11):
+            document.prefetch_batch(concepts)
+        with self.assertNumQueries(0):
+            prepared = {concept.id: normalized(document.prepare(concept)) for concept in concepts}
+
+        self.assertEqual(prepared, expected)
+
     def test_has_children(self):
         concept = ConceptFactory()
 
@@ -1340,6 +1499,42 @@ class ConceptTest(OCLTestCase):
             root.url
         )
 
+    def test_cascade(self):
+        source = OrganizationSourceFactory()
+        root = ConceptFactory(parent=source, mnemonic='root')
+        child1 = ConceptFactory(parent=source, mnemonic='child1')
+        child1.parent_concepts.add(root)
+        child2 = ConceptFactory(parent=source, mnemonic='child2')
+        child2.parent_concepts.add(root)
+        mapped1 = ConceptFactory(parent=source, mnemonic='mapped1')
+        mapped2 = ConceptFactory(parent=source, mnemonic='mapped2')
+        mapping1 = MappingFactory(parent=source, from_concept=child1, to_concept=mapped1, map_type='Q-AND-A')
+        mapping2 = MappingFactory(parent=source, from_concept=mapped1, to_concept=mapped2, map_type='SAME-AS')
+        with self.assertNumQueries(3 + 3 + 3 + 2):  # mappings, hierarchy uris, concepts per level, last one is empty
+            result = root.cascade(source)
+        self.assertEqual(
+            sorted(result['concepts'].values_list('mnemonic', flat=True)),
+            ['child1', 'child2', 'mapped1', 'mapped2', 'root']
+        )
+        self.assertEqual(list(result['mappings']), [mapping1, mapping2])
+
+        result = root.cascade(source, cascade_levels=2, return_map_types='SAME-AS')
+        self.assertEqual(
+            sorted(result['concepts'].values_list('mnemonic', flat=True)), ['child1', 'child2', 'mapped1', 'root'])
+        self.assertEqual(result['mappings'].count(), 0)
+
+        result = root.cascade(source, max_results=3)
+        self.assertEqual(result['concepts'].count(), 3)
+
+        result = root.cascade(source, map_types='SAME-AS')
+        self.assertEqual(sorted(result['concepts'].values_list('mnemonic', flat=True)), ['child1', 'child2', 'root'])
+        self.assertEqual(list(result['mappings']), [mapping1])  # returned, but not cascaded
+
+        result = mapped2.cascade(source, reverse=True)
+        self.assertEqual(
+            sorted(result['concepts'].values_list('mnemonic', flat=True)), ['child1', 'mapped1', 'mapped2', 'root'])
+        self.assertEqual(list(result['mappings']), [mapping1, mapping2])
+
     @patch('core.common.checksums.Checksum.generate')
     def test_checksum(self, checksum_generate_mock):
         checksum_generate_mock.side_effect = [
@@ -1375,6 +1570,65 @@ class ConceptTest(OCLTestCase):
         self.assertTrue(checksums['standard'] == concept.checksums['standard'] == concept.checksum)
         self.assertTrue(checksums['smart'] == concept.checksums['smart'])
 
+    def test_export_batch_serializer(self):
+        parent = OrganizationSourceFactory(default_locale='fr', supported_locales=['fr', 'en'])
+        root = ConceptFactory(parent=parent, names=[ConceptNameFactory.build(locale='en', locale_preferred=True)])
+        concept1 = ConceptFactory(parent=parent, names=[
+            ConceptNameFactory.build(locale='en', locale_preferred=True),
+            ConceptNameFactory.build(locale='fr', type='ISO 639-1')
+        ])
+        ConceptDescriptionFactory(concept=concept1, locale='en')
+        concept1.parent_concepts.add(root)
+        concept2 = ConceptFactory(parent=UserSourceFactory())
+        ConceptNameFactory(concept=concept2, locale='es', locale_preferred=True)
+        concept2_version = concept2.get_latest_version()
+        concept2.versions.update(is_latest_version=False)
+        queryset = Concept.objects.filter(id__in=[
+            root.id, concept1.id, concept1.get_latest_version().id, concept2.id, concept2_version.id
+        ]).order_by('-id')
+
+        data = ConceptVersionExportBatchSerializer(queryset, many=True).data
+
+        self.assertEqual(len(data), 5)
+        self.assertEqual(data, ConceptVersionExportSerializer(
+            queryset.prefetch_related('names', 'descriptions'), many=True).data)
+        self.assertNotIn('version_url', data[1])
+        self.assertEqual(data[1]['owner_type'], 'User')
+        self.assertEqual(data[3]['display_name'], concept1.names.get(locale='fr').name)
+        self.assertEqual(data[3]['locale'], concept1.names.get(locale='fr').name)
+        self.assertEqual(data[3]['parent_concept_urls'], [root.uri])
+        self.assertEqual(data[3]['checksums'], Concept.objects.get(id=concept1.id).checksums)
+
+        with self.assertNumQueries(7):
+            ConceptVersionExportBatchSerializer(queryset.all()[:2], many=True).data  # pylint: disable=expression-not-assigned
+        with self.assertNumQueries(7):
+            ConceptVersionExportBatchSerializer(queryset, many=True).data  # pylint: disable=expression-not-assigned
+
+    def test_set_checksums_in_batches(self):
+        parent = OrganizationSourceFactory()
+        root = ConceptFactory(parent=parent, names=[ConceptNameFactory.build(locale='en', locale_preferred=True)])
+        concept = ConceptFactory(parent=parent, names=[
+            ConceptNameFactory.build(locale='en', locale_preferred=True, type='FULLY_SPECIFIED'),
+            ConceptNameFactory.build(locale='fr', type='Short')
+        ], extras={'foo': 'bar'})
+        ConceptDescriptionFactory(concept=concept, locale='en')
+        concept.parent_concepts.add(root)
+        concepts = Concept.objects.filter(parent=parent)
+        self.assertEqual(concepts.count(), 4)
+        expected = {_concept.id: _concept.get_all_checksums() for _concept in concepts}
+        concepts.update(checksums={})
+
+        with self.assertNumQueries(1 + 3 + 7 * 2):  # toggle, ids of each batch (+1 empty), 7 per batch
+            self.assertEqual(Concept.set_checksums_in_batches(concepts, batch_size=2), 4)
+
+        self.assertEqual({_concept.id: _concept.checksums for _concept in concepts}, expected)
+        self.assertEqual(Concept.set_checksums_in_batches(concepts), 0)
+        self.assertEqual(Concept.set_checksums_in_batches(concepts, recalculate=True), 4)
+
+        concepts.filter(id=root.id).update(checksums=None)
+        self.assertEqual(Concept.set_checksums_in_batches(concepts), 1)
+        self.assertEqual(Concept.objects.get(id=root.id).checksums, expected[root.id])
+
 
 class OpenMRSConceptValidatorTest(OCLTestCase):
     def setUp(self):
@@ -15,16 +15,16 @@ from core.bundles.models import Bundle
 from core.bundles.serializers import BundleSerializer
 from core.collections.documents import CollectionDocument
 from core.common.constants import (
-    HEAD, INCLUDE_INVERSE_MAPPINGS_PARAM, INCLUDE_RETIRED_PARAM, ACCESS_TYPE_NONE)
+    HEAD, INCLUDE_INVERSE_MAPPINGS_PARAM, INCLUDE_RETIRED_PARAM, ACCESS_TYPE_NONE, HIERARCHY_DEPTH_PARAM, ALL)
 from core.common.exceptions import Http400, Http403
 from core.common.mixins import ListWithHeadersMixin, ConceptDictionaryMixin
 from core.common.swagger_parameters import (
-    q_param, limit_param, sort_desc_param, page_param, sort_asc_param, verbose_param,
+    q_param, limit_param, sort_desc_param, page_param, cursor_param, sort_asc_param, verbose_param,
     include_facets_header, updated_since_param, include_inverse_mappings_param, include_retired_param,
     compress_header, include_source_versions_param, include_collection_versions_param, cascade_method_param,
     cascade_map_types_param, cascade_exclude_map_types_param, cascade_hierarchy_param, cascade_mappings_param,
     cascade_levels_param, cascade_direction_param, cascade_view_hierarchy, return_map_types_param,
-    omit_if_exists_in_param, equivalency_map_types_param, search_from_latest_repo_header)
+    omit_if_exists_in_param, equivalency_map_types_param, search_from_latest_repo_header, hierarchy_depth_param)
 from core.common.tasks import delete_concept, make_hierarchy
 from core.common.utils import to_parent_uri_from_kwargs, generate_temp_version, get_truthy_values
 from core.common.views import SourceChildCommonBaseView, SourceChildExtrasView, \
@@ -78,6 +78,18 @@ class ConceptBaseView(SourceChildCommonBaseView):
             parent_resource = Collection.get_version(collection, container_version or HEAD, filters)
         self.kwargs['parent_resource'] = self.parent_resource = parent_resource
 
+    def get_hierarchy_depth(self):
+        depth = self.request.query_params.get(HIERARCHY_DEPTH_PARAM) or 1
+        if depth == ALL:
+            return None
+        try:
+            depth = int(depth)
+        except ValueError as ex:
+            raise Http400(detail=f'{HIERARCHY_DEPTH_PARAM} should be a positive integer or {ALL}') from ex
+        if depth < 1:
+            raise Http400(detail=f'{HIERARCHY_DEPTH_PARAM} should be a positive integer or {ALL}')
+        return depth
+
 
 # this is a cached view (expiry 24 hours)
 # used for TermBrowser forms lookup values -- map-types/locales/datatypes/etc
@@ -129,6 +141,7 @@ class ConceptDefaultLocalesView(ListAPIView, BaseAPIView):  # pragma: no cover
 
 class ConceptListView(ConceptBaseView, ListWithHeadersMixin, CreateModelMixin):
     serializer_class = ConceptListSerializer
+    list_response_cache = True
 
     def get_permissions(self):
         if self.request.method == 'POST':
@@ -189,7 +202,7 @@ class ConceptListView(ConceptBaseView, ListWithHeadersMixin, CreateModelMixin):
 
     @swagger_auto_schema(
         manual_parameters=[
-            q_param, limit_param, sort_desc_param, sort_asc_param, page_param, verbose_param,
+            q_param, limit_param, sort_desc_param, sort_asc_param, page_param, cursor_param, verbose_param,
             include_retired_param, include_inverse_mappings_param, updated_since_param,
             include_facets_header, compress_header, search_from_latest_repo_header
         ]
@@ -446,8 +459,9 @@ class ConceptChildrenView(ConceptBaseView, ListWithHeadersMixin):
             raise Http404()
 
         self.check_object_permissions(self.request, instance)
-        return instance.child_concept_queryset()
+        return instance.get_descendants(self.get_hierarchy_depth())
 
+    @swagger_auto_schema(manual_parameters=[hierarchy_depth_param])
     def get(self, request, *args, **kwargs):
         return self.list(request, *args, **kwargs)
 
@@ -461,8 +475,9 @@ class ConceptParentsView(ConceptBaseView, ListWithHeadersMixin):
             raise Http404()
 
         self.check_object_permissions(self.request, instance)
-        return instance.parent_concept_queryset()
+        return instance.get_ancestors(self.get_hierarchy_depth())
 
+    @swagger_auto_schema(manual_parameters=[hierarchy_depth_param])
     def get(self, request, *args, **kwargs):
         return self.list(request, *args, **kwargs)
 
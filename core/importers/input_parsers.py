@@ -1,19 +1,157 @@
+import codecs
 import csv
+import hashlib
 import io
+import json
+import uuid
+from tempfile import SpooledTemporaryFile
 from zipfile import ZipFile
 
 import requests
+from django.conf import settings
+from django.core.exceptions import ValidationError
 from ocldev.oclexporttoimportconverter import OCLExportToImportConverter
 from ocldev.oclcsvtojsonconverter import OclStandardCsvToJsonConverter
 from pydash import get, compact
 
-from core.common.utils import is_zip_file, is_csv_file
+from core.common.utils import is_zip_file, is_csv_file, iter_chunks
+from core.services.storages.redis import RedisService
+
+SOURCE_VERSION_EXPORT_PREFIX = '{"type": "Source Version"'
 
 
 def csv_file_data_to_input_list(file_content):
     return [row for row in csv.DictReader(io.StringIO(file_content))]  # pylint: disable=unnecessary-comprehension
 
 
+def iter_file_chunks(file, chunk_size=None):
+    chunk_size = chunk_size or settings.IMPORT_READ_CHUNK_SIZE
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def iter_lines(chunks):
+    """Yields '\n' terminated text lines from text/utf-8 bytes chunks, keeping only one line in memory"""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    pending = ''
+    for chunk in chunks:
+        pending += decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+        *lines, pending = pending.split('\n')
+        for line in lines:
+            yield line + '\n'
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending
+
+
+def iter_content_lines(content):
+    """Yields non blank lines/items of a json lines string, of a list or of stored content, without copying it"""
+    if ImportContentStore.is_reference(content):
+        yield from ImportContentStore.iter_lines(content)
+        return
+    if isinstance(content, list):
+        yield from content
+        return
+    start = 0
+    length = len(content or '')
+    while start < length:
+        end = content.find('\n', start)
+        if end == -1:
+            end = length
+        line = content[start:end].strip()
+        if line:
+            yield line
+        start = end + 1
+
+
+class ImportContentStore:
+    """
+    Streams import content into redis lists (one json line per item), so that neither the request nor the import
+    tasks hold the whole content in memory. Lines are appended to segments (one per resource type for CSV) that are
+    read back in order. Import tasks are queued with a reference to the stored content ({'import_content': keys})
+    that is named by the checksum of the content, so that the same import is still queued only once.
+    """
+    PREFIX = 'import:content'
+    REFERENCE_KEY = 'import_content'
+
+    def __init__(self):
+        self.client = RedisService.get_client()
+        self.token = uuid.uuid4().hex
+        self.checksum = hashlib.sha1()
+        self.keys = {}
+        self.buffers = {}
+
+    def append(self, line, segment=''):
+        line = (line if isinstance(line, str) else json.dumps(line)).strip()
+        if not line:
+            return
+        if segment not in self.keys:
+            self.keys[segment] = f'{self.PREFIX}:{self.token}:{len(self.keys)}'
+            self.buffers[segment] = []
+        self.checksum.update(line.encode('utf-8') + b'\n')
+        self.buffers[segment].append(line)
+        if len(self.buffers[segment]) >= settings.IMPORT_CONTENT_BATCH_SIZE:
+            self.flush(segment)
+
+    def flush(self, segment):
+        if self.buffers[segment]:
+            key = self.keys[segment]
+            self.client.rpush(key, *self.buffers[segment])
+            self.client.expire(key, settings.IMPORT_CONTENT_EXPIRY)
+            self.buffers[segment] = []
+
+    def save(self, order=None):
+        """Stores the segments (the ones named in order first) under the checksum and returns the reference"""
+        if not self.keys:
+            return None
+        order = order or []
+        segments = sorted(self.keys, key=lambda segment: order.index(segment) if segment in order else len(order))
+        checksum = self.checksum.hexdigest()
+        keys = []
+        pipeline = self.client.pipeline()
+        for index, segment in enumerate(segments):
+            self.flush(segment)
+            key = f'{self.PREFIX}:{checksum}:{index}'
+            pipeline.rename(self.keys[segment], key)
+            pipeline.expire(key, settings.IMPORT_CONTENT_EXPIRY)
+            keys.append(key)
+        pipeline.execute()
+        return {self.REFERENCE_KEY: keys}
+
+    def discard(self):
+        if self.keys:
+            self.client.delete(*self.keys.values())
+
+    @classmethod
+    def is_reference(cls, content):
+        return isinstance(content, dict) and cls.REFERENCE_KEY in content
+
+    @classmethod
+    def iter_lines(cls, reference):
+        client = RedisService.get_client()
+        keys = reference[cls.REFERENCE_KEY]
+        if keys and not client.exists(keys[0]):
+            raise ValidationError('Import content has expired or has already been imported')
+        batch_size = settings.IMPORT_CONTENT_BATCH_SIZE
+        for key in keys:
+            start = 0
+            while True:
+                lines = client.lrange(key, start, start + batch_size - 1)
+                for line in lines:
+                    yield line.decode('utf-8')
+                if len(lines) < batch_size:
+                    break
+                start += batch_size
+
+    @classmethod
+    def delete(cls, content):
+        if cls.is_reference(content) and content[cls.REFERENCE_KEY]:
+            RedisService.get_client().delete(*content[cls.REFERENCE_KEY])
+
+
 class ImportContentParser:
     """
     1. Processes json data from 'content' arg
@@ -67,10 +205,11 @@ class ImportContentParser:
 
     def set_file_from_response(self, response):
         if get(response, 'ok'):
-            if self.is_zip_file:
-                self.file = io.BytesIO(response.content)
-            else:
-                self.file = response.text
+            # spooled to disk past IMPORT_SPOOL_MAX_SIZE, so that the download is never held in memory
+            self.file = SpooledTemporaryFile(max_size=settings.IMPORT_SPOOL_MAX_SIZE)  # pylint: disable=consider-using-with
+            for chunk in response.iter_content(chunk_size=settings.IMPORT_READ_CHUNK_SIZE):
+                self.file.write(chunk)
+            self.file.seek(0)
         elif response:
             self.errors.append(f'Failed to download file from {self.file_url}, Status: {response.status_code}.')
 
@@ -79,32 +218,73 @@ class ImportContentParser:
             if self.is_zip_file:
                 self.set_zipped_content()
             else:
-                self.content = self.file.read()
-                if isinstance(self.content, bytes):
-                    self.content = self.content.decode('utf-8')
-                if self.is_csv_file:
-                    self.set_csv_content()
-            if self.is_ocl_source_version_export():
-                converter = OCLExportToImportConverter(
-                    content=self.content,
-                    return_output=True,
-                    version=self.kwargs.get('version', None),
-                    owner=self.kwargs.get('owner', None),
-                    owner_type=self.kwargs.get('owner_type', None)
-                )
-                converter.process()
-                self.content = converter.result
-
-    def is_ocl_source_version_export(self):
-        return isinstance(self.content, str) and self.content.startswith(
-            '{"type": "Source Version"') and '"concepts":' in self.content and '"mappings":' in self.content
-
-    def set_csv_content(self):
+                self.set_content_from_lines(iter_lines(iter_file_chunks(self.file)), self.is_csv_file)
+
+    @staticmethod
+    def is_ocl_source_version_export(content):
+        return isinstance(content, str) and content.startswith(
+            SOURCE_VERSION_EXPORT_PREFIX) and '"concepts":' in content and '"mappings":' in content
+
+    @staticmethod
+    def get_csv_resource_types():
+        """Resource types in the order of the CSV definitions, i.e. all concepts are imported before all mappings"""
+        resource_types = []
+        for definition in OclStandardCsvToJsonConverter.default_csv_resource_definitions:
+            resource_type = definition.get('resource_type')
+            if resource_type and resource_type != 'AUTO-RESOURCE' and resource_type not in resource_types:
+                resource_types.append(resource_type)
+        return resource_types
+
+    def set_content_from_lines(self, lines, is_csv):
+        """Streams the lines into an ImportContentStore and sets the content to its reference"""
+        store = ImportContentStore()
+        try:
+            if is_csv:
+                self.set_csv_content(lines, store)
+            else:
+                self.set_json_content(lines, store)
+        except Exception:
+            store.discard()
+            raise
+        if self.errors:
+            store.discard()
+        else:
+            self.content = store.save(self.get_csv_resource_types() if is_csv else None)
+
+    def set_json_content(self, lines, store):
+        lines = iter(lines)
+        first_line = next(lines, '')
+        if not first_line.startswith(SOURCE_VERSION_EXPORT_PREFIX):
+            store.append(first_line)
+            for line in lines:
+                store.append(line)
+            return
+        content = first_line + ''.join(lines)  # the export is a single json document, converted as a whole
+        if not self.is_ocl_source_version_export(content):
+            for line in iter_content_lines(content):
+                store.append(line)
+            return
+        converter = OCLExportToImportConverter(
+            content=content,
+            return_output=True,
+            version=self.kwargs.get('version', None),
+            owner=self.kwargs.get('owner', None),
+            owner_type=self.kwargs.get('owner_type', None)
+        )
+        converter.process()
+        for item in converter.result:
+            store.append(item)
+
+    def set_csv_content(self, lines, store):
+        """
+        Converts CSV rows in chunks of CSV_IMPORT_CHUNK_SIZE as they are read and appends the resources to a segment
+        per resource type, so that they are imported in the order of the definitions (orgs, sources, concepts,
+        mappings...) across all the chunks.
+        """
         try:
-            self.content = OclStandardCsvToJsonConverter(
-                input_list=csv_file_data_to_input_list(self.content),
-                allow_special_characters=True
-            ).process()
+            for rows in iter_chunks(csv.DictReader(lines), settings.CSV_IMPORT_CHUNK_SIZE):
+                for item in OclStandardCsvToJsonConverter(input_list=rows, allow_special_characters=True).process():
+                    store.append(item, get(item, 'type') or '')
         except Exception as e:
             self.errors.append(f'Failed to process CSV file: {e}.')
 
@@ -116,6 +296,5 @@ class ImportContentParser:
             else:
                 with zip_file.open(filename_list[0]) as file:
                     self.extracted_file = file
-                    self.content = file.read().decode('utf-8')
-                    if is_csv_file(name=filename_list[0]):
-                        self.set_csv_content()
+                    self.set_content_from_lines(
+                        iter_lines(iter_file_chunks(file)), is_csv_file(name=filename_list[0]))
@@ -1,13 +1,13 @@
 import json
 import time
-from collections import deque
+from collections import defaultdict
 from datetime import datetime
 
 from celery import group
 from celery.utils.log import get_task_logger
 from django.conf import settings
-from django.core.exceptions import ValidationError
-from django.db.models import F
+from django.core.exceptions import ValidationError, NON_FIELD_ERRORS
+from django.db.models import F, OuterRef, Subquery
 from ocldev.oclfleximporter import OclFlexImporter
 from pydash import compact, get
 
@@ -17,10 +17,13 @@ from core.common.constants import HEAD
 from core.services.storages.redis import RedisService
 from core.common.tasks import bulk_import_parts_inline, delete_organization, batch_index_resources, \
     post_import_update_resource_counts
-from core.common.utils import drop_version, is_url_encoded_string, encode_string, to_parent_uri, chunks
-from core.concepts.models import Concept
+from core.common.utils import drop_version, is_url_encoded_string, encode_string, to_parent_uri, chunks, \
+    generate_temp_version
+from core.concepts.models import Concept, ConceptName, ConceptDescription, HierarchicalConcepts
+from core.importers.input_parsers import iter_content_lines
 from core.mappings.models import Mapping
 from core.orgs.models import Organization
+from core.services.storages.postgres import PostgresQL
 from core.sources.models import Source
 from core.users.models import UserProfile
 
@@ -64,7 +67,7 @@ class BaseImporter:
         if isinstance(self.content, list):
             self.input_list = self.content
         else:
-            for line in self.content.splitlines():
+            for line in iter_content_lines(self.content):
                 self.input_list.append(json.loads(line))
 
     def set_user(self):
@@ -640,15 +643,407 @@ class ReferenceImporter(BaseResourceImporter):
         return FAILED
 
 
+class BaseBulkLoader:
+    """
+    Bulk load import mode, for brand new concepts/mappings of a source. Lines are validated and created, with their
+    initial versions, locales and through table rows, in a few bulk_create calls per batch, skipping per row signals,
+    tasks, counts and indexing (left to the caller, once per import). Uniqueness is checked once per batch, against
+    the database and the other lines of the batch.
+    Lines which are not brand new (already existing or repeated in the batch), need sequential mnemonics or belong to
+    a source with a custom validation schema (whose checks query the database per line) are processed by the regular
+    importer.
+    """
+    importer_class = None
+    model = None
+    id_seq_name = None
+    excluded_validation_fields = ['parent', 'versioned_object', 'created_by', 'updated_by']
+
+    def __init__(self, user, update_if_exists=False):
+        self.user = user
+        self.update_if_exists = update_if_exists
+        self.parents = {}
+
+    def get_parent(self, importer):
+        key = (importer.get_owner_type_filter(), importer.get('owner'), importer.get('source'))
+        if key not in self.parents:
+            parent = Source.objects.filter(**{key[0]: key[1]}, mnemonic=key[2], version=HEAD).first()
+            self.parents[key] = parent, bool(parent and parent.has_edit_access(self.user))
+        return self.parents[key]
+
+    @staticmethod
+    def get_mnemonic(importer):
+        return str(importer.get('id') or '')
+
+    def can_bulk_load(self, importer, parent, mnemonic):
+        raise NotImplementedError()
+
+    def build(self, importer, parent, mnemonic):
+        raise NotImplementedError()
+
+    def set_ids(self, instance, vo_id, version_id):
+        raise NotImplementedError()
+
+    def create(self, built):
+        raise NotImplementedError()
+
+    def exclude_duplicates(self, built):
+        """
+        Splits built (original_item, importer, instance) into the ones to bulk create and the ones duplicating an
+        existing resource or another line of the batch, these are processed by the regular importer.
+        """
+        return built, []
+
+    def get_existing_mnemonics(self, candidates):
+        mnemonics = defaultdict(set)
+        for _, importer, parent in candidates:
+            mnemonic = self.get_mnemonic(importer)
+            if mnemonic:
+                mnemonics[parent.id].add(mnemonic)
+
+        return {
+            parent_id: set(self.model.objects.filter(
+                parent_id=parent_id, mnemonic__in=parent_mnemonics).values_list('mnemonic', flat=True))
+            for parent_id, parent_mnemonics in mnemonics.items()
+        }
+
+    def get_candidates(self, items, results):
+        candidates = []
+        for original_item, item in items:
+            importer = self.importer_class(  # pylint: disable=not-callable
+                item, self.user, self.update_if_exists)
+            if not importer.is_valid():
+                results.append((False, original_item, None))
+                continue
+            parent, has_edit_access = self.get_parent(importer)
+            if not parent:
+                results.append((FAILED, original_item, None))
+            elif not has_edit_access:
+                results.append((PERMISSION_DENIED, original_item, None))
+            else:
+                candidates.append((original_item, importer, parent))
+        return candidates
+
+    def bulk_create(self, instances):
+        ids = PostgresQL.next_values(self.id_seq_name, len(instances) * 2)
+        for index, instance in enumerate(instances):
+            self.set_ids(instance, ids[index * 2], ids[index * 2 + 1])
+        self.create(instances)
+        self.model.set_checksums_in_batches(self.model.objects.filter(id__in=ids))
+
+    def load(self, items):
+        """Loads (original_item, item) lines and returns (result, original_item, instance) of each of them"""
+        results = []
+        candidates = self.get_candidates(items, results)
+        taken = self.get_existing_mnemonics(candidates)
+        built = []
+        regular = []
+        for original_item, importer, parent in candidates:
+            mnemonic = self.get_mnemonic(importer)
+            parent_taken = taken.setdefault(parent.id, set())
+            if not self.can_bulk_load(importer, parent, mnemonic) or mnemonic in parent_taken:
+                regular.append((original_item, importer))
+                continue
+            try:
+                instance = self.build(importer, parent, mnemonic)
+            except ValidationError as ex:
+                results.append((ex.message_dict, original_item, None))
+                continue
+            if mnemonic:
+                parent_taken.add(mnemonic)
+            built.append((original_item, importer, instance))
+
+        built, duplicates = self.exclude_duplicates(built)
+        regular += [(original_item, importer) for original_item, importer, _ in duplicates]
+        if built:
+            self.bulk_create([instance for *_, instance in built])
+            results += [(CREATED, original_item, instance) for original_item, _, instance in built]
+
+        for original_item, importer in regular:
+            results.append((importer.run(), original_item, importer.instance))
+
+        return results
+
+
+class ConceptBulkLoader(BaseBulkLoader):
+    importer_class = ConceptImporter
+    model = Concept
+    id_seq_name = 'concepts_id_seq'
+
+    @staticmethod
+    def get_mnemonic(importer):
+        mnemonic = str(importer.get('id') or '')
+        if mnemonic and not is_url_encoded_string(mnemonic):
+            return encode_string(mnemonic)
+        return mnemonic
+
+    def can_bulk_load(self, importer, parent, mnemonic):
+        if parent.custom_validation_schema:
+            return False
+        return bool(mnemonic) or not parent.is_sequential_concepts_mnemonic
+
+    def build(self, importer, parent, mnemonic):
+        data = importer.get_filter_allowed_fields()
+        data.pop('id', None)
+        names = ConceptName.build(data.pop('names', None))
+        descriptions = ConceptDescription.build(data.pop('descriptions', None))
+        parent_concept_urls = data.pop('parent_concept_urls', None)
+        if 'update_comment' in data:
+            data['comment'] = data.pop('update_comment')
+        concept = Concept(
+            **data, parent=parent, created_by=self.user, updated_by=self.user, public_access=parent.public_access,
+            mnemonic=mnemonic or generate_temp_version(), version=generate_temp_version(), is_latest_version=False,
+            _counted=None, _index=False
+        )
+        concept.cloned_names = names
+        concept.cloned_descriptions = descriptions
+        concept.validate_locales_limit(names, descriptions)
+        concept.full_clean(exclude=self.excluded_validation_fields, validate_unique=False, validate_constraints=False)
+        if not mnemonic:
+            concept.mnemonic = None
+        concept.external_id = concept.external_id or parent.concept_external_id_next
+        concept.parent_concept_uris = parent_concept_urls
+        return concept
+
+    def set_ids(self, instance, vo_id, version_id):
+        parent = instance.parent
+        instance.id = instance.versioned_object_id = vo_id
+        instance.version = str(vo_id)
+        if not instance.mnemonic:
+            instance.name = instance.mnemonic = parent.concept_mnemonic_next or str(vo_id)
+        instance.uri = instance.calculate_uri()
+        initial_version = Concept(
+            id=version_id, version=str(version_id), mnemonic=instance.mnemonic, parent=parent,
+            public_access=instance.public_access, external_id=instance.external_id,
+            concept_class=instance.concept_class, datatype=instance.datatype, retired=instance.retired,
+            extras=instance.extras or {}, comment=instance.comment, versioned_object=instance,
+            created_by_id=instance.created_by_id, updated_by_id=instance.updated_by_id,
+            released=True, is_latest_version=True, _index=False
+        )
+        initial_version.uri = initial_version.calculate_uri()
+        instance.initial_version = initial_version
+        instance.latest_version_id = version_id
+
+    @staticmethod
+    def build_locales(concepts, attr, next_external_id_attr):
+        locales = []
+        for concept in concepts:
+            for owner in [concept, concept.initial_version]:
+                for locale in get(concept, attr) or []:
+                    new_locale = locale.clone()
+                    new_locale.concept_id = owner.id
+                    new_locale.external_id = new_locale.external_id or get(concept.parent, next_external_id_attr)
+                    checksums = new_locale.get_all_checksums()
+                    if checksums is not None:
+                        new_locale.checksums = checksums
+                    locales.append(new_locale)
+        return locales
+
+    def create(self, built):
+        Concept.objects.bulk_create(
+            [*built, *[concept.initial_version for concept in built]], batch_size=settings.BULK_LOAD_BATCH_SIZE)
+        ConceptName.objects.bulk_create(
+            self.build_locales(built, 'cloned_names', 'concept_name_external_id_next'),
+            batch_size=settings.BULK_LOAD_BATCH_SIZE
+        )
+        ConceptDescription.objects.bulk_create(
+            self.build_locales(built, 'cloned_descriptions', 'concept_description_external_id_next'),
+            batch_size=settings.BULK_LOAD_BATCH_SIZE
+        )
+        Concept.set_display_names_in_batches(Concept.objects.filter(
+            id__in=[_id for concept in built for _id in [concept.id, concept.latest_version_id]]))
+        Concept.sources.through.objects.bulk_create(
+            [
+                Concept.sources.through(concept_id=concept_id, source_id=concept.parent_id)
+                for concept in built for concept_id in [concept.id, concept.latest_version_id]
+            ],
+            batch_size=settings.BULK_LOAD_BATCH_SIZE
+        )
+        self.create_hierarchy(built)
+        self.update_mappings(built)
+
+    @staticmethod
+    def create_hierarchy(built):
+        """Same as process_hierarchy_for_new_concept, parents are the latest versions of parent_concept_urls"""
+        uris = {uri for concept in built for uri in (concept.parent_concept_uris or [])}
+        if not uris:
+            return
+        versioned_object_ids = dict(Concept.objects.filter(uri__in=uris).values_list('uri', 'versioned_object_id'))
+        latest_versions = dict(Concept.objects.filter(
+            versioned_object_id__in=versioned_object_ids.values(), is_latest_version=True, is_active=True
+        ).exclude(id=F('versioned_object_id')).order_by('created_at').values_list('versioned_object_id', 'id'))
+        HierarchicalConcepts.objects.bulk_create(
+            [
+                HierarchicalConcepts(child_id=child_id, parent_id=parent_id)
+                for concept in built
+                for parent_id in {
+                    latest_versions.get(versioned_object_ids.get(uri))
+                    for uri in (concept.parent_concept_uris or [])
+                } - {None}
+                for child_id in [concept.id, concept.latest_version_id]
+            ],
+            batch_size=settings.BULK_LOAD_BATCH_SIZE
+        )
+
+    @staticmethod
+    def update_mappings(built):
+        """Same as Concept.update_mappings, for all new concepts of a parent at once"""
+        parents = {concept.parent_id: concept.parent for concept in built}
+        for parent in parents.values():
+            mnemonics = [concept.mnemonic for concept in built if concept.parent_id == parent.id]
+            for relation in ['to', 'from']:
+                Mapping.objects.filter(**{
+                    f'{relation}_concept_code__in': mnemonics, f'{relation}_source_url__in': parent.identity_uris,
+                    f'{relation}_concept__isnull': True
+                }).update(**{f'{relation}_concept_id': Subquery(Concept.objects.filter(
+                    parent_id=parent.id, id=F('versioned_object_id'), mnemonic=OuterRef(f'{relation}_concept_code')
+                ).values('id')[:1])})
+
+
+class MappingBulkLoader(BaseBulkLoader):
+    importer_class = MappingImporter
+    model = Mapping
+    id_seq_name = 'mappings_id_seq'
+    excluded_validation_fields = [
+        *BaseBulkLoader.excluded_validation_fields, 'from_concept', 'to_concept', 'from_source', 'to_source'
+    ]
+    related_fields = ['from_concept_url', 'to_concept_url', 'to_source_url', 'from_source_url']
+
+    unique_fields = ['map_type', 'from_concept_code', 'to_concept_code', 'from_source_url', 'to_source_url']
+
+    def can_bulk_load(self, importer, parent, mnemonic):
+        if parent.custom_validation_schema:
+            return False
+        if mnemonic:
+            return True
+        return not self.update_if_exists and not parent.is_sequential_mappings_mnemonic
+
+    def get_unique_key(self, mapping):
+        return tuple(getattr(mapping, field) for field in self.unique_fields)
+
+    def get_existing_unique_keys(self, parent_id, mappings):
+        return set(Mapping.objects.filter(
+            parent_id=parent_id, is_latest_version=True, retired=False,
+            from_concept_code__in={mapping.from_concept_code for mapping in mappings},
+            map_type__in={mapping.map_type for mapping in mappings}
+        ).values_list(*self.unique_fields))
+
+    def exclude_duplicates(self, built):
+        """Same as the unique attributes check of MappingValidationMixin.clean, for the whole batch at once"""
+        mappings = defaultdict(list)
+        for *_, mapping in built:
+            mappings[mapping.parent_id].append(mapping)
+        taken = {
+            parent_id: self.get_existing_unique_keys(parent_id, parent_mappings)
+            for parent_id, parent_mappings in mappings.items()
+        }
+        unique = []
+        duplicates = []
+        for original_item, importer, mapping in built:
+            key = self.get_unique_key(mapping)
+            if key in taken[mapping.parent_id]:
+                duplicates.append((original_item, importer, mapping))
+            else:
+                taken[mapping.parent_id].add(key)
+                unique.append((original_item, importer, mapping))
+        return unique, duplicates
+
+    @staticmethod
+    def set_sort_weights(mappings):
+        """Same as Mapping.get_next_sort_weight, counting the mappings of the batch created before"""
+        existing_max_sort_weights = {}
+        batch_max_sort_weights = {}
+        for mapping in mappings:
+            if not mapping.from_concept_id or not mapping.map_type:
+                continue
+            key = (mapping.from_concept_id, mapping.map_type)
+            if mapping.sort_weight is None:
+                if key not in existing_max_sort_weights:
+                    next_sort_weight = mapping.get_next_sort_weight()
+                    existing_max_sort_weights[key] = None if next_sort_weight is None else next_sort_weight - 1
+                sort_weights = [
+                    sort_weight for sort_weight in [existing_max_sort_weights[key], batch_max_sort_weights.get(key)]
+                    if sort_weight is not None
+                ]
+                mapping.sort_weight = max(sort_weights) + 1 if sort_weights else None
+            if mapping.sort_weight is not None and not mapping.retired:
+                batch_max_sort_weights[key] = max(
+                    mapping.sort_weight, batch_max_sort_weights.get(key, mapping.sort_weight))
+
+    def bulk_create(self, instances):
+        if not settings.DISABLE_VALIDATION:
+            self.set_sort_weights(instances)
+        super().bulk_create(instances)
+
+    def build(self, importer, parent, mnemonic):
+        data = importer.get_filter_allowed_fields()
+        data.pop('id', None)
+        if 'update_comment' in data:
+            data['comment'] = data.pop('update_comment')
+        to_concept_code = data.get('to_concept_code')
+        if to_concept_code and not is_url_encoded_string(to_concept_code):
+            data['to_concept_code'] = encode_string(to_concept_code, safe='')
+        url_params = {key: data.pop(key) for key in self.related_fields if key in data}
+        mapping = Mapping(
+            **data, parent=parent, created_by=self.user, updated_by=self.user, public_access=parent.public_access,
+            mnemonic=mnemonic or generate_temp_version(), version=generate_temp_version(), _counted=None,
+            _index=False
+        )
+        mapping.populate_fields_from_relations(url_params)
+        mapping.clean_fields(exclude=self.excluded_validation_fields)
+        errors = mapping.get_concept_code_errors()
+        if errors:
+            raise ValidationError({NON_FIELD_ERRORS: [' '.join(errors)]})
+        if not mnemonic:
+            mapping.mnemonic = None
+        mapping.external_id = mapping.external_id or parent.mapping_external_id_next
+        return mapping
+
+    def set_ids(self, instance, vo_id, version_id):
+        instance.id = instance.versioned_object_id = vo_id
+        instance.version = str(vo_id)
+        instance.mnemonic = instance.mnemonic or instance.parent.mapping_mnemonic_next or str(vo_id)
+        instance.uri = instance.calculate_uri()
+        initial_version = instance.clone()
+        initial_version.id = version_id
+        initial_version.version = str(version_id)
+        initial_version.parent = instance.parent
+        initial_version.versioned_object = instance
+        initial_version.created_by_id = instance.created_by_id
+        initial_version.updated_by_id = instance.updated_by_id
+        initial_version.comment = instance.comment
+        initial_version.is_latest_version = True
+        initial_version.uri = initial_version.calculate_uri()
+        instance.initial_version = initial_version
+        instance.latest_version_id = version_id
+
+    def create(self, built):
+        Mapping.objects.bulk_create(
+            [*built, *[mapping.initial_version for mapping in built]], batch_size=settings.BULK_LOAD_BATCH_SIZE)
+        Mapping.sources.through.objects.bulk_create(
+            [
+                Mapping.sources.through(mapping_id=mapping_id, source_id=mapping.parent_id)
+                for mapping in built for mapping_id in [mapping.id, mapping.latest_version_id]
+            ],
+            batch_size=settings.BULK_LOAD_BATCH_SIZE
+        )
+
+
 class BulkImportInline(BaseImporter):
     def __init__(  # pylint: disable=too-many-arguments
             self, content, username, update_if_exists=False, input_list=None, user=None, set_user=True,
-            self_task_id=None
+            self_task_id=None, bulk_load=False
     ):
         super().__init__(content, username, update_if_exists, user, not bool(input_list), set_user)
         self.self_task_id = self_task_id
         if input_list:
             self.input_list = input_list
+        self.bulk_loaders = {
+            'concept': ConceptBulkLoader(self.user, update_if_exists),
+            'mapping': MappingBulkLoader(self.user, update_if_exists),
+        } if bulk_load else {}
+        self.bulk_load_type = None
+        self.bulk_load_items = []
+        self.bulk_loaded = False
         self.unknown = []
         self.invalid = []
         self.exists = []
@@ -703,6 +1098,28 @@ class BulkImportInline(BaseImporter):
             service = RedisService()
             service.set(self.self_task_id, self.processed)
 
+    @staticmethod
+    def get_resource_ids(instance):
+        return set(compact(
+            [
+                instance.versioned_object_id,
+                get(instance, 'prev_latest_version_id'),
+                get(instance, 'latest_version_id'),
+                instance.id,
+            ]
+        ))
+
+    def bulk_load_pending_items(self, new_ids):
+        if not self.bulk_load_items:
+            return
+        loader = self.bulk_loaders[self.bulk_load_type]
+        for result, item, instance in loader.load(self.bulk_load_items):
+            if get(instance, 'id'):
+                new_ids[self.bulk_load_type].update(self.get_resource_ids(instance))
+            self.handle_item_import_result(result, item)
+        self.bulk_load_items = []
+        self.bulk_loaded = True
+
     def run(self):  # pylint: disable=too-many-branches,too-many-statements,too-many-locals
         if self.self_task_id:  # pragma: no cover
             print("****STARTED SUBPROCESS****")
@@ -710,6 +1127,7 @@ class BulkImportInline(BaseImporter):
             print("***************")
         new_concept_ids = set()
         new_mapping_ids = set()
+        new_ids = {'concept': new_concept_ids, 'mapping': new_mapping_ids}
         for original_item in self.input_list:
             self.processed += 1
             logger.info('Processing %s of %s', str(self.processed), str(self.total))
@@ -719,6 +1137,13 @@ class BulkImportInline(BaseImporter):
             action = item.pop('__action', '').lower()
             if not item_type:
                 self.unknown.append(original_item)
+            if item_type in self.bulk_loaders and action != 'delete':
+                if item_type != self.bulk_load_type or len(self.bulk_load_items) >= settings.BULK_LOAD_BATCH_SIZE:
+                    self.bulk_load_pending_items(new_ids)
+                self.bulk_load_type = item_type
+                self.bulk_load_items.append((original_item, item))
+                continue
+            self.bulk_load_pending_items(new_ids)
             if item_type == 'organization':
                 org_importer = OrganizationImporter(item, self.user, self.update_if_exists)
                 self.handle_item_import_result(
@@ -751,28 +1176,14 @@ class BulkImportInline(BaseImporter):
                 concept_importer = ConceptImporter(item, self.user, self.update_if_exists)
                 _result = concept_importer.delete() if action == 'delete' else concept_importer.run()
                 if get(concept_importer.instance, 'id'):
-                    new_concept_ids.update(set(compact(
-                        [
-                            concept_importer.instance.versioned_object_id,
-                            get(concept_importer.instance, 'prev_latest_version_id'),
-                            get(concept_importer.instance, 'latest_version_id'),
-                            concept_importer.instance.id,
-                        ]
-                    )))
+                    new_concept_ids.update(self.get_resource_ids(concept_importer.instance))
                 self.handle_item_import_result(_result, original_item)
                 continue
             if item_type == 'mapping':
                 mapping_importer = MappingImporter(item, self.user, self.update_if_exists)
                 _result = mapping_importer.delete() if action == 'delete' else mapping_importer.run()
                 if get(mapping_importer.instance, 'id'):
-                    new_mapping_ids.update(set(compact(
-                        [
-                            mapping_importer.instance.versioned_object_id,
-                            get(mapping_importer.instance, 'prev_latest_version_id'),
-                            get(mapping_importer.instance, 'latest_version_id'),
-                            mapping_importer.instance.id,
-                        ]
-                    )))
+                    new_mapping_ids.update(self.get_resource_ids(mapping_importer.instance))
                 self.handle_item_import_result(_result, original_item)
                 continue
             if item_type == 'reference':
@@ -781,6 +1192,13 @@ class BulkImportInline(BaseImporter):
                 )
                 continue
 
+        self.bulk_load_pending_items(new_ids)
+        if self.bulk_loaded:
+            if get(settings, 'TEST_MODE', False):
+                post_import_update_resource_counts()
+            else:
+                post_import_update_resource_counts.delay()
+
         if new_concept_ids:
             for chunk in chunks(list(set(new_concept_ids)), 5000):
                 batch_index_resources.apply_async(
@@ -838,11 +1256,12 @@ class BulkImportInline(BaseImporter):
 
 class BulkImportParallelRunner(BaseImporter):  # pragma: no cover
     def __init__(
-            self, content, username, update_if_exists, parallel=None, self_task_id=None
+            self, content, username, update_if_exists, parallel=None, self_task_id=None, bulk_load=False
     ):  # pylint: disable=too-many-arguments
         super().__init__(content, username, update_if_exists, None, False)
         self.start_time = time.time()
         self.self_task_id = self_task_id
+        self.bulk_load = bulk_load
         self.username = username
         self.total = 0
         self.resource_distribution = {}
@@ -852,60 +1271,63 @@ class BulkImportParallelRunner(BaseImporter):  # pragma: no cover
         self.results = []
         self.elapsed_seconds = 0
         self.resource_wise_time = {}
-        self.parts = deque([])
+        self.parts = iter([])
         self.result = None
         self._json_result = None
         self.redis_service = RedisService()
-        if self.content:
-            self.input_list = self.content if isinstance(self.content, list) else self.content.splitlines()
-            self.total = len(self.input_list)
         self.make_resource_distribution()
         self.make_parts()
-        self.content = None  # memory optimization
-        self.input_list = []  # memory optimization
+
+    @staticmethod
+    def to_dict(line):
+        return line if isinstance(line, dict) else json.loads(line)
 
     def make_resource_distribution(self):
-        for line in self.input_list:
-            data = line if isinstance(line, dict) else json.loads(line)
+        """Validates and counts all lines, only keeping orgs/sources/collections, which are imported first"""
+        for line in iter_content_lines(self.content):
+            data = self.to_dict(line)
             data_type = data.get('type', None)
-            if not data_type or data_type.lower() not in ['organization', 'source', 'collection']:
+            if not data_type:
+                raise ValidationError('"type" should be present in each line')
+            self.total += 1
+            if data_type.lower() not in ['organization', 'source', 'collection']:
                 continue
             if data_type not in self.resource_distribution:
                 self.resource_distribution[data_type] = []
             self.resource_distribution[data_type].append(data)
 
     def make_parts(self):
-        prev_line = None
-        orgs = self.resource_distribution.pop('Organization', None)
-        sources = self.resource_distribution.pop('Source', None)
-        collections = self.resource_distribution.pop('Collection', None)
-        if orgs:
-            self.parts = deque([orgs])
-        if sources:
-            self.parts.append(sources)
-        if collections:
-            self.parts.append(collections)
-
-        self.parts.append([])
-
-        for data in self.input_list:
-            line = data if isinstance(data, dict) else json.loads(data)
+        self.parts = self.iter_parts()
+
+    def iter_parts(self):
+        """
+        Yields orgs, sources and collections and then consecutive lines of the same child type (or of non child
+        types), reading the content lazily and splitting them in parts of at most BULK_IMPORT_PART_SIZE lines, so
+        that only the part being imported is held as dicts.
+        """
+        for data_type in ['Organization', 'Source', 'Collection']:
+            part = self.resource_distribution.pop(data_type, None)
+            if part:
+                yield part
+
+        part = []
+        prev_type = None
+        children_data_types = ['concept', 'mapping', 'reference']
+        for data in iter_content_lines(self.content):
+            line = self.to_dict(data)
             data_type = line.get('type', '').lower()
-            if not data_type:
-                raise ValidationError('"type" should be present in each line')
-            if data_type not in ['organization', 'source', 'collection']:
-                if prev_line:
-                    prev_type = prev_line.get('type').lower()
-                    children_data_types = ['concept', 'mapping', 'reference']
-                    if prev_type == data_type or (
-                            data_type not in children_data_types and prev_type not in children_data_types
-                    ):
-                        self.parts[-1].append(line)
-                    else:
-                        self.parts.append([line])
-                else:
-                    self.parts[-1].append(line)
-                prev_line = line
+            if data_type in ['organization', 'source', 'collection']:
+                continue
+            is_same_part = prev_type is None or prev_type == data_type or (
+                data_type not in children_data_types and prev_type not in children_data_types)
+            if part and (not is_same_part or len(part) >= settings.BULK_IMPORT_PART_SIZE):
+                yield part
+                part = []
+            part.append(line)
+            prev_type = data_type
+        if part:
+            yield part
+        self.content = None  # memory optimization
 
     @staticmethod
     def chunker_list(seq, size, is_child):  # pylint: disable=too-many-locals
@@ -1006,8 +1428,7 @@ class BulkImportParallelRunner(BaseImporter):  # pragma: no cover
             print("****STARTED MAIN****")
             print(f"TASK ID: {self.self_task_id}")
             print("***************")
-        while len(self.parts) > 0:
-            part_list = self.parts.popleft()
+        for part_list in self.parts:
             if part_list:
                 part_type = get(part_list, '0.type', '').lower()
                 if part_type:
@@ -1101,7 +1522,10 @@ class BulkImportParallelRunner(BaseImporter):  # pragma: no cover
         has_delete_action = not is_child and any(line.get('__action') == 'DELETE' for line in part_list)
         chunked_lists = [part_list] if has_delete_action else compact(
             self.chunker_list(part_list, self.parallel, is_child))
-        jobs = group(bulk_import_parts_inline.s(_list, self.username, self.update_if_exists) for _list in chunked_lists)
+        jobs = group(
+            bulk_import_parts_inline.s(_list, self.username, self.update_if_exists, self.bulk_load)
+            for _list in chunked_lists
+        )
         group_result = jobs.apply_async(queue='concurrent')
         self.groups.append(group_result)
         self.tasks += group_result.results
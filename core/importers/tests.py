@@ -5,8 +5,10 @@ from json import JSONDecodeError
 from zipfile import ZipFile
 
 from celery_once import AlreadyQueued
+from django.core.exceptions import ValidationError
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.management import call_command
+from django.test import override_settings
 from django.db.models import F
 from mock import patch, Mock, ANY, call, PropertyMock
 from ocldev.oclcsvtojsonconverter import OclStandardCsvToJsonConverter
@@ -18,7 +20,7 @@ from core.common.tasks import post_import_update_resource_counts, bulk_import_pa
 from core.common.tests import OCLAPITestCase, OCLTestCase
 from core.concepts.models import Concept
 from core.concepts.tests.factories import ConceptFactory
-from core.importers.input_parsers import ImportContentParser
+from core.importers.input_parsers import ImportContentParser, iter_lines, iter_content_lines, ImportContentStore
 from core.importers.models import BulkImport, BulkImportInline, BulkImportParallelRunner
 from core.importers.views import csv_file_data_to_input_list
 from core.mappings.models import Mapping
@@ -799,6 +801,144 @@ class BulkImportInlineTest(OCLTestCase):
         self.assertEqual(len(importer.permission_denied), 0)
         batch_index_resources_mock.apply_async.assert_called()
 
+    @patch('core.importers.models.batch_index_resources')
+    def test_bulk_load(self, batch_index_resources_mock):
+        source = OrganizationSourceFactory(
+            organization=(OrganizationFactory(mnemonic='DemoOrg')), mnemonic='DemoSource', version='HEAD'
+        )
+        existing_concept = ConceptFactory(parent=source, mnemonic='Existing')
+        unresolved_mapping = MappingFactory(to_concept=None, to_concept_code='Corn', to_source_url=source.uri)
+        owner = {"source": "DemoSource", "owner": "DemoOrg", "owner_type": "Organization"}
+        concept_url = '/orgs/DemoOrg/sources/DemoSource/concepts/{}/'.format
+        input_list = [
+            {
+                "type": "Concept", "id": "Food", "concept_class": "Root", "datatype": "None", **owner,
+                "names": [{"name": "Food", "locale": "en", "locale_preferred": True, "name_type": "Fully Specified"}],
+                "descriptions": [{"description": "Food", "locale": "en"}],
+            },
+            {
+                "type": "Concept", "id": "Corn", "concept_class": "Misc", "datatype": "None", **owner,
+                "names": [{"name": "Corn", "locale": "en", "locale_preferred": True, "name_type": "Fully Specified"}],
+                "parent_concept_urls": [concept_url('Food')]
+            },
+            {
+                "type": "Concept", "id": "Existing", "concept_class": "Misc", "datatype": "Rule", **owner,
+                "names": [{"name": "Existing", "locale": "en", "locale_preferred": True}],
+            },
+            {"type": "Concept", "id": "Invalid", **owner},
+            {
+                "type": "Mapping", "id": "M1", "map_type": "Has Child", **owner,
+                "from_concept_url": concept_url('Food'), "to_concept_url": concept_url('Corn'),
+            },
+            {
+                "type": "Mapping", "id": "M1", "map_type": "Has Child", "extras": {"foo": "bar"}, **owner,
+                "from_concept_url": concept_url('Food'), "to_concept_url": concept_url('Corn'),
+            },
+        ]
+
+        importer = BulkImportInline(None, 'ocladmin', True, input_list=input_list, bulk_load=True)
+        importer.run()
+
+        self.assertEqual(importer.processed, 6)
+        self.assertEqual(len(importer.created), 3)
+        self.assertEqual(len(importer.updated), 2)
+        self.assertEqual(len(importer.invalid), 1)
+        self.assertEqual(importer.failed, [])
+        self.assertEqual(importer.created[0]['id'], 'Food')
+
+        food = Concept.objects.get(mnemonic='Food', id=F('versioned_object_id'))
+        food_version = food.get_latest_version()
+        corn = Concept.objects.get(mnemonic='Corn', id=F('versioned_object_id'))
+        self.assertEqual(food.uri, concept_url('Food'))
+        self.assertEqual(food_version.uri, f"{concept_url('Food')}{food_version.id}/")
+        self.assertEqual(food.version, str(food.id))
+        self.assertTrue(food_version.released)
+        self.assertEqual(list(food.names.values_list('name', flat=True)), ['Food'])
+        self.assertEqual(list(food_version.names.values_list('name', flat=True)), ['Food'])
+        self.assertEqual(list(food_version.descriptions.values_list('name', flat=True)), ['Food'])
+        self.assertEqual(
+            list(Concept.objects.filter(versioned_object_id=food.id).values_list(
+                '_display_name', '_display_locale').distinct()),
+            [('Food', 'en')]
+        )
+        self.assertEqual(list(food.sources.all()), [source])
+        self.assertEqual(list(food_version.sources.all()), [source])
+        self.assertEqual(corn.parent_concept_urls, [food.uri])
+        self.assertEqual(corn.get_latest_version().parent_concept_urls, [food.uri])
+        self.assertTrue(food._counted)  # pylint: disable=protected-access
+        self.assertEqual(existing_concept.versions.count(), 2)
+        self.assertFalse(Concept.objects.filter(mnemonic='Invalid').exists())
+
+        mapping = Mapping.objects.get(map_type='Has Child', id=F('versioned_object_id'))
+        self.assertEqual(mapping.from_concept_id, food.id)
+        self.assertEqual(mapping.to_concept_id, corn.id)
+        self.assertEqual(mapping.mnemonic, 'M1')
+        self.assertEqual(mapping.versions.count(), 2)
+        self.assertEqual(mapping.get_latest_version().extras, {'foo': 'bar'})
+        self.assertEqual(list(mapping.sources.all()), [source])
+        unresolved_mapping.refresh_from_db()
+        self.assertEqual(unresolved_mapping.to_concept_id, corn.id)
+
+        batch_index_resources_mock.apply_async.assert_any_call(
+            ('concept', {'id__in': ANY}, True), queue='indexing')
+        self.assertEqual(
+            sorted(batch_index_resources_mock.apply_async.mock_calls[0][1][0][1]['id__in']),
+            sorted(Concept.objects.filter(mnemonic__in=['Food', 'Corn', 'Existing']).values_list('id', flat=True))
+        )
+
+    @patch('core.importers.models.batch_index_resources', Mock())
+    def test_bulk_load_checks_uniqueness_within_batch(self):
+        call_command('import_lookup_values')
+        org = OrganizationFactory(mnemonic='DemoOrg')
+        OrganizationSourceFactory(organization=org, mnemonic='DemoSource', version='HEAD')
+        OrganizationSourceFactory(
+            organization=org, mnemonic='OpenMRSSource', version='HEAD',
+            custom_validation_schema=OPENMRS_VALIDATION_SCHEMA
+        )
+        owner = {"source": "DemoSource", "owner": "DemoOrg", "owner_type": "Organization"}
+        concept_url = '/orgs/DemoOrg/sources/DemoSource/concepts/{}/'.format
+
+        def concept(mnemonic, source='DemoSource'):
+            return {
+                "type": "Concept", "id": mnemonic, "concept_class": "Misc", "datatype": "None", **owner,
+                "source": source, "names": [
+                    {"name": "Grain", "locale": "en", "locale_preferred": True, "name_type": "Fully Specified"}],
+                "descriptions": [{"description": mnemonic, "locale": "en"}],
+            }
+
+        def mapping(mnemonic, to_concept, **kwargs):
+            return {
+                "type": "Mapping", "id": mnemonic, "map_type": "Has Child", **owner, **kwargs,
+                "from_concept_url": concept_url('Food'), "to_concept_url": concept_url(to_concept),
+            }
+
+        importer = BulkImportInline(
+            None, 'ocladmin', True, bulk_load=True, input_list=[
+                *[concept(mnemonic) for mnemonic in ['Food', 'Corn', 'Rice', 'Beans']],
+                concept('Wheat', 'OpenMRSSource'), concept('Barley', 'OpenMRSSource'),
+                mapping('M1', 'Corn', sort_weight=1),
+            ]
+        )
+        importer.run()
+
+        self.assertEqual(len(importer.created), 6)
+        self.assertEqual(len(importer.failed), 1)
+        self.assertEqual(importer.failed[0]['id'], 'Barley')
+
+        importer = BulkImportInline(
+            None, 'ocladmin', True, bulk_load=True, input_list=[
+                mapping('M2', 'Rice'), mapping('M3', 'Beans'), mapping('M4', 'Corn'), mapping('M5', 'Rice')
+            ]
+        )
+        importer.run()
+
+        self.assertEqual([item['id'] for item in importer.created], ['M2', 'M3'])
+        self.assertEqual([item['id'] for item in importer.failed], ['M4', 'M5'])
+        self.assertEqual(
+            dict(Mapping.objects.filter(id=F('versioned_object_id')).values_list('mnemonic', 'sort_weight')),
+            {'M1': 1, 'M2': 2, 'M3': 3}
+        )
+
 
 class BulkImportParallelRunnerTest(OCLTestCase):
     def test_invalid_json(self):
@@ -822,21 +962,39 @@ class BulkImportParallelRunnerTest(OCLTestCase):
             'ocladmin', True
         )
 
-        self.assertEqual(len(importer.parts), 7)
-        self.assertEqual(len(importer.parts[0]), 2)
-        self.assertEqual(len(importer.parts[1]), 2)
-        self.assertEqual(len(importer.parts[2]), 1)
-        self.assertEqual(len(importer.parts[3]), 23)
-        self.assertEqual(len(importer.parts[4]), 22)
-        self.assertEqual(len(importer.parts[5]), 2)
-        self.assertEqual(len(importer.parts[6]), 12)
-        self.assertEqual([part['type'] for part in importer.parts[0]], ['Organization', 'Organization'])
-        self.assertEqual([part['type'] for part in importer.parts[1]], ['Source', 'Source'])
-        self.assertEqual([part['type'] for part in importer.parts[2]], ['Source Version'])
-        self.assertEqual(list({part['type'] for part in importer.parts[3]}), ['Concept'])
-        self.assertEqual(list({part['type'] for part in importer.parts[4]}), ['Mapping'])
-        self.assertEqual([part['type'] for part in importer.parts[5]], ['Source Version', 'Source Version'])
-        self.assertEqual(list({part['type'] for part in importer.parts[6]}), ['Concept'])
+        self.assertEqual(importer.total, 64)
+        parts = list(importer.parts)
+        self.assertEqual(len(parts), 7)
+        self.assertEqual(len(parts[0]), 2)
+        self.assertEqual(len(parts[1]), 2)
+        self.assertEqual(len(parts[2]), 1)
+        self.assertEqual(len(parts[3]), 23)
+        self.assertEqual(len(parts[4]), 22)
+        self.assertEqual(len(parts[5]), 2)
+        self.assertEqual(len(parts[6]), 12)
+        self.assertEqual([part['type'] for part in parts[0]], ['Organization', 'Organization'])
+        self.assertEqual([part['type'] for part in parts[1]], ['Source', 'Source'])
+        self.assertEqual([part['type'] for part in parts[2]], ['Source Version'])
+        self.assertEqual(list({part['type'] for part in parts[3]}), ['Concept'])
+        self.assertEqual(list({part['type'] for part in parts[4]}), ['Mapping'])
+        self.assertEqual([part['type'] for part in parts[5]], ['Source Version', 'Source Version'])
+        self.assertEqual(list({part['type'] for part in parts[6]}), ['Concept'])
+        self.assertIsNone(importer.content)
+
+    @override_settings(BULK_IMPORT_PART_SIZE=10)
+    @patch('core.importers.models.RedisService')
+    def test_make_parts_with_max_part_size(self, redis_service_mock):
+        redis_service_mock.return_value = Mock()
+
+        importer = BulkImportParallelRunner(
+            open(
+                os.path.join(os.path.dirname(__file__), '..', 'samples/sample_ocldev.json'), 'r'
+            ).read(),
+            'ocladmin', True
+        )
+
+        self.assertEqual(
+            [len(part) for part in importer.parts], [2, 2, 1, 10, 10, 3, 10, 10, 2, 2, 10, 2])
 
     @patch('core.importers.models.app.control')
     @patch('core.importers.models.RedisService')
@@ -1284,7 +1442,7 @@ class BulkImportViewTest(OCLAPITestCase):
             response.data, {'task': 'task-id', 'state': 'pending', 'queue': 'default', 'username': 'ocladmin'})
         self.assertTrue(DEPRECATED_API_HEADER not in response)
         self.assertEqual(bulk_import_mock.apply_async.call_count, 1)
-        self.assertEqual(bulk_import_mock.apply_async.call_args[0], ((["some-data"], 'ocladmin', True, 5),))
+        self.assertEqual(bulk_import_mock.apply_async.call_args[0], ((["some-data"], 'ocladmin', True, 5, False),))
         self.assertEqual(bulk_import_mock.apply_async.call_args[1]['task_id'][36:], '-ocladmin~priority')
         self.assertEqual(bulk_import_mock.apply_async.call_args[1]['queue'], 'bulk_import_root')
 
@@ -1305,7 +1463,7 @@ class BulkImportViewTest(OCLAPITestCase):
             'username': 'oswell'
         })
         self.assertEqual(bulk_import_mock.apply_async.call_count, 2)
-        self.assertEqual(bulk_import_mock.apply_async.call_args[0], ((["some-data"], 'oswell', True, 2),))
+        self.assertEqual(bulk_import_mock.apply_async.call_args[0], ((["some-data"], 'oswell', True, 2, False),))
         self.assertEqual(bulk_import_mock.apply_async.call_args[1]['task_id'][36:], '-oswell~default')
         self.assertTrue(bulk_import_mock.apply_async.call_args[1]['queue'].startswith('bulk_import_'))
 
@@ -1324,7 +1482,7 @@ class BulkImportViewTest(OCLAPITestCase):
             'username': 'oswell'
         })
         self.assertEqual(bulk_import_mock.apply_async.call_count, 3)
-        self.assertEqual(bulk_import_mock.apply_async.call_args[0], ((["some-data"], 'oswell', True, 10),))
+        self.assertEqual(bulk_import_mock.apply_async.call_args[0], ((["some-data"], 'oswell', True, 10, False),))
         self.assertEqual(bulk_import_mock.apply_async.call_args[1]['task_id'][36:], '-oswell~foobar-queue')
         self.assertTrue(bulk_import_mock.apply_async.call_args[1]['queue'].startswith('bulk_import_'))
 
@@ -1394,7 +1552,11 @@ class BulkImportViewTest(OCLAPITestCase):
         self.assertTrue(DEPRECATED_API_HEADER in response)
         self.assertEqual(response[DEPRECATED_API_HEADER], 'True')
         self.assertEqual(bulk_import_mock.apply_async.call_count, 1)
-        self.assertEqual(bulk_import_mock.apply_async.call_args[0], (('{"key": "value"}', 'ocladmin', True, 5),))
+        content = bulk_import_mock.apply_async.call_args[0][0][0]
+        self.assertEqual(bulk_import_mock.apply_async.call_args[0], ((content, 'ocladmin', True, 5, False),))
+        self.assertTrue(ImportContentStore.is_reference(content))
+        self.assertEqual(list(iter_content_lines(content)), ['{"key": "value"}'])
+        ImportContentStore.delete(content)
         self.assertEqual(bulk_import_mock.apply_async.call_args[1]['task_id'][37:], 'ocladmin~priority')
         self.assertEqual(bulk_import_mock.apply_async.call_args[1]['queue'], 'bulk_import_root')
 
@@ -1419,7 +1581,7 @@ class BulkImportViewTest(OCLAPITestCase):
             'username': 'ocladmin'
         })
         self.assertEqual(bulk_import_mock.apply_async.call_count, 1)
-        self.assertEqual(bulk_import_mock.apply_async.call_args[0], (('{"key": "value"}', 'ocladmin', True),))
+        self.assertEqual(bulk_import_mock.apply_async.call_args[0], (('{"key": "value"}', 'ocladmin', True, False),))
         self.assertEqual(bulk_import_mock.apply_async.call_args[1]['task_id'][37:], 'ocladmin~priority')
         self.assertEqual(bulk_import_mock.apply_async.call_args[1]['queue'], 'bulk_import_root')
 
@@ -1556,7 +1718,7 @@ class TasksTest(OCLTestCase):
         bulk_import_parts_inline([1, 2], 'username', True)  # pylint: disable=no-value-for-parameter
         bulk_import_inline_mock.assert_called_once_with(
             content=None, username='username', update_if_exists=True, input_list=[1, 2],
-            self_task_id=ANY
+            self_task_id=ANY, bulk_load=False
         )
         bulk_import_inline_mock().run.assert_called_once()
 
@@ -1566,7 +1728,7 @@ class TasksTest(OCLTestCase):
 
         bulk_import_inline([1, 2], 'username', True)
         bulk_import_inline_mock.assert_called_once_with(
-            content=[1, 2], username='username', update_if_exists=True
+            content=[1, 2], username='username', update_if_exists=True, bulk_load=False
         )
         bulk_import_inline_mock().run.assert_called_once()
 
@@ -1582,6 +1744,85 @@ class TasksTest(OCLTestCase):
 
 
 class ImportContentParserTest(OCLTestCase):
+    def test_iter_lines(self):
+        self.assertEqual(list(iter_lines([])), [])
+        self.assertEqual(list(iter_lines(['{"a": 1}\n{"b"', ': 2}\n', '{"c": 3}'])), [
+            '{"a": 1}\n', '{"b": 2}\n', '{"c": 3}'
+        ])
+        encoded = '{"name": "Ṡarán"}\n{"name": "x"}\n'.encode('utf-8')
+        self.assertEqual(
+            list(iter_lines([encoded[:11], encoded[11:13], encoded[13:]])),
+            ['{"name": "Ṡarán"}\n', '{"name": "x"}\n']
+        )
+
+    def test_iter_content_lines(self):
+        self.assertEqual(list(iter_content_lines(None)), [])
+        self.assertEqual(list(iter_content_lines('{"a": 1}\r\n\n{"b": 2}')), ['{"a": 1}', '{"b": 2}'])
+        self.assertEqual(list(iter_content_lines([{'a': 1}])), [{'a': 1}])
+
+    @override_settings(IMPORT_READ_CHUNK_SIZE=7, CSV_IMPORT_CHUNK_SIZE=2)
+    def test_parse_csv_file_in_chunks(self):
+        file = SimpleUploadedFile(
+            'concepts.csv',
+            b'resource_type,id,owner_id,owner_type,source,concept_class,datatype,name\n'
+            b'Concept,C1,DemoOrg,Organization,DemoSource,Misc,None,C1\n'
+            b'Concept,C2,DemoOrg,Organization,DemoSource,Misc,None,C2\n'
+            b'Concept,C3,DemoOrg,Organization,DemoSource,Misc,None,"C\n3"\n'
+        )
+
+        parser = ImportContentParser(file=file)
+        parser.parse()
+
+        self.assertEqual(parser.errors, [])
+        self.assertTrue(ImportContentStore.is_reference(parser.content))
+        content = [json.loads(line) for line in iter_content_lines(parser.content)]
+        self.assertEqual([line['id'] for line in content], ['C1', 'C2', 'C3'])
+        self.assertEqual(content[2]['names'][0]['name'], 'C\n3')
+        ImportContentStore.delete(parser.content)
+
+    @override_settings(CSV_IMPORT_CHUNK_SIZE=1)
+    def test_parse_csv_file_keeps_resource_type_order(self):
+        file = SimpleUploadedFile(
+            'concepts.csv',
+            b'resource_type,id,owner_id,owner_type,source,concept_class,datatype,name,map_type,from_concept_url,'
+            b'to_concept_url\n'
+            b'Concept,C1,DemoOrg,Organization,DemoSource,Misc,None,C1,,,\n'
+            b'Mapping,,DemoOrg,Organization,DemoSource,,,,Q-AND-A,/concepts/C1/,/concepts/C2/\n'
+            b'Concept,C2,DemoOrg,Organization,DemoSource,Misc,None,C2,,,\n'
+        )
+
+        parser = ImportContentParser(file=file)
+        parser.parse()
+
+        self.assertEqual(parser.errors, [])
+        self.assertEqual(
+            [json.loads(line)['type'] for line in iter_content_lines(parser.content)],
+            ['Concept', 'Concept', 'Mapping']
+        )
+        ImportContentStore.delete(parser.content)
+
+    @override_settings(IMPORT_CONTENT_BATCH_SIZE=2)
+    def test_parse_json_file_streams_to_store(self):
+        file = SimpleUploadedFile('concepts.json', b'{"type": "Concept", "id": "C1"}\n\n{"type": "Concept"}\n{"a": 1}')
+
+        parser = ImportContentParser(file=file)
+        parser.parse()
+        parser1 = ImportContentParser(
+            file=SimpleUploadedFile('concepts.json', b'{"type": "Concept", "id": "C1"}\n{"type": "Concept"}\n{"a": 1}'))
+        parser1.parse()
+
+        self.assertEqual(parser.errors, [])
+        self.assertEqual(parser.content, parser1.content)
+        self.assertEqual(
+            list(iter_content_lines(parser.content)),
+            ['{"type": "Concept", "id": "C1"}', '{"type": "Concept"}', '{"a": 1}']
+        )
+
+        ImportContentStore.delete(parser.content)
+
+        with self.assertRaises(ValidationError):
+            list(iter_content_lines(parser.content))
+
     def test_parse_content(self):
         parser = ImportContentParser(content='foobar')
         parser.parse()
@@ -1603,7 +1844,7 @@ class ImportContentParserTest(OCLTestCase):
         parser.parse()
 
         self.assertEqual(
-            parser.content,
+            [json.loads(line) for line in iter_content_lines(parser.content)],
             [{
                  'type': 'Organization',
                  'id': 'DemoOrg',
@@ -1788,7 +2029,7 @@ class ImportContentParserTest(OCLTestCase):
     @patch('requests.get')
     def test_parse_zip_file_url(self, requests_get_mock, zipfile_mock):
         file = open(os.path.join(os.path.dirname(__file__), '..', 'samples/DemoSource_v1.0.20230526120030.zip'), 'r')
-        requests_get_mock.return_value = Mock(ok=True, content=b'file-content')
+        requests_get_mock.return_value = Mock(ok=True, iter_content=Mock(return_value=[b'file-', b'content']))
         real_zipfile = ZipFile(file.name, 'r')
         zipfile_mock.return_value = real_zipfile
 
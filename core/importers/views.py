@@ -18,7 +18,7 @@ from core.celery import app
 from core.common.constants import DEPRECATED_API_HEADER
 from core.services.storages.redis import RedisService
 from core.common.swagger_parameters import update_if_exists_param, task_param, result_param, username_param, \
-    file_upload_param, file_url_param, parallel_threads_param, verbose_param
+    file_upload_param, file_url_param, parallel_threads_param, verbose_param, bulk_load_param
 from core.common.utils import parse_bulk_import_task_id, task_exists, flower_get, queue_bulk_import, \
     get_bulk_import_celery_once_lock_key, is_csv_file, get_truthy_values
 from core.importers.constants import ALREADY_QUEUED, INVALID_UPDATE_IF_EXISTS, NO_CONTENT_TO_IMPORT
@@ -44,11 +44,12 @@ def import_response(request, import_queue, data, threads=None, inline=False, dep
             status=status.HTTP_400_BAD_REQUEST
         )
     update_if_exists = update_if_exists == 'true'
+    bulk_load = request.GET.get('bulk_load') in TRUTHY
 
     data = data.decode('utf-8') if isinstance(data, bytes) else data
 
     try:
-        task = queue_bulk_import(data, import_queue, username, update_if_exists, threads, inline)
+        task = queue_bulk_import(data, import_queue, username, update_if_exists, threads, inline, bulk_load=bulk_load)
     except AlreadyQueued:
         return Response({'exception': ALREADY_QUEUED}, status=status.HTTP_409_CONFLICT)
     parsed_task = parse_bulk_import_task_id(task.id)
@@ -226,7 +227,9 @@ class BulkImportParallelInlineView(APIView):
         return super().get_parsers()
 
     @swagger_auto_schema(
-        manual_parameters=[update_if_exists_param, file_url_param, file_upload_param, parallel_threads_param],
+        manual_parameters=[
+            update_if_exists_param, file_url_param, file_upload_param, parallel_threads_param, bulk_load_param
+        ],
         deprecated=True
     )
     def post(self, request, import_queue=None):
@@ -253,7 +256,9 @@ class ImportView(BulkImportParallelInlineView, ImportRetrieveDestroyMixin):
     deprecated = False
 
     @swagger_auto_schema(
-        manual_parameters=[update_if_exists_param, file_url_param, file_upload_param, parallel_threads_param],
+        manual_parameters=[
+            update_if_exists_param, file_url_param, file_upload_param, parallel_threads_param, bulk_load_param
+        ],
     )
     def post(self, request, import_queue=None):
         return super().post(request, import_queue)
@@ -377,7 +382,7 @@ class BulkImportInlineView(APIView):  # pragma: no cover
     deprecated = True
 
     @swagger_auto_schema(
-        manual_parameters=[update_if_exists_param, file_url_param, file_upload_param],
+        manual_parameters=[update_if_exists_param, file_url_param, file_upload_param, bulk_load_param],
         deprecated=True
     )
     def post(self, request, import_queue=None):
@@ -1,11 +1,13 @@
-from unittest.mock import patch
+from unittest.mock import patch, Mock
 
 from django.conf import settings
+from elasticsearch_dsl.utils import AttrDict
 from mock import ANY
 
 from core.bundles.models import Bundle
 from core.collections.tests.factories import OrganizationCollectionFactory, ExpansionFactory
-from core.common.constants import OPENMRS_VALIDATION_SCHEMA
+from core.common.constants import OPENMRS_VALIDATION_SCHEMA, ACCESS_TYPE_NONE
+from core.common.search import CustomESSearch
 from core.common.tasks import rebuild_indexes
 from core.common.tests import OCLAPITestCase
 from core.concepts.documents import ConceptDocument
@@ -798,6 +800,58 @@ class ConceptCreateUpdateDestroyViewTest(OCLAPITestCase):
         self.assertTrue('/concepts/?page=1&limit=1&verbose=true&includeInverseMappings=true' in response['previous'])
         self.assertFalse(response.has_header('next'))
 
+    @patch('core.common.search.CustomESSearch._CustomESSearch__get_response')
+    @patch('core.common.search.get_connection')
+    def test_get_200_search_with_cursor(self, get_connection_mock, es_response_mock):
+        get_connection_mock.return_value = Mock(open_point_in_time=Mock(return_value={'id': 'pit-id'}))
+        concept1 = ConceptFactory(parent=self.source, mnemonic='conceptA')
+        concept2 = ConceptFactory(parent=self.source, mnemonic='conceptB')
+        hits = AttrDict({
+            'hits': [{'_id': str(concept2.id), '_score': 2, 'sort': [2, 11]}],
+            'total': {'value': 2}, 'max_score': 2
+        })
+        es_response_mock.return_value = (AttrDict({'pit_id': 'pit-id2'}), hits)
+
+        response = self.client.get(
+            "/concepts/?q=concept&limit=1&cursor=true",
+            HTTP_AUTHORIZATION='Token ' + self.token,
+            format='json'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([concept['id'] for concept in response.data], [concept2.mnemonic])
+        self.assertEqual(response['num_found'], '2')
+        self.assertEqual(CustomESSearch.decode_cursor(response['next_cursor']), ('pit-id2', [2, 11]))
+        self.assertTrue(f"cursor={response['next_cursor']}" in response['next'])
+        self.assertFalse(response.has_header('previous'))
+        get_connection_mock.return_value.open_point_in_time.assert_called_once()
+
+        hits = AttrDict({
+            'hits': [{'_id': str(concept1.id), '_score': 1, 'sort': [1, 12]}],
+            'total': {'value': 2}, 'max_score': 2
+        })
+        es_response_mock.return_value = (AttrDict({'pit_id': 'pit-id2'}), hits)
+        response = self.client.get(
+            f"/concepts/?q=concept&limit=2&cursor={response['next_cursor']}",
+            HTTP_AUTHORIZATION='Token ' + self.token,
+            format='json'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([concept['id'] for concept in response.data], [concept1.mnemonic])
+        self.assertFalse(response.has_header('next'))
+        self.assertFalse(response.has_header('next_cursor'))
+        get_connection_mock.return_value.open_point_in_time.assert_called_once()
+        get_connection_mock.return_value.close_point_in_time.assert_called_once_with(body={'id': 'pit-id2'})
+
+        response = self.client.get(
+            "/concepts/?q=concept&limit=1&cursor=foobar",
+            HTTP_AUTHORIZATION='Token ' + self.token,
+            format='json'
+        )
+
+        self.assertEqual(response.status_code, 400)
+
 
 class ConceptVersionRetrieveViewTest(OCLAPITestCase):
     def setUp(self):
@@ -1964,6 +2018,75 @@ class ConceptListViewTest(OCLAPITestCase):
         self.assertFalse(class_b_facet[2])
         self.assertEqual([x for x in response.data['facets']['fields']['conceptClass'] if x[0] == 'classa'], [])
 
+    @patch('core.common.views.BaseAPIView.execute_faceted_search')
+    def test_facets_precomputed_for_repo_version(self, execute_faceted_search_mock):
+        execute_faceted_search_mock.return_value = {
+            'conceptClass': [('classb', 1, False)], 'updatedBy': [('ocladmin', 1, False)]
+        }
+
+        response = self.client.get(self.source_v1.uri + 'concepts/?facetsOnly=true')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['facets']['fields'], {'conceptClass': [('classb', 1, False)]})
+        execute_faceted_search_mock.assert_called_once()
+        self.source_v1.refresh_from_db()
+        self.assertEqual(
+            self.source_v1.facets,
+            {'concepts': {'conceptClass': [['classb', 1, False]], 'updatedBy': [['ocladmin', 1, False]]}}
+        )
+
+        execute_faceted_search_mock.reset_mock()
+        response = self.client.get(self.source_v1.uri + 'concepts/?facetsOnly=true&limit=10&verbose=true')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['facets']['fields'], {'conceptClass': [['classb', 1, False]]})
+        execute_faceted_search_mock.assert_not_called()
+
+        self.client.get(self.source_v1.uri + 'concepts/?facetsOnly=true&q=MyConcept')
+        self.client.get(self.source_v1.uri + 'concepts/?facetsOnly=true&conceptClass=classB')
+        self.client.get(self.source.uri + 'HEAD/concepts/?facetsOnly=true')
+        self.assertEqual(execute_faceted_search_mock.call_count, 3)
+        self.source.refresh_from_db()
+        self.assertIsNone(self.source.facets)
+
+
+    @patch('core.common.views.BaseAPIView.execute_faceted_search', autospec=True)
+    def test_facets_precomputed_for_public_scope_only(self, execute_faceted_search_mock):
+        private_concept = ConceptFactory(parent=self.source, concept_class='classC', public_access=ACCESS_TYPE_NONE)
+        self.source_v1.concepts.add(private_concept.get_latest_version())
+        public_facets = {'conceptClass': [('classb', 1, False)]}
+        all_facets = {'conceptClass': [('classb', 1, False), ('classc', 1, False)]}
+        execute_faceted_search_mock.side_effect = lambda view: {
+            **(all_facets if view._should_include_private() else public_facets)  # pylint: disable=protected-access
+        }
+        url = self.source_v1.uri + 'concepts/?facetsOnly=true'
+
+        response = self.client.get(url, HTTP_AUTHORIZATION='Token ' + self.token)
+
+        self.assertEqual(response.data['facets']['fields'], all_facets)
+        self.source_v1.refresh_from_db()
+        self.assertIsNone(self.source_v1.facets)
+
+        response = self.client.get(url)
+
+        self.assertEqual(response.data['facets']['fields'], public_facets)
+        self.source_v1.refresh_from_db()
+        self.assertEqual(self.source_v1.facets, {'concepts': {'conceptClass': [['classb', 1, False]]}})
+        self.assertEqual(execute_faceted_search_mock.call_count, 2)
+
+        response = self.client.get(url, HTTP_AUTHORIZATION='Token ' + self.token)
+
+        self.assertEqual(response.data['facets']['fields'], all_facets)
+        self.assertEqual(execute_faceted_search_mock.call_count, 3)
+
+        self.client.get(url, HTTP_AUTHORIZATION='Token ' + self.random_user.get_token())
+        self.assertEqual(execute_faceted_search_mock.call_count, 4)
+
+        response = self.client.get(url)
+
+        self.assertEqual(response.data['facets']['fields'], {'conceptClass': [['classb', 1, False]]})
+        self.assertEqual(execute_faceted_search_mock.call_count, 4)
+
 
 class ConceptNameRetrieveUpdateDestroyViewTest(OCLAPITestCase):
     def setUp(self):
@@ -2091,6 +2214,15 @@ class ConceptChildrenViewTest(OCLAPITestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(len(response.data), 0)
 
+    def test_get_400_for_invalid_depth(self):
+        concept = ConceptFactory()
+
+        for depth in ['0', '-1', '1.5', 'foo']:
+            response = self.client.get(concept.url + f'children/?depth={depth}')
+
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.data, {'detail': 'depth should be a positive integer or *'})
+
 
 class ConceptCollectionMembershipViewTest(OCLAPITestCase):
     def test_get_200(self):
@@ -1,10 +1,13 @@
 import json
+import os
+import tempfile
 import time
 import zipfile
 
 from celery_once import AlreadyQueued
 from django.conf import settings
 from django.db import transaction
+from django.test import override_settings
 from mock import patch, Mock, ANY, PropertyMock
 from mock.mock import call
 from rest_framework.exceptions import ErrorDetail
@@ -1007,6 +1010,48 @@ class SourceVersionExportViewTest(OCLAPITestCase):
         s3_has_path_mock.assert_called_once_with("users/username/username_source1_v1.")
         s3_url_for_mock.assert_called_once_with(f"users/username/username_source1_v1.{self.v1_updated_at}.zip")
 
+    @patch('core.services.storages.cloud.aws.S3.get_last_key_from_path')
+    def test_get_204_delta(self, s3_get_last_key_from_path_mock):
+        s3_get_last_key_from_path_mock.return_value = None
+
+        response = self.client.get(
+            self.source_v1.uri + 'export/delta/',
+            HTTP_AUTHORIZATION='Token ' + self.token,
+            format='json'
+        )
+
+        self.assertEqual(response.status_code, 204)
+        s3_get_last_key_from_path_mock.assert_called_once_with("deltas/users/username/username_source1_v1.")
+
+    @patch('core.services.storages.cloud.aws.S3.url_for')
+    @patch('core.services.storages.cloud.aws.S3.get_last_key_from_path')
+    def test_get_303_delta(self, s3_get_last_key_from_path_mock, s3_url_for_mock):
+        s3_url = f'https://s3/deltas/users/username/username_source1_v1.{self.v1_updated_at}.zip'
+        s3_url_for_mock.return_value = s3_url
+        s3_get_last_key_from_path_mock.return_value = (
+            f'deltas/users/username/username_source1_v1.{self.v1_updated_at}.zip')
+
+        response = self.client.get(
+            self.source_v1.uri + 'export/delta/',
+            HTTP_AUTHORIZATION='Token ' + self.token,
+            format='json'
+        )
+
+        self.assertEqual(response.status_code, 303)
+        self.assertEqual(response['Location'], s3_url)
+        self.assertEqual(
+            response['Last-Updated'], str(self.source_v1.last_child_update.isoformat()).split('.', maxsplit=1)[0])
+        s3_url_for_mock.assert_called_once_with(
+            f"deltas/users/username/username_source1_v1.{self.v1_updated_at}.zip")
+
+        response = self.client.post(
+            self.source_v1.uri + 'export/delta/',
+            HTTP_AUTHORIZATION='Token ' + self.token,
+            format='json'
+        )
+
+        self.assertEqual(response.status_code, 405)
+
     @patch('core.services.storages.cloud.aws.S3.url_for')
     @patch('core.services.storages.cloud.aws.S3.exists')
     def test_get_303_head(self, s3_exists_mock, s3_url_for_mock):
@@ -1305,6 +1350,124 @@ class ExportSourceTaskTest(OCLAPITestCase):
         import shutil
         shutil.rmtree(latest_temp_dir)
 
+    @override_settings(EXPORT_BATCH_SIZE=2)
+    @patch('core.common.utils.get_export_service')
+    def test_export_source_in_batches(self, export_service_mock):
+        export_service_mock.return_value = Mock(url_for=Mock(return_value='https://s3-url'))
+        source = OrganizationSourceFactory()
+        concepts = [ConceptFactory(parent=source) for _ in range(5)]
+        mappings = [
+            MappingFactory(from_concept=concepts[0], to_concept=concept, parent=source) for concept in concepts[1:]
+        ]
+        export_source(source.id)  # pylint: disable=no-value-for-parameter
+
+        latest_temp_dir = get_latest_dir_in_path('/tmp/')
+        zipped_file = zipfile.ZipFile(latest_temp_dir + '/export.zip')
+        self.assertEqual(zipped_file.namelist(), ['export.json'])
+        exported_data = json.loads(zipped_file.read('export.json').decode('utf-8'))
+
+        self.assertEqual(
+            [concept['uuid'] for concept in exported_data['concepts']],
+            [str(concept.get_latest_version().id) for concept in reversed(concepts)]
+        )
+        self.assertEqual(
+            [mapping['uuid'] for mapping in exported_data['mappings']],
+            [str(mapping.get_latest_version().id) for mapping in reversed(mappings)]
+        )
+
+        import shutil
+        shutil.rmtree(latest_temp_dir)
+
+    @patch('core.common.utils.get_export_service')
+    def test_export_source_delta(self, export_service_mock):  # pylint: disable=too-many-locals
+        s3_mock = Mock(url_for=Mock(return_value='https://s3-url'))
+        export_service_mock.return_value = s3_mock
+        source = OrganizationSourceFactory()
+        changed = ConceptFactory(parent=source, checksums={'standard': 'changed-v1', 'smart': 'changed-v1'})
+        unchanged = ConceptFactory(parent=source, checksums={'standard': 'unchanged', 'smart': 'unchanged'})
+        removed = ConceptFactory(parent=source)
+        mapping = MappingFactory(parent=source, from_concept=changed, to_concept=unchanged)
+        source_v1 = OrganizationSourceFactory(
+            mnemonic=source.mnemonic, organization=source.organization, version='v1', released=True)
+        for resource in [changed, unchanged, removed, mapping]:
+            resource.sources.add(source_v1)
+        changed_v2 = ConceptFactory(
+            parent=source, mnemonic=changed.mnemonic, version='v2', versioned_object=changed,
+            checksums={'standard': 'changed-v2', 'smart': 'changed-v2'})
+        unchanged_v2 = ConceptFactory(
+            parent=source, mnemonic=unchanged.mnemonic, version='v2', versioned_object=unchanged,
+            checksums={'standard': 'unchanged', 'smart': 'unchanged'})
+        added = ConceptFactory(parent=source)
+        source_v2 = OrganizationSourceFactory(
+            mnemonic=source.mnemonic, organization=source.organization, version='v2', released=True)
+        for resource in [changed_v2, unchanged_v2, added, mapping]:
+            resource.sources.add(source_v2)
+
+        export_source(source_v2.id)  # pylint: disable=no-value-for-parameter
+
+        latest_temp_dir = get_latest_dir_in_path('/tmp/')
+        delta = json.loads(zipfile.ZipFile(latest_temp_dir + '/delta.zip').read('delta.json').decode('utf-8'))
+
+        self.assertEqual(
+            delta,
+            {
+                'id': 'v2',
+                'url': source_v2.uri,
+                'previous_version': 'v1',
+                'previous_version_url': source_v1.uri,
+                'concepts': {
+                    'added': ConceptVersionExportSerializer([added], many=True).data,
+                    'changed': ConceptVersionExportSerializer([changed_v2], many=True).data,
+                    'removed': [
+                        {'type': 'Concept', 'id': removed.mnemonic, 'url': removed.uri, 'version_url': removed.uri}
+                    ]
+                },
+                'mappings': {'added': [], 'changed': [], 'removed': []}
+            }
+        )
+        s3_mock.upload_file.assert_called_with(
+            key=f'deltas/{source_v2.version_export_path}', file_path=latest_temp_dir + '/delta.zip', binary=True,
+            metadata={'ContentType': 'application/zip'}, headers={'content-type': 'application/zip'}
+        )
+
+        import shutil
+        shutil.rmtree(latest_temp_dir)
+
+    @override_settings(EXPORT_BATCH_SIZE=2)
+    @patch('core.common.utils.get_export_service')
+    def test_export_source_in_shards(self, export_service_mock):
+        export_service_mock.return_value = Mock(url_for=Mock(return_value='https://s3-url'))
+        source = OrganizationSourceFactory()
+        concepts = [ConceptFactory(parent=source) for _ in range(7)]
+        for concept in concepts[1:]:
+            MappingFactory(from_concept=concepts[0], to_concept=concept, parent=source)
+
+        def get_exported_data():
+            export_source(source.id)  # pylint: disable=no-value-for-parameter
+            latest_temp_dir = get_latest_dir_in_path('/tmp/')
+            exported_data = json.loads(
+                zipfile.ZipFile(latest_temp_dir + '/export.zip').read('export.json').decode('utf-8'))
+            import shutil
+            shutil.rmtree(latest_temp_dir)
+            exported_data.pop('export_time')
+            # the version is processing while written from its shards, as it is while any export task is running
+            exported_data.pop('is_processing')
+            return exported_data
+
+        serially_exported_data = get_exported_data()
+        shards_dir = tempfile.mkdtemp()
+        with override_settings(EXPORT_SHARDS=3, EXPORT_SHARDS_DIR=os.path.join(shards_dir, 'shards')):
+            sharded_exported_data = get_exported_data()
+
+        self.assertEqual(len(sharded_exported_data['concepts']), 7)
+        self.assertEqual(len(sharded_exported_data['mappings']), 6)
+        self.assertEqual(sharded_exported_data, serially_exported_data)
+        self.assertEqual(os.listdir(os.path.join(shards_dir, 'shards')), [])
+        source.refresh_from_db()
+        self.assertEqual(source._background_process_ids, [])  # pylint: disable=protected-access
+        os.rmdir(os.path.join(shards_dir, 'shards'))
+        os.rmdir(shards_dir)
+
 
 class SourceLogoViewTest(OCLAPITestCase):
     def setUp(self):
@@ -1,13 +1,15 @@
+from django.db.models import prefetch_related_objects
 from django_elasticsearch_dsl import Document, fields
 from django_elasticsearch_dsl.registries import registry
 from pydash import get
 
+from core.common.documents import BatchIndexDocumentMixin
 from core.common.utils import jsonify_safe, flatten_dict
 from core.mappings.models import Mapping
 
 
 @registry.register_document
-class MappingDocument(Document):
+class MappingDocument(BatchIndexDocumentMixin, Document):
     class Index:
         name = 'mappings'
         settings = {'number_of_shards': 1, 'number_of_replicas': 0}
@@ -101,30 +103,6 @@ class MappingDocument(Document):
     def prepare_to_concept(instance):
         return [instance.get_to_concept_code(), instance.get_to_concept_name()]
 
-    @staticmethod
-    def prepare_source_version(instance):
-        return list(instance.sources.values_list('version', flat=True))
-
-    @staticmethod
-    def prepare_collection_version(instance):
-        return list(set(instance.expansion_set.values_list('collection_version__version', flat=True)))
-
-    @staticmethod
-    def prepare_expansion(instance):
-        return list(instance.expansion_set.values_list('mnemonic', flat=True))
-
-    @staticmethod
-    def prepare_collection(instance):
-        return list(set(instance.expansion_set.values_list('collection_version__mnemonic', flat=True)))
-
-    @staticmethod
-    def prepare_collection_url(instance):
-        return list(set(list(instance.expansion_set.values_list('collection_version__uri', flat=True))))
-
-    @staticmethod
-    def prepare_collection_owner_url(instance):
-        return list(set(expansion.owner_url for expansion in instance.expansion_set.all()))
-
     @staticmethod
     def prepare_extras(instance):
         value = {}
@@ -135,3 +113,23 @@ class MappingDocument(Document):
                 value = flatten_dict(value)
 
         return value or {}
+
+    def get_batch_prefetches(self):
+        return [
+            'from_source__organization', 'from_source__user', 'to_source__organization', 'to_source__user',
+            'from_concept__parent__organization', 'from_concept__parent__user',
+            'to_concept__parent__organization', 'to_concept__parent__user',
+        ]
+
+    def prefetch_batch(self, instances):
+        super().prefetch_batch(instances)
+        # display names are only needed for concepts whose names are not denormalized on the mapping
+        prefetch_related_objects(
+            [
+                *[instance.from_concept for instance in instances
+                  if instance.from_concept_id and not instance.from_concept_name],
+                *[instance.to_concept for instance in instances
+                  if instance.to_concept_id and not instance.to_concept_name],
+            ],
+            'names'
+        )
@@ -10,13 +10,17 @@ from .custom_validators import OpenMRSMappingValidator
 
 
 class MappingValidationMixin:
-    def clean(self):
-        from .models import Mapping
+    def get_concept_code_errors(self):
         errors = []
         if not self.from_concept_code:
             errors.append(MUST_SPECIFY_FROM_CONCEPT)
         if not self.to_concept_code:
             errors.append(MUST_SPECIFY_TO_CONCEPT_OR_TO_SOURCE)
+        return errors
+
+    def clean(self):
+        from .models import Mapping
+        errors = self.get_concept_code_errors()
         if Mapping.objects.exclude(
                 versioned_object_id=self.versioned_object_id
         ).filter(
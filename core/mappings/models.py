@@ -175,6 +175,13 @@ class Mapping(MappingValidationMixin, SourceChildMixin, VersionedModel):
             'retired': get(data, 'retired')
         }
 
+    @classmethod
+    def get_checksum_rows(cls, ids):
+        return list(Mapping.objects.filter(id__in=ids).values(
+            'id', 'checksums', 'map_type', 'from_concept_code', 'to_concept_code', 'from_concept_name',
+            'to_concept_name', 'retired', 'extras', 'external_id'
+        ))
+
     @staticmethod
     def get_search_document():
         from core.mappings.documents import MappingDocument
@@ -1,3 +1,7 @@
+from functools import reduce
+from operator import or_
+
+from django.db.models import F, Q
 from pydash import get
 from rest_framework.fields import CharField, JSONField, IntegerField, DateTimeField, ListField, SerializerMethodField, \
     FloatField
@@ -5,13 +9,17 @@ from rest_framework.serializers import ModelSerializer
 
 from core.common.constants import MAPPING_LOOKUP_CONCEPTS, MAPPING_LOOKUP_SOURCES, MAPPING_LOOKUP_FROM_CONCEPT, \
     MAPPING_LOOKUP_TO_CONCEPT, MAPPING_LOOKUP_FROM_SOURCE, MAPPING_LOOKUP_TO_SOURCE, INCLUDE_EXTRAS_PARAM, \
-    INCLUDE_SOURCE_VERSIONS, INCLUDE_COLLECTION_VERSIONS, INCLUDE_VERBOSE_REFERENCES
+    INCLUDE_SOURCE_VERSIONS, INCLUDE_COLLECTION_VERSIONS, INCLUDE_VERBOSE_REFERENCES, ACCESS_TYPE_EDIT, ACCESS_TYPE_VIEW
 from core.common.fields import EncodedDecodedCharField
-from core.common.serializers import AbstractResourceSerializer
-from core.common.utils import get_truthy_values
-from core.concepts.serializers import ConceptDetailSerializer
+from core.common.serializers import AbstractResourceSerializer, ExportBatchListSerializer, \
+    RepresentationCacheListSerializer, RepresentationCacheMixin
+from core.common.utils import get_truthy_values, drop_version
+from core.concepts.models import Concept
+from core.concepts.serializers import ConceptDetailSerializer, ConceptVersionExportBatchSerializer
 from core.mappings.models import Mapping
+from core.sources.models import Source
 from core.sources.serializers import SourceListSerializer, SourceDetailSerializer
+from core.toggles.models import Toggle
 
 
 TRUTHY = get_truthy_values()
@@ -80,7 +88,6 @@ class AbstractMappingSerializer(AbstractResourceSerializer):
         params = get(request, 'query_params')
         is_brief = params.get('brief') in TRUTHY
         is_verbose = params.get('verbose') in TRUTHY
-        from core.concepts.models import Concept
         return Concept.get_serializer_class(verbose=is_verbose, brief=is_brief)
 
     def get_from_concept(self, obj):
@@ -98,7 +105,7 @@ class AbstractMappingSerializer(AbstractResourceSerializer):
         return obj.get_checksums()
 
 
-class MappingListSerializer(AbstractMappingSerializer):
+class MappingListSerializer(RepresentationCacheMixin, AbstractMappingSerializer):
     type = CharField(source='resource_type', read_only=True)
     id = CharField(source='mnemonic', required=False)
     uuid = CharField(source='id', read_only=True)
@@ -120,6 +127,7 @@ class MappingListSerializer(AbstractMappingSerializer):
 
     class Meta:
         model = Mapping
+        list_serializer_class = RepresentationCacheListSerializer
         fields = AbstractMappingSerializer.Meta.fields + (
             'external_id', 'retired', 'map_type', 'source', 'owner', 'owner_type',
             'from_concept_code', 'from_concept_name', 'from_concept_url',
@@ -141,6 +149,7 @@ class MappingVersionListSerializer(MappingListSerializer):
 
     class Meta:
         model = Mapping
+        list_serializer_class = RepresentationCacheListSerializer
         fields = MappingListSerializer.Meta.fields + (
             'previous_version_url', 'source_versions', 'collection_versions'
         )
@@ -236,6 +245,7 @@ class MappingDetailSerializer(MappingListSerializer):
 
     class Meta:
         model = Mapping
+        list_serializer_class = RepresentationCacheListSerializer
         fields = MappingListSerializer.Meta.fields + (
             'type', 'uuid', 'extras', 'created_on', 'updated_on', 'created_by',
             'updated_by', 'parent_id', 'public_can_view', 'latest_source_version'
@@ -254,6 +264,143 @@ class MappingDetailSerializer(MappingListSerializer):
         return instance
 
 
+class MappingExportBatchSerializer(MappingDetailSerializer):
+    """
+    Same representation as MappingDetailSerializer (without request context), but a batch of mappings is serialized
+    with a fixed number of queries (concepts, sources and versions are fetched for the whole batch at once).
+    """
+
+    class Meta:
+        model = Mapping
+        fields = MappingDetailSerializer.Meta.fields
+        list_serializer_class = ExportBatchListSerializer
+
+    @staticmethod
+    def get_checksums(obj):
+        return obj['checksums']
+
+    @staticmethod
+    def get_batch_concepts(concept_ids):
+        concepts = list(Concept.objects.filter(id__in=concept_ids).values(
+            'id', 'uri', 'parent_id', 'parent__default_locale', 'parent__supported_locales', '_display_name'))
+        names = Concept.get_batch_names(
+            [concept['id'] for concept in concepts if concept['_display_name'] is None])
+        return {
+            concept['id']: {
+                'url': concept['uri'],
+                'parent_id': concept['parent_id'],
+                'display_name': concept['_display_name'] if concept['_display_name'] is not None else get(
+                    Concept.get_preferred_name(
+                        names[concept['id']], concept['parent__default_locale'], concept['parent__supported_locales']
+                    ), 'name')
+            } for concept in concepts
+        }
+
+    @staticmethod
+    def get_batch_latest_source_versions(mappings):
+        parents = {
+            (mapping['parent__mnemonic'], mapping['parent__organization_id'], mapping['parent__user_id'])
+            for mapping in mappings
+        }
+        latest_versions = {}
+        for version in Source.objects.filter(
+                reduce(or_, [
+                    Q(mnemonic=mnemonic, organization_id=organization_id, user_id=user_id)
+                    for mnemonic, organization_id, user_id in parents
+                ]),
+                is_active=True, released=True
+        ).order_by('-created_at').values('mnemonic', 'organization_id', 'user_id', 'version'):
+            latest_versions.setdefault((version['mnemonic'], version['organization_id'], version['user_id']), version)
+        return latest_versions
+
+    @classmethod
+    def get_batch_rows(cls, queryset):  # pylint: disable=too-many-locals
+        mappings = list(queryset.values(
+            'id', 'mnemonic', 'external_id', 'extras', 'retired', 'map_type', 'version', 'uri', 'created_at',
+            'updated_at', 'comment', 'is_latest_version', 'versioned_object_id', 'checksums', 'public_access',
+            'sort_weight', 'from_concept_id', 'from_concept_code', 'from_concept_name', 'from_source_id',
+            'from_source_url', 'from_source_version', 'to_concept_id', 'to_concept_code', 'to_concept_name',
+            'to_source_id', 'to_source_url', 'to_source_version', 'parent__mnemonic', 'parent__organization_id',
+            'parent__user_id', 'parent__organization__mnemonic', 'parent__user__username', 'created_by__username',
+            'updated_by__username'
+        ))
+        if not mappings:
+            return []
+
+        checksums_toggle = Toggle.get('CHECKSUMS_TOGGLE')
+        concepts = cls.get_batch_concepts(
+            {mapping[f'{end}_concept_id'] for mapping in mappings for end in ['from', 'to']} - {None})
+        sources = {
+            source['id']: source for source in Source.objects.filter(
+                id__in=({mapping[f'{end}_source_id'] for mapping in mappings for end in ['from', 'to']} |
+                        {concept['parent_id'] for concept in concepts.values()}) - {None}
+            ).values('id', 'mnemonic', 'organization__mnemonic', 'user__username')
+        }
+        latest_source_versions = cls.get_batch_latest_source_versions(mappings)
+        in_latest_source_versions = set(Mapping.sources.through.objects.filter(
+            mapping_id__in=[mapping['id'] for mapping in mappings],
+            source__version__in={version['version'] for version in latest_source_versions.values()}
+        ).values_list('mapping_id', 'source__version'))
+        latest_versions = {}
+        for version in Mapping.objects.filter(
+                versioned_object_id__in=[mapping['id'] for mapping in mappings if mapping['id'] == mapping[
+                    'versioned_object_id']], is_active=True, is_latest_version=True
+        ).exclude(id=F('versioned_object_id')).order_by('-created_at').values('versioned_object_id', 'uri'):
+            latest_versions.setdefault(version['versioned_object_id'], version)
+
+        rows = []
+        missing_checksums = []
+        for mapping in mappings:
+            owner, owner_type = ConceptVersionExportBatchSerializer.get_owner(mapping)
+            latest_source_version = latest_source_versions.get(
+                (mapping['parent__mnemonic'], mapping['parent__organization_id'], mapping['parent__user_id']))
+            row = {
+                **mapping,
+                'resource_type': Mapping.OBJECT_TYPE,
+                'source': mapping['parent__mnemonic'],
+                'parent_resource': mapping['parent__mnemonic'],
+                'owner_name': str(owner or ''),
+                'owner_type': owner_type,
+                'url': drop_version(mapping['uri']),
+                'versioned_object_url': drop_version(mapping['uri']),
+                'created_by': {'username': mapping['created_by__username']},
+                'updated_by': {'username': mapping['updated_by__username']},
+                'public_can_view': mapping['public_access'].lower() in [
+                    ACCESS_TYPE_EDIT.lower(), ACCESS_TYPE_VIEW.lower()],
+                'latest_source_version': latest_source_version if latest_source_version and (
+                    mapping['id'], latest_source_version['version']) in in_latest_source_versions else None,
+            }
+            for end in ['from', 'to']:
+                concept = concepts.get(mapping[f'{end}_concept_id'])
+                source = sources.get(mapping[f'{end}_source_id'] or get(concept, 'parent_id'))
+                source_owner, source_owner_type = ConceptVersionExportBatchSerializer.get_owner(
+                    source, '') if source else (None, None)
+                row[f'{end}_concept'] = concept
+                row[f'{end}_source_owner'] = str(source_owner) if source else ''
+                row[f'{end}_source_owner_type'] = source_owner_type
+                row[f'{end}_source_name'] = get(source, 'mnemonic')
+            row['from_concept_url'] = get(row, 'from_concept.url', '')
+            row['to_concept_url'] = get(row, 'to_concept.url')
+            if mapping['id'] != mapping['versioned_object_id']:
+                row['version_url'] = mapping['uri']
+            elif mapping['id'] in latest_versions:
+                row['version_url'] = latest_versions[mapping['id']]['uri']
+            if checksums_toggle:
+                if not mapping['checksums'] or not all(
+                        key in mapping['checksums'] for key in [
+                            Mapping.STANDARD_CHECKSUM_KEY, Mapping.SMART_CHECKSUM_KEY]):
+                    row['checksums'] = Mapping.get_checksums_for_resource(row)
+                    missing_checksums.append(Mapping(id=mapping['id'], checksums=row['checksums']))
+            else:
+                row['checksums'] = None
+            rows.append(row)
+
+        if missing_checksums:
+            Mapping.objects.bulk_update(missing_checksums, ['checksums'])
+
+        return rows
+
+
 class MappingVersionDetailSerializer(MappingDetailSerializer):
     previous_version_url = CharField(read_only=True, source='prev_version_uri')
     source_versions = ListField(read_only=True)
@@ -261,6 +408,7 @@ class MappingVersionDetailSerializer(MappingDetailSerializer):
 
     class Meta:
         model = Mapping
+        list_serializer_class = RepresentationCacheListSerializer
         fields = MappingDetailSerializer.Meta.fields + (
             'previous_version_url', 'source_versions', 'collection_versions',
         )
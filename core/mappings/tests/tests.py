@@ -10,7 +10,7 @@ from core.mappings.documents import MappingDocument
 from core.mappings.models import Mapping
 from core.mappings.serializers import MappingMinimalSerializer, MappingVersionDetailSerializer, \
     MappingDetailSerializer, \
-    MappingVersionListSerializer, MappingListSerializer, MappingReverseMinimalSerializer
+    MappingVersionListSerializer, MappingListSerializer, MappingReverseMinimalSerializer, MappingExportBatchSerializer
 from core.mappings.tests.factories import MappingFactory
 from core.orgs.models import Organization
 from core.orgs.tests.factories import OrganizationFactory
@@ -326,6 +326,77 @@ class MappingTest(OCLTestCase):
             ["Must specify a 'from_concept'. Must specify either 'to_concept_url' or 'to_source_url' & 'to_concept_code'."]   # pylint: disable=line-too-long
         )
 
+    def test_export_batch_serializer(self):
+        source = OrganizationSourceFactory()
+        source_v1 = OrganizationSourceFactory(
+            mnemonic=source.mnemonic, organization=source.organization, version='v1', released=True)
+        from_concept = ConceptFactory(names=[ConceptNameFactory.build(locale='en', locale_preferred=True)])
+        to_concept = ConceptFactory(parent=from_concept.parent, names=[ConceptNameFactory.build(locale='fr')])
+        mapping1 = MappingFactory(parent=source, from_concept=from_concept, to_concept=to_concept)
+        mapping1.sources.add(source_v1)
+        mapping2 = MappingFactory(
+            parent=source, from_concept=to_concept, to_concept=None, to_concept_code='foo', to_source=source)
+        queryset = Mapping.objects.filter(id__in=[
+            mapping1.id, mapping1.get_latest_version().id, mapping2.id]).order_by('-id')
+
+        data = MappingExportBatchSerializer(queryset, many=True).data
+
+        self.assertEqual(len(data), 3)
+        self.assertEqual(data, MappingDetailSerializer(queryset, many=True).data)
+        self.assertEqual(data[0]['latest_source_version'], None)
+        self.assertEqual(data[2]['latest_source_version'], 'v1')
+        self.assertEqual(data[2]['from_concept_name_resolved'], from_concept.display_name)
+        self.assertNotIn('to_concept_name_resolved', data[0])
+        self.assertEqual(data[0]['to_source_name'], source.mnemonic)
+
+        with self.assertNumQueries(8):
+            MappingExportBatchSerializer(queryset.all()[:1], many=True).data  # pylint: disable=expression-not-assigned
+        with self.assertNumQueries(8):
+            MappingExportBatchSerializer(queryset, many=True).data  # pylint: disable=expression-not-assigned
+
+    def test_set_checksums_in_batches(self):
+        source = OrganizationSourceFactory()
+        MappingFactory(parent=source, extras={'foo': 'bar'})
+        MappingFactory(parent=source, to_concept=None, to_concept_code='foo', to_source=source)
+        mappings = Mapping.objects.filter(parent=source)
+        self.assertEqual(mappings.count(), 4)
+        expected = {mapping.id: mapping.get_all_checksums() for mapping in mappings}
+        mappings.update(checksums={'standard': 'foo'})
+
+        with self.assertNumQueries(4):
+            self.assertEqual(Mapping.set_checksums_in_batches(mappings), 4)
+
+        self.assertEqual({mapping.id: mapping.checksums for mapping in mappings}, expected)
+
+    def test_search_document_prepare_batch(self):
+        def normalized(data):
+            return {key: sorted(value, key=str) if isinstance(value, list) else value for key, value in data.items()}
+
+        source = OrganizationSourceFactory()
+        from_concept = ConceptFactory(parent=source, names=[ConceptNameFactory.build(name='From', locale='en')])
+        MappingFactory(parent=source, from_concept=from_concept, extras={'foo': 'bar'})
+        MappingFactory(parent=source, to_concept=None, to_concept_code='foo', to_source=source)
+        source_version = OrganizationSourceFactory(
+            mnemonic=source.mnemonic, organization=source.organization, version='v1', released=True)
+        for mapping in Mapping.objects.filter(parent=source):
+            mapping.sources.add(source_version)
+
+        expected = {
+            mapping.id: normalized(MappingDocument().prepare(mapping))
+            for mapping in Mapping.objects.filter(parent=source)
+        }
+        self.assertEqual(len(expected), 4)
+        self.assertTrue(all(data['is_in_latest_source_version'] for data in expected.values()))
+        self.assertEqual(sum(data['from_concept'] == ['From', None] for data in expected.values()), 2)
+
+        document = MappingDocument()
+        mappings = list(Mapping.objects.filter(parent=source))
+        document.prefetch_batch(mappings)
+        with self.assertNumQueries(0):
+            prepared = {mapping.id: normalized(document.prepare(mapping)) for mapping in mappings}
+
+        self.assertEqual(prepared, expected)
+
 
 class OpenMRSMappingValidatorTest(OCLTestCase):
     def setUp(self):
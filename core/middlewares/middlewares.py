@@ -6,8 +6,10 @@ from request_logging.middleware import LoggingMiddleware
 
 from core.common.constants import VERSION_HEADER, REQUEST_USER_HEADER, RESPONSE_TIME_HEADER, REQUEST_URL_HEADER, \
     REQUEST_METHOD_HEADER
+from core.common.models import ConceptContainerModel
 from core.common.utils import set_current_user, set_request_url
 from core.services.auth.core import AuthService
+from core.toggles.models import Toggle
 
 request_logger = logging.getLogger('request_logger')
 MAX_BODY_LENGTH = 50000
@@ -64,6 +66,21 @@ class CurrentUserMiddleware(BaseMiddleware):
         return response
 
 
+class ToggleMemoMiddleware(BaseMiddleware):
+    def __call__(self, request):
+        Toggle.start_request_memo()
+        try:
+            return self.get_response(request)
+        finally:
+            Toggle.end_request_memo()
+
+
+class ResolutionMemoMiddleware(BaseMiddleware):
+    def __call__(self, request):
+        with ConceptContainerModel.resolution_memo_scope():
+            return self.get_response(request)
+
+
 class TokenAuthMiddleWare(BaseMiddleware):
     def __call__(self, request):
         if not AuthService.is_valid_django_token(request):
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.4 on 2026-10-18 19:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RepoStatistics',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resource_id', models.PositiveIntegerField()),
+                ('data', models.JSONField(default=dict)),
+                ('is_stale', models.BooleanField(db_index=True, default=False)),
+                ('generation', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('resource_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype')),
+            ],
+            options={
+                'db_table': 'repo_statistics',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='repostatistics',
+            constraint=models.UniqueConstraint(fields=('resource_type', 'resource_id'), name='repo_statistics_unique'),
+        ),
+    ]
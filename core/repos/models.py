@@ -1,3 +1,14 @@
+import copy
+import json
+
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.models import ContentType
+from django.db import models
+from django.db.models import UniqueConstraint, F, Value
+from django.db.models.expressions import CombinedExpression
+from pydash import compact
+from rest_framework.utils.encoders import JSONEncoder
+
 from core.collections.models import Collection
 from core.sources.models import Source
 
@@ -11,3 +22,97 @@ class Repository:
             repo = Collection.objects.filter(criteria).first()
 
         return repo
+
+
+class RepoStatistics(models.Model):
+    """
+    Materialized summary statistics (distributions, counts) of a source/collection version.
+    data holds the result of each statistic by name, computed on first read. Concept/mapping writes mark
+    the row stale, a stale statistic is recomputed on its next read and stale rows are refreshed in batches
+    by the refresh_stale_repo_statistics beat task. generation guards against storing results computed
+    before the latest write.
+    """
+    class Meta:
+        db_table = 'repo_statistics'
+        constraints = [
+            UniqueConstraint(fields=['resource_type', 'resource_id'], name='repo_statistics_unique')
+        ]
+
+    resource_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    resource_id = models.PositiveIntegerField()
+    resource = GenericForeignKey('resource_type', 'resource_id')
+    data = models.JSONField(default=dict)
+    is_stale = models.BooleanField(default=False, db_index=True)
+    generation = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def get_for(cls, repo):
+        instance, _ = cls.objects.get_or_create(
+            resource_type=ContentType.objects.get_for_model(repo), resource_id=repo.id)
+        return instance
+
+    @classmethod
+    def mark_stale(cls, model, ids):
+        if ids:
+            cls.objects.filter(
+                resource_type=ContentType.objects.get_for_model(model), resource_id__in=ids
+            ).update(is_stale=True, generation=F('generation') + 1)
+
+    @classmethod
+    def invalidate(cls, *repos):
+        for repo in {repo for repo in repos if repo and repo.id}:
+            cls.mark_stale(repo.__class__, [repo.id])
+            cls.reset(repo)
+
+    @classmethod
+    def invalidate_for(cls, instances):
+        """Marks the parent sources of the given concepts/mappings stale"""
+        instances = compact(instances)
+        cls.mark_stale(Source, {instance.parent_id for instance in instances if instance.parent_id})
+        for instance in instances:
+            if type(instance).parent.is_cached(instance):
+                cls.reset(instance.parent)
+
+    @staticmethod
+    def reset(repo):
+        """Drops the row memoized by repo.statistics, so that the next read sees the stale flag"""
+        if repo:
+            repo.__dict__.pop('statistics', None)
+
+    @staticmethod
+    def to_json(value):
+        return json.loads(json.dumps(value, cls=JSONEncoder))
+
+    def fetch(self, name, compute):
+        if self.is_stale or name not in self.data:
+            self.store(name, self.to_json(compute()))
+        return copy.deepcopy(self.data[name])
+
+    def store(self, name, value):
+        queryset = RepoStatistics.objects.filter(id=self.id, generation=self.generation)
+        if self.is_stale:
+            self.data = {name: value}
+            queryset.update(data=self.data, is_stale=False)
+        else:
+            self.data[name] = value
+            queryset.update(data=CombinedExpression(F('data'), '||', Value({name: value}, models.JSONField())))
+        self.is_stale = False
+
+    def refresh(self):
+        repo = self.resource
+        if not repo:
+            self.delete()
+            return
+        data = {}
+        for name in self.data:
+            attr = getattr(type(repo), name, None)
+            func = get_statistic_func(attr)
+            if func:
+                data[name] = self.to_json(func(repo))
+        RepoStatistics.objects.filter(id=self.id, generation=self.generation).update(data=data, is_stale=False)
+
+
+def get_statistic_func(attr):
+    func = attr.fget if isinstance(attr, property) else attr
+    return getattr(func, '__wrapped__', None)
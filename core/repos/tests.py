@@ -1,8 +1,13 @@
+from unittest.mock import Mock, patch
+
 from core.collections.documents import CollectionDocument
 from core.collections.models import Collection
 from core.collections.tests.factories import OrganizationCollectionFactory, UserCollectionFactory
-from core.common.tests import OCLAPITestCase
+from core.common.tasks import refresh_stale_repo_statistics
+from core.common.tests import OCLAPITestCase, OCLTestCase
+from core.concepts.tests.factories import ConceptFactory
 from core.orgs.tests.factories import OrganizationFactory
+from core.repos.models import RepoStatistics
 from core.sources.documents import SourceDocument
 from core.sources.models import Source
 from core.sources.tests.factories import OrganizationSourceFactory, UserSourceFactory
@@ -135,3 +140,105 @@ class UserOrganizationRepoListViewTest(OCLAPITestCase):
 
         self.assertEqual(response.status_code, 200)
         self.assertEqual(len(response.data), 0)
+
+
+class RepoStatisticsTest(OCLTestCase):
+    def test_fetch_and_store(self):
+        source = OrganizationSourceFactory()
+        statistics = RepoStatistics.get_for(source)
+        compute = Mock(return_value={'total': 1})
+
+        self.assertEqual(statistics.fetch('foo', compute), {'total': 1})
+        self.assertEqual(statistics.fetch('foo', compute), {'total': 1})
+        self.assertEqual(compute.call_count, 1)
+
+        statistics.fetch('bar', Mock(return_value=2))
+        self.assertEqual(RepoStatistics.get_for(source).data, {'foo': {'total': 1}, 'bar': 2})
+
+        RepoStatistics.invalidate(source)
+        statistics = RepoStatistics.get_for(source)
+        self.assertTrue(statistics.is_stale)
+        self.assertEqual(statistics.generation, 1)
+
+        self.assertEqual(statistics.fetch('foo', Mock(return_value={'total': 2})), {'total': 2})
+        statistics = RepoStatistics.get_for(source)
+        self.assertFalse(statistics.is_stale)
+        self.assertEqual(statistics.data, {'foo': {'total': 2}})
+
+    def test_statistics_memoized_per_repo(self):
+        source = OrganizationSourceFactory()
+        statistics = source.statistics
+        source.concept_class_count  # pylint: disable=pointless-statement
+
+        with self.assertNumQueries(0):
+            self.assertIs(source.statistics, statistics)
+            self.assertEqual(source.concept_class_count, 0)
+
+        ConceptFactory(parent=source, concept_class='Diagnosis')
+
+        self.assertIsNot(source.statistics, statistics)
+        self.assertEqual(source.concept_class_count, 1)
+
+    def test_store_skips_results_older_than_latest_write(self):
+        source = OrganizationSourceFactory()
+        statistics = RepoStatistics.get_for(source)
+        RepoStatistics.invalidate(source)
+
+        statistics.store('foo', 1)
+
+        statistics = RepoStatistics.get_for(source)
+        self.assertTrue(statistics.is_stale)
+        self.assertEqual(statistics.data, {})
+
+    def test_materialized_statistic(self):
+        source = OrganizationSourceFactory()
+        ConceptFactory(parent=source, concept_class='Diagnosis')
+
+        self.assertEqual(source.concept_class_count, 1)
+        self.assertEqual(RepoStatistics.get_for(source).data, {'concept_class_count': 1})
+
+        ConceptFactory(parent=source, concept_class='Procedure')
+
+        self.assertTrue(RepoStatistics.get_for(source).is_stale)
+        self.assertEqual(source.concept_class_count, 2)
+        self.assertCountEqual(
+            source.get_concept_class_distribution(), [{'concept_class': 'Diagnosis', 'count': 1},
+                                                      {'concept_class': 'Procedure', 'count': 1}]
+        )
+        self.assertEqual(
+            sorted(RepoStatistics.get_for(source).data), ['concept_class_count', 'get_concept_class_distribution'])
+
+    def test_refresh_stale_repo_statistics(self):
+        source = OrganizationSourceFactory()
+        ConceptFactory(parent=source, datatype='Text')
+        self.assertEqual(source.datatype_count, 1)
+        ConceptFactory(parent=source, datatype='Numeric')
+
+        self.assertEqual(refresh_stale_repo_statistics(), 1)
+
+        statistics = RepoStatistics.get_for(source)
+        self.assertFalse(statistics.is_stale)
+        self.assertEqual(statistics.data, {'datatype_count': 2})
+        self.assertEqual(refresh_stale_repo_statistics(), 0)
+
+    def test_version_delete_marks_head_stale(self):
+        source = OrganizationSourceFactory()
+        version = OrganizationSourceFactory(
+            version='v1', mnemonic=source.mnemonic, organization=source.organization)
+        self.assertEqual(source.versions_distribution, {'total': 2, 'released': 0})
+
+        version.delete()
+
+        self.assertTrue(RepoStatistics.get_for(source).is_stale)
+        self.assertEqual(Source.objects.get(id=source.id).versions_distribution, {'total': 1, 'released': 0})
+
+    @patch('core.sources.models.Source._get_sources_map_type_distribution', return_value=[])
+    def test_cross_source_distributions_are_computed_live(self, distribution_mock):
+        source = OrganizationSourceFactory()
+
+        self.assertEqual(source.get_from_sources_map_type_distribution(), [])
+        self.assertEqual(source.get_to_sources_map_type_distribution(), [])
+        self.assertEqual(source.get_from_sources_map_type_distribution(), [])
+
+        self.assertEqual(distribution_mock.call_count, 3)
+        self.assertEqual(RepoStatistics.get_for(source).data, {})
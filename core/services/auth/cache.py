@@ -0,0 +1,94 @@
+import hashlib
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import cache
+from pydash import get
+
+
+class AuthCache:
+    """
+    Caches the user id a Django token or an OIDC access token authenticated as, in this process (bounded, for
+    AUTH_CACHE_LOCAL_TTL secs) and in redis (for AUTH_CACHE_TTL secs). Tokens are only kept as sha256 digests.
+    Deleted tokens are dropped from redis and from this process, other processes drop them once their local
+    entry expires. Users are always loaded by id, so deactivated users fail authentication right away.
+    """
+    PREFIX = 'auth'
+    DJANGO = 'token'
+    OIDC = 'oidc'
+    MAX_LOCAL_ENTRIES = 10000
+    entries = OrderedDict()  # per process, key -> (user_id, expires_at)
+    lock = Lock()  # entries are shared by the threads of the process
+
+    @staticmethod
+    def is_enabled():
+        return bool(settings.AUTH_CACHE_TTL) and not get(settings, 'TEST_MODE', False)
+
+    @classmethod
+    def get_key(cls, kind, token):
+        return f'{cls.PREFIX}:{kind}:' + hashlib.sha256(token.encode()).hexdigest()
+
+    @classmethod
+    def get_user_id(cls, kind, token):
+        if not cls.is_enabled() or not token:
+            return None
+        key = cls.get_key(kind, token)
+        with cls.lock:
+            entry = cls.entries.get(key)
+        if entry and entry[1] > time.monotonic():
+            return entry[0]
+
+        try:
+            user_id = cache.get(key)
+        except:  # pylint: disable=bare-except
+            user_id = None
+        if user_id:
+            cls.set_local(key, user_id)
+        return user_id
+
+    @classmethod
+    def set_user_id(cls, kind, token, user_id, timeout=None):
+        """timeout (secs) caps AUTH_CACHE_TTL, e.g. to the remaining lifetime of the token"""
+        timeout = settings.AUTH_CACHE_TTL if timeout is None else min(int(timeout), settings.AUTH_CACHE_TTL)
+        if not cls.is_enabled() or not token or not user_id or timeout <= 0:
+            return
+        key = cls.get_key(kind, token)
+        cls.set_local(key, user_id, timeout)
+        try:
+            cache.set(key, user_id, timeout)
+        except:  # pylint: disable=bare-except
+            pass
+
+    @classmethod
+    def set_local(cls, key, user_id, timeout=None):
+        timeout = settings.AUTH_CACHE_LOCAL_TTL if timeout is None else min(timeout, settings.AUTH_CACHE_LOCAL_TTL)
+        with cls.lock:
+            cls.entries[key] = (user_id, time.monotonic() + timeout)
+            cls.entries.move_to_end(key)
+            while len(cls.entries) > cls.MAX_LOCAL_ENTRIES:
+                cls.entries.popitem(last=False)
+
+    @classmethod
+    def fetch_user_id(cls, kind, token, get_user_id):
+        user_id = cls.get_user_id(kind, token)
+        if user_id is None:
+            user_id = get_user_id()
+            cls.set_user_id(kind, token, user_id)
+        return user_id
+
+    @classmethod
+    def invalidate(cls, kind, token):
+        key = cls.get_key(kind, token)
+        with cls.lock:
+            cls.entries.pop(key, None)
+        try:
+            cache.delete(key)
+        except:  # pylint: disable=bare-except
+            pass
+
+    @classmethod
+    def clear(cls):
+        with cls.lock:
+            cls.entries.clear()
@@ -25,9 +25,22 @@ class AuthService:
         authorization_header = request.META.get('HTTP_AUTHORIZATION')
         if authorization_header and authorization_header.startswith('Token '):
             token_key = authorization_header.replace('Token ', '')
-            return Token.objects.filter(key=token_key).exists()
+            return bool(AuthService.get_django_token_user_id(request, token_key))
         return False
 
+    @staticmethod
+    def get_django_token_user_id(request, token_key):
+        """Memoized on the request, it is checked by the middleware and again by authentication"""
+        from core.services.auth.cache import AuthCache
+        request = getattr(request, '_request', request)
+        memo = request.__dict__.setdefault('_django_token_user_ids', {})
+        if token_key not in memo:
+            memo[token_key] = AuthCache.fetch_user_id(
+                AuthCache.DJANGO, token_key,
+                lambda: Token.objects.filter(key=token_key).values_list('user_id', flat=True).first()
+            )
+        return memo[token_key]
+
 
 class AbstractAuthService:
     def __init__(self, username=None, password=None, user=None):
@@ -1,12 +1,12 @@
 from django.contrib.auth.backends import ModelBackend
-from rest_framework.authentication import TokenAuthentication
 
+from core.common.authentication import OCLTokenAuthentication
 from core.services.auth.core import AbstractAuthService
 
 
 class DjangoAuthService(AbstractAuthService):
     token_type = 'Token'
-    authentication_class = TokenAuthentication
+    authentication_class = OCLTokenAuthentication
     authentication_backend_class = ModelBackend
 
     def get_token(self, check_password=True):
@@ -1,8 +1,21 @@
+import base64
+import json
+import time
+from threading import Thread
 from unittest.mock import patch, Mock, ANY
 
+from django.test import RequestFactory
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+from core.common.authentication import OCLTokenAuthentication
+from core.common.backends import OCLOIDCAuthenticationBackend
+from core.services.auth.cache import AuthCache
+from core.services.auth.core import AuthService
 from core.services.auth.django import DjangoAuthService
 from core.services.auth.openid import OpenIDAuthService
 from core.common.tests import OCLTestCase
+from core.users.models import UserProfile
 from core.users.tests.factories import UserProfileFactory
 
 
@@ -21,6 +34,116 @@ class DjangoAuthServiceTest(OCLTestCase):
         self.assertTrue(len(token), 64)
 
 
+class AuthCacheTest(OCLTestCase):
+    def setUp(self):
+        super().setUp()
+        AuthCache.clear()
+
+    def tearDown(self):
+        AuthCache.clear()
+        super().tearDown()
+
+    def test_is_valid_django_token(self):
+        user = UserProfileFactory()
+        token = user.get_token()
+        AuthCache.invalidate(AuthCache.DJANGO, token)
+
+        def get_request():
+            return RequestFactory().get('/', HTTP_AUTHORIZATION=f'Token {token}')
+
+        with self.settings(TEST_MODE=False):
+            request = get_request()
+            with self.assertNumQueries(1):
+                self.assertTrue(AuthService.is_valid_django_token(request))
+                self.assertTrue(AuthService.is_valid_django_token(request))
+            with self.assertNumQueries(0):
+                self.assertTrue(AuthService.is_valid_django_token(get_request()))
+            self.assertEqual(AuthCache.get_user_id(AuthCache.DJANGO, token), user.id)
+
+            user.deactivate()
+
+            self.assertIsNone(AuthCache.get_user_id(AuthCache.DJANGO, token))
+            self.assertFalse(AuthService.is_valid_django_token(get_request()))
+            self.assertFalse(
+                AuthService.is_valid_django_token(RequestFactory().get('/', HTTP_AUTHORIZATION='Bearer foo')))
+
+    def test_token_authentication(self):
+        user = UserProfileFactory()
+        token = user.get_token()
+        AuthCache.invalidate(AuthCache.DJANGO, token)
+
+        with self.settings(TEST_MODE=False):
+            self.assertEqual(OCLTokenAuthentication().authenticate_credentials(token)[0], user)
+            with self.assertNumQueries(1):
+                authenticated_user, authenticated_token = OCLTokenAuthentication().authenticate_credentials(token)
+            self.assertEqual(authenticated_user, user)
+            self.assertEqual(authenticated_token.key, token)
+
+            UserProfile.objects.filter(id=user.id).update(is_active=False)
+
+            with self.assertRaises(AuthenticationFailed):
+                OCLTokenAuthentication().authenticate_credentials(token)
+
+            Token.objects.filter(key=token).delete()
+            self.assertIsNone(AuthCache.get_user_id(AuthCache.DJANGO, token))
+
+    @patch('mozilla_django_oidc.auth.OIDCAuthenticationBackend.get_or_create_user')
+    def test_oidc_get_or_create_user(self, get_or_create_user_mock):
+        user = UserProfileFactory()
+        get_or_create_user_mock.return_value = user
+        AuthCache.invalidate(AuthCache.OIDC, 'access-token')
+        backend = OCLOIDCAuthenticationBackend()
+
+        payload = {'exp': time.time() + 60}
+
+        with self.settings(TEST_MODE=False):
+            self.assertEqual(backend.get_or_create_user('access-token', None, payload), user)
+            self.assertEqual(backend.get_or_create_user('access-token', None, payload), user)
+            get_or_create_user_mock.assert_called_once_with('access-token', None, payload)
+
+            user.deactivate()
+
+            self.assertEqual(backend.get_or_create_user('access-token', None, payload), user)
+            self.assertEqual(get_or_create_user_mock.call_count, 2)
+
+        AuthCache.invalidate(AuthCache.OIDC, 'access-token')
+
+    @patch('core.services.auth.cache.cache')
+    @patch('mozilla_django_oidc.auth.OIDCAuthenticationBackend.get_or_create_user')
+    def test_oidc_get_or_create_user_caches_till_token_expiry(self, get_or_create_user_mock, cache_mock):
+        user = UserProfileFactory()
+        get_or_create_user_mock.return_value = user
+        cache_mock.get.return_value = None
+        backend = OCLOIDCAuthenticationBackend()
+        claims = base64.urlsafe_b64encode(json.dumps({'exp': time.time() + 60}).encode()).decode().rstrip('=')
+        jwt = f'header.{claims}.signature'
+
+        with self.settings(TEST_MODE=False, AUTH_CACHE_TTL=3600):
+            self.assertEqual(backend.get_or_create_user(jwt, None, None), user)
+            cache_mock.set.assert_called_once_with(AuthCache.get_key(AuthCache.OIDC, jwt), user.id, ANY)
+            self.assertTrue(55 <= cache_mock.set.call_args[0][2] <= 60)
+
+            cache_mock.set.reset_mock()
+            self.assertEqual(backend.get_or_create_user('opaque-token', None, None), user)
+            self.assertEqual(backend.get_or_create_user('expired-token', None, {'exp': time.time() - 1}), user)
+            cache_mock.set.assert_not_called()
+            self.assertIsNone(AuthCache.get_user_id(AuthCache.OIDC, 'expired-token'))
+
+    def test_set_local_is_thread_safe(self):
+        def set_local(index):
+            for i in range(500):
+                AuthCache.set_local(f'key-{(index + i) % 50}', i)
+
+        with self.settings(AUTH_CACHE_LOCAL_TTL=60):
+            threads = [Thread(target=set_local, args=(index,)) for index in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(len(AuthCache.entries), 50)
+
+
 class OpenIDAuthServiceTest(OCLTestCase):
     def test_get_login_redirect_url(self):
         self.assertEqual(
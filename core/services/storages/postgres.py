@@ -29,3 +29,9 @@ class PostgresQL:
         with connection.cursor() as cursor:
             cursor.execute(f"SELECT last_value from {seq_name};")
             return cursor.fetchone()[0]
+
+    @staticmethod
+    def next_values(seq_name, count):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT nextval('{seq_name}') FROM generate_series(1, {int(count)});")
+            return [row[0] for row in cursor.fetchall()]
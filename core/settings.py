@@ -99,7 +99,7 @@ INSTALLED_APPS = [
     'core.pins',
     'core.client_configs',
     'core.tasks',
-    'core.toggles',
+    'core.toggles.apps.ToggleConfig',
     'core.repos',
     'core.url_registry',
 ]
@@ -162,6 +162,8 @@ MIDDLEWARE = [
     'core.middlewares.middlewares.FixMalformedLimitParamMiddleware',
     'core.middlewares.middlewares.ResponseHeadersMiddleware',
     'core.middlewares.middlewares.CurrentUserMiddleware',
+    'core.middlewares.middlewares.ToggleMemoMiddleware',
+    'core.middlewares.middlewares.ResolutionMemoMiddleware',
     'core.middlewares.middlewares.FhirMiddleware'
 ]
 
@@ -331,6 +333,35 @@ AZURE_STORAGE_CONNECTION_STRING = os.environ.get('AZURE_STORAGE_CONNECTION_STRIN
 
 # Repo Export Upload/download
 EXPORT_SERVICE = os.environ.get('EXPORT_SERVICE', 'core.services.storages.cloud.aws.S3')
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 100))
+EXPORT_SHARDS = int(os.environ.get('EXPORT_SHARDS', 1))  # > 1 serializes concepts/mappings in parallel celery tasks
+EXPORT_SHARDS_DIR = os.environ.get('EXPORT_SHARDS_DIR', '/tmp/export-shards')  # must be shared by the celery workers
+TOGGLES_CACHE_TTL = int(os.environ.get('TOGGLES_CACHE_TTL', 10))  # seconds, 0 reads toggles from the db every time
+CHECKSUM_BATCH_SIZE = int(os.environ.get('CHECKSUM_BATCH_SIZE', 1000))  # resources per bulk checksum update
+DISPLAY_NAME_BATCH_SIZE = int(os.environ.get('DISPLAY_NAME_BATCH_SIZE', 1000))  # concepts per bulk display name update
+BULK_LOAD_BATCH_SIZE = int(os.environ.get('BULK_LOAD_BATCH_SIZE', 1000))  # import lines per bulk_create pass
+IMPORT_READ_CHUNK_SIZE = int(os.environ.get('IMPORT_READ_CHUNK_SIZE', 1024 * 1024))  # bytes read at a time
+IMPORT_SPOOL_MAX_SIZE = int(os.environ.get('IMPORT_SPOOL_MAX_SIZE', 50 * 1024 * 1024))  # larger downloads go to disk
+CSV_IMPORT_CHUNK_SIZE = int(os.environ.get('CSV_IMPORT_CHUNK_SIZE', 10000))  # csv rows converted at a time
+BULK_IMPORT_PART_SIZE = int(os.environ.get('BULK_IMPORT_PART_SIZE', 20000))  # max lines held/queued per import part
+IMPORT_CONTENT_BATCH_SIZE = int(os.environ.get('IMPORT_CONTENT_BATCH_SIZE', 1000))  # lines sent to redis at a time
+IMPORT_CONTENT_EXPIRY = 86400  # seconds, in case the import task never runs
+ES_INDEX_BATCH_SIZE = int(os.environ.get('ES_INDEX_BATCH_SIZE', 500))  # documents prepared/bulk indexed at a time
+ES_PIT_KEEP_ALIVE = os.environ.get('ES_PIT_KEEP_ALIVE', '2m')  # how long a search cursor stays valid between pages
+ES_SCAN_BATCH_SIZE = int(os.environ.get('ES_SCAN_BATCH_SIZE', 1000))  # hits fetched per scroll page
+ES_SYNC_QUEUE = os.environ.get('ES_SYNC_QUEUE', 'true').lower() == 'true'  # coalesce save/m2m index updates
+ES_SYNC_QUEUE_FLUSH_SIZE = int(os.environ.get('ES_SYNC_QUEUE_FLUSH_SIZE', 5000))  # pending ids that trigger a flush
+ES_SYNC_QUEUE_FLUSH_INTERVAL = int(os.environ.get('ES_SYNC_QUEUE_FLUSH_INTERVAL', 10))  # seconds between flushes
+ES_SYNC_QUEUE_MAX_BACKLOG = int(os.environ.get('ES_SYNC_QUEUE_MAX_BACKLOG', 500000))  # healthcheck fails above it
+LIST_RESPONSE_CACHE_TTL = int(os.environ.get('LIST_RESPONSE_CACHE_TTL', 60))  # seconds, 0 disables list response cache
+AUTH_CACHE_TTL = int(os.environ.get('AUTH_CACHE_TTL', 300))  # seconds token -> user id is cached in redis, 0 disables
+AUTH_CACHE_LOCAL_TTL = int(os.environ.get('AUTH_CACHE_LOCAL_TTL', 10))  # seconds it is kept in process
+TERMINOLOGY_CACHE_TTL = int(os.environ.get(
+    'TERMINOLOGY_CACHE_TTL', 86400))  # seconds canonical url resolutions and code indexes are kept, 0 disables
+REPRESENTATION_CACHE_TTL = int(os.environ.get(
+    'REPRESENTATION_CACHE_TTL', 86400))  # seconds serialized concept/mapping versions are kept, 0 disables
+REPO_STATISTICS_REFRESH_BATCH_SIZE = int(
+    os.environ.get('REPO_STATISTICS_REFRESH_BATCH_SIZE', 50))  # stale repo statistics refreshed per beat run
 
 DISABLE_VALIDATION = os.environ.get('DISABLE_VALIDATION', False)
 API_SUPERUSER_PASSWORD = os.environ.get('API_SUPERUSER_PASSWORD', 'Root123')  # password for ocladmin superuser
@@ -407,6 +438,7 @@ CELERY_TASK_ROUTES = {
     'core.common.tasks.handle_save': {'queue': 'indexing'},
     'core.common.tasks.handle_m2m_changed': {'queue': 'indexing'},
     'core.common.tasks.handle_pre_delete': {'queue': 'indexing'},
+    'core.common.tasks.flush_index_sync_queue': {'queue': 'indexing'},
     'core.common.tasks.populate_indexes': {'queue': 'indexing'},
     'core.common.tasks.rebuild_indexes': {'queue': 'indexing'}
 }
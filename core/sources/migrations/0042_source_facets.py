@@ -0,0 +1,18 @@
+# Generated by Django 4.2.4 on 2026-10-18 19:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sources', '0041_source_source_org_released_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='source',
+            name='facets',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -9,7 +9,7 @@ from django.db.models.functions import Cast
 from pydash import get
 
 from core.common.constants import HEAD
-from core.common.models import ConceptContainerModel
+from core.common.models import ConceptContainerModel, materialized_statistic
 from core.common.tasks import update_mappings_source, index_source_concepts, index_source_mappings
 from core.common.validators import validate_non_negative
 from core.concepts.models import ConceptName, Concept
@@ -361,6 +361,9 @@ class Source(DirtyFieldsMixin, ConceptContainerModel):
         self.batch_index(self.concepts, ConceptDocument)
         self.batch_index(self.mappings, MappingDocument)
 
+    def get_index_tasks(self):
+        return [(index_source_concepts, {'source_id': self.id}), (index_source_mappings, {'source_id': self.id})]
+
     def __get_resource_db_sequence_prefix(self):
         return self.uri.replace('/', '_').replace('-', '_').replace('.', '_').replace('@', '_')
 
@@ -660,6 +663,8 @@ class Source(DirtyFieldsMixin, ConceptContainerModel):
     def to_sources(self):
         return Source.objects.filter(id__in=self.referenced_to_sources().values_list('id', flat=True))
 
+    # the mappings to/from other sources are not owned by this source, so their changes (or the removal of the other
+    # sources) never mark its statistics stale, these are computed live
     def get_to_sources_map_type_distribution(self, source_names=None):
         sources = self.to_sources
         if source_names:
@@ -750,6 +755,7 @@ class Source(DirtyFieldsMixin, ConceptContainerModel):
         )
 
     @property
+    @materialized_statistic
     def mappings_distribution(self):
         facets = self.get_mapping_facets()
 
@@ -762,6 +768,14 @@ class Source(DirtyFieldsMixin, ConceptContainerModel):
             'contributors': self._to_clean_facets(facets.updatedBy or [])
         }
 
+    def get_facets_search_filters(self):
+        return {
+            'owner': self.parent.mnemonic,
+            'owner_type': self.parent.resource_type,
+            'source': self.mnemonic,
+            'source_version': self.version
+        }
+
     def _get_resource_facet_filters(self, filters=None):
         _filters = {
             'source': self.mnemonic,
@@ -770,6 +770,30 @@ class SourceTest(OCLTestCase):
         self.assertEqual(resolved_version.canonical_url, None)
         self.assertFalse(resolved_version.is_fqdn)
 
+    def test_resolve_reference_expression_in_resolution_memo_scope(self):
+        org = OrganizationFactory(mnemonic='org')
+        source = OrganizationSourceFactory(mnemonic='source', organization=org)
+        source_v1 = OrganizationSourceFactory(mnemonic='source', organization=org, version='v1.0', released=True)
+
+        with Source.resolution_memo_scope():
+            resolved_version = Source.resolve_reference_expression('/orgs/org/sources/source/')
+            self.assertEqual(resolved_version.id, source_v1.id)
+            with self.assertNumQueries(0):
+                self.assertIs(Source.resolve_reference_expression('/orgs/org/sources/source/'), resolved_version)
+                self.assertIs(Collection.resolve_reference_expression('/orgs/org/sources/source/'), resolved_version)
+            with Source.resolution_memo_scope():
+                with self.assertNumQueries(0):
+                    Source.resolve_reference_expression('/orgs/org/sources/source/')
+
+            source_v2 = OrganizationSourceFactory(
+                mnemonic='source', organization=org, version='v2.0', released=True)
+
+            self.assertEqual(Source.resolve_reference_expression('/orgs/org/sources/source/').id, source_v2.id)
+            self.assertEqual(
+                Source.resolve_reference_expression('/orgs/org/sources/source/', version=HEAD).id, source.id)
+
+        self.assertIsNone(Source.resolution_memo.repos)
+
     def test_resolve_reference_expression_with_canonical_url(self):
         org1 = OrganizationFactory(mnemonic='org1')
         org2 = OrganizationFactory(mnemonic='org2')
@@ -1214,6 +1238,69 @@ class SourceTest(OCLTestCase):
         self.assertEqual(result.cascaded_entries['concepts'].count(), 0)
         self.assertEqual(result.cascaded_entries['mappings'].count(), 0)
 
+    @patch('core.sources.models.Source._compute_facets')
+    def test_update_facets(self, compute_facets_mock):
+        compute_facets_mock.side_effect = [{'conceptClass': [['Drug', 2, False]]}, {'mapType': [['SAME-AS', 1, False]]}]
+        source = OrganizationSourceFactory()
+        source_v1 = OrganizationSourceFactory(
+            version='v1', mnemonic=source.mnemonic, organization=source.organization)
+
+        self.assertEqual(
+            source_v1.get_facets_search_filters(),
+            {
+                'owner': source.organization.mnemonic, 'owner_type': 'Organization',
+                'source': source.mnemonic, 'source_version': 'v1'
+            }
+        )
+
+        source_v1.update_facets()
+        compute_facets_mock.assert_not_called()
+
+        with self.settings(TEST_MODE=False):
+            source.update_facets()
+            compute_facets_mock.assert_not_called()
+
+            source_v1.update_facets()
+
+        self.assertEqual(compute_facets_mock.call_count, 2)
+        source_v1.refresh_from_db()
+        self.assertEqual(
+            source_v1.facets,
+            {'concepts': {'conceptClass': [['Drug', 2, False]]}, 'mappings': {'mapType': [['SAME-AS', 1, False]]}}
+        )
+        self.assertEqual(source_v1.get_precomputed_facets('concepts'), {'conceptClass': [['Drug', 2, False]]})
+        self.assertIsNone(source.get_precomputed_facets('concepts'))
+
+        source_v1.set_precomputed_facets('mappings', {})
+        source_v1.refresh_from_db()
+        self.assertEqual(source_v1.facets, {'concepts': {'conceptClass': [['Drug', 2, False]]}, 'mappings': {}})
+
+        lock_key = index_source_concepts.get_key(kwargs={'source_id': source_v1.id})
+        self.assertFalse(source_v1.has_pending_index_tasks())
+        index_source_concepts.once_backend.redis.set(lock_key, 'task-id')
+        try:
+            self.assertTrue(source_v1.has_pending_index_tasks())
+            source_v1.set_precomputed_facets('mappings', {'mapType': []})
+            with self.settings(TEST_MODE=False):
+                source_v1.update_facets()
+        finally:
+            index_source_concepts.once_backend.redis.delete(lock_key)
+        self.assertEqual(compute_facets_mock.call_count, 2)
+        source_v1.refresh_from_db()
+        self.assertEqual(source_v1.facets, {'concepts': {'conceptClass': [['Drug', 2, False]]}, 'mappings': {}})
+
+
+    def test_compute_facets_counts_public_children_only(self):
+        source = OrganizationSourceFactory(version='v1')
+        facet_class = Mock()
+        facet_class.return_value.execute.return_value.facets.to_dict.return_value = {'conceptClass': []}
+
+        self.assertEqual(source._compute_facets(facet_class, ConceptDocument), {'conceptClass': []})  # pylint: disable=protected-access
+
+        search = facet_class.call_args[1]['_search'].to_dict()
+        self.assertIn({'match': {'public_can_view': True}}, search['query']['bool']['must'])
+        self.assertIn({'match': {'source_version': 'v1'}}, search['query']['bool']['must'])
+
 
 class TasksTest(OCLTestCase):
     @patch('core.sources.models.Source.index_children')
@@ -1235,9 +1322,10 @@ class TasksTest(OCLTestCase):
         export_source_task.delay.assert_not_called()
         index_children_mock.assert_not_called()
 
+    @patch('core.sources.models.Source.update_facets')
     @patch('core.sources.models.Source.index_children')
     @patch('core.common.tasks.export_source')
-    def test_seed_children_task_with_export(self, export_source_task, index_children_mock):
+    def test_seed_children_task_with_export(self, export_source_task, index_children_mock, update_facets_mock):
         source = OrganizationSourceFactory()
         ConceptFactory(parent=source)
         MappingFactory(parent=source)
@@ -1253,6 +1341,7 @@ class TasksTest(OCLTestCase):
         self.assertEqual(source_v1.mappings.count(), 1)
         export_source_task.delay.assert_called_once_with(source_v1.id)
         index_children_mock.assert_called_once()
+        update_facets_mock.assert_called_once()
 
     def test_update_source_active_mappings_count(self):
         source = OrganizationSourceFactory()
@@ -58,6 +58,11 @@ urlpatterns = [
         views.SourceVersionExportView.as_view(),
         name='sourceversion-latest-export-detail'
     ),
+    re_path(
+        fr'^(?P<source>{NAMESPACE_PATTERN})/latest/export/delta/$',
+        views.SourceVersionDeltaExportView.as_view(),
+        name='sourceversion-latest-export-delta'
+    ),
     re_path(fr"^(?P<source>{NAMESPACE_PATTERN})/concepts/\$clone/", views.SourceConceptsCloneView.as_view()),
     re_path(fr"^(?P<source>{NAMESPACE_PATTERN})/concepts/indexes/", views.SourceConceptsIndexView.as_view()),
     re_path(fr"^(?P<source>{NAMESPACE_PATTERN})/mappings/indexes/", views.SourceMappingsIndexView.as_view()),
@@ -87,6 +92,10 @@ urlpatterns = [
         r'^(?P<source>{pattern})/(?P<version>{pattern})/export/$'.format(pattern=NAMESPACE_PATTERN),
         views.SourceVersionExportView.as_view(), name='sourceversion-export'
     ),
+    re_path(
+        r'^(?P<source>{pattern})/(?P<version>{pattern})/export/delta/$'.format(pattern=NAMESPACE_PATTERN),
+        views.SourceVersionDeltaExportView.as_view(), name='sourceversion-export-delta'
+    ),
     re_path(
         r"^(?P<source>{pattern})/(?P<version>{pattern})/extras/$".format(pattern=NAMESPACE_PATTERN),
         views.SourceVersionExtrasView.as_view(),
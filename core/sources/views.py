@@ -24,8 +24,8 @@ from core.common.permissions import CanViewConceptDictionary, CanEditConceptDict
     CanViewConceptDictionaryVersion
 from core.common.serializers import TaskSerializer
 from core.common.swagger_parameters import q_param, limit_param, sort_desc_param, sort_asc_param, \
-    page_param, verbose_param, include_retired_param, updated_since_param, include_facets_header, compress_header, \
-    canonical_url_param
+    page_param, cursor_param, verbose_param, include_retired_param, updated_since_param, include_facets_header, \
+    compress_header, canonical_url_param
 from core.common.tasks import export_source, index_source_concepts, index_source_mappings, delete_source
 from core.common.utils import parse_boolean_query_param, compact_dict_by_values, to_parent_uri
 from core.common.views import BaseAPIView, BaseLogoView, ConceptContainerExtraRetrieveUpdateDestroyView, TaskMixin
@@ -132,7 +132,7 @@ class SourceListView(SourceBaseView, ConceptDictionaryCreateMixin, ListWithHeade
 
     @swagger_auto_schema(
         manual_parameters=[
-            q_param, limit_param, sort_desc_param, sort_asc_param, page_param, verbose_param,
+            q_param, limit_param, sort_desc_param, sort_asc_param, page_param, cursor_param, verbose_param,
             include_retired_param, updated_since_param, canonical_url_param, include_facets_header, compress_header
         ]
     )
@@ -502,6 +502,11 @@ class SourceVersionExportView(ConceptContainerExportMixin, SourceVersionBaseView
             return status.HTTP_409_CONFLICT
 
 
+class SourceVersionDeltaExportView(SourceVersionExportView):
+    is_delta = True
+    http_method_names = ['get']
+
+
 class SourceHierarchyView(SourceBaseView, RetrieveAPIView):
     serializer_class = SourceSummaryDetailSerializer
     permission_classes = (CanViewConceptDictionary,)
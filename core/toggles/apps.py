@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class ToggleConfig(AppConfig):
+    name = 'core.toggles'
+    verbose_name = "Toggle"
+
+    def ready(self):
+        from core.toggles import signals  # pylint: disable=unused-variable, unused-import
@@ -1,8 +1,12 @@
+import time
+from threading import local
+
 from django.conf import settings
 from django.db import models
 from pydash import get
 
 from core.common.constants import SUPER_ADMIN_USER_ID
+from core.services.storages.redis import RedisService
 
 
 class Toggle(models.Model):
@@ -26,6 +30,10 @@ class Toggle(models.Model):
     updated_at = models.DateTimeField(auto_now=True, null=True)
     is_active = models.BooleanField(default=True)
 
+    CACHE_VERSION_KEY = 'toggles:version'
+    snapshot = {}  # per process, all toggles with the cache version they were loaded at, for TOGGLES_CACHE_TTL secs
+    memo = local()  # per request, set up by ToggleMemoMiddleware
+
     @classmethod
     def all(cls):
         return Toggle.objects.filter(is_active=True)
@@ -44,4 +52,57 @@ class Toggle(models.Model):
 
     @classmethod
     def get(cls, name):
-        return get(cls.to_dict(name), name, None)
+        memo = getattr(cls.memo, 'toggles', None)
+        if memo is not None and name in memo:
+            return memo[name]
+
+        value = get(cls.get_snapshot(), name, None)
+        if memo is not None:
+            memo[name] = value
+        return value
+
+    @classmethod
+    def get_snapshot(cls):
+        """
+        Returns all toggles from the process snapshot. Once the snapshot is older than TOGGLES_CACHE_TTL, it is
+        reloaded only if the cache version in redis has changed since, else it is kept for another TTL.
+        """
+        if get(settings, 'TEST_MODE', False) or not settings.TOGGLES_CACHE_TTL:
+            return cls.to_dict()
+
+        now = time.monotonic()
+        snapshot = cls.snapshot
+        if snapshot and now < snapshot['expires_at']:
+            return snapshot['toggles']
+
+        version = cls.get_cache_version()
+        if not snapshot or version is None or version != snapshot['version']:
+            snapshot = {'toggles': cls.to_dict(), 'version': version}
+        cls.snapshot = {**snapshot, 'expires_at': now + settings.TOGGLES_CACHE_TTL}
+        return snapshot['toggles']
+
+    @classmethod
+    def get_cache_version(cls):
+        try:
+            return RedisService().get(cls.CACHE_VERSION_KEY) or b'0'
+        except:  # pylint: disable=bare-except
+            return None
+
+    @classmethod
+    def invalidate_cache(cls):
+        """Drops this process's snapshot/request memo and makes other processes reload theirs once their TTL ends."""
+        cls.snapshot = {}
+        if getattr(cls.memo, 'toggles', None) is not None:
+            cls.memo.toggles = {}
+        try:
+            RedisService().get_client().incr(cls.CACHE_VERSION_KEY)
+        except:  # pylint: disable=bare-except
+            pass
+
+    @classmethod
+    def start_request_memo(cls):
+        cls.memo.toggles = {}
+
+    @classmethod
+    def end_request_memo(cls):
+        cls.memo.toggles = None
@@ -0,0 +1,12 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from core.toggles.models import Toggle
+
+
+@receiver(post_save, sender=Toggle)
+@receiver(post_delete, sender=Toggle)
+def invalidate_toggles_cache(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    # only once committed, so that no process caches the toggles again from the old rows in between
+    transaction.on_commit(Toggle.invalidate_cache)
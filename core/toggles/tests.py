@@ -1,5 +1,7 @@
 from unittest.mock import patch, Mock
 
+from django.test import override_settings
+
 from core.common.tests import OCLTestCase
 from core.toggles.models import Toggle
 
@@ -35,3 +37,50 @@ class ToggleTest(OCLTestCase):
 
         self.assertTrue(toggle_dict['qa-active-default-true'])
         self.assertFalse(toggle_dict['qa-default-active-false'])
+
+    @override_settings(TEST_MODE=False, TOGGLES_CACHE_TTL=60)
+    @patch('core.toggles.models.RedisService')
+    def test_get_from_snapshot(self, redis_service_mock):
+        redis_service_mock.return_value.get.return_value = b'1'
+        Toggle.snapshot = {}
+
+        with self.assertNumQueries(1):
+            self.assertTrue(Toggle.get('dev'))
+            self.assertIsNone(Toggle.get('qa-inactive-default-true'))
+        redis_service_mock.return_value.get.assert_called_once_with('toggles:version')
+
+        Toggle.snapshot['expires_at'] = 0
+        with self.assertNumQueries(0):
+            self.assertTrue(Toggle.get('dev'))
+
+        Toggle.snapshot['expires_at'] = 0
+        redis_service_mock.return_value.get.return_value = b'2'
+        with self.assertNumQueries(1):
+            self.assertTrue(Toggle.get('dev'))
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Toggle.objects.filter(name='dev').first().delete()
+            redis_service_mock.return_value.get_client.return_value.incr.assert_not_called()
+        self.assertEqual(len(callbacks), 1)
+        redis_service_mock.return_value.get_client.return_value.incr.assert_called_once_with('toggles:version')
+        self.assertEqual(Toggle.snapshot, {})
+        self.assertIsNone(Toggle.get('dev'))
+
+        Toggle.snapshot = {}
+
+    def test_get_from_request_memo(self):
+        Toggle.start_request_memo()
+        try:
+            with self.assertNumQueries(1):
+                self.assertTrue(Toggle.get('dev'))
+                self.assertTrue(Toggle.get('dev'))
+
+            with self.captureOnCommitCallbacks(execute=True):
+                Toggle(name='new-dev').save()
+            with self.assertNumQueries(1):
+                self.assertTrue(Toggle.get('new-dev'))
+        finally:
+            Toggle.end_request_memo()
+
+        with self.assertNumQueries(1):
+            self.assertTrue(Toggle.get('dev'))
@@ -27,7 +27,7 @@ from core.collections.views import ReferenceExpressionResolveView
 from core.common.constants import NAMESPACE_PATTERN
 from core.common.utils import get_api_base_url
 from core.common.views import RootView, FeedbackView, APIVersionView, ChangeLogView, StandardChecksumView, \
-    SmartChecksumView
+    SmartChecksumView, ListResponseCacheStatsView
 from core.concepts.views import ConceptsHierarchyAmendAdminView
 from core.importers.views import BulkImportView
 from core.settings import ENV
@@ -56,6 +56,7 @@ urlpatterns = [
     path('admin/reports/authored/', report_views.AuthoredView.as_view(), name='authored-report'),
     path(
         'admin/reports/monthly-usage/job/', report_views.ResourcesReportJobView.as_view(), name='monthly-usage-job'),
+    path('admin/cache/list-responses/', ListResponseCacheStatsView.as_view(), name='list-response-cache-stats'),
     path('admin/concepts/amend-hierarchy/', ConceptsHierarchyAmendAdminView.as_view(), name='concepts-amend-hierarchy'),
     re_path(r'^\$resolveReference/$', ReferenceExpressionResolveView.as_view(), name='$resolveReference'),
     re_path(r'^\$checksum/standard/$', StandardChecksumView.as_view(), name='$checksum-standard'),
@@ -404,6 +404,43 @@ class ValueSetTest(OCLAPITestCase):
         self.assertEqual(resource['parameter'][0]['name'], 'result')
         self.assertEqual(resource['parameter'][0]['valueBoolean'], True)
 
+    def test_validate_code_globally_via_bundle(self):
+        self.collection.add_references([
+            CollectionReference(
+                expression=self.concept_1.uri, collection=self.collection, code=self.concept_1.mnemonic,
+                system=self.concept_1.parent.uri, version='v2'
+            ),
+        ])
+        self.collection_v1.seed_references()
+
+        def entry(code, url='http://c1.com'):
+            return {'resource': {'resourceType': 'Parameters', 'parameter': [
+                {'name': 'url', 'valueUri': url},
+                {'name': 'system', 'valueUri': 'http://some/url'},
+                {'name': 'systemVersion', 'valueString': self.org_source_v2.version},
+                {'name': 'code', 'valueCode': code}
+            ]}}
+
+        response = self.client.post(
+            '/fhir/ValueSet/$validate-code/',
+            data={
+                'resourceType': 'Bundle',
+                'type': 'batch',
+                'entry': [
+                    entry(self.concept_1.mnemonic), entry(self.concept_2.mnemonic), entry('non_existing'),
+                    entry(self.concept_1.mnemonic, 'http://non/existing')
+                ]
+            },
+            format='json'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['type'], 'batch-response')
+        self.assertEqual(
+            [entry['resource']['parameter'][0]['valueBoolean'] for entry in response.data['entry']],
+            [True, False, False, False]
+        )
+
     def test_validate_code_globally_negative(self):
         self.collection.add_references([
             CollectionReference(
@@ -52,6 +52,14 @@ class ValueSetListView(CollectionListView):
 
 
 class ValueSetValidateCodeView(CodeSystemValidateCodeView):
+    required_parameters = ['url', 'system', 'code']
+    coding_parameters = {'system': 'system', 'version': 'systemVersion', 'code': 'code', 'display': 'display'}
+
+    def is_fast_path_supported(self, inputs, is_batch):
+        return 'collection' not in self.kwargs and super().is_fast_path_supported(inputs, is_batch)
+
+    def evaluate(self, operations, inputs):
+        return operations.validate_value_set_code(inputs)
 
     def get_queryset(self):
         queryset = super(ConceptRetrieveUpdateDestroyView, self).get_queryset()
@@ -65,22 +73,20 @@ class ValueSetValidateCodeView(CodeSystemValidateCodeView):
         system_version = parameters.get('systemVersion')
 
         if url:
-            collection = Collection.objects.filter(canonical_url=url).exclude(version=HEAD)\
-                .filter(is_latest_version=True)
+            collection = Collection.memoize_resolution(
+                ('fhir_value_set', url),
+                lambda: Collection.objects.filter(
+                    canonical_url=url, is_latest_version=True).exclude(version=HEAD).first()
+            )
             if not collection:
                 return queryset.none()
-            queryset = queryset.filter(references__collection=collection.first())
+            queryset = queryset.filter(references__collection=collection)
 
         if code and system:
-            concept_source = Source.objects.filter(canonical_url=system)
-            if not concept_source:
-                return queryset.none()
-            if system_version:
-                concept_source = concept_source.filter(version=system_version)
-            else:
-                concept_source = concept_source.filter(is_latest_version=True).exclude(version=HEAD)
+            concept_source = Source.memoize_resolution(
+                ('fhir_value_set_system', system, system_version), lambda: self.resolve_system(system, system_version))
             if concept_source:
-                queryset = queryset.filter(sources=concept_source.first(), mnemonic=code)
+                queryset = queryset.filter(sources=concept_source, mnemonic=code)
             else:
                 return queryset.none()
 
@@ -91,6 +97,15 @@ class ValueSetValidateCodeView(CodeSystemValidateCodeView):
 
         return queryset
 
+    @staticmethod
+    def resolve_system(system, system_version):
+        concept_source = Source.objects.filter(canonical_url=system)
+        if system_version:
+            concept_source = concept_source.filter(version=system_version)
+        else:
+            concept_source = concept_source.filter(is_latest_version=True).exclude(version=HEAD)
+        return concept_source.first()
+
 
 class ValueSetRetrieveUpdateView(CollectionRetrieveUpdateDestroyView):
     serializer_class = ValueSetDetailSerializer